@@ -6,18 +6,24 @@ import os
 import shutil
 import subprocess
 import pandas as pd
+import numpy as np
 import json
+import hashlib
+import sqlite3
+import tempfile
 from collections import Counter
 from django import db
+from django.db import transaction
 from multiprocessing import Queue as mp_Queue, Manager, Process, Lock as mp_Lock
 from threading import Lock as mt_Lock, Thread, get_ident
-from queue import Queue as mt_Queue
-from general import ThreadSafeGeneral
+from queue import Queue as mt_Queue, Empty, Full
+from general import ThreadSafeGeneral, ResultQueueWorkerPool, SharedResourceLock
 from datetime import datetime
 import distance
 from plotting import DistScatterPlotterSamples, SeqStackedBarPlotter
 from symportal_utils import BlastnAnalysis, MothurAnalysis, NucleotideSequence
 from output import SequenceCountTableCreator
+from resource_estimation import StageProfiler, get_data_loading_work_units
 import ntpath
 import re
 import math
@@ -25,23 +31,51 @@ from numpy import NaN
 from collections import defaultdict
 import itertools
 import time
+import traceback
 from shutil import which
 import sp_config
-from django_general import CreateStudyAndAssociateUsers
+from django_general import CreateStudyAndAssociateUsers, WorkerReferenceData, ReferenceSequenceCache
 import logging
 
 
+def initialize_pool_worker(path_to_symclade_db=None):
+    """The initializer of each worker of the persistent ResultQueueWorkerPool of a run. The workers are forked
+    with Django already set up (by the parent, which closes its database connections before forking them) and
+    each opens its own database connection. The read only data that is used by the jobs of the run is loaded once
+    per worker here rather than by each job: the ReferenceSequences (see WorkerReferenceData) and, when given,
+    the clade k-mer sets of the symClade database (see SymCladeKmerPreClassifier.get_shared).
+    """
+    if WorkerReferenceData.version is None:
+        WorkerReferenceData.load()
+    if path_to_symclade_db is not None and os.path.isfile(path_to_symclade_db):
+        SymCladeKmerPreClassifier.get_shared(path_to_symclade_db=path_to_symclade_db)
+
+
 class DataLoading:
     # The clades refer to the phylogenetic divisions of the Symbiodiniaceae. Most of them are represented at the genera
     # level. E.g. All members of clade C belong to the genus Cladocopium.
     clade_list = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I']
+    # The SharedResourceLocks that coordinate concurrent loadings
+    symclade_db_lock_name = 'symclade_db'
+    reference_sequences_lock_name = 'reference_sequences'
 
     def __init__(
             self, parent_work_flow_obj, user_input_path, datasheet_path,
             screen_sub_evalue, num_proc,no_fig, no_ord, no_output,
-            distance_method, no_pre_med_seqs, multiprocess, start_time, date_time_str, debug=False):
+            distance_method, no_pre_med_seqs, multiprocess, start_time, date_time_str, debug=False,
+            single_mothur_batch=False, use_qc_cache=False, lazy_input_staging=False, release_intermediates=False,
+            temp_disk_budget=None, deduplicated_blast_screening=False, use_blast_cache=False,
+            incremental_symclade_updates=False, kmer_preclassifier=False, kmer_preclassifier_validation=False,
+            sub_evalue_screening_db=None, use_sub_evalue_verdict_cache=False, streaming_pipeline=False,
+            resume_data_set_uid=None, database_writer_process=False, worker_pool=None,
+            auto_concurrency_selector=None):
         self.parent = parent_work_flow_obj
         self.thread_safe_general = ThreadSafeGeneral()
+        # When given, rather than a new DataSet being created, the loading of this DataSet is resumed.
+        # The stages and samples with verified checkpoints (see DataLoadingCheckpoint) in its
+        # temp working directory, or that are already complete in the database, are skipped.
+        self.resume_data_set_uid = resume_data_set_uid
+        self.samples_resumed_with_initial_mothur_qc_complete = set()
         # check and generate the sample_meta_info_df first before creating the DataSet object
         self.sample_meta_info_df = None
         self.user_input_path = user_input_path
@@ -62,10 +96,15 @@ class DataLoading:
 
         self.num_proc = min(num_proc, len(self.list_of_samples_names))
         self.temp_working_directory = self._setup_temp_working_directory()
-        self.date_time_str = date_time_str
+        if self.resume_data_set_uid is not None:
+            # Continue to use the output directory of the loading being resumed as it holds the pre-MED seqs
+            self.date_time_str = self.dataset_object.time_stamp
+        else:
+            self.date_time_str = date_time_str
         self.output_directory = self._setup_output_directory()
         logging.basicConfig(format='%(levelname)s:%(message)s',
-                            filename=os.path.join(self.output_directory, f'{self.date_time_str}_log.log'), filemode='w',
+                            filename=os.path.join(self.output_directory, f'{self.date_time_str}_log.log'),
+                            filemode='a' if self.resume_data_set_uid is not None else 'w',
                             level=logging.INFO)
         logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
         # directory for the data_explorer outputs
@@ -81,7 +120,7 @@ class DataLoading:
             self.sample_name_to_seq_files_dict = dict()
             self._generate_stability_file_and_data_set_sample_objects_without_datasheet(end_index)
         self.list_of_dss_objects = DataSetSample.objects.filter(data_submission_from=self.dataset_object)
-        if sp_config.system_type == 'remote':
+        if sp_config.system_type == 'remote' and self.resume_data_set_uid is None:
             csaau = CreateStudyAndAssociateUsers(
                 date_time_str=self.date_time_str, ds=self.dataset_object, list_of_dss_objects=self.list_of_dss_objects)
             csaau.create_study_and_user_objects()
@@ -172,22 +211,125 @@ class DataLoading:
         self.pre_med_seq_start_time = None
         self.pre_med_seq_stop_time = None
         self.multiprocess = multiprocess
+        # When True the initial mothur QC of each sample is run as a single mothur batch (one mothur process)
+        self.single_mothur_batch = single_mothur_batch
+        # When use_qc_cache is True, the results of the initial mothur QC are stored in, and where available
+        # retrieved from, a cache keyed by the contents of the fastq pair and the QC parameters
+        if use_qc_cache:
+            self.qc_cache_directory = os.path.join(self.symportal_root_directory, 'qc_cache')
+        else:
+            self.qc_cache_directory = None
+        # When True the fastq files are not copied to the temp working directory before the QC starts.
+        # Rather, mothur reads each pair directly from the path it was supplied at.
+        self.lazy_input_staging = lazy_input_staging
+        # When release_intermediates is True (or a temp_disk_budget in GB is given) the intermediate files of each
+        # sample are removed from the temp working directory as soon as no later stage needs them.
+        # When a temp_disk_budget is given, no new samples are started in the initial QC while the
+        # temp working directory is larger than the budget.
+        if release_intermediates or temp_disk_budget is not None:
+            self.temp_working_directory_lifecycle = TempWorkingDirectoryLifecycle(
+                temp_working_directory=self.temp_working_directory, disk_budget_gb=temp_disk_budget)
+        else:
+            self.temp_working_directory_lifecycle = None
+        # When True the unique sequences of all samples are BLASTed against symClade together (each only once)
+        # rather than each sample's sequences being BLASTed separately
+        self.deduplicated_blast_screening = deduplicated_blast_screening
+        # When use_blast_cache is True the results of BLASTing sequences against symClade are stored in,
+        # and where available retrieved from, a cache keyed by the sequence and the symClade version.
+        # The cache is only used by the deduplicated BLAST screening.
+        if use_blast_cache:
+            if not self.deduplicated_blast_screening:
+                raise RuntimeError({'message': 'use_blast_cache requires deduplicated_blast_screening'})
+            self.blast_cache_directory = os.path.join(self.symportal_root_directory, 'blast_cache')
+        else:
+            self.blast_cache_directory = None
+        # When True the sequences confirmed as Symbiodiniaceae during the sub e value screening are held in a
+        # secondary BLAST database (the SymCladeDeltaDatabase) rather than symClade being rewritten and rebuilt
+        # in every iteration. symClade is updated once at the end of the screening.
+        self.incremental_symclade_updates = incremental_symclade_updates
+        self.symclade_delta_database = None
+        # The SymCladeKmerPreClassifier mode. 'classify' to only BLAST the sequences that the pre-classifier
+        # cannot confidently classify, 'validate' to BLAST as normal and report the pre-classifier's concordance
+        if kmer_preclassifier_validation:
+            self.kmer_preclassifier_mode = 'validate'
+        elif kmer_preclassifier:
+            self.kmer_preclassifier_mode = 'classify'
+        else:
+            self.kmer_preclassifier_mode = None
+        # The BLAST database that the sub e value sequences are screened against. When None, the default
+        # NCBI nt database is used. When a database is given, the screening is also performed on local systems.
+        self.sub_evalue_screening_db_path = sub_evalue_screening_db
+        if self.sub_evalue_screening_db_path is not None:
+            self.screen_sub_evalue = True
+        if use_sub_evalue_verdict_cache:
+            self.sub_evalue_verdict_cache_directory = os.path.join(
+                self.symportal_root_directory, 'sub_evalue_verdict_cache')
+        else:
+            self.sub_evalue_verdict_cache_directory = None
+        self.sub_evalue_screening_backend = None
+        # When True the initial mothur QC, taxonomic screening and MED are run as a per sample pipeline
+        # by the StreamingSamplePipelineHandler so that each sample advances to its next stage as soon as its
+        # previous stage is complete rather than waiting for all samples to complete the stage.
+        self.streaming_pipeline = streaming_pipeline
+        self.streaming_sample_pipeline_handler = None
+        # When True the DataSetSample objects collected from the workers of the parallel stages are saved
+        # in batched transactions by a single dedicated DatabaseWriter process rather than one at a time.
+        self.database_writer_process = database_writer_process
+        # The ResultQueueWorkerPool used by the parallel stages. When the pool of the run is not given, each stage
+        # starts and stops its own workers.
+        if worker_pool is None:
+            self.worker_pool = ResultQueueWorkerPool(num_proc=self.num_proc, multiprocess=self.multiprocess)
+        else:
+            self.worker_pool = worker_pool
+        # When given (--num_proc auto), self.num_proc is set for each of the parallel stages
+        # by the AutoConcurrencySelector (see _select_num_proc_for_stage).
+        self.auto_concurrency_selector = auto_concurrency_selector
+        # Records the time and resources of each stage to calibrate the RuntimeResourceEstimator (--dry_run)
+        self.stage_profiler = StageProfiler(
+            symportal_root_directory=self.symportal_root_directory,
+            temp_working_directory=self.temp_working_directory, worker_pool=self.worker_pool)
         self.start_time = start_time
 
     def load_data(self):
-        self._copy_and_decompress_input_files_to_temp_wkd()
+        taxonomic_screening_complete = False
+        if self.resume_data_set_uid is not None:
+            taxonomic_screening_complete = self._prepare_to_resume()
+
+        if not taxonomic_screening_complete:
+            self._copy_and_decompress_input_files_to_temp_wkd()
+
+            # Exclusive so that a concurrent loading does not make, or BLAST against, the binaries at the same time
+            with SharedResourceLock(self.symclade_db_lock_name):
+                self._if_symclade_binaries_not_present_remake_db()
+
+        if self.streaming_pipeline and not taxonomic_screening_complete:
+            self.stage_profiler.start_stage('streaming_sample_pipeline')
+            self._do_streaming_sample_pipeline()
+            self._record_taxonomic_screening_checkpoint()
+            self.stage_profiler.end_stage(num_proc=self.num_proc)
+        else:
+            if not taxonomic_screening_complete:
+                self.stage_profiler.start_stage('initial_mothur_qc')
+                self._do_initial_mothur_qc()
+                self.stage_profiler.end_stage(num_proc=self.num_proc)
 
-        self._if_symclade_binaries_not_present_remake_db()
+                self.stage_profiler.start_stage('taxonomic_screening')
+                self._taxonomic_screening()
 
-        self._do_initial_mothur_qc()
+                self._record_taxonomic_screening_checkpoint()
+                self.stage_profiler.end_stage(num_proc=self.num_proc)
 
-        self._taxonomic_screening()
-
-        self._do_med_decomposition()
+            self.stage_profiler.start_stage('med_decomposition')
+            self._do_med_decomposition()
+            self.stage_profiler.end_stage(num_proc=self.num_proc)
 
+        self.stage_profiler.start_stage('data_set_sample_sequence_creation')
         self._create_data_set_sample_sequences_from_med_nodes()
+        self.stage_profiler.end_stage(num_proc=1)
         if not self.no_pre_med_seqs:
+            self.stage_profiler.start_stage('pre_med_seq_creation')
             self._create_data_set_sample_sequence_pre_med_objs()
+            self.stage_profiler.end_stage(num_proc=self.num_proc)
         else:
             print('\n\nSkipping generation of pre med seq objects at users request\n\n')
 
@@ -200,6 +342,7 @@ class DataLoading:
         self._write_data_set_info_to_stdout()
 
         if not self.no_output:
+            self.stage_profiler.start_stage('data_loading_outputs')
             self._output_seqs_count_table()
 
             self._write_sym_non_sym_and_size_violation_dirs_to_stdout()
@@ -218,6 +361,12 @@ class DataLoading:
             self.thread_safe_general.write_out_js_file_to_return_python_objs_as_js_objs(
                 [{'function_name': 'getDataFilePaths', 'python_obj': new_dict}],
                 js_outpath=self.js_file_path)
+            self.stage_profiler.end_stage(num_proc=self.num_proc)
+
+        # The stages completed before a resumed loading was interrupted were not profiled
+        if self.resume_data_set_uid is None:
+            self.stage_profiler.write_stage_profiles(
+                work_units_dict=get_data_loading_work_units(data_set_object=self.dataset_object))
 
         print('\n\nDATA LOADING COMPLETE')
         print(f'DataSet id: {self.dataset_object.id}')
@@ -229,6 +378,70 @@ class DataLoading:
         print(f'DataSet loading_complete_time_stamp: {self.dataset_object.loading_complete_time_stamp}\n\n\n')
         print(f"Log written to {os.path.join(self.output_directory, f'{self.date_time_str}_log.log')}")
 
+    def _prepare_to_resume(self):
+        """Identify what was completed in the loading being resumed.
+        The samples that produced errors are retrieved from the database and will not be reprocessed.
+        Returns True if the taxonomic screening (and therefore also the initial mothur QC) is complete
+        and the MED inputs that are still required are verified.
+        If the taxonomic screening is not complete the samples with a verified initial mothur QC
+        checkpoint are identified so that their QC can be skipped.
+        """
+        print(f'\nResuming the loading of DataSet {self.dataset_object.id}: {self.dataset_object.name}')
+        self.samples_that_caused_errors_in_qc_list = [
+            dss.name for dss in DataSetSample.objects.filter(
+                data_submission_from=self.dataset_object, error_in_processing=True)]
+        print(f'{len(self.samples_that_caused_errors_in_qc_list)} samples produced errors in the previous loading')
+
+        if self._taxonomic_screening_checkpoint_is_complete():
+            print('Taxonomic screening complete. Resuming from MED.')
+            return True
+
+        # The taxonomic screening will be performed again so the checkpoints of the later stages
+        # can no longer be relied upon
+        DataLoadingCheckpoint(stage=DataLoadingCheckpoint.med_input_stage).remove_from(self.temp_working_directory)
+        DataLoadingCheckpoint(stage=DataLoadingCheckpoint.med_stage).remove_from(self.temp_working_directory)
+        initial_mothur_qc_checkpoint = DataLoadingCheckpoint(stage=DataLoadingCheckpoint.initial_mothur_qc_stage)
+        # The checkpoint is recorded by the QC worker and so may be ahead of the database. Only samples whose
+        # QC attributes were also saved can skip their QC.
+        sample_names_with_saved_qc_attributes = set(
+            DataSetSample.objects.filter(
+                data_submission_from=self.dataset_object, post_qc_absolute_num_seqs__gt=0
+            ).values_list('name', flat=True))
+        self.samples_resumed_with_initial_mothur_qc_complete = set(
+            sample_name for sample_name in self.list_of_samples_names if
+            sample_name in sample_names_with_saved_qc_attributes and
+            initial_mothur_qc_checkpoint.is_complete(os.path.join(self.temp_working_directory, sample_name)))
+        print(f'Initial mothur QC complete for {len(self.samples_resumed_with_initial_mothur_qc_complete)} samples')
+        return False
+
+    def _taxonomic_screening_checkpoint_is_complete(self):
+        if not DataLoadingCheckpoint(stage=DataLoadingCheckpoint.taxonomic_screening_stage).is_complete(
+                self.temp_working_directory):
+            return False
+        # Verify each of the redundant fastas that are still to be decomposed
+        med_input_checkpoint = DataLoadingCheckpoint(stage=DataLoadingCheckpoint.med_input_stage)
+        med_checkpoint = DataLoadingCheckpoint(stage=DataLoadingCheckpoint.med_stage)
+        for redundant_fasta_path in PerformMEDHandler.get_list_of_redundant_fasta_paths(self.temp_working_directory):
+            if med_checkpoint.is_complete(os.path.join(os.path.dirname(redundant_fasta_path), 'MEDOUT')):
+                continue
+            if not med_input_checkpoint.is_complete(os.path.dirname(redundant_fasta_path)):
+                print(f'{redundant_fasta_path} could not be verified')
+                return False
+        return True
+
+    def _record_taxonomic_screening_checkpoint(self):
+        """Record the redundant fastas that are the input to MED and then the completion of the taxonomic
+        screening along with the pre-MED seqs that it wrote to the output directory."""
+        med_input_checkpoint = DataLoadingCheckpoint(stage=DataLoadingCheckpoint.med_input_stage)
+        for redundant_fasta_path in PerformMEDHandler.get_list_of_redundant_fasta_paths(self.temp_working_directory):
+            med_input_checkpoint.record(
+                directory=os.path.dirname(redundant_fasta_path), file_paths=[redundant_fasta_path])
+        pre_med_file_paths = []
+        for dirpath, dirnames, files in os.walk(self.pre_med_sequence_output_directory_path):
+            pre_med_file_paths.extend([os.path.join(dirpath, file_name) for file_name in files])
+        DataLoadingCheckpoint(stage=DataLoadingCheckpoint.taxonomic_screening_stage).record(
+            directory=self.temp_working_directory, file_paths=pre_med_file_paths)
+
     def _check_mothur_version(self):
         mothur_version_cmd = subprocess.run(
             ['mothur', '-v'], stdout=subprocess.PIPE, stderr=subprocess.PIPE
@@ -239,6 +452,9 @@ class DataLoading:
         raise RuntimeError('SymPortal currently uses version 1.43 of mothur.\nCheck your version.')
 
     def _make_new_dataset_object(self):
+        if self.resume_data_set_uid is not None:
+            self._get_dataset_object_to_resume()
+            return
         self.dataset_object = DataSet(
             name=self.parent.args.name, time_stamp=self.parent.date_time_str,
             reference_fasta_database_used=self.parent.reference_db,
@@ -247,6 +463,24 @@ class DataLoading:
         self.dataset_object.save()
         self.parent.data_set_object = self.dataset_object
 
+    def _get_dataset_object_to_resume(self):
+        try:
+            self.dataset_object = DataSet.objects.get(id=self.resume_data_set_uid)
+        except DataSet.DoesNotExist:
+            raise RuntimeError(f'DataSet {self.resume_data_set_uid} not found. Unable to resume its loading.')
+        if self.dataset_object.loading_complete_time_stamp != 'None':
+            raise RuntimeError(
+                f'The loading of DataSet {self.resume_data_set_uid} is already complete. Nothing to resume.')
+        self.parent.data_set_object = self.dataset_object
+
+    def _check_data_set_samples_of_resumed_dataset(self):
+        resumed_sample_names = set(
+            dss.name for dss in DataSetSample.objects.filter(data_submission_from=self.dataset_object))
+        if resumed_sample_names != set(self.list_of_samples_names):
+            raise RuntimeError(
+                f'The samples of DataSet {self.dataset_object.id} do not match those being loaded. '
+                f'Please resume using the same input directory and datasheet as the original loading.')
+
     def _write_sym_non_sym_and_size_violation_dirs_to_stdout(self):
         if not self.no_pre_med_seqs:
             print(f'\nPre-MED Symbiodiniaceae sequences written out to:\n'
@@ -341,12 +575,14 @@ class DataLoading:
 
     def _output_seqs_count_table(self):
         sys.stdout.write('\nGenerating count tables for post- and pre-MED sequence abundances\n')
+        self._select_num_proc_for_stage(stage='seq_count_table_output', num_tasks=len(self.list_of_samples_names))
         self.sequence_count_table_creator = SequenceCountTableCreator(
             symportal_root_dir=self.symportal_root_directory, call_type='submission',
             no_pre_med_seqs=self.no_pre_med_seqs, ds_uids_output_str=str(self.dataset_object.id),
             num_proc=self.num_proc, date_time_str=self.date_time_str,
             html_dir=self.html_dir,
-            js_output_path_dict=self.js_output_path_dict, multiprocess=self.multiprocess)
+            js_output_path_dict=self.js_output_path_dict, multiprocess=self.multiprocess,
+            worker_pool=self.worker_pool)
         self.sequence_count_table_creator.make_seq_output_tables()
         self.seq_abund_relative_df_post_med = self.sequence_count_table_creator.output_df_relative_post_med
         self.output_path_list.extend(self.sequence_count_table_creator.output_paths_list)
@@ -395,36 +631,46 @@ class DataLoading:
                      f'{failed_count} samples produced errors\n')
 
     def _create_data_set_sample_sequences_from_med_nodes(self):
-        self.data_set_sample_creator_handler_instance = DataSetSampleCreatorHandler()
+        self.data_set_sample_creator_handler_instance = DataSetSampleCreatorHandler(multiprocess=self.multiprocess)
         self.data_set_sample_creator_handler_instance.execute_data_set_sample_creation(
             data_loading_list_of_med_output_directories=self.list_of_med_output_directories,
-            data_loading_debug=self.debug, data_loading_dataset_object=self.dataset_object)
+            data_loading_debug=self.debug, data_loading_dataset_object=self.dataset_object,
+            data_loading_temp_working_directory_lifecycle=self.temp_working_directory_lifecycle,
+            data_loading_resume=self.resume_data_set_uid is not None)
         self.dataset_object.currently_being_processed = False
         self.dataset_object.save()
 
     def _create_data_set_sample_sequence_pre_med_objs(self):
         print('\n\nCreating DataSetSampleSequencePM objects')
         self.pre_med_seq_start_time = time.time()
+        if self.resume_data_set_uid is not None:
+            # Remove any objects created before the loading being resumed was interrupted
+            DataSetSampleSequencePM.objects.filter(
+                data_set_sample_from__data_submission_from=self.dataset_object).delete()
+        self._select_num_proc_for_stage(stage='pre_med_seq_matching')
         data_set_sample_pre_med_obj_creator = FastDataSetSampleSequencePMCreator(
             dataset_object=self.dataset_object,
             pre_med_sequence_output_directory_path=self.pre_med_sequence_output_directory_path,
             num_proc=self.num_proc, path_to_seq_match_executable=self.path_to_seq_match_executable,
-            temp_working_directory=self.temp_working_directory)
+            temp_working_directory=self.temp_working_directory,
+            database_writer_process=self.database_writer_process, multiprocess=self.multiprocess)
         data_set_sample_pre_med_obj_creator.make_data_set_sample_pm_objects()
         self.pre_med_seq_stop_time = time.time()
         print(f'\n\nCreation of DataSetSampleSequencePM objects took '
               f'{self.pre_med_seq_stop_time-self.pre_med_seq_start_time}s')
 
     def _do_med_decomposition(self):
+        self._select_num_proc_for_stage(stage='med_decomposition', num_tasks=len(self.list_of_samples_names))
         self.perform_med_handler_instance = PerformMEDHandler(
             data_loading_temp_working_directory=self.temp_working_directory,
             data_loading_num_proc=self.num_proc,
-            multiprocess=self.multiprocess)
+            multiprocess=self.multiprocess, worker_pool=self.worker_pool)
 
         self.perform_med_handler_instance.execute_perform_med_worker(
             data_loading_debug=self.debug,
             data_loading_path_to_med_decompose_executable=self.path_to_med_decompose_executable,
-            data_loading_path_to_med_padding_executable=self.path_to_med_padding_executable)
+            data_loading_path_to_med_padding_executable=self.path_to_med_padding_executable,
+            data_loading_temp_working_directory_lifecycle=self.temp_working_directory_lifecycle)
 
         self.list_of_med_output_directories = self.perform_med_handler_instance.list_of_med_result_dirs
 
@@ -433,15 +679,71 @@ class DataLoading:
             for med_output_directory in self.list_of_med_output_directories:
                 print(med_output_directory)
 
+    def _select_num_proc_for_stage(self, stage, num_tasks=None):
+        if self.auto_concurrency_selector is None:
+            return
+        self.num_proc = self.auto_concurrency_selector.select_num_proc(stage=stage, num_tasks=num_tasks)
+
     def _do_initial_mothur_qc(self):
 
         if not self.sample_fastq_pairs:
             self._exit_and_del_data_set_sample('Sample fastq pairs list empty')
 
+        self._select_num_proc_for_stage(stage='initial_mothur_qc', num_tasks=len(self.sample_fastq_pairs))
         self.initial_mothur_handler = InitialMothurHandler(data_loading_parent=self)
         self.initial_mothur_handler.execute_worker_initial_mothur()
         self.samples_that_caused_errors_in_qc_list = list(
-            self.initial_mothur_handler.samples_that_caused_errors_in_qc_mp_list)
+            self.initial_mothur_handler.samples_that_caused_errors_in_qc_list)
+
+    def _do_streaming_sample_pipeline(self):
+        """Perform the initial mothur QC, the taxonomic screening and the MED decomposition using the
+        StreamingSamplePipelineHandler. If we are screening the sub evalue sequences, the screening needs the
+        results of all of the samples so we have a synchronisation point: the samples are streamed through the QC
+        and the first round of the potential symbiodiniaceae screening, then the iterative screening is
+        performed (see _taxonomic_screening), and then the samples are streamed through the sym non sym
+        screening and MED.
+        """
+        if not self.sample_fastq_pairs:
+            self._exit_and_del_data_set_sample('Sample fastq pairs list empty')
+
+        self.streaming_sample_pipeline_handler = StreamingSamplePipelineHandler(data_loading_parent=self)
+        # The first round of the potential sym tax screening is done within the pipeline. The handler holds
+        # the results under the same attributes as the PotentialSymTaxScreeningHandler.
+        self.taxonomic_screening_handler = self.streaming_sample_pipeline_handler
+        # The pipelines that BLAST against symClade hold the shared symClade lock so that it is not rewritten
+        # by a concurrent loading while they are running.
+        if self.screen_sub_evalue:
+            with SharedResourceLock(self.symclade_db_lock_name, shared=True):
+                self.streaming_sample_pipeline_handler.execute_streaming_sample_pipeline(
+                    stages=[
+                        StreamingSamplePipelineHandler.initial_mothur_qc_stage,
+                        StreamingSamplePipelineHandler.potential_sym_tax_screening_stage])
+            self.samples_that_caused_errors_in_qc_list = list(
+                self.streaming_sample_pipeline_handler.samples_that_caused_errors_in_qc_list)
+            self._taxa_screening_update_checked_samples_list()
+            self._make_fasta_of_seqs_found_in_more_than_two_samples_that_need_screening()
+
+            # The synchronisation point
+            self._iterative_sub_evalue_screening(first_iteration_complete=True)
+
+            self.streaming_sample_pipeline_handler.execute_streaming_sample_pipeline(
+                stages=[
+                    StreamingSamplePipelineHandler.sym_non_sym_tax_screening_stage,
+                    StreamingSamplePipelineHandler.med_stage])
+        else:
+            with SharedResourceLock(self.symclade_db_lock_name, shared=True):
+                self.streaming_sample_pipeline_handler.execute_streaming_sample_pipeline(
+                    stages=StreamingSamplePipelineHandler.all_stages)
+            self._make_fasta_of_seqs_found_in_more_than_two_samples_that_need_screening()
+
+        self.samples_that_caused_errors_in_qc_list = list(
+            self.streaming_sample_pipeline_handler.samples_that_caused_errors_in_qc_list)
+        self.list_of_med_output_directories = self.streaming_sample_pipeline_handler.list_of_med_output_directories
+
+        if self.debug:
+            print('MED dirs:')
+            for med_output_directory in self.list_of_med_output_directories:
+                print(med_output_directory)
 
     def _taxonomic_screening(self):
         """
@@ -472,23 +774,7 @@ class DataLoading:
         """
 
         if self.screen_sub_evalue:
-            if not len(self.samples_that_caused_errors_in_qc_list) == self.list_of_samples_names:
-                self._create_symclade_backup_incase_of_accidental_deletion_of_corruption()
-
-            while 1:
-                self.new_seqs_added_in_iteration = 0
-                # This method simply identifies whether there are sequences that need screening.
-                # Everytime that the execute_worker is run it pickles out the files needed for the next worker
-                self._make_fasta_of_sequences_that_need_taxa_screening()
-
-                if self.sequences_to_screen_fasta_as_list:
-                    # Now do the screening
-                    # The outcome of this will be an updated symClade.fa that we should then make a blastdb from it.
-                    self._screen_sub_e_seqs()
-                    if self.new_seqs_added_in_iteration == 0:
-                        break
-                else:
-                    break
+            self._iterative_sub_evalue_screening()
 
         else:
             # if not doing the screening we can simply run the execute_worker_taxa_screening once.
@@ -499,22 +785,67 @@ class DataLoading:
 
         self._do_sym_non_sym_tax_screening()
 
+    def _iterative_sub_evalue_screening(self, first_iteration_complete=False):
+        """The iterative screening of the sub evalue sequences described in _taxonomic_screening.
+        first_iteration_complete: True if the potential sym tax screening of the first iteration has already
+        been performed (by the StreamingSamplePipelineHandler).
+        """
+        if not len(self.samples_that_caused_errors_in_qc_list) == self.list_of_samples_names:
+            with SharedResourceLock(self.symclade_db_lock_name, shared=True):
+                self._create_symclade_backup_incase_of_accidental_deletion_of_corruption()
+
+        self.sub_evalue_screening_backend = SubEValueScreeningBackend(
+            temp_working_directory=self.temp_working_directory, num_proc=self.num_proc, debug=self.debug,
+            required_symbiodiniaceae_matches=self.required_symbiodiniaceae_matches,
+            db_path=self.sub_evalue_screening_db_path,
+            verdict_cache_directory=self.sub_evalue_verdict_cache_directory)
+
+        if self.incremental_symclade_updates:
+            self.symclade_delta_database = SymCladeDeltaDatabase(
+                temp_working_directory=self.temp_working_directory, debug=self.debug)
+
+        while 1:
+            self.new_seqs_added_in_iteration = 0
+            # This method simply identifies whether there are sequences that need screening.
+            # Everytime that the execute_worker is run it pickles out the files needed for the next worker
+            if first_iteration_complete:
+                first_iteration_complete = False
+            else:
+                self._make_fasta_of_sequences_that_need_taxa_screening()
+
+            if self.sequences_to_screen_fasta_as_list:
+                # Now do the screening
+                # The outcome of this will be an updated symClade.fa that we should then make a blastdb from it.
+                self._screen_sub_e_seqs()
+                if self.new_seqs_added_in_iteration == 0:
+                    break
+            else:
+                break
+        self.sub_evalue_screening_backend.close()
+
+        if self.symclade_delta_database is not None and self.symclade_delta_database.fasta_as_list:
+            self._taxa_screening_add_seqs_to_symclade_db(self.symclade_delta_database.fasta_as_list)
+
     def _do_sym_non_sym_tax_screening(self):
+        self._select_num_proc_for_stage(
+            stage='sym_non_sym_tax_screening', num_tasks=len(self.list_of_samples_names))
         self.sym_non_sym_tax_screening_handler = SymNonSymTaxScreeningHandler(
             data_loading_list_of_samples_names=self.list_of_samples_names,
             data_loading_num_proc=self.num_proc,
-            data_loading_samples_that_caused_errors_in_qc_mp_list=self.samples_that_caused_errors_in_qc_list,
-            multiprocess=self.multiprocess, data_loading_dataset_object=self.dataset_object
+            data_loading_samples_that_caused_errors_in_qc_list=self.samples_that_caused_errors_in_qc_list,
+            multiprocess=self.multiprocess, data_loading_dataset_object=self.dataset_object,
+            database_writer_process=self.database_writer_process, worker_pool=self.worker_pool
         )
         self.sym_non_sym_tax_screening_handler.execute_sym_non_sym_tax_screening(
             data_loading_temp_working_directory=self.temp_working_directory,
             data_loading_pre_med_sequence_output_directory_path=self.pre_med_sequence_output_directory_path,
 
             non_symb_and_size_violation_base_dir_path=self.non_symb_and_size_violation_base_dir_path,
-            data_loading_debug=self.debug
+            data_loading_debug=self.debug,
+            data_loading_temp_working_directory_lifecycle=self.temp_working_directory_lifecycle
         )
         self.samples_that_caused_errors_in_qc_list = list(
-            self.sym_non_sym_tax_screening_handler.samples_that_caused_errors_in_qc_mp_list
+            self.sym_non_sym_tax_screening_handler.samples_that_caused_errors_in_qc_list
         )
 
     def _screen_sub_e_seqs(self):
@@ -529,22 +860,11 @@ class DataLoading:
         at a 60% or higher
         identity. It must also have Symbiodinium or Symbiodiniaceae in the name. We will also require that a
         sub_e_value seq has at least the required_sybiodinium_matches (3 at the moment) before we call it Symbiodinium.
+        The search itself is done by the SubEValueScreeningBackend.
         """
-
-        blastn_analysis_object = BlastnAnalysis(
-            input_file_path=self.sequences_to_screen_fasta_path,
-            output_file_path=os.path.join(self.temp_working_directory, 'blast.out'),
-            max_target_seqs=10,
-            num_threads=str(self.num_proc), pipe_stdout_sterr=(not self.debug)
-        )
-
-        blastn_analysis_object.execute_blastn_analysis()
-
-        blast_output_dict = blastn_analysis_object.return_blast_results_dict()
-
-        query_sequences_verified_as_symbiodiniaceae_list = self._get_list_of_seqs_in_blast_result_that_are_symbiodiniaceae(
-            blast_output_dict
-        )
+        query_sequences_verified_as_symbiodiniaceae_list = \
+            self.sub_evalue_screening_backend.get_names_of_sequences_verified_as_symbiodiniaceae(
+                self.sequences_to_screen_fasta_path)
 
         self.new_seqs_added_in_iteration = len(query_sequences_verified_as_symbiodiniaceae_list)
         self.new_seqs_added_running_total += self.new_seqs_added_in_iteration
@@ -558,8 +878,19 @@ class DataLoading:
         new_symclade_fasta_as_list = self._taxa_screening_make_new_fasta_of_screened_seqs_to_be_added_to_symclade_db(
             query_sequences_verified_as_symbiodiniaceae_list
         )
-        combined_fasta = self._taxa_screening_combine_new_symclade_seqs_with_current(new_symclade_fasta_as_list)
-        self._taxa_screening_make_new_symclade_db(combined_fasta)
+        if self.symclade_delta_database is not None:
+            # symClade itself is only updated once the screening is complete
+            self.symclade_delta_database.add_sequences(new_symclade_fasta_as_list)
+            return
+        self._taxa_screening_add_seqs_to_symclade_db(new_symclade_fasta_as_list)
+
+    def _taxa_screening_add_seqs_to_symclade_db(self, new_symclade_fasta_as_list):
+        # symClade.fa is read, rewritten and its BLAST database remade under the exclusive symClade lock
+        # so that the sequences added by a concurrent loading are not lost and no loading BLASTs against
+        # a partially made database.
+        with SharedResourceLock(self.symclade_db_lock_name):
+            combined_fasta = self._taxa_screening_combine_new_symclade_seqs_with_current(new_symclade_fasta_as_list)
+            self._taxa_screening_make_new_symclade_db(combined_fasta)
 
     def _taxa_screening_make_new_symclade_db(self, combined_fasta):
         self.thread_safe_general.write_list_to_destination(self.symclade_db_full_path, combined_fasta)
@@ -586,45 +917,27 @@ class DataLoading:
             )
         return new_symclade_fasta_as_list
 
-    def _get_list_of_seqs_in_blast_result_that_are_symbiodiniaceae(self, blast_output_dict):
-        query_sequences_verified_as_symbiodiniaceae_list = []
-        for query_sequence_name, blast_result_list_for_query_sequence in blast_output_dict.items():
-            sym_count = 0
-            for result_str in blast_result_list_for_query_sequence:
-                if 'Symbiodinium' in result_str or 'Symbiodiniaceae' in result_str:
-                    percentage_coverage = float(result_str.split('\t')[4])
-                    percentage_identity_match = float(result_str.split('\t')[3])
-                    if percentage_coverage > 95 and percentage_identity_match > 60:
-                        sym_count += 1
-                        if sym_count == self.required_symbiodiniaceae_matches:
-                            query_sequences_verified_as_symbiodiniaceae_list.append(query_sequence_name)
-                            break
-        return query_sequences_verified_as_symbiodiniaceae_list
-
     def _make_fasta_of_seqs_found_in_more_than_two_samples_that_need_screening(self):
-        """ The below_e_cutoff_dict has nucleotide sequencs as the
-        key and the number of samples that sequences was found in as the value.
+        """ The sub_evalue_sequence_counter holds the number of samples each of the sub e value
+        nucleotide sequences was found in.
         """
-        sub_evalue_nuclotide_sequence_to_number_of_samples_found_in_dict = dict(
-            self.taxonomic_screening_handler.sub_evalue_sequence_to_num_sampes_found_in_mp_dict)
+        sub_evalue_sequence_counter = self.taxonomic_screening_handler.sub_evalue_sequence_counter
         self.sequences_to_screen_fasta_as_list = []
         sequence_number_counter = 0
-        for nucleotide_sequence, num_samples_found_in in \
-                sub_evalue_nuclotide_sequence_to_number_of_samples_found_in_dict.items():
-            if num_samples_found_in >= self.required_sample_support_for_sub_evalue_sequencs:
-                # then this is a sequences that was found in three or more samples
-                clade_of_sequence = self.taxonomic_screening_handler.sub_evalue_nucleotide_sequence_to_clade_mp_dict[
+        # Only the sequences found in three or more samples
+        for nucleotide_sequence, num_samples_found_in, clade_of_sequence in \
+                sub_evalue_sequence_counter.get_sequences_found_in_at_least(
+                    self.required_sample_support_for_sub_evalue_sequencs):
+            self.sequences_to_screen_fasta_as_list.extend(
+                [
+                    f'>sub_e_seq_count_{sequence_number_counter}_'
+                    f'{self.dataset_object.id}_{num_samples_found_in}_'
+                    f'{clade_of_sequence}',
                     nucleotide_sequence
                 ]
-                self.sequences_to_screen_fasta_as_list.extend(
-                    [
-                        f'>sub_e_seq_count_{sequence_number_counter}_'
-                        f'{self.dataset_object.id}_{num_samples_found_in}_'
-                        f'{clade_of_sequence}',
-                        nucleotide_sequence
-                    ]
-                )
-                sequence_number_counter += 1
+            )
+            sequence_number_counter += 1
+        sub_evalue_sequence_counter.close()
         if self.sequences_to_screen_fasta_as_list:
             self.thread_safe_general.write_list_to_destination(
                 self.sequences_to_screen_fasta_path, self.sequences_to_screen_fasta_as_list)
@@ -635,8 +948,11 @@ class DataLoading:
         symclade_current_path = os.path.abspath(
             os.path.join(self.symportal_root_directory, 'symbiodiniaceaeDB', 'symClade.fa'))
 
-        symclade_backup_path = os.path.join(back_up_dir, f'symClade_{self.date_time_str}.fa')
-        symclade_backup_readme_path = os.path.join(back_up_dir, f'symClade_{self.date_time_str}.readme')
+        # The DataSet UID is included so that concurrent loadings started in the same second do not share the files
+        symclade_backup_path = os.path.join(
+            back_up_dir, f'symClade_{self.date_time_str}_{self.dataset_object.id}.fa')
+        symclade_backup_readme_path = os.path.join(
+            back_up_dir, f'symClade_{self.date_time_str}_{self.dataset_object.id}.readme')
         # then write a copy to it.
         shutil.copy(symclade_current_path, symclade_backup_path)
         # Then write out a very breif readme
@@ -647,12 +963,14 @@ class DataLoading:
     def _make_fasta_of_sequences_that_need_taxa_screening(self):
         self._init_potential_sym_tax_screen_handler()
 
-        # the self.taxonomic_screening_handler.sub_evalue_sequence_to_num_sampes_found_in_mp_dict is populated here
-        self.taxonomic_screening_handler.execute_potential_sym_tax_screening(
-            data_loading_temp_working_directory=self.temp_working_directory,
-            data_loading_path_to_symclade_db=self.symclade_db_full_path,
-            data_loading_debug=self.debug
-        )
+        # the self.taxonomic_screening_handler.sub_evalue_sequence_counter is populated here
+        # symClade is not rewritten by a concurrent loading while we BLAST against it
+        with SharedResourceLock(self.symclade_db_lock_name, shared=True):
+            self.taxonomic_screening_handler.execute_potential_sym_tax_screening(
+                data_loading_temp_working_directory=self.temp_working_directory,
+                data_loading_path_to_symclade_db=self.symclade_db_full_path,
+                data_loading_debug=self.debug
+            )
 
         self._taxa_screening_update_checked_samples_list()
 
@@ -660,16 +978,30 @@ class DataLoading:
 
     def _taxa_screening_update_checked_samples_list(self):
         self.checked_samples_with_no_additional_symbiodiniaceae_sequences = \
-            list(self.taxonomic_screening_handler.checked_samples_mp_list)
+            list(self.taxonomic_screening_handler.checked_samples_list)
 
     def _init_potential_sym_tax_screen_handler(self):
+        self._select_num_proc_for_stage(
+            stage='potential_sym_tax_screening', num_tasks=len(self.list_of_samples_names))
 
         self.taxonomic_screening_handler = PotentialSymTaxScreeningHandler(
             samples_that_caused_errors_in_qc_list=self.samples_that_caused_errors_in_qc_list,
             checked_samples_list=self.checked_samples_with_no_additional_symbiodiniaceae_sequences,
-            list_of_samples_names=self.list_of_samples_names, num_proc=self.num_proc, multiprocess=self.multiprocess
+            list_of_samples_names=self.list_of_samples_names, num_proc=self.num_proc, multiprocess=self.multiprocess,
+            deduplicated_blast_screening=self.deduplicated_blast_screening,
+            blast_cache_directory=self.blast_cache_directory,
+            path_to_symclade_delta_db=self._get_path_to_symclade_delta_db(),
+            kmer_preclassifier_mode=self.kmer_preclassifier_mode, worker_pool=self.worker_pool,
+            temp_working_directory=self.temp_working_directory
         )
 
+    def _get_path_to_symclade_delta_db(self):
+        # None until sequences have been added to the delta database.
+        # Until then the samples are BLASTed against symClade.
+        if self.symclade_delta_database is not None and self.symclade_delta_database.fasta_as_list:
+            return self.symclade_delta_database.fasta_path
+        return None
+
     def _if_symclade_binaries_not_present_remake_db(self):
         list_of_binaries_that_should_exist = [
             self.dataset_object.reference_fasta_database_used + extension for extension in ['.nhr', '.nin', '.nsq']
@@ -722,7 +1054,10 @@ class DataLoading:
 
         self.make_dot_stability_file_inferred(end_index)
 
-        self._create_data_set_sample_objects_in_bulk_without_datasheet()
+        if self.resume_data_set_uid is not None:
+            self._check_data_set_samples_of_resumed_dataset()
+        else:
+            self._create_data_set_sample_objects_in_bulk_without_datasheet()
 
     def make_dot_stability_file_inferred(self, end_index):
         """Search for the fastq files that contain the inferred sample names. NB this is not so simple
@@ -885,7 +1220,10 @@ class DataLoading:
     def _generate_stability_file_and_data_set_sample_objects_with_datasheet(self):
         # if we are given a data_sheet then use the sample names given as the DataSetSample object names
         self.make_dot_stability_file_datasheet()
-        self._create_data_set_sample_objects_in_bulk_with_datasheet()
+        if self.resume_data_set_uid is not None:
+            self._check_data_set_samples_of_resumed_dataset()
+        else:
+            self._create_data_set_sample_objects_in_bulk_with_datasheet()
 
     def make_dot_stability_file_datasheet(self):
         """Create the .stability file that mothur will use to make contigs.
@@ -1289,6 +1627,9 @@ class DataLoading:
 
     def _copy_and_decompress_input_files_to_temp_wkd(self):
         if not self.is_single_file_or_paired_input:
+            if self.lazy_input_staging:
+                print('\nfastq files will be read by the QC directly from their input paths')
+                return
             self._copy_fastq_files_from_input_dir_to_temp_wkd()
         else:
             self._extract_single_compressed_file_to_temp_wkd()
@@ -1319,6 +1660,8 @@ class DataLoading:
         if self.datasheet_path:
             # If working form datasheet this is as easy as copying over the specified file paths
             for sample_name in self.sample_meta_info_df.index.values.tolist():
+                if sample_name in self.samples_resumed_with_initial_mothur_qc_complete:
+                    continue
                 # copy over the fwd read
                 shutil.copy(self.sample_meta_info_df.loc[sample_name, 'fastq_fwd_file_name'],
                             self.temp_working_directory)
@@ -1328,9 +1671,20 @@ class DataLoading:
         else:
             # If not working from datasheet then we transfer over all files of the right extension
             for file_path, fwd_rev_list in self.sample_name_to_seq_files_dict.items():
+                if file_path in self.samples_resumed_with_initial_mothur_qc_complete:
+                    continue
                 shutil.copy(fwd_rev_list[0], self.temp_working_directory)
                 shutil.copy(fwd_rev_list[1], self.temp_working_directory)
 
+    def get_source_fastq_path_pair(self, sample_name):
+        """Return the paths of the fwd and rev fastq files for the given sample as supplied by the user
+        i.e. before being copied to the temp working directory."""
+        if self.datasheet_path:
+            return (self.sample_meta_info_df.loc[sample_name, 'fastq_fwd_file_name'],
+                    self.sample_meta_info_df.loc[sample_name, 'fastq_rev_file_name'])
+        else:
+            return tuple(self.sample_name_to_seq_files_dict[sample_name])
+
     def _determine_if_single_file_or_paired_input(self):
         for file in os.listdir(self.user_input_path):
             if 'fastq' in file or 'fq' in file:
@@ -1341,6 +1695,10 @@ class DataLoading:
 
     def _create_pre_med_write_out_directory_path(self):
         pre_med_write_out_directory_path = os.path.join(self.output_directory, 'pre_med_seqs')
+        if self.resume_data_set_uid is not None:
+            # The pre-MED seqs written out in the loading being resumed are kept
+            os.makedirs(pre_med_write_out_directory_path, exist_ok=True)
+            return pre_med_write_out_directory_path
         if os.path.exists(pre_med_write_out_directory_path):
             shutil.rmtree(pre_med_write_out_directory_path)
         os.makedirs(pre_med_write_out_directory_path)
@@ -1353,8 +1711,10 @@ class DataLoading:
         return output_directory
 
     def _setup_sequence_dump_file_path(self):
+        # The DataSet UID is included so that concurrent loadings started in the same second do not share the file
         seq_dump_file_path = os.path.join(
-            self.symportal_root_directory, 'dbBackUp', 'seq_dumps', f'seq_dump_{self.date_time_str}')
+            self.symportal_root_directory, 'dbBackUp', 'seq_dumps',
+            f'seq_dump_{self.date_time_str}_{self.dataset_object.id}')
         os.makedirs(os.path.dirname(seq_dump_file_path), exist_ok=True)
         return seq_dump_file_path
 
@@ -1379,6 +1739,9 @@ class DataLoading:
         return self.temp_working_directory
 
     def _create_temp_wkd(self):
+        if self.resume_data_set_uid is not None and os.path.exists(self.temp_working_directory):
+            # The checkpoints and intermediate files of the loading being resumed are in here
+            return
         # if the directory already exists remove it and start from scratch
         if os.path.exists(self.temp_working_directory):
             shutil.rmtree(self.temp_working_directory)
@@ -1388,7 +1751,9 @@ class DataLoading:
 class FastDataSetSampleSequencePMCreator:
     def __init__(
             self, pre_med_sequence_output_directory_path, dataset_object, num_proc,
-            path_to_seq_match_executable, temp_working_directory):
+            path_to_seq_match_executable, temp_working_directory, database_writer_process=False, multiprocess=True):
+        self.database_writer_process = database_writer_process
+        self.multiprocess = multiprocess
         # dictionaries to save us having to do lots of database look ups
         self.path_to_seq_match_executable = path_to_seq_match_executable
         self.pre_med_sequence_output_directory_path = pre_med_sequence_output_directory_path
@@ -1463,21 +1828,28 @@ class FastDataSetSampleSequencePMCreator:
 
     def make_data_set_sample_pm_objects(self):
         print('\nProcessing pre-MED seqs for each clade')
-        for clade, seq_dict in self.consolidated_sequence_to_sample_and_abund_dict.items():
-            print(f'\nProcessing clade {clade}')
-            seq_matcher = self.SeqMatcher(
-                clade=clade, seq_dict=seq_dict, rs_dict=self.ref_seq_sequence_to_ref_seq_obj_dict[clade],
-                match_dict=self.ref_seq_match_obj_to_seq_sample_abundance_dict[clade],
-                non_match_dict=self.no_match_consolidated_seq_to_sample_and_abund_dict[clade],
-                num_proc=self.num_proc, path_to_seq_match_executable=self.path_to_seq_match_executable,
-                temp_working_directory=self.temp_working_directory
-            )
-            seq_matcher.match_and_make_ref_seqs()
+        # The ReferenceSequences and DataSetSampleSequencePMs are created in bulk by a DatabaseWriter
+        database_writer = DatabaseWriter(
+            use_writer_process=self.database_writer_process, multiprocess=self.multiprocess)
+        database_writer.start()
+        try:
+            for clade, seq_dict in self.consolidated_sequence_to_sample_and_abund_dict.items():
+                print(f'\nProcessing clade {clade}')
+                seq_matcher = self.SeqMatcher(
+                    clade=clade, seq_dict=seq_dict, rs_dict=self.ref_seq_sequence_to_ref_seq_obj_dict[clade],
+                    match_dict=self.ref_seq_match_obj_to_seq_sample_abundance_dict[clade],
+                    non_match_dict=self.no_match_consolidated_seq_to_sample_and_abund_dict[clade],
+                    num_proc=self.num_proc, path_to_seq_match_executable=self.path_to_seq_match_executable,
+                    temp_working_directory=self.temp_working_directory, database_writer=database_writer
+                )
+                seq_matcher.match_and_make_ref_seqs()
+        finally:
+            database_writer.close()
 
     class SeqMatcher:
         def __init__(
                 self, clade, rs_dict, seq_dict, match_dict, non_match_dict,
-                num_proc, path_to_seq_match_executable, temp_working_directory):
+                num_proc, path_to_seq_match_executable, temp_working_directory, database_writer):
             # The current clade we are working with
             self.clade = clade
             # Dict of nucleotide sequence to ref seq obj for all ref seq objs of this clade
@@ -1495,6 +1867,7 @@ class FastDataSetSampleSequencePMCreator:
             self.num_proc = num_proc
             self.path_to_seq_match_executable = path_to_seq_match_executable
             self.temp_working_directory = temp_working_directory
+            self.database_writer = database_writer
 
         def match_and_make_ref_seqs(self):
             # self._assign_sequence_to_match_or_non_match_dicts()
@@ -1821,8 +2194,29 @@ class FastDataSetSampleSequencePMCreator:
             # For each consolidated sequences, create a ReferenceSequence after checking to see that the sequence
             # does not already fit into one of the
             print('\ncreating ReferenceSequence objects')
+            # Under the reference sequences lock so that a concurrent loading does not create a second
+            # ReferenceSequence for a sequence. The sequences that were created by a concurrent loading since
+            # self.rs_dict was populated are matched to rather than created.
+            with SharedResourceLock(DataLoading.reference_sequences_lock_name):
+                self._create_new_reference_sequences(testing=testing)
+
+            # Now get the newly create ref seq objects back and create a dict form them
+            # with rs sequence as key and the rs object itself as the value
+            new_rs_seq_to_obj_dict = {
+                rs.sequence: rs for rs in ReferenceSequence.objects.filter(
+                    sequence__in=list(self.non_match_dict.keys()))}
+            # Now go back through the no match dict and use this dictionary to poulate the match dictionary
+            for c_seq in self.non_match_dict.keys():
+                self.match_dict[new_rs_seq_to_obj_dict[c_seq]] = self.non_match_dict[c_seq]
+
+        def _create_new_reference_sequences(self, testing):
+            sequences_created_by_concurrent_loadings_set = set(
+                ReferenceSequence.objects.filter(
+                    sequence__in=list(self.non_match_dict.keys())).values_list('sequence', flat=True))
             new_rs_list = []
             for c_seq in self.non_match_dict.keys():
+                if c_seq in sequences_created_by_concurrent_loadings_set:
+                    continue
                 if testing:
                     if (c_seq in self.rs_dict) or ('A' + c_seq in self.rs_dict):
                         raise RuntimeError(
@@ -1835,17 +2229,10 @@ class FastDataSetSampleSequencePMCreator:
                 new_rs_list.append(ReferenceSequence(clade=self.clade, sequence=c_seq))
 
             print(f'\ncreating {len(new_rs_list)} new ReferenceSequence objects in bulk for clade {self.clade}')
-            for rs_chunk in self.thread_safe_general.chunks(new_rs_list):
-                ReferenceSequence.objects.bulk_create(rs_chunk)
-
-            # Now get the newly create ref seq objects back and create a dict form them
-            # with rs sequence as key and the rs object itself as the value
-            new_rs_seq_to_obj_dict = {
-                rs.sequence: rs for rs in ReferenceSequence.objects.filter(
-                    sequence__in=list(self.non_match_dict.keys()))}
-            # Now go back through the no match dict and use this dictionary to poulate the match dictionary
-            for c_seq in self.non_match_dict.keys():
-                self.match_dict[new_rs_seq_to_obj_dict[c_seq]] = self.non_match_dict[c_seq]
+            self.database_writer.bulk_create(new_rs_list)
+            # The new ReferenceSequences are read back from the database and must be committed
+            # before the reference sequences lock is released
+            self.database_writer.flush()
 
         def _create_data_set_sample_sequence_pm_objects(self):
             """Finally now that we have a reference sqeuence object representing
@@ -1860,8 +2247,7 @@ class FastDataSetSampleSequencePMCreator:
                     data_set_sample_sequence_pre_med_list.append(dsspm)
             print(f'\ncreating {len(data_set_sample_sequence_pre_med_list)} '
                   f'new DataSetSampleSequencePM objects in bulk for clade {self.clade}')
-            for dssspm_chunk in self.thread_safe_general.chunks(data_set_sample_sequence_pre_med_list):
-                DataSetSampleSequencePM.objects.bulk_create(dssspm_chunk)
+            self.database_writer.bulk_create(data_set_sample_sequence_pre_med_list)
 
 
 class DSSAttributeAssignmentHolder:
@@ -1889,157 +2275,655 @@ class DSSAttributeAssignmentHolder:
         self.initial_processing_complete = False
 
 
+class DatabaseWriter:
+    """Saves the model objects collected from the workers of the parallel stages.
+    Without a writer process (the default) each object is saved as soon as it is passed to save(), each in its own
+    transaction. With a writer process the objects are put onto a queue and saved by a single dedicated
+    process (a thread when not multiprocessing) with its own database connection. The writer commits the objects
+    in batches, each in a single transaction, so that the SQLite write lock is taken once per batch rather than
+    once per object and the collection of the worker outputs is not held up by the database.
+    A batch is committed once max_batch_size objects are pending or max_seconds_between_commits
+    have passed since the last commit. The write queue holds at most 2 * max_batch_size items, each either a single
+    object to save or the objects of one write_atomically (e.g. a whole max_batch_size chunk of a bulk_create),
+    so that save() blocks, rather than the pending objects accumulating in memory, when the database falls behind.
+    Objects may also be created in bulk (bulk_create) and a set of objects may be created and saved in a single
+    transaction (write_atomically). The primary keys of objects created in bulk are not set, and objects written
+    by the writer are only visible to other connections once committed: flush() waits for the pending objects to
+    be committed. close() must be called before the saved objects are read from the database.
+    The writer process is not used within the Django testing framework as the in memory test database
+    is not visible to other processes.
+    """
+    max_batch_size = 500
+    max_seconds_between_commits = 10
+
+    def __init__(self, use_writer_process, multiprocess):
+        self.use_writer_process = use_writer_process
+        self.multiprocess = multiprocess
+        self.write_queue = None
+        self.flushed_queue = None
+        self.writer = None
+
+    def start(self):
+        if not self.use_writer_process:
+            return
+        # http://stackoverflow.com/questions/8242837/django-multiprocessing-and-database-connections
+        db.connections.close_all()
+        if self.multiprocess:
+            self.write_queue = mp_Queue(maxsize=2 * self.max_batch_size)
+            self.flushed_queue = mp_Queue()
+            self.writer = Process(target=self._database_writer_worker, args=(
+                self.write_queue, self.flushed_queue, self.max_batch_size, self.max_seconds_between_commits))
+        else:
+            self.write_queue = mt_Queue(maxsize=2 * self.max_batch_size)
+            self.flushed_queue = mt_Queue()
+            self.writer = Thread(target=self._database_writer_worker, args=(
+                self.write_queue, self.flushed_queue, self.max_batch_size, self.max_seconds_between_commits))
+        self.writer.start()
+
+    def save(self, model_object):
+        if not self.use_writer_process:
+            model_object.save()
+        else:
+            self._put_on_write_queue(model_object)
+
+    def bulk_create(self, model_objects):
+        """Create the model objects (all of the same model) in bulk."""
+        for model_objects_chunk in ThreadSafeGeneral.chunks(model_objects, n=self.max_batch_size):
+            self.write_atomically(model_objects_to_bulk_create=model_objects_chunk)
+
+    def write_atomically(self, model_objects_to_bulk_create=(), model_objects_to_save=()):
+        """Create the model objects (all of the same model) in bulk and then save the model objects
+        to save, all in a single transaction."""
+        if not self.use_writer_process:
+            self._write_atomically(list(model_objects_to_bulk_create), list(model_objects_to_save))
+        else:
+            self._put_on_write_queue((list(model_objects_to_bulk_create), list(model_objects_to_save)))
+
+    def flush(self):
+        """Wait until all of the objects passed to the writer so far have been committed."""
+        if not self.use_writer_process:
+            return
+        self._put_on_write_queue('FLUSH')
+        while True:
+            try:
+                self.flushed_queue.get(timeout=self.max_seconds_between_commits)
+                return
+            except Empty:
+                self._raise_if_writer_is_not_alive()
+
+    def close(self):
+        """Commit any objects that are still pending and wait for the writer to finish."""
+        if not self.use_writer_process:
+            return
+        self._put_on_write_queue('STOP')
+        self.writer.join()
+        if self.multiprocess and self.writer.exitcode != 0:
+            raise RuntimeError({'message': 'The database writer process did not complete successfully',
+                                'exitcode': self.writer.exitcode})
+
+    def _put_on_write_queue(self, write_queue_item):
+        # The write queue is bounded. If the writer has died the queue will never be emptied
+        # and a put without a timeout would block forever once it is full.
+        while True:
+            try:
+                self.write_queue.put(write_queue_item, timeout=self.max_seconds_between_commits)
+                return
+            except Full:
+                self._raise_if_writer_is_not_alive()
+
+    def _raise_if_writer_is_not_alive(self):
+        if not self.writer.is_alive():
+            raise RuntimeError({'message': 'The database writer is no longer running',
+                                'exitcode': self.writer.exitcode if self.multiprocess else None})
+
+    @staticmethod
+    def _database_writer_worker(write_queue, flushed_queue, max_batch_size, max_seconds_between_commits):
+        pending_write_queue_items = []
+        num_pending_model_objects = 0
+        time_of_last_commit = time.time()
+        while True:
+            try:
+                write_queue_item = write_queue.get(timeout=max_seconds_between_commits)
+            except Empty:
+                write_queue_item = None
+            if isinstance(write_queue_item, str) and write_queue_item == 'STOP':
+                break
+            if isinstance(write_queue_item, str) and write_queue_item == 'FLUSH':
+                if pending_write_queue_items:
+                    DatabaseWriter._commit_write_queue_items(pending_write_queue_items)
+                    pending_write_queue_items = []
+                    num_pending_model_objects = 0
+                    time_of_last_commit = time.time()
+                flushed_queue.put('FLUSHED')
+                continue
+            if write_queue_item is not None:
+                pending_write_queue_items.append(write_queue_item)
+                if isinstance(write_queue_item, tuple):
+                    num_pending_model_objects += len(write_queue_item[0]) + len(write_queue_item[1])
+                else:
+                    num_pending_model_objects += 1
+            if num_pending_model_objects >= max_batch_size or (
+                    pending_write_queue_items and time.time() - time_of_last_commit >= max_seconds_between_commits):
+                DatabaseWriter._commit_write_queue_items(pending_write_queue_items)
+                pending_write_queue_items = []
+                num_pending_model_objects = 0
+                time_of_last_commit = time.time()
+        if pending_write_queue_items:
+            DatabaseWriter._commit_write_queue_items(pending_write_queue_items)
+        # Close this worker's connection so that it is not left open once the writer has finished
+        db.connections.close_all()
+
+    @staticmethod
+    def _commit_write_queue_items(write_queue_items):
+        # The objects are saved in the order in which they were put onto the queue so that
+        # where an object was put more than once its latest state is the one saved.
+        with transaction.atomic():
+            for write_queue_item in write_queue_items:
+                if isinstance(write_queue_item, tuple):
+                    DatabaseWriter._write_atomically(*write_queue_item)
+                else:
+                    write_queue_item.save()
+
+    @staticmethod
+    def _write_atomically(model_objects_to_bulk_create, model_objects_to_save):
+        with transaction.atomic():
+            if model_objects_to_bulk_create:
+                type(model_objects_to_bulk_create[0]).objects.bulk_create(
+                    model_objects_to_bulk_create, batch_size=DatabaseWriter.max_batch_size)
+            for model_object in model_objects_to_save:
+                model_object.save()
+
+
+class DataLoadingCheckpoint:
+    """Records the completion of a stage of the data loading so that a --resume loading of the same DataSet
+    is able to skip it. A checkpoint is a small json file written into the directory whose work it records
+    (e.g. a sample's directory in the temp working directory or a MED output directory). It holds the sha256 of
+    each of the files produced and these are verified before the files are reused.
+    As each checkpoint is its own file they can be written from within the workers.
+    """
+    initial_mothur_qc_stage = 'initial_mothur_qc'
+    taxonomic_screening_stage = 'taxonomic_screening'
+    med_input_stage = 'med_input'
+    med_stage = 'med'
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.checkpoint_file_name = f'.{self.stage}.checkpoint'
+
+    def record(self, directory, file_paths):
+        checkpoint_dict = {
+            os.path.relpath(file_path, directory): self._get_sha256(file_path) for file_path in file_paths}
+        # Write to a temporary file first and then rename it into place so that
+        # a partially written checkpoint is never read
+        file_descriptor, temp_checkpoint_path = tempfile.mkstemp(dir=directory, prefix=self.checkpoint_file_name)
+        with os.fdopen(file_descriptor, 'w') as f:
+            json.dump(checkpoint_dict, f)
+        os.replace(temp_checkpoint_path, os.path.join(directory, self.checkpoint_file_name))
+
+    def is_complete(self, directory):
+        checkpoint_path = os.path.join(directory, self.checkpoint_file_name)
+        if not os.path.isfile(checkpoint_path):
+            return False
+        try:
+            with open(checkpoint_path, 'r') as f:
+                checkpoint_dict = json.load(f)
+        except ValueError:
+            return False
+        for relative_file_path, sha256 in checkpoint_dict.items():
+            file_path = os.path.join(directory, relative_file_path)
+            if not os.path.isfile(file_path) or self._get_sha256(file_path) != sha256:
+                return False
+        return True
+
+    def remove_from(self, directory):
+        """Remove the checkpoints of this stage from the directory and its sub directories"""
+        for dirpath, dirnames, files in os.walk(directory):
+            if self.checkpoint_file_name in files:
+                os.remove(os.path.join(dirpath, self.checkpoint_file_name))
+
+    @staticmethod
+    def get_file_paths_in_directory(directory):
+        """The paths of the files in the directory excluding any checkpoints"""
+        return [
+            os.path.join(directory, file_name) for file_name in os.listdir(directory) if
+            os.path.isfile(os.path.join(directory, file_name)) and not file_name.endswith('.checkpoint')]
+
+    @staticmethod
+    def _get_sha256(file_path):
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+
+class TempWorkingDirectoryLifecycle:
+    """Removes the intermediate files of each sample from the temp working directory as soon as no later
+    stage of the loading needs them, rather than leaving everything in place until the loading is complete.
+    After each stage, a sample's directory holds only what the following stages read:
+    initial QC: the .names and .fasta files for taxonomic screening
+    sym non sym tax screening: the clade directories holding the redundant fastas for MED
+    MED: the MEDOUT directories
+    DataSetSample creation: nothing
+    Optionally, a disk budget can be set. While the temp working directory is larger than the budget
+    no new samples are started in the initial QC.
+    """
+    disk_budget_poll_interval = 10
+
+    def __init__(self, temp_working_directory, disk_budget_gb=None):
+        self.temp_working_directory = temp_working_directory
+        if disk_budget_gb is None:
+            self.disk_budget_bytes = None
+        else:
+            self.disk_budget_bytes = int(disk_budget_gb * 1024 ** 3)
+
+    def wait_for_disk_budget(self, sample_name, samples_in_initial_qc_list):
+        """Wait while the temp working directory is over the disk budget.
+        We only wait as long as other samples are still in the initial QC. These will release their
+        intermediates when they complete. If there are none, waiting would not free any space so we carry on.
+        """
+        if self.disk_budget_bytes is None:
+            return
+        warned = False
+        while self._get_temp_working_directory_size() > self.disk_budget_bytes:
+            if not samples_in_initial_qc_list:
+                print(f'{sample_name}: WARNING temp working directory is over the disk budget '
+                      f'but no samples are being QCed. Continuing.')
+                return
+            if not warned:
+                sys.stdout.write(f'{sample_name}: temp working directory is over the disk budget. '
+                                 f'Waiting for running samples to complete\n')
+                warned = True
+            time.sleep(self.disk_budget_poll_interval)
+
+    def _get_temp_working_directory_size(self):
+        total_size = 0
+        for dirpath, dirnames, files in os.walk(self.temp_working_directory):
+            for file_name in files:
+                try:
+                    total_size += os.path.getsize(os.path.join(dirpath, file_name))
+                except OSError:
+                    # The file was removed by another worker since the walk listed it
+                    continue
+        return total_size
+
+    def release_initial_qc_intermediates(self, sample_name, fastq_path_pair):
+        sample_directory = os.path.join(self.temp_working_directory, sample_name)
+        files_to_keep = ['name_file_for_tax_screening.names', 'fasta_file_for_tax_screening.fasta']
+        for file_name in os.listdir(sample_directory):
+            # The checkpoints are kept so that a --resume loading is able to skip the completed stages
+            if file_name in files_to_keep or file_name.endswith('.checkpoint'):
+                continue
+            self._remove_path(os.path.join(sample_directory, file_name))
+        self._release_fastq_pair(fastq_path_pair)
+
+    def release_failed_sample(self, sample_name, fastq_path_pair=None):
+        self._remove_path(os.path.join(self.temp_working_directory, sample_name))
+        if fastq_path_pair is not None:
+            self._release_fastq_pair(fastq_path_pair)
+
+    def _release_fastq_pair(self, fastq_path_pair):
+        # The fastq files are only read by make.contigs. We only remove the copies that
+        # are held in the temp working directory, never the user's input files.
+        for fastq_path in fastq_path_pair:
+            if os.path.abspath(fastq_path).startswith(os.path.join(self.temp_working_directory, '')):
+                self._remove_path(fastq_path)
+
+    def release_tax_screening_intermediates(self, sample_name):
+        # Only the clade directories (holding the redundant fastas for MED) and the checkpoints are kept
+        sample_directory = os.path.join(self.temp_working_directory, sample_name)
+        if not os.path.exists(sample_directory):
+            return
+        for file_name in os.listdir(sample_directory):
+            path = os.path.join(sample_directory, file_name)
+            if not os.path.isdir(path) and not file_name.endswith('.checkpoint'):
+                self._remove_path(path)
+        self._remove_directory_if_empty(sample_directory)
+
+    def release_med_input(self, redundant_fasta_path_list):
+        for redundant_fasta_path in redundant_fasta_path_list:
+            if redundant_fasta_path is not None:
+                self._remove_path(redundant_fasta_path)
+
+    def release_med_output(self, med_output_directory):
+        # Remove the clade directory that holds the MEDOUT directory
+        # and then the sample's directory if this was its last clade.
+        clade_directory = os.path.dirname(med_output_directory.rstrip('/'))
+        self._remove_path(clade_directory)
+        self._remove_directory_if_empty(os.path.dirname(clade_directory))
+
+    @staticmethod
+    def _remove_directory_if_empty(directory_path):
+        try:
+            os.rmdir(directory_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _remove_path(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
 class InitialMothurHandler:
     def __init__(self, data_loading_parent):
         self.parent = data_loading_parent
+        # When resuming, this starts with the samples that produced errors in the loading being resumed.
+        # The names of the samples that produce errors are returned by the workers along with their attributes.
+        self.samples_that_caused_errors_in_qc_list = list(self.parent.samples_that_caused_errors_in_qc_list)
         if self.parent.multiprocess:
-            self.input_queue_containing_pairs_of_fastq_file_paths = mp_Queue()
-            self.worker_manager = Manager()
-            self.samples_that_caused_errors_in_qc_mp_list = self.worker_manager.list()
-            self.output_queue_for_attribute_data = mp_Queue()
-            self._populate_input_queue()
+            # The names of the samples currently being QCed. Used by the workers to throttle against the
+            # temp disk budget and so, unlike the results of the workers, has to be shared between them.
+            if self.parent.temp_working_directory_lifecycle is not None:
+                self.worker_manager = Manager()
+                self.samples_in_initial_qc_mp_list = self.worker_manager.list()
+            else:
+                self.samples_in_initial_qc_mp_list = None
         else:
-            self.input_queue_containing_pairs_of_fastq_file_paths = mt_Queue()
-            self.samples_that_caused_errors_in_qc_mp_list = []
-            self.output_queue_for_attribute_data = mt_Queue()
-            self._populate_input_queue()
-
-    def _populate_input_queue(self):
+            self.samples_in_initial_qc_mp_list = []
+        self.dss_obj_uid_to_obj_dict = None
+        self.database_writer = None
+
+    def _get_input_queue_items(self):
+        """Yield the (fastq_path_pair, DSSAttributeAssignmentHolder) of each sample to be QCed. As a generator,
+        the work items are only made as the ResultQueueWorkerPool takes them."""
+        dss_name_to_uid_dict = {dss_obj.name: dss_obj.id for dss_obj in self.dss_obj_uid_to_obj_dict.values()}
+        # When resuming, the samples that have already been QCed or that produced errors are skipped
+        samples_to_skip_set = set(self.parent.samples_resumed_with_initial_mothur_qc_complete).union(
+            self.samples_that_caused_errors_in_qc_list)
         for fastq_path_pair in self.parent.sample_fastq_pairs:
             sample_name = fastq_path_pair.split('\t')[0].replace('[dS]', '-')
-            data_set_sample = DataSetSample.objects.get(
-                    name=sample_name, data_submission_from=self.parent.dataset_object
-                )
-            dss_att_holder = DSSAttributeAssignmentHolder(name=data_set_sample.name, uid=data_set_sample.id)
-            self.input_queue_containing_pairs_of_fastq_file_paths.put((fastq_path_pair, dss_att_holder))
-            
-        for n in range(self.parent.num_proc):
-            self.input_queue_containing_pairs_of_fastq_file_paths.put('STOP')
+            if sample_name in samples_to_skip_set:
+                continue
+            dss_att_holder = DSSAttributeAssignmentHolder(name=sample_name, uid=dss_name_to_uid_dict[sample_name])
+            if self.parent.lazy_input_staging:
+                # The files have not been copied to the temp working directory so give the worker
+                # the source paths to read from
+                fastq_path_pair = '\t'.join(
+                    [fastq_path_pair.split('\t')[0]] + list(self.parent.get_source_fastq_path_pair(sample_name)))
+            yield fastq_path_pair, dss_att_holder
 
     def execute_worker_initial_mothur(self):
-        all_processes = []
+        sys.stdout.write('\nPerforming initial mothur QC\n')
+        self.dss_obj_uid_to_obj_dict = {dss_obj.id: dss_obj for dss_obj in
+                                        DataSetSample.objects.filter(data_submission_from=self.parent.dataset_object)}
+        self.database_writer = DatabaseWriter(
+            use_writer_process=self.parent.database_writer_process, multiprocess=self.parent.multiprocess)
+        self.database_writer.start()
         # http://stackoverflow.com/questions/8242837/django-multiprocessing-and-database-connections
         db.connections.close_all()
-
-        sys.stdout.write('\nPerforming initial mothur QC\n')
-        for n in range(self.parent.num_proc):
-            if self.parent.multiprocess:
-                p = Process(target=self._worker_initial_mothur,
-                            args=(self.input_queue_containing_pairs_of_fastq_file_paths, 
-                            self.samples_that_caused_errors_in_qc_mp_list, 
-                            self.output_queue_for_attribute_data, 
-                            self.parent.temp_working_directory, 
-                            self.parent.debug)
-                            )
-            else:
-                p = Thread(target=self._worker_initial_mothur,
-                        args=(self.input_queue_containing_pairs_of_fastq_file_paths, 
-                        self.samples_that_caused_errors_in_qc_mp_list, 
-                        self.output_queue_for_attribute_data, 
-                        self.parent.temp_working_directory, 
-                        self.parent.debug)
-                        )
-
-            all_processes.append(p)
-            p.start()
-
-        # Here process the queue as we go because it was getting too large and causing the
-        # p.join() to hang. We will put a 'DONE' in queue everytime a process finishes with the
-        # list of samples
-
-        self._update_dss_obj_attributes()
-
-        for p in all_processes:
-            p.join()
-
-    def _update_dss_obj_attributes(self):
-        done_count = 0
-        dss_obj_uid_to_obj_dict = {dss_obj.id: dss_obj for dss_obj in
-                                   DataSetSample.objects.filter(data_submission_from=self.parent.dataset_object)}
-        while done_count < self.parent.num_proc:
-            dss_proxy = self.output_queue_for_attribute_data.get()
-            if dss_proxy == 'DONE':
-                done_count += 1
+        try:
+            # The outputs of each sample are saved as they are returned rather than once all samples are QCed
+            self.parent.worker_pool.execute(
+                worker_function=self._worker_initial_mothur, work_items=self._get_input_queue_items(),
+                merge_result=self._update_dss_obj_attributes,
+                worker_args=(
+                    self.parent.temp_working_directory, self.parent.debug, self.parent.single_mothur_batch,
+                    self.parent.qc_cache_directory, self.parent.lazy_input_staging,
+                    self.parent.temp_working_directory_lifecycle, self.samples_in_initial_qc_mp_list),
+                num_workers=self.parent.num_proc)
+        finally:
+            self.database_writer.close()
+
+    def _update_dss_obj_attributes(self, initial_mothur_qc_outputs):
+        for dss_proxy in initial_mothur_qc_outputs:
+            if isinstance(dss_proxy, tuple):
+                output_type, sample_name = dss_proxy
+                if output_type == 'error_sample_name':
+                    self.samples_that_caused_errors_in_qc_list.append(sample_name)
             else:
-                dss_obj = dss_obj_uid_to_obj_dict[dss_proxy.uid]
-                if dss_proxy.error_in_processing:
-                    dss_obj.error_in_processing = dss_proxy.error_in_processing
-                    dss_obj.error_reason = dss_proxy.error_reason
-                    dss_obj.unique_num_sym_seqs = dss_proxy.unique_num_sym_seqs
-                    dss_obj.absolute_num_sym_seqs = dss_proxy.absolute_num_sym_seqs
-                    dss_obj.post_qc_absolute_num_seqs = dss_proxy.post_qc_absolute_num_seqs
-                    dss_obj.post_qc_unique_num_seqs = dss_proxy.post_qc_unique_num_seqs
-                    dss_obj.num_contigs = dss_proxy.num_contigs
-                    dss_obj.save()
-                else:
-                    dss_obj.post_qc_absolute_num_seqs = dss_proxy.post_qc_absolute_num_seqs
-                    dss_obj.post_qc_unique_num_seqs = dss_proxy.post_qc_unique_num_seqs
-                    dss_obj.num_contigs = dss_proxy.num_contigs
-                    dss_obj.save()
+                dss_obj = self.dss_obj_uid_to_obj_dict[dss_proxy.uid]
+                self.assign_qc_attributes_to_dss_obj(dss_obj=dss_obj, dss_proxy=dss_proxy)
+                self.database_writer.save(dss_obj)
+
+    @staticmethod
+    def assign_qc_attributes_to_dss_obj(dss_obj, dss_proxy):
+        """Set the attributes collected in the DSSAttributeAssignmentHolder during the QC on the DataSetSample"""
+        if dss_proxy.error_in_processing:
+            dss_obj.error_in_processing = dss_proxy.error_in_processing
+            dss_obj.error_reason = dss_proxy.error_reason
+            dss_obj.unique_num_sym_seqs = dss_proxy.unique_num_sym_seqs
+            dss_obj.absolute_num_sym_seqs = dss_proxy.absolute_num_sym_seqs
+        dss_obj.post_qc_absolute_num_seqs = dss_proxy.post_qc_absolute_num_seqs
+        dss_obj.post_qc_unique_num_seqs = dss_proxy.post_qc_unique_num_seqs
+        dss_obj.num_contigs = dss_proxy.num_contigs
 
     # We will attempt to fix the weakref pickling issue we are having by maing this a static method.
     @staticmethod
-    def _worker_initial_mothur(in_q_paths, out_list_error_samples, out_q_attr_data, temp_working_directory, debug):
+    def _worker_initial_mothur(
+            contigpair_and_dss_att_holder, temp_working_directory, debug,
+            single_mothur_batch=False, qc_cache_directory=None, lazy_input_staging=False,
+            temp_working_directory_lifecycle=None, samples_in_initial_qc_mp_list=None):
         """
         This worker performs the pre-MED processing that is primarily mothur-based.
         This QC includes making contigs, screening for ambigous calls (0 allowed),
         Discarding singletons and doublets, in silico PCR. It also checks whether sequences are rev compliment.
         This is all done through the use of an InitialMothurWorker class which in turn makes use of the MothurAnalysis
         class that does the heavy lifting of running the mothur commands in sequence.
+        Run by the ResultQueueWorkerPool for a single sample. Returns the outputs of the QC of the sample
+        (its DSSAttributeAssignmentHolder and/or an ('error_sample_name', name) tuple) in the order they were made.
         """
-        for contigpair, dss_att_holder in iter(in_q_paths.get, 'STOP'):
-
-            initial_morthur_worker = InitialMothurWorker(
-                dss_att_holder=dss_att_holder, 
-                contig_pair=contigpair, 
-                temp_working_directory=temp_working_directory,
-                debug=debug, out_q_attr_data=out_q_attr_data
-                )
+        contigpair, dss_att_holder = contigpair_and_dss_att_holder
+        out_q_attr_data = mt_Queue()
+        InitialMothurHandler._initial_mothur_qc_of_sample(
+            contigpair=contigpair, dss_att_holder=dss_att_holder, out_q_attr_data=out_q_attr_data,
+            temp_working_directory=temp_working_directory, debug=debug,
+            single_mothur_batch=single_mothur_batch, qc_cache_directory=qc_cache_directory,
+            lazy_input_staging=lazy_input_staging,
+            temp_working_directory_lifecycle=temp_working_directory_lifecycle,
+            samples_in_initial_qc_mp_list=samples_in_initial_qc_mp_list)
+        return [out_q_attr_data.get() for i in range(out_q_attr_data.qsize())]
 
+    @staticmethod
+    def _initial_mothur_qc_of_sample(
+            contigpair, dss_att_holder, out_q_attr_data, temp_working_directory, debug, single_mothur_batch,
+            qc_cache_directory, lazy_input_staging, temp_working_directory_lifecycle, samples_in_initial_qc_mp_list):
+        """QC a single sample. Any error in the QC of the sample (not only the RuntimeErrors raised by the
+        InitialMothurWorker but also e.g. an OSError from the QC cache) is reported to the parent as an error
+        of that sample so that the worker can carry on with the next sample."""
+        if temp_working_directory_lifecycle is not None:
+            temp_working_directory_lifecycle.wait_for_disk_budget(
+                sample_name=dss_att_holder.name, samples_in_initial_qc_list=samples_in_initial_qc_mp_list)
+            samples_in_initial_qc_mp_list.append(dss_att_holder.name)
+        try:
             try:
+                initial_morthur_worker = InitialMothurWorker(
+                    dss_att_holder=dss_att_holder,
+                    contig_pair=contigpair,
+                    temp_working_directory=temp_working_directory,
+                    debug=debug, out_q_attr_data=out_q_attr_data,
+                    single_mothur_batch=single_mothur_batch,
+                    qc_cache_directory=qc_cache_directory,
+                    lazy_input_staging=lazy_input_staging
+                    )
                 initial_morthur_worker.start_initial_mothur_worker()
-                out_q_attr_data.put(initial_morthur_worker.dss_att_holder)
-            except RuntimeError as e:
-                out_list_error_samples.append(e.args[0]['sample_name'])
-        out_q_attr_data.put('DONE')
-        return
+            except Exception as e:
+                if not isinstance(e, RuntimeError):
+                    # The RuntimeErrors have already been logged against the sample by the InitialMothurWorker
+                    traceback.print_exc()
+                    InitialMothurWorker.log_qc_error_of_dss_att_holder(
+                        dss_att_holder=dss_att_holder, out_q_attr_data=out_q_attr_data,
+                        errorreason=f'{e.__class__.__name__} in initial QC')
+                out_q_attr_data.put(('error_sample_name', dss_att_holder.name))
+                if temp_working_directory_lifecycle is not None:
+                    temp_working_directory_lifecycle.release_failed_sample(
+                        sample_name=dss_att_holder.name, fastq_path_pair=contigpair.split('\t')[1:3])
+                return
+            out_q_attr_data.put(initial_morthur_worker.dss_att_holder)
+            try:
+                initial_morthur_worker.record_checkpoint()
+                if temp_working_directory_lifecycle is not None:
+                    temp_working_directory_lifecycle.release_initial_qc_intermediates(
+                        sample_name=dss_att_holder.name,
+                        fastq_path_pair=initial_morthur_worker.get_fastq_path_pair())
+            except OSError as e:
+                # The QC of the sample succeeded. Failing to checkpoint or to release its intermediates
+                # only means that it will be QCed again on resume or that the files stay on disk.
+                print(f'{dss_att_holder.name}: WARNING unable to checkpoint or release the initial QC: {e}')
+        finally:
+            if temp_working_directory_lifecycle is not None:
+                samples_in_initial_qc_mp_list.remove(dss_att_holder.name)
+
+
+class InitialMothurQCCache:
+    """Content-addressed store of the results of the initial mothur QC.
+    Each entry is keyed by the sha256 of the fwd and rev fastq files together with the QC parameters
+    and holds the post-QC .names and .fasta files and the number of contigs. Only successful QCs are stored.
+    """
+    def __init__(self, cache_directory, fastq_fwd_path, fastq_rev_path, qc_parameters_dict):
+        self.cache_directory = cache_directory
+        self.key = self._make_key(fastq_fwd_path, fastq_rev_path, qc_parameters_dict)
+        self.entry_directory = os.path.join(self.cache_directory, self.key)
+        self.name_file_path = os.path.join(self.entry_directory, 'name_file_for_tax_screening.names')
+        self.fasta_file_path = os.path.join(self.entry_directory, 'fasta_file_for_tax_screening.fasta')
+        self.num_contigs_file_path = os.path.join(self.entry_directory, 'num_contigs.txt')
+
+    @staticmethod
+    def _make_key(fastq_fwd_path, fastq_rev_path, qc_parameters_dict):
+        sha256 = hashlib.sha256()
+        for fastq_path in [fastq_fwd_path, fastq_rev_path]:
+            with open(fastq_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    sha256.update(block)
+        sha256.update(json.dumps(qc_parameters_dict, sort_keys=True).encode('utf-8'))
+        return sha256.hexdigest()
+
+    def is_cached(self):
+        return os.path.isfile(self.num_contigs_file_path)
+
+    def get_num_contigs(self):
+        return int(ThreadSafeGeneral.read_defined_file_to_list(self.num_contigs_file_path)[0])
+
+    def copy_results_to(self, name_file_destination_path, fasta_file_destination_path):
+        shutil.copyfile(self.name_file_path, name_file_destination_path)
+        shutil.copyfile(self.fasta_file_path, fasta_file_destination_path)
+
+    def store_results(self, name_file_path, fasta_file_path, num_contigs):
+        # Write the entry to a temporary directory first and then rename it into place so that
+        # a partially written entry is never visible to other workers or loadings.
+        os.makedirs(self.cache_directory, exist_ok=True)
+        temp_entry_directory = tempfile.mkdtemp(dir=self.cache_directory, prefix=f'.{self.key}_')
+        shutil.copyfile(name_file_path, os.path.join(temp_entry_directory, os.path.basename(self.name_file_path)))
+        shutil.copyfile(fasta_file_path, os.path.join(temp_entry_directory, os.path.basename(self.fasta_file_path)))
+        ThreadSafeGeneral.write_list_to_destination(
+            os.path.join(temp_entry_directory, os.path.basename(self.num_contigs_file_path)), [str(num_contigs)])
+        try:
+            os.rename(temp_entry_directory, self.entry_directory)
+        except OSError:
+            # Another worker has already stored the same entry
+            shutil.rmtree(temp_entry_directory, ignore_errors=True)
 
 
 class InitialMothurWorker:
-    def __init__(self, dss_att_holder, contig_pair, temp_working_directory, debug, out_q_attr_data):
+    def __init__(
+            self, dss_att_holder, contig_pair, temp_working_directory, debug, out_q_attr_data,
+            single_mothur_batch=False, qc_cache_directory=None, lazy_input_staging=False):
         self.sample_name = dss_att_holder.name
         self.dss_att_holder = dss_att_holder
         self.cwd = os.path.join(temp_working_directory, self.sample_name)
         self.debug = debug
+        self.single_mothur_batch = single_mothur_batch
+        self.qc_cache_directory = qc_cache_directory
         os.makedirs(self.cwd, exist_ok=True)
+        # With lazy_input_staging, contig_pair holds the source paths. mothur reads the (compressed) fastq files
+        # once, in make.contigs, so it is given these paths directly rather than copies in the cwd.
+        self.lazy_input_staging = lazy_input_staging
+        fastq_fwd_path, fastq_rev_path = contig_pair.split('\t')[1], contig_pair.split('\t')[2]
         self.mothur_analysis_object = MothurAnalysis(
             name=self.sample_name,
             output_dir=self.cwd, input_dir=self.cwd,
-            fastq_gz_fwd_path=contig_pair.split('\t')[1], fastq_gz_rev_path=contig_pair.split('\t')[2],
+            fastq_gz_fwd_path=fastq_fwd_path, fastq_gz_rev_path=fastq_rev_path,
             stdout_and_sterr_to_pipe=(not self.debug)
             )
         self.output_queue_for_attribute_data = out_q_attr_data
         self.thread_safe_general = ThreadSafeGeneral()
 
     def start_initial_mothur_worker(self):
+        self._do_initial_mothur_qc()
+
+    def get_fastq_path_pair(self):
+        return self.mothur_analysis_object.fastq_gz_fwd_path, self.mothur_analysis_object.fastq_gz_rev_path
+
+    def record_checkpoint(self):
+        DataLoadingCheckpoint(stage=DataLoadingCheckpoint.initial_mothur_qc_stage).record(
+            directory=self.cwd, file_paths=[
+                os.path.join(self.cwd, 'name_file_for_tax_screening.names'),
+                os.path.join(self.cwd, 'fasta_file_for_tax_screening.fasta')])
+
+    def _do_initial_mothur_qc(self):
         sys.stdout.write(f'{self.sample_name}: QC started\n')
 
-        self._do_make_contigs()
+        qc_cache = self._get_qc_cache()
+        if qc_cache is not None and qc_cache.is_cached():
+            self._load_initial_qc_results_from_cache(qc_cache)
+            return
+
+        if self.single_mothur_batch:
+            self._do_initial_qc_single_batch()
+        else:
+            self._do_make_contigs()
 
-        self._do_unique_seqs()
+            self._do_unique_seqs()
 
-        self._do_fwd_and_rev_pcr()
+            self._do_fwd_and_rev_pcr()
 
-        self._do_unique_seqs()
+            self._do_unique_seqs()
 
-        self._do_screen_seqs()
+            self._do_screen_seqs()
 
-        self._do_split_abund()
+            self._do_split_abund()
 
         self._set_unique_and_abs_num_seqs_after_initial_qc()
 
         self._write_out_final_name_and_fasta_for_tax_screening()
 
+        if qc_cache is not None:
+            qc_cache.store_results(
+                name_file_path=os.path.join(self.cwd, 'name_file_for_tax_screening.names'),
+                fasta_file_path=os.path.join(self.cwd, 'fasta_file_for_tax_screening.fasta'),
+                num_contigs=self.dss_att_holder.num_contigs)
+
+        self.output_queue_for_attribute_data.put(self.dss_att_holder)
+
+        sys.stdout.write(f'{self.sample_name}: Initial mothur complete\n')
+
+    def _get_qc_cache(self):
+        if self.qc_cache_directory is None:
+            return None
+        qc_parameters_dict = {
+            'pcr_fwd_primer': self.mothur_analysis_object.pcr_fwd_primer,
+            'pcr_rev_primer': self.mothur_analysis_object.pcr_rev_primer,
+            'pcr_fwd_primer_mismatch': self.mothur_analysis_object.pcr_fwd_primer_mismatch,
+            'pcr_rev_primer_mismatch': self.mothur_analysis_object.pcr_rev_primer_mismatch,
+            'screen_seqs_maxambig': 0,
+            'split_abund_cutoff': 2,
+            # Versioned so that the entries of the earlier single batch QC, whose results differed
+            # from those of the per-step QC, are not reused
+            'single_mothur_batch': 'v2' if self.single_mothur_batch else False
+        }
+        return InitialMothurQCCache(
+            cache_directory=self.qc_cache_directory,
+            fastq_fwd_path=self.mothur_analysis_object.fastq_gz_fwd_path,
+            fastq_rev_path=self.mothur_analysis_object.fastq_gz_rev_path,
+            qc_parameters_dict=qc_parameters_dict)
+
+    def _load_initial_qc_results_from_cache(self, qc_cache):
+        sys.stdout.write(f'{self.sample_name}: QC results found in cache {qc_cache.key}\n')
+        taxonomic_screening_name_file_path = os.path.join(self.cwd, 'name_file_for_tax_screening.names')
+        taxonomic_screening_fasta_file_path = os.path.join(self.cwd, 'fasta_file_for_tax_screening.fasta')
+        qc_cache.copy_results_to(
+            name_file_destination_path=taxonomic_screening_name_file_path,
+            fasta_file_destination_path=taxonomic_screening_fasta_file_path)
+        self.mothur_analysis_object.name_file_path = taxonomic_screening_name_file_path
+        self.mothur_analysis_object.fasta_path = taxonomic_screening_fasta_file_path
+        self.dss_att_holder.num_contigs = qc_cache.get_num_contigs()
+        sys.stdout.write(
+            f'{self.sample_name}: data_set_sample_instance_in_q.num_contigs = {self.dss_att_holder.num_contigs}\n')
+
+        self._set_unique_and_abs_num_seqs_after_initial_qc()
+
         self.output_queue_for_attribute_data.put(self.dss_att_holder)
 
         sys.stdout.write(f'{self.sample_name}: Initial mothur complete\n')
@@ -2064,6 +2948,23 @@ class InitialMothurWorker:
                 self.log_qc_error_and_continue(errorreason='Error in make.contigs')
                 raise RuntimeError({'sample_name': self.sample_name})
 
+    def _do_initial_qc_single_batch(self):
+        try:
+            self.dss_att_holder.num_contigs = self.mothur_analysis_object.execute_initial_qc_single_batch()
+            sys.stdout.write(
+                f'{self.sample_name}: data_set_sample_instance_in_q.num_contigs = {self.dss_att_holder.num_contigs}\n')
+        except RuntimeError as e:
+            if str(e) == 'bad fastq, mothur stuck in loop':
+                self.log_qc_error_and_continue(errorreason='Bad fastq, mothur stuck in loop')
+            elif str(e) in ['empty fasta', 'Make.contigs out fasta not found']:
+                self.log_qc_error_and_continue(errorreason='Error in make.contigs')
+            elif str(e) == 'PCR fasta file is blank':
+                self.log_qc_error_and_continue(errorreason='No seqs left after PCR')
+            else:
+                stage_of_qc = self.mothur_analysis_object.get_initial_qc_single_batch_failed_command()
+                self.log_qc_error_and_continue(errorreason=f'error in inital QC during {stage_of_qc}')
+            raise RuntimeError({'sample_name': self.sample_name})
+
     def _write_out_final_name_and_fasta_for_tax_screening(self):
         name_file_as_list = self.thread_safe_general.read_defined_file_to_list(
             self.mothur_analysis_object.name_file_path)
@@ -2135,13 +3036,553 @@ class InitialMothurWorker:
         raise RuntimeError({'sample_name': self.sample_name})
 
     def log_qc_error_and_continue(self, errorreason):
-        print('{}: Error in processing sample'.format(self.sample_name))
-        self.dss_att_holder.unique_num_sym_seqs = 0
-        self.dss_att_holder.absolute_num_sym_seqs = 0
-        self.dss_att_holder.initial_processing_complete = True
-        self.dss_att_holder.error_in_processing = True
-        self.dss_att_holder.error_reason = errorreason
-        self.output_queue_for_attribute_data.put(self.dss_att_holder)
+        self.log_qc_error_of_dss_att_holder(
+            dss_att_holder=self.dss_att_holder, out_q_attr_data=self.output_queue_for_attribute_data,
+            errorreason=errorreason)
+
+    @staticmethod
+    def log_qc_error_of_dss_att_holder(dss_att_holder, out_q_attr_data, errorreason):
+        print('{}: Error in processing sample'.format(dss_att_holder.name))
+        dss_att_holder.unique_num_sym_seqs = 0
+        dss_att_holder.absolute_num_sym_seqs = 0
+        dss_att_holder.initial_processing_complete = True
+        dss_att_holder.error_in_processing = True
+        dss_att_holder.error_reason = errorreason
+        out_q_attr_data.put(dss_att_holder)
+
+
+class SubEValueScreeningBackend:
+    """Screens the sub e value sequences to see whether they are Symbiodiniaceae in origin by BLASTing them
+    against a nucleotide database. This is NCBI's nt by default but can be any local BLAST database (e.g. the
+    small stand-in at tests/data/sub_evalue_screening_db/nt_stand_in.fa). If a fasta is given whose BLAST
+    database binaries do not exist, they are made.
+    All of the pending sequences of an iteration are searched in a single blastn.
+    Optionally, the verdict for each sequence (Symbiodiniaceae or not) is cached by the sha256 of the sequence
+    so that repeat loadings do not search the same sequences again. The verdicts are held in an SQLite database per
+    BLAST database and verdict criteria, so a change to either of these starts a new set of verdicts. The BLAST
+    database is identified by the size and modification time of its files. If these cannot be read the
+    verdicts are not cached.
+    """
+    min_percentage_coverage = 95
+    min_percentage_identity = 60
+    max_target_seqs = 10
+
+    def __init__(
+            self, temp_working_directory, num_proc, debug, required_symbiodiniaceae_matches, db_path=None,
+            verdict_cache_directory=None):
+        self.thread_safe_general = ThreadSafeGeneral()
+        self.temp_working_directory = temp_working_directory
+        self.num_proc = num_proc
+        self.debug = debug
+        self.required_symbiodiniaceae_matches = required_symbiodiniaceae_matches
+        if db_path is not None:
+            self.db_path = os.path.abspath(db_path)
+            self._make_db_if_binaries_not_present()
+        else:
+            self.db_path = BlastnAnalysis.default_db_path
+        self.verdict_cache_connection = None
+        if verdict_cache_directory is not None:
+            verdict_cache_key = self._make_verdict_cache_key()
+            if verdict_cache_key is None:
+                print(f'WARNING: unable to read the files of the sub e value screening BLAST database '
+                      f'{self.db_path}. The sub e value verdicts will not be cached.')
+            else:
+                os.makedirs(verdict_cache_directory, exist_ok=True)
+                # The timeout covers another loading adding its verdicts to the same database
+                self.verdict_cache_connection = sqlite3.connect(
+                    os.path.join(verdict_cache_directory, f'{verdict_cache_key}.sqlite3'), timeout=60)
+                with self.verdict_cache_connection:
+                    self.verdict_cache_connection.execute(
+                        'CREATE TABLE IF NOT EXISTS verdict ('
+                        'sequence_hash TEXT PRIMARY KEY, is_symbiodiniaceae INTEGER NOT NULL)')
+
+    def _make_db_if_binaries_not_present(self):
+        if os.path.isfile(self.db_path) and not all(
+                [os.path.isfile(self.db_path + extension) for extension in ['.nhr', '.nin', '.nsq']]):
+            sys.stdout.write(f'Making BLAST database for sub e value screening from {self.db_path}\n')
+            self.thread_safe_general.make_new_blast_db(
+                input_fasta_to_make_db_from=self.db_path, db_title='sub_evalue_screening',
+                pipe_stdout_sterr=(not self.debug))
+
+    def _make_verdict_cache_key(self):
+        """The database is identified by its path and the size and modification time of its files
+        (including those of each volume of a multi-volume database e.g. nt.00.nhr) so that an updated
+        database starts a new set of verdicts. None if the database's files cannot be found or read."""
+        db_file_stats = []
+        db_directory = os.path.dirname(self.db_path)
+        try:
+            for file_name in sorted(os.listdir(db_directory)):
+                if file_name.startswith(os.path.basename(self.db_path) + '.'):
+                    file_stat = os.stat(os.path.join(db_directory, file_name))
+                    db_file_stats.append([file_name, file_stat.st_size, int(file_stat.st_mtime)])
+        except OSError:
+            return None
+        if not db_file_stats:
+            return None
+        key_dict = {
+            'db_path': self.db_path, 'db_file_stats': db_file_stats,
+            'required_symbiodiniaceae_matches': self.required_symbiodiniaceae_matches,
+            'min_percentage_coverage': self.min_percentage_coverage,
+            'min_percentage_identity': self.min_percentage_identity, 'max_target_seqs': self.max_target_seqs}
+        return hashlib.sha256(json.dumps(key_dict, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _get_sequence_hash(nucleotide_sequence):
+        return hashlib.sha256(nucleotide_sequence.encode('utf-8')).hexdigest()
+
+    def _get_cached_verdict(self, nucleotide_sequence):
+        """True or False if the verdict of the sequence is cached, else None"""
+        if self.verdict_cache_connection is None:
+            return None
+        row = self.verdict_cache_connection.execute(
+            'SELECT is_symbiodiniaceae FROM verdict WHERE sequence_hash = ?',
+            (self._get_sequence_hash(nucleotide_sequence),)).fetchone()
+        return None if row is None else bool(row[0])
+
+    def _store_verdicts(self, nucleotide_sequence_to_verdict_dict):
+        if self.verdict_cache_connection is None:
+            return
+        with self.verdict_cache_connection:
+            self.verdict_cache_connection.executemany(
+                'INSERT OR REPLACE INTO verdict (sequence_hash, is_symbiodiniaceae) VALUES (?, ?)',
+                ((self._get_sequence_hash(nucleotide_sequence), int(verdict)) for
+                 nucleotide_sequence, verdict in nucleotide_sequence_to_verdict_dict.items()))
+
+    def close(self):
+        if self.verdict_cache_connection is not None:
+            self.verdict_cache_connection.close()
+            self.verdict_cache_connection = None
+
+    def get_names_of_sequences_verified_as_symbiodiniaceae(self, sequences_to_screen_fasta_path):
+        fasta_dict = self.thread_safe_general.create_dict_from_fasta(fasta_path=sequences_to_screen_fasta_path)
+        query_sequences_verified_as_symbiodiniaceae_list = []
+        sequences_to_search_fasta_as_list = []
+        for sequence_name, nucleotide_sequence in fasta_dict.items():
+            verdict = self._get_cached_verdict(nucleotide_sequence)
+            if verdict is None:
+                sequences_to_search_fasta_as_list.extend([f'>{sequence_name}', nucleotide_sequence])
+            elif verdict:
+                query_sequences_verified_as_symbiodiniaceae_list.append(sequence_name)
+        sys.stdout.write(
+            f'\nScreening {int(len(sequences_to_search_fasta_as_list) / 2)} sub e value sequences '
+            f'({len(fasta_dict) - int(len(sequences_to_search_fasta_as_list) / 2)} verdicts cached)\n')
+        if not sequences_to_search_fasta_as_list:
+            return query_sequences_verified_as_symbiodiniaceae_list
+
+        sequences_to_search_fasta_path = os.path.join(self.temp_working_directory, 'sub_e_seqs_to_search.fasta')
+        self.thread_safe_general.write_list_to_destination(
+            sequences_to_search_fasta_path, sequences_to_search_fasta_as_list)
+        blastn_kwargs = dict(
+            input_file_path=sequences_to_search_fasta_path,
+            output_file_path=os.path.join(self.temp_working_directory, 'blast.out'),
+            db_path=self.db_path, max_target_seqs=self.max_target_seqs,
+            num_threads=str(self.num_proc), pipe_stdout_sterr=(not self.debug))
+        blastn_analysis_object = BlastnAnalysis(**blastn_kwargs)
+
+        blastn_analysis_object.execute_blastn_analysis()
+
+        newly_verified_list = self._get_list_of_seqs_in_blast_result_that_are_symbiodiniaceae(
+            blastn_analysis_object.return_blast_results_dict())
+        newly_verified_set = set(newly_verified_list)
+        self._store_verdicts({
+            fasta_dict[sequence_name[1:]]: sequence_name[1:] in newly_verified_set for
+            sequence_name in sequences_to_search_fasta_as_list[0::2]})
+        query_sequences_verified_as_symbiodiniaceae_list.extend(newly_verified_list)
+        return query_sequences_verified_as_symbiodiniaceae_list
+
+    def _get_list_of_seqs_in_blast_result_that_are_symbiodiniaceae(self, blast_output_dict):
+        query_sequences_verified_as_symbiodiniaceae_list = []
+        for query_sequence_name, blast_result_list_for_query_sequence in blast_output_dict.items():
+            sym_count = 0
+            for result_str in blast_result_list_for_query_sequence:
+                if 'Symbiodinium' in result_str or 'Symbiodiniaceae' in result_str:
+                    percentage_coverage = float(result_str.split('\t')[4])
+                    percentage_identity_match = float(result_str.split('\t')[3])
+                    if percentage_coverage > self.min_percentage_coverage and \
+                            percentage_identity_match > self.min_percentage_identity:
+                        sym_count += 1
+                        if sym_count == self.required_symbiodiniaceae_matches:
+                            query_sequences_verified_as_symbiodiniaceae_list.append(query_sequence_name)
+                            break
+        return query_sequences_verified_as_symbiodiniaceae_list
+
+
+class SymCladeKmerPreClassifier:
+    """A fast in process classifier built from the k-mers of the symClade database sequences of each clade.
+    For a query sequence, the proportion of its k-mers found in the k-mers of each clade is calculated.
+    A sequence is confidently assigned to a clade if this proportion is high for its best clade and clearly
+    lower for every other clade, and if nearly all of its k-mers are also found in a single reference sequence.
+    As a clade assignment is not checked by BLAST, the latter stops a chimera of two references of the same clade,
+    whose best BLAST match would fail the coverage threshold, from being assigned to the clade.
+    It is confidently rejected as non-Symbiodiniaceae if the proportion is very
+    low for every clade. All other sequences are ambiguous and should be BLASTed.
+    The verdicts are not dressed up as BLAST results. They are written to the sample's kmer_preclassification.out
+    (the sequence name and either the assigned clade or 'rejected') and the blast.out only holds the results of the
+    sequences that were BLASTed. The taxonomic screenings read the verdicts alongside the blast.out:
+    a sequence assigned to a clade is Symbiodiniaceae of that clade and a rejected sequence is treated
+    as a sequence with no BLAST match.
+    """
+    kmer_length = 9
+    min_containment_for_clade_assignment = 0.9
+    min_containment_margin_for_clade_assignment = 0.3
+    # The proportion of the k-mers that must be found in a single reference sequence for a clade assignment.
+    # Each mismatch to the reference loses up to kmer_length k-mers so this allows a couple of mismatches,
+    # or a short unmatched end, while keeping well inside the SymCladeMatchThresholds.
+    min_containment_for_reference_match = 0.95
+    max_containment_for_rejection = 0.05
+    verdicts_file_name = 'kmer_preclassification.out'
+    rejected_verdict = 'rejected'
+    # The pre-classifiers built by this process (and shared by its threads) by symClade path (see get_shared)
+    shared_preclassifier_dict = {}
+
+    def __init__(self, path_to_symclade_db):
+        self.clade_to_kmer_set_dict = defaultdict(set)
+        # The indices of the reference sequences (in the order of symClade) that each k-mer is found in
+        kmer_to_reference_index_list_dict = defaultdict(list)
+        fasta_dict = ThreadSafeGeneral().create_dict_from_fasta(fasta_path=path_to_symclade_db)
+        for reference_index, (sequence_name, nucleotide_sequence) in enumerate(fasta_dict.items()):
+            reference_kmer_set = self._get_kmer_set(nucleotide_sequence)
+            # As for the symClade BLAST results the clade is the last character of the sequence name
+            self.clade_to_kmer_set_dict[sequence_name[-1]].update(reference_kmer_set)
+            for kmer in reference_kmer_set:
+                kmer_to_reference_index_list_dict[kmer].append(reference_index)
+        self.num_reference_sequences = len(fasta_dict)
+        self.kmer_to_reference_index_array_dict = {
+            kmer: np.array(reference_index_list, dtype=np.int32) for
+            kmer, reference_index_list in kmer_to_reference_index_list_dict.items()}
+
+    @classmethod
+    def get_shared(cls, path_to_symclade_db):
+        """The pre-classifier of the symClade database at path_to_symclade_db. It is built once by each worker
+        of the ResultQueueWorkerPool and then used by all of the worker's jobs until the database is changed
+        (e.g. by the sequences added to it at the end of the taxonomic screening)."""
+        symclade_db_stat = os.stat(path_to_symclade_db)
+        symclade_db_state = (symclade_db_stat.st_mtime_ns, symclade_db_stat.st_size)
+        state_and_preclassifier = cls.shared_preclassifier_dict.get(path_to_symclade_db)
+        if state_and_preclassifier is None or state_and_preclassifier[0] != symclade_db_state:
+            state_and_preclassifier = (symclade_db_state, cls(path_to_symclade_db=path_to_symclade_db))
+            cls.shared_preclassifier_dict[path_to_symclade_db] = state_and_preclassifier
+        return state_and_preclassifier[1]
+
+    def _get_kmer_set(self, nucleotide_sequence):
+        nucleotide_sequence = nucleotide_sequence.upper().replace('-', '')
+        return {
+            nucleotide_sequence[i:i + self.kmer_length] for
+            i in range(len(nucleotide_sequence) - self.kmer_length + 1)}
+
+    def classify(self, nucleotide_sequence):
+        """Return a tuple of the classification ('clade', 'rejected' or 'ambiguous'),
+        the best clade and the proportion of the sequence's k-mers found in the best clade"""
+        query_kmer_set = self._get_kmer_set(nucleotide_sequence)
+        if not query_kmer_set:
+            return 'ambiguous', None, 0
+        clade_containment_list = sorted(
+            [(len(query_kmer_set & clade_kmer_set) / len(query_kmer_set), clade) for
+             clade, clade_kmer_set in self.clade_to_kmer_set_dict.items()], reverse=True)
+        best_containment, best_clade = clade_containment_list[0]
+        second_best_containment = clade_containment_list[1][0] if len(clade_containment_list) > 1 else 0
+        if best_containment >= self.min_containment_for_clade_assignment and \
+                best_containment - second_best_containment >= self.min_containment_margin_for_clade_assignment:
+            # The k-mers of the clade may come from several of its references (e.g. for a chimera)
+            if self._get_best_reference_containment(query_kmer_set) >= self.min_containment_for_reference_match:
+                return 'clade', best_clade, best_containment
+            return 'ambiguous', None, best_containment
+        if best_containment <= self.max_containment_for_rejection:
+            return 'rejected', None, best_containment
+        return 'ambiguous', None, best_containment
+
+    def _get_best_reference_containment(self, query_kmer_set):
+        """Return the highest proportion of the query's k-mers found in any single reference sequence.
+        Only called for the sequences that pass the clade containment thresholds, so its best reference
+        is always of the best clade."""
+        reference_index_array_list = [
+            self.kmer_to_reference_index_array_dict[kmer] for
+            kmer in query_kmer_set if kmer in self.kmer_to_reference_index_array_dict]
+        if not reference_index_array_list:
+            return 0
+        num_kmers_per_reference = np.bincount(
+            np.concatenate(reference_index_array_list), minlength=self.num_reference_sequences)
+        return num_kmers_per_reference.max() / len(query_kmer_set)
+
+    def get_verdict(self, nucleotide_sequence):
+        """Return the clade the sequence is assigned to, rejected_verdict,
+        or None if the sequence is ambiguous and needs BLASTing."""
+        classification, clade, containment = self.classify(nucleotide_sequence)
+        if classification == 'clade':
+            return clade
+        if classification == 'rejected':
+            return self.rejected_verdict
+        return None
+
+    @classmethod
+    def write_verdicts(cls, sample_directory, sequence_name_to_verdict_dict):
+        ThreadSafeGeneral.write_list_to_destination(
+            os.path.join(sample_directory, cls.verdicts_file_name),
+            [f'{sequence_name}\t{verdict}' for sequence_name, verdict in sequence_name_to_verdict_dict.items()])
+
+    @classmethod
+    def read_clade_verdicts(cls, sample_directory):
+        """Return a dict of sequence name to clade for the sequences of the sample assigned to a clade.
+        Empty if the sample was not pre-classified."""
+        verdicts_path = os.path.join(sample_directory, cls.verdicts_file_name)
+        if not os.path.isfile(verdicts_path):
+            return {}
+        sequence_name_to_clade_dict = {}
+        for line in ThreadSafeGeneral.read_defined_file_to_list(verdicts_path):
+            sequence_name, verdict = line.split('\t')
+            if verdict != cls.rejected_verdict:
+                sequence_name_to_clade_dict[sequence_name] = verdict
+        return sequence_name_to_clade_dict
+
+    @classmethod
+    def remove_verdicts(cls, sample_directory):
+        """Remove the verdicts of an earlier screening of the sample so that they are not read alongside
+        a blast.out that holds the results of all of the sample's sequences."""
+        verdicts_path = os.path.join(sample_directory, cls.verdicts_file_name)
+        if os.path.isfile(verdicts_path):
+            os.remove(verdicts_path)
+
+    def report_concordance_with_blast(self, label, fasta_dict, blast_output_as_list):
+        """Print how the pre-classifier's calls compare to the symClade BLAST results.
+        A clade assignment agrees if BLAST gives the sequence a good match to the same clade.
+        A rejection agrees if BLAST gives the sequence no match or only a below threshold match."""
+        sequence_name_to_blast_clade_dict = {}
+        for blast_line in blast_output_as_list:
+            sequence_name_to_blast_clade_dict.setdefault(blast_line.split('\t')[0], blast_line.split('\t')[1][-1])
+        unresolved_sequence_names_set = set(
+            SymCladeDeltaDatabase.get_unresolved_sequence_names(fasta_dict, blast_output_as_list))
+        concordance_counter = Counter()
+        for sequence_name, nucleotide_sequence in fasta_dict.items():
+            classification, clade, containment = self.classify(nucleotide_sequence)
+            if classification == 'clade':
+                if sequence_name not in unresolved_sequence_names_set and \
+                        sequence_name_to_blast_clade_dict[sequence_name] == clade:
+                    concordance_counter['clade_agree'] += 1
+                else:
+                    concordance_counter['clade_disagree'] += 1
+            elif classification == 'rejected':
+                if sequence_name in unresolved_sequence_names_set:
+                    concordance_counter['rejected_agree'] += 1
+                else:
+                    concordance_counter['rejected_disagree'] += 1
+            else:
+                concordance_counter['ambiguous'] += 1
+        print(
+            f'{label}: k-mer pre-classifier concordance with BLAST: '
+            f'clade assigned {concordance_counter["clade_agree"]} agree, '
+            f'{concordance_counter["clade_disagree"]} disagree; '
+            f'rejected {concordance_counter["rejected_agree"]} agree, '
+            f'{concordance_counter["rejected_disagree"]} disagree; '
+            f'{concordance_counter["ambiguous"]} ambiguous')
+        return concordance_counter
+
+
+class SymCladeMatchThresholds:
+    """The thresholds that the match of a sequence to the symClade database must meet for the sequence to be
+    considered Symbiodiniaceae. Used by both taxonomic screenings and by the SymCladeDeltaDatabase
+    so that they always agree on which sequences fall below the thresholds."""
+    evalue_power_threshold = 100
+    identity_threshold = 80
+    coverage_threshold = 95
+
+    @classmethod
+    def is_below_match_thresholds(cls, blast_line):
+        """blast_line is a line of the blast output in the format used for the symClade BLASTs:
+        qseqid sseqid staxids evalue pident qcovs.
+        With the smallest sequences i.e. 185bp it is impossible to get above the evalue threshold
+        even if there is an exact match. As such, a match that fails the evalue threshold (or whose evalue
+        cannot be read) is only below the thresholds if its identity or coverage is also too low."""
+        blast_line_fields = blast_line.split('\t')
+        try:
+            if int(blast_line_fields[3].split('-')[1]) >= cls.evalue_power_threshold:
+                return False
+        except (IndexError, ValueError):
+            pass
+        return float(blast_line_fields[4]) < cls.identity_threshold or \
+            float(blast_line_fields[5]) < cls.coverage_threshold
+
+
+class SymCladeDeltaDatabase:
+    """Holds the sequences that have been confirmed as Symbiodiniaceae during the sub e value screening of the
+    current loading as a small BLAST database in the temp working directory. This is searched alongside symClade so
+    that symClade does not have to be rewritten and rebuilt, and every sample re-BLASTed, in each iteration.
+    In each iteration only the still unresolved sequences (those with no match or with a match that would see them
+    added to the potential non-Symbiodiniaceae sequences) are BLASTed against this database and a better match
+    replaces the symClade match in the sample's blast.out.
+    """
+    def __init__(self, temp_working_directory, debug=False):
+        self.fasta_path = os.path.join(temp_working_directory, 'symClade_delta.fa')
+        self.debug = debug
+        self.fasta_as_list = []
+
+    def add_sequences(self, new_symclade_fasta_as_list):
+        # The newest sequences are put first as they would be in symClade
+        self.fasta_as_list = new_symclade_fasta_as_list + self.fasta_as_list
+        ThreadSafeGeneral.write_list_to_destination(self.fasta_path, self.fasta_as_list)
+        ThreadSafeGeneral.make_new_blast_db(
+            input_fasta_to_make_db_from=self.fasta_path, db_title='symClade_delta',
+            pipe_stdout_sterr=(not self.debug))
+
+    @staticmethod
+    def get_unresolved_sequence_names(fasta_dict, blast_output_as_list, sequence_name_to_kmer_clade_dict=None):
+        """Return the names of the sequences that the PotentialSymTaxScreeningWorker would add to its
+        potential_non_symbiodiniaceae_sequences_list given this blast output. The sequences assigned to a clade
+        by the SymCladeKmerPreClassifier (sequence_name_to_kmer_clade_dict) are resolved."""
+        sequence_name_to_first_blast_line_dict = {}
+        for blast_line in blast_output_as_list:
+            sequence_name_to_first_blast_line_dict.setdefault(blast_line.split('\t')[0], blast_line)
+        unresolved_sequence_names = []
+        for sequence_name in fasta_dict.keys():
+            if sequence_name_to_kmer_clade_dict and sequence_name in sequence_name_to_kmer_clade_dict:
+                continue
+            if sequence_name not in sequence_name_to_first_blast_line_dict:
+                unresolved_sequence_names.append(sequence_name)
+                continue
+            if SymCladeMatchThresholds.is_below_match_thresholds(sequence_name_to_first_blast_line_dict[sequence_name]):
+                unresolved_sequence_names.append(sequence_name)
+        return unresolved_sequence_names
+
+    @staticmethod
+    def merge_delta_blast_output(blast_output_as_list, delta_blast_output_as_list):
+        """Replace the symClade results of each sequence with its delta results where the best delta match is
+        better than the best symClade match (lower evalue, then higher coverage and identity)."""
+        sequence_name_to_blast_lines_dict = defaultdict(list)
+        for blast_line in blast_output_as_list:
+            sequence_name_to_blast_lines_dict[blast_line.split('\t')[0]].append(blast_line)
+        sequence_name_to_delta_blast_lines_dict = defaultdict(list)
+        for blast_line in delta_blast_output_as_list:
+            sequence_name_to_delta_blast_lines_dict[blast_line.split('\t')[0]].append(blast_line)
+
+        def match_rank(blast_line):
+            blast_line_fields = blast_line.split('\t')
+            return float(blast_line_fields[3]), -float(blast_line_fields[5]), -float(blast_line_fields[4])
+
+        for sequence_name, delta_blast_lines in sequence_name_to_delta_blast_lines_dict.items():
+            if sequence_name not in sequence_name_to_blast_lines_dict or \
+                    match_rank(delta_blast_lines[0]) < match_rank(sequence_name_to_blast_lines_dict[sequence_name][0]):
+                sequence_name_to_blast_lines_dict[sequence_name] = delta_blast_lines
+        return [blast_line for blast_lines in sequence_name_to_blast_lines_dict.values() for blast_line in blast_lines]
+
+
+class SymCladeBlastResultCache:
+    """Persistent store of the results of BLASTing sequences against the symClade database.
+    Results are only valid for the version of symClade they were BLASTed against so each version has its own
+    SQLite database in the cache directory, named by the sha256 of the symClade.fa that the BLAST database was
+    made from. Entries are keyed by the sha256 of the nucleotide sequence and hold the BLAST result lines
+    (without the qseqid). Sequences that returned no match are stored with no result lines so that they are not
+    BLASTed again. Each sequence is looked up by its hash so only the entries of the sequences being screened are
+    read, and each version is held in a single file however many loadings have added to it.
+    """
+    def __init__(self, cache_directory, path_to_symclade_db):
+        self.cache_directory = cache_directory
+        self.version = self._get_symclade_version(path_to_symclade_db)
+        os.makedirs(self.cache_directory, exist_ok=True)
+        self.version_db_path = os.path.join(self.cache_directory, f'{self.version}.sqlite3')
+        # The timeout covers another loading adding its results to the same version
+        self.connection = sqlite3.connect(self.version_db_path, timeout=60)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS blast_result ('
+                'sequence_hash TEXT PRIMARY KEY, blast_results TEXT NOT NULL)')
+
+    @staticmethod
+    def _get_symclade_version(path_to_symclade_db):
+        sha256 = hashlib.sha256()
+        with open(path_to_symclade_db, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def get_sequence_hash(nucleotide_sequence):
+        return hashlib.sha256(nucleotide_sequence.encode('utf-8')).hexdigest()
+
+    def get_blast_results(self, nucleotide_sequence):
+        """Return the list of cached BLAST result lines or None if the sequence is not in the cache"""
+        row = self.connection.execute(
+            'SELECT blast_results FROM blast_result WHERE sequence_hash = ?',
+            (self.get_sequence_hash(nucleotide_sequence),)).fetchone()
+        if row is None:
+            return None
+        return row[0].split('\n') if row[0] else []
+
+    def store_blast_results(self, nucleotide_sequence_to_blast_results_dict):
+        # The entries are added in a single transaction. If another loading has BLASTed the same
+        # sequence against the same version its entry is identical so it is kept.
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO blast_result (sequence_hash, blast_results) VALUES (?, ?)',
+                ((self.get_sequence_hash(nucleotide_sequence), '\n'.join(blast_result_list)) for
+                 nucleotide_sequence, blast_result_list in nucleotide_sequence_to_blast_results_dict.items()))
+
+    def close(self):
+        self.connection.close()
+
+
+class SubEValueSequenceCounter:
+    """The number of samples that each sub e value sequence (a sequence that provided a match in the symClade BLAST
+    and is of suitable size but whose match has an evalue below the cutoff) was found in, along with the clade
+    of its match in the first of these samples. The sequences of every sample are counted so, to bound the memory
+    of the parent, at most max_in_memory_sequences are counted in memory. Beyond this the counts are spilled to
+    (and added to any already spilled in) an SQLite database in the spill_directory.
+    """
+    max_in_memory_sequences = 500000
+
+    def __init__(self, spill_directory=None):
+        self.spill_directory = spill_directory
+        # nucleotide sequence to a [number of samples found in, clade] list
+        self.nucleotide_sequence_to_num_samples_and_clade_dict = {}
+        self.spill_path = None
+        self.spill_connection = None
+
+    def add_sample_sequences(self, nucleotide_sequence_to_clade_dict):
+        for nucleotide_sequence, clade in nucleotide_sequence_to_clade_dict.items():
+            num_samples_and_clade = self.nucleotide_sequence_to_num_samples_and_clade_dict.get(nucleotide_sequence)
+            if num_samples_and_clade is None:
+                self.nucleotide_sequence_to_num_samples_and_clade_dict[nucleotide_sequence] = [1, clade]
+            else:
+                num_samples_and_clade[0] += 1
+        if len(self.nucleotide_sequence_to_num_samples_and_clade_dict) > self.max_in_memory_sequences:
+            self._spill()
+
+    def _spill(self):
+        if self.spill_connection is None:
+            spill_file_descriptor, self.spill_path = tempfile.mkstemp(
+                dir=self.spill_directory, prefix='sub_evalue_sequences_', suffix='.sqlite3')
+            os.close(spill_file_descriptor)
+            self.spill_connection = sqlite3.connect(self.spill_path)
+            self.spill_connection.execute(
+                'CREATE TABLE sub_evalue_sequence ('
+                'nucleotide_sequence TEXT PRIMARY KEY, num_samples INTEGER NOT NULL, clade TEXT NOT NULL)')
+        # The clade of a sequence that has already been spilled is that of the sample it was first found in
+        with self.spill_connection:
+            self.spill_connection.executemany(
+                'INSERT INTO sub_evalue_sequence VALUES (?, ?, ?) ON CONFLICT (nucleotide_sequence) '
+                'DO UPDATE SET num_samples = num_samples + excluded.num_samples',
+                ((nucleotide_sequence, num_samples, clade) for nucleotide_sequence, (num_samples, clade) in
+                 self.nucleotide_sequence_to_num_samples_and_clade_dict.items()))
+        self.nucleotide_sequence_to_num_samples_and_clade_dict = {}
+
+    def get_sequences_found_in_at_least(self, num_samples):
+        """Yield the (nucleotide_sequence, number of samples found in, clade) of each sequence found in at least
+        num_samples samples in the order the sequences were first found."""
+        if self.spill_connection is None:
+            for nucleotide_sequence, (num_samples_found_in, clade) in \
+                    self.nucleotide_sequence_to_num_samples_and_clade_dict.items():
+                if num_samples_found_in >= num_samples:
+                    yield nucleotide_sequence, num_samples_found_in, clade
+        else:
+            self._spill()
+            yield from self.spill_connection.execute(
+                'SELECT nucleotide_sequence, num_samples, clade FROM sub_evalue_sequence '
+                'WHERE num_samples >= ? ORDER BY rowid', (num_samples,))
+
+    def close(self):
+        self.nucleotide_sequence_to_num_samples_and_clade_dict = {}
+        if self.spill_connection is not None:
+            self.spill_connection.close()
+            self.spill_connection = None
+            os.remove(self.spill_path)
 
 
 class PotentialSymTaxScreeningHandler:
@@ -2151,128 +3592,285 @@ class PotentialSymTaxScreeningHandler:
     """
     def __init__(
             self, samples_that_caused_errors_in_qc_list,
-            checked_samples_list, list_of_samples_names, num_proc, multiprocess):
+            checked_samples_list, list_of_samples_names, num_proc, multiprocess, deduplicated_blast_screening=False,
+            blast_cache_directory=None, path_to_symclade_delta_db=None, kmer_preclassifier_mode=None,
+            worker_pool=None, temp_working_directory=None):
         self.multiprocess = multiprocess
-        if self.multiprocess:
-            self.input_queue = mp_Queue()
-            self.manager = Manager()
-            self.sub_evalue_sequence_to_num_sampes_found_in_mp_dict = self.manager.dict()
-            self.sub_evalue_nucleotide_sequence_to_clade_mp_dict = self.manager.dict()
-            self.error_samples_mp_list = self.manager.list(samples_that_caused_errors_in_qc_list)
-            self.checked_samples_mp_list = self.manager.list(checked_samples_list)
-            self.list_of_sample_names = list_of_samples_names
-            self.num_proc = num_proc
-            self._load_input_queue()
-            self.lock = mp_Lock()
+        self.kmer_preclassifier_mode = kmer_preclassifier_mode
+        self.deduplicated_blast_screening = deduplicated_blast_screening
+        self.blast_cache_directory = blast_cache_directory
+        # When set, the samples have already been BLASTed against symClade in an earlier iteration and
+        # only their unresolved sequences are BLASTed against the SymCladeDeltaDatabase
+        self.path_to_symclade_delta_db = path_to_symclade_delta_db
+        # The workers return one summary per sample which are aggregated into this
+        # in _collect_sample_summary. The workers themselves hold no shared objects.
+        # It counts the samples that each nucleotide sequence that has:
+        # 1 - provided a match in the blast analysis
+        # 2 - is of suitable size
+        # 3 - but has an evalue match below the cuttof
+        # was found in.
+        self.sub_evalue_sequence_counter = SubEValueSequenceCounter(spill_directory=temp_working_directory)
+        self.error_samples_list = list(samples_that_caused_errors_in_qc_list)
+        self.checked_samples_list = list(checked_samples_list)
+        self.list_of_sample_names = list_of_samples_names
+        self.num_proc = num_proc
+        if worker_pool is None:
+            self.worker_pool = ResultQueueWorkerPool(num_proc=self.num_proc, multiprocess=self.multiprocess)
         else:
-            self.input_queue = mt_Queue()
-            self.sub_evalue_sequence_to_num_sampes_found_in_mp_dict = {}
-            self.sub_evalue_nucleotide_sequence_to_clade_mp_dict = {}
-            self.error_samples_mp_list = samples_that_caused_errors_in_qc_list
-            self.checked_samples_mp_list = checked_samples_list
-            self.list_of_sample_names = list_of_samples_names
-            self.num_proc = num_proc
-            self._load_input_queue()
-            self.lock = mt_Lock()
-
-    def _load_input_queue(self):
-        # load up the input q
-        for sample_name in self.list_of_sample_names:
-            self.input_queue.put(sample_name)
-        # load in the STOPs
-        for n in range(self.num_proc):
-            self.input_queue.put('STOP')
+            self.worker_pool = worker_pool
 
     def execute_potential_sym_tax_screening(
             self, data_loading_temp_working_directory, data_loading_path_to_symclade_db, data_loading_debug):
-        all_processes = []
         # http://stackoverflow.com/questions/8242837/django-multiprocessing-and-database-connections
         db.connections.close_all()
+        if self.deduplicated_blast_screening:
+            if self.path_to_symclade_delta_db is not None:
+                self._blast_unresolved_unique_sequences_of_samples_to_screen_against_delta(
+                    data_loading_temp_working_directory, data_loading_debug)
+            else:
+                self._blast_unique_sequences_of_samples_to_screen(
+                    data_loading_temp_working_directory, data_loading_path_to_symclade_db, data_loading_debug)
         sys.stdout.write('\nPerforming potential sym tax screening QC\n')
-        for n in range(self.num_proc):
-            if self.multiprocess:
-                p = Process(
-                    target=self._potential_sym_tax_screening_worker,
-                    args=(
-                        self.input_queue, 
-                        self.error_samples_mp_list,
-                        self.checked_samples_mp_list,
-                        self.sub_evalue_sequence_to_num_sampes_found_in_mp_dict, 
-                        self.sub_evalue_nucleotide_sequence_to_clade_mp_dict,
-                        data_loading_temp_working_directory,
-                        data_loading_path_to_symclade_db,
-                        data_loading_debug, self.lock
-                        ))
+        # If the sample gave an error during the inital mothur then we don't consider it here.
+        # A sample will be in the checked list if we have already performed this worker on it and none of its
+        # sequences gave matches to the symClade database at below the evalue threshold
+        self.worker_pool.execute(
+            worker_function=self._potential_sym_tax_screening_worker, work_items=self._get_samples_to_screen(),
+            merge_result=self._collect_sample_summary,
+            worker_args=(
+                data_loading_temp_working_directory, data_loading_path_to_symclade_db, data_loading_debug,
+                self.deduplicated_blast_screening, self.path_to_symclade_delta_db, self.kmer_preclassifier_mode),
+            num_workers=self.num_proc)
+
+    def _collect_sample_summary(self, sample_summary):
+        self.add_sample_summary_to_results(
+            sample_summary=sample_summary, checked_samples_list=self.checked_samples_list,
+            sub_evalue_sequence_counter=self.sub_evalue_sequence_counter)
+
+    @staticmethod
+    def add_sample_summary_to_results(sample_summary, checked_samples_list, sub_evalue_sequence_counter):
+        sample_name, no_potential_non_sym_seqs, sample_sub_evalue_nucleotide_sequence_to_clade_dict = sample_summary
+        if no_potential_non_sym_seqs:
+            checked_samples_list.append(sample_name)
+        sub_evalue_sequence_counter.add_sample_sequences(sample_sub_evalue_nucleotide_sequence_to_clade_dict)
+
+    def _blast_unique_sequences_of_samples_to_screen(
+            self, data_loading_temp_working_directory, data_loading_path_to_symclade_db, data_loading_debug):
+        """Rather than each worker BLASTing the sequences of its sample, BLAST each unique sequence found in
+        the samples to be screened only once, in a single multithreaded blastn. The results are then written back out
+        as each sample's blast.out using the sample's own sequence names so that the workers can read them
+        in place of running blastn. As the results of a BLAST query do not depend on the other
+        queries in the same search, the workers' results are identical to those of per sample BLASTing.
+        If a blast_cache_directory is set, only the sequences without results cached for the current
+        version of symClade are BLASTed and their results are then added to the cache.
+        """
+        thread_safe_general = ThreadSafeGeneral()
+        samples_to_screen = list(self._get_samples_to_screen())
+        sys.stdout.write(f'\nBLASTing the unique sequences of {len(samples_to_screen)} samples against symClade\n')
+        if self.blast_cache_directory is not None:
+            blast_cache = SymCladeBlastResultCache(
+                cache_directory=self.blast_cache_directory, path_to_symclade_db=data_loading_path_to_symclade_db)
+        else:
+            blast_cache = None
+        if self.kmer_preclassifier_mode is not None:
+            kmer_preclassifier = SymCladeKmerPreClassifier.get_shared(
+                path_to_symclade_db=data_loading_path_to_symclade_db)
+        else:
+            kmer_preclassifier = None
+        # The BLAST results (the result line without the qseqid) of each nucleotide sequence
+        nucleotide_sequence_to_blast_results_dict = {}
+        # The verdicts of the sequences confidently classified by the SymCladeKmerPreClassifier
+        nucleotide_sequence_to_kmer_verdict_dict = {}
+        nucleotide_sequence_to_unique_sequence_name_dict = {}
+        unique_sequences_fasta_as_list = []
+        for sample_name in samples_to_screen:
+            fasta_dict = thread_safe_general.create_dict_from_fasta(fasta_path=os.path.join(
+                data_loading_temp_working_directory, sample_name, 'fasta_file_for_tax_screening.fasta'))
+            for nucleotide_sequence in fasta_dict.values():
+                if nucleotide_sequence in nucleotide_sequence_to_blast_results_dict or \
+                        nucleotide_sequence in nucleotide_sequence_to_kmer_verdict_dict or \
+                        nucleotide_sequence in nucleotide_sequence_to_unique_sequence_name_dict:
+                    continue
+                if blast_cache is not None:
+                    cached_blast_results = blast_cache.get_blast_results(nucleotide_sequence)
+                    if cached_blast_results is not None:
+                        nucleotide_sequence_to_blast_results_dict[nucleotide_sequence] = cached_blast_results
+                        continue
+                if self.kmer_preclassifier_mode == 'classify':
+                    kmer_verdict = kmer_preclassifier.get_verdict(nucleotide_sequence)
+                    if kmer_verdict is not None:
+                        nucleotide_sequence_to_kmer_verdict_dict[nucleotide_sequence] = kmer_verdict
+                        continue
+                unique_sequence_name = f'unique_seq_{len(nucleotide_sequence_to_unique_sequence_name_dict)}'
+                nucleotide_sequence_to_unique_sequence_name_dict[nucleotide_sequence] = unique_sequence_name
+                unique_sequences_fasta_as_list.extend([f'>{unique_sequence_name}', nucleotide_sequence])
+        if blast_cache is not None:
+            sys.stdout.write(
+                f'{len(nucleotide_sequence_to_blast_results_dict)} unique sequences found in the BLAST cache\n')
+        sys.stdout.write(f'{len(nucleotide_sequence_to_unique_sequence_name_dict)} unique sequences to BLAST\n')
+
+        if unique_sequences_fasta_as_list:
+            unique_sequence_name_to_blast_results_dict = self._blast_unique_sequences(
+                data_loading_temp_working_directory, data_loading_path_to_symclade_db, data_loading_debug,
+                unique_sequences_fasta_as_list)
+            newly_blasted_nucleotide_sequence_to_blast_results_dict = {
+                nucleotide_sequence: unique_sequence_name_to_blast_results_dict.get(unique_sequence_name, []) for
+                nucleotide_sequence, unique_sequence_name in nucleotide_sequence_to_unique_sequence_name_dict.items()}
+            if blast_cache is not None:
+                blast_cache.store_blast_results(newly_blasted_nucleotide_sequence_to_blast_results_dict)
+            nucleotide_sequence_to_blast_results_dict.update(newly_blasted_nucleotide_sequence_to_blast_results_dict)
+        if blast_cache is not None:
+            blast_cache.close()
+
+        if self.kmer_preclassifier_mode == 'validate':
+            kmer_preclassifier.report_concordance_with_blast(
+                label='unique sequences',
+                fasta_dict={
+                    unique_sequence_name: nucleotide_sequence for
+                    nucleotide_sequence, unique_sequence_name in
+                    nucleotide_sequence_to_unique_sequence_name_dict.items()},
+                blast_output_as_list=[
+                    f'{unique_sequence_name}\t{blast_result}' for
+                    nucleotide_sequence, unique_sequence_name in
+                    nucleotide_sequence_to_unique_sequence_name_dict.items() for
+                    blast_result in nucleotide_sequence_to_blast_results_dict[nucleotide_sequence]])
+
+        for sample_name in samples_to_screen:
+            fasta_dict = thread_safe_general.create_dict_from_fasta(fasta_path=os.path.join(
+                data_loading_temp_working_directory, sample_name, 'fasta_file_for_tax_screening.fasta'))
+            sample_blast_output_as_list = []
+            sample_sequence_name_to_kmer_verdict_dict = {}
+            for sequence_name, nucleotide_sequence in fasta_dict.items():
+                if nucleotide_sequence in nucleotide_sequence_to_kmer_verdict_dict:
+                    sample_sequence_name_to_kmer_verdict_dict[sequence_name] = \
+                        nucleotide_sequence_to_kmer_verdict_dict[nucleotide_sequence]
+                    continue
+                for blast_result in nucleotide_sequence_to_blast_results_dict[nucleotide_sequence]:
+                    sample_blast_output_as_list.append(f'{sequence_name}\t{blast_result}')
+            sample_directory = os.path.join(data_loading_temp_working_directory, sample_name)
+            thread_safe_general.write_list_to_destination(
+                os.path.join(sample_directory, 'blast.out'), sample_blast_output_as_list)
+            if self.kmer_preclassifier_mode == 'classify':
+                SymCladeKmerPreClassifier.write_verdicts(sample_directory, sample_sequence_name_to_kmer_verdict_dict)
             else:
-                p = Thread(
-                target=self._potential_sym_tax_screening_worker,
-                args=(
-                    self.input_queue, 
-                    self.error_samples_mp_list,
-                    self.checked_samples_mp_list,
-                    self.sub_evalue_sequence_to_num_sampes_found_in_mp_dict, 
-                    self.sub_evalue_nucleotide_sequence_to_clade_mp_dict,
-                    data_loading_temp_working_directory,
-                    data_loading_path_to_symclade_db,
-                    data_loading_debug, self.lock
-                    ))
-
-            all_processes.append(p)
-            p.start()
-        for p in all_processes:
-            p.join()
+                SymCladeKmerPreClassifier.remove_verdicts(sample_directory)
+        sys.stdout.write('BLAST complete\n')
+
+    def _blast_unresolved_unique_sequences_of_samples_to_screen_against_delta(
+            self, data_loading_temp_working_directory, data_loading_debug):
+        """The deduplicated equivalent of the PotentialSymTaxScreeningWorker BLASTing the unresolved sequences
+        of its sample against the SymCladeDeltaDatabase. The unique unresolved sequences are BLASTed once and the
+        results merged into each sample's blast.out."""
+        thread_safe_general = ThreadSafeGeneral()
+        samples_to_screen = list(self._get_samples_to_screen())
+        nucleotide_sequence_to_unique_sequence_name_dict = {}
+        unique_sequences_fasta_as_list = []
+        for sample_name in samples_to_screen:
+            fasta_dict = thread_safe_general.create_dict_from_fasta(fasta_path=os.path.join(
+                data_loading_temp_working_directory, sample_name, 'fasta_file_for_tax_screening.fasta'))
+            blast_output_as_list = thread_safe_general.read_defined_file_to_list(
+                os.path.join(data_loading_temp_working_directory, sample_name, 'blast.out'))
+            for sequence_name in SymCladeDeltaDatabase.get_unresolved_sequence_names(
+                    fasta_dict, blast_output_as_list, SymCladeKmerPreClassifier.read_clade_verdicts(
+                        os.path.join(data_loading_temp_working_directory, sample_name))):
+                nucleotide_sequence = fasta_dict[sequence_name]
+                if nucleotide_sequence not in nucleotide_sequence_to_unique_sequence_name_dict:
+                    unique_sequence_name = f'unique_seq_{len(nucleotide_sequence_to_unique_sequence_name_dict)}'
+                    nucleotide_sequence_to_unique_sequence_name_dict[nucleotide_sequence] = unique_sequence_name
+                    unique_sequences_fasta_as_list.extend([f'>{unique_sequence_name}', nucleotide_sequence])
+        sys.stdout.write(
+            f'\nBLASTing {len(nucleotide_sequence_to_unique_sequence_name_dict)} unresolved unique sequences '
+            f'against the symClade delta database\n')
+        if not unique_sequences_fasta_as_list:
+            return
+        unique_sequence_name_to_blast_results_dict = self._blast_unique_sequences(
+            data_loading_temp_working_directory, self.path_to_symclade_delta_db, data_loading_debug,
+            unique_sequences_fasta_as_list)
+
+        for sample_name in samples_to_screen:
+            fasta_dict = thread_safe_general.create_dict_from_fasta(fasta_path=os.path.join(
+                data_loading_temp_working_directory, sample_name, 'fasta_file_for_tax_screening.fasta'))
+            sample_blast_output_path = os.path.join(data_loading_temp_working_directory, sample_name, 'blast.out')
+            blast_output_as_list = thread_safe_general.read_defined_file_to_list(sample_blast_output_path)
+            delta_blast_output_as_list = []
+            for sequence_name in SymCladeDeltaDatabase.get_unresolved_sequence_names(
+                    fasta_dict, blast_output_as_list, SymCladeKmerPreClassifier.read_clade_verdicts(
+                        os.path.join(data_loading_temp_working_directory, sample_name))):
+                unique_sequence_name = nucleotide_sequence_to_unique_sequence_name_dict[fasta_dict[sequence_name]]
+                for blast_result in unique_sequence_name_to_blast_results_dict.get(unique_sequence_name, []):
+                    delta_blast_output_as_list.append(f'{sequence_name}\t{blast_result}')
+            thread_safe_general.write_list_to_destination(
+                sample_blast_output_path,
+                SymCladeDeltaDatabase.merge_delta_blast_output(blast_output_as_list, delta_blast_output_as_list))
+
+    def _blast_unique_sequences(
+            self, data_loading_temp_working_directory, data_loading_path_to_symclade_db, data_loading_debug,
+            unique_sequences_fasta_as_list):
+        thread_safe_general = ThreadSafeGeneral()
+        unique_sequences_fasta_path = os.path.join(
+            data_loading_temp_working_directory, 'unique_seqs_for_tax_screening.fasta')
+        thread_safe_general.write_list_to_destination(unique_sequences_fasta_path, unique_sequences_fasta_as_list)
+        blastn_analysis = BlastnAnalysis(
+            input_file_path=unique_sequences_fasta_path,
+            output_file_path=os.path.join(
+                data_loading_temp_working_directory, 'unique_seqs_for_tax_screening.blast.out'),
+            db_path=data_loading_path_to_symclade_db, num_threads=self.num_proc,
+            output_format_string="6 qseqid sseqid staxids evalue pident qcovs")
+        blastn_analysis.execute_blastn_analysis(pipe_stdout_sterr=(not data_loading_debug))
+        # NB the order of the results for each query is preserved
+        return blastn_analysis.return_blast_results_dict()
+
+    def _get_samples_to_screen(self):
+        """Yield the names of the samples to screen. As a generator, the work items of the ResultQueueWorkerPool
+        are only made as it takes them."""
+        error_samples_set = set(self.error_samples_list)
+        checked_samples_set = set(self.checked_samples_list)
+        for sample_name in self.list_of_sample_names:
+            if sample_name not in error_samples_set and sample_name not in checked_samples_set:
+                yield sample_name
 
     @staticmethod
     def _potential_sym_tax_screening_worker(
-            in_q, 
-            error_samples_mp_list, 
-            checked_samples_mp_list, 
-            sub_evalue_sequence_to_num_sampes_found_in_mp_dict, 
-            sub_evalue_nucleotide_sequence_to_clade_mp_dict, 
-            data_loading_temp_working_directory, 
-            data_loading_path_to_symclade_db, 
-            data_loading_debug, lock):
+            sample_name,
+            data_loading_temp_working_directory,
+            data_loading_path_to_symclade_db,
+            data_loading_debug, blast_output_precomputed=False, path_to_symclade_delta_db=None,
+            kmer_preclassifier_mode=None):
         """
-        input_q: The multiprocessing queue that holds a list of the sample names
-        e_val_collection_dict: This is a managed dictionary where key is a nucleotide sequence that has:
-        1 - provided a match in the blast analysis
-        2 - is of suitable size
-        3 - but has an evalue match below the cuttof
-        the value of the dict is an int that represents how many samples this nucleotide sequence was found in
-        err_smpl_list: This is a managed list containing sample names of the samples that had errors during the
-        initial mothur qc and therefore don't require taxonomic screening performed on them
-        checked_samples: This is a list of sample names for samples that were found to contain only
-        Symbiodinium sequences or have already had all potential Symbiodinium sequences screened and so don't
-        require any further taxonomic screening
-        Whilst this doesn't return anything a number of objects are picked out in each of the local
+        Run by the ResultQueueWorkerPool for each of the samples to be screened.
+        Returns the summary of the sample (see PotentialSymTaxScreeningWorker.get_sample_summary).
+        blast_output_precomputed: if True, the blast.out of each sample has already been written by the handler
+        and is read in rather than running blastn.
+        path_to_symclade_delta_db: if set, only the unresolved sequences of each sample are BLASTed, against
+        the SymCladeDeltaDatabase, and the results merged into the blast.out from the earlier iteration.
+        kmer_preclassifier_mode: 'classify' or 'validate' to make use of the SymCladeKmerPreClassifier.
+        The classifier is built once per worker (see SymCladeKmerPreClassifier.get_shared).
+        Additionally, a number of objects are picked out in each of the local
         working directories for use in the workers that follow this one.
         """
-        for sample_name in iter(in_q.get, 'STOP'):
-
-            # If the sample gave an error during the inital mothur then we don't consider it here.
-            if sample_name in error_samples_mp_list:
-                continue
-
-            # A sample will be in this list if we have already performed this worker on it and none of its sequences
-            # gave matches to the symClade database at below the evalue threshold
-            if sample_name in checked_samples_mp_list:
-                continue
+        # The pre-classifier is only needed when the workers BLAST the samples against symClade themselves
+        if kmer_preclassifier_mode is not None and not blast_output_precomputed and path_to_symclade_delta_db is None:
+            kmer_preclassifier = SymCladeKmerPreClassifier.get_shared(
+                path_to_symclade_db=data_loading_path_to_symclade_db)
+        else:
+            kmer_preclassifier = None
 
-            taxonomic_screening_worker = PotentialSymTaxScreeningWorker(
-                sample_name=sample_name, wkd=data_loading_temp_working_directory,
-                path_to_symclade_db=data_loading_path_to_symclade_db, debug=data_loading_debug,
-                checked_samples_mp_list=checked_samples_mp_list,
-                e_val_collection_mp_dict=sub_evalue_sequence_to_num_sampes_found_in_mp_dict,
-                sub_evalue_nucleotide_sequence_to_clade_mp_dict=sub_evalue_nucleotide_sequence_to_clade_mp_dict,
-                lock=lock)
+        taxonomic_screening_worker = PotentialSymTaxScreeningWorker(
+            sample_name=sample_name, wkd=data_loading_temp_working_directory,
+            path_to_symclade_db=data_loading_path_to_symclade_db, debug=data_loading_debug,
+            blast_output_precomputed=blast_output_precomputed,
+            path_to_symclade_delta_db=path_to_symclade_delta_db, kmer_preclassifier=kmer_preclassifier,
+            kmer_preclassifier_mode=kmer_preclassifier_mode)
 
-            taxonomic_screening_worker.execute_tax_screening()
+        taxonomic_screening_worker.execute_tax_screening()
+        return taxonomic_screening_worker.get_sample_summary()
 
 
 class PotentialSymTaxScreeningWorker:
     def __init__(
-            self, sample_name, wkd, path_to_symclade_db, debug, e_val_collection_mp_dict,
-            checked_samples_mp_list, sub_evalue_nucleotide_sequence_to_clade_mp_dict, lock):
+            self, sample_name, wkd, path_to_symclade_db, debug,
+            blast_output_precomputed=False, path_to_symclade_delta_db=None, kmer_preclassifier=None,
+            kmer_preclassifier_mode=None):
         self.thread_safe_general = ThreadSafeGeneral()
         self.sample_name = sample_name
         self.cwd = os.path.join(wkd, self.sample_name)
@@ -2283,15 +3881,15 @@ class PotentialSymTaxScreeningWorker:
             a.split('\t')[0]: a for a in self.thread_safe_general.read_defined_file_to_list(self.name_file_path)}
         self.path_to_symclade_db = path_to_symclade_db
         self.debug = debug
-        # This is a managed dictionary where key is a nucleotide sequence that has:
+        # Key is a nucleotide sequence of this sample that has:
         # 1 - provided a match in the blast analysis
         # 2 - is of suitable size
         # 3 - but has an evalue match below the cuttof
-        # the value of the dict is an int that represents how many samples this nucleotide sequence was found in
-        self.e_val_collection_mp_dict = e_val_collection_mp_dict
-        # This dictionary will be used outside of the multiprocessing to append the clade of a given sequences
-        # that is being added to the symClade reference database
-        self.sub_evalue_nucleotide_sequence_to_clade_mp_dict = sub_evalue_nucleotide_sequence_to_clade_mp_dict
+        # the value is the clade of the match. This is returned to the handler in the sample summary where
+        # the number of samples each sequence was found in is counted. The clade will be used outside of the
+        # multiprocessing to append the clade of a given sequences that is being added to the symClade
+        # reference database
+        self.sub_evalue_nucleotide_sequence_to_clade_dict = {}
         # The potential_non_symbiodiniaceae_sequences_list is used to see if there are any samples, that don't have
         # any potential non symbiodnium sequences. i.e. only definite symbiodiniaceae sequences.
         # These samples are added to
@@ -2299,11 +3897,12 @@ class PotentialSymTaxScreeningWorker:
         self.potential_non_symbiodiniaceae_sequences_list = []
         self.sequence_name_to_clade_dict = None
         self.blast_output_as_list = None
-        self.already_processed_blast_seq_result = []
-        # this is a managed list that holds the names of samples from which no sequences were thrown out from
-        # it will be used in downstream processes.
-        self.checked_samples_mp_list = checked_samples_mp_list
-        self.lock = lock
+        self.already_processed_blast_seq_result = set()
+        # If True the blast.out has already been written out by the PotentialSymTaxScreeningHandler
+        self.blast_output_precomputed = blast_output_precomputed
+        self.path_to_symclade_delta_db = path_to_symclade_delta_db
+        self.kmer_preclassifier = kmer_preclassifier
+        self.kmer_preclassifier_mode = kmer_preclassifier_mode
 
     def execute_tax_screening(self):
         sys.stdout.write(f'{self.sample_name}: verifying seqs are Symbiodinium and determining clade\n')
@@ -2313,20 +3912,35 @@ class PotentialSymTaxScreeningWorker:
             output_file_path=os.path.join(self.cwd, 'blast.out'), db_path=self.path_to_symclade_db,
             output_format_string="6 qseqid sseqid staxids evalue pident qcovs")
 
-        if self.debug:
-            blastn_analysis.execute_blastn_analysis(pipe_stdout_sterr=False)
+        if self.blast_output_precomputed:
+            pass
+        elif self.path_to_symclade_delta_db is not None:
+            self._blast_unresolved_seqs_against_symclade_delta_db()
+        elif self.kmer_preclassifier is not None and self.kmer_preclassifier_mode == 'classify':
+            self._preclassify_and_blast_ambiguous_seqs()
         else:
-            blastn_analysis.execute_blastn_analysis(pipe_stdout_sterr=True)
+            SymCladeKmerPreClassifier.remove_verdicts(self.cwd)
+            if self.debug:
+                blastn_analysis.execute_blastn_analysis(pipe_stdout_sterr=False)
+            else:
+                blastn_analysis.execute_blastn_analysis(pipe_stdout_sterr=True)
 
-        sys.stdout.write(f'{self.sample_name}: BLAST complete\n')
+            sys.stdout.write(f'{self.sample_name}: BLAST complete\n')
 
         self.blast_output_as_list = blastn_analysis.return_blast_output_as_list()
 
+        if self.kmer_preclassifier is not None and self.kmer_preclassifier_mode == 'validate':
+            self.kmer_preclassifier.report_concordance_with_blast(
+                label=self.sample_name, fasta_dict=self.fasta_dict, blast_output_as_list=self.blast_output_as_list)
+
         self._if_debug_warn_if_blast_out_empty_or_low_seqs()
 
         self.sequence_name_to_clade_dict = {
             blast_out_line.split('\t')[0]: blast_out_line.split('\t')[1][-1] for
             blast_out_line in self.blast_output_as_list}
+        # The sequences assigned to a clade by the SymCladeKmerPreClassifier are Symbiodiniaceae.
+        # They have no BLAST results and so are never added to the potential non symbiodiniaceae sequences.
+        self.sequence_name_to_clade_dict.update(SymCladeKmerPreClassifier.read_clade_verdicts(self.cwd))
 
         self._add_seqs_with_no_blast_match_to_non_sym_list()
 
@@ -2335,39 +3949,81 @@ class PotentialSymTaxScreeningWorker:
         # process each sequence once.
         self._identify_and_allocate_non_sym_and_sub_e_seqs()
 
-        if not self.potential_non_symbiodiniaceae_sequences_list:
-            self.checked_samples_mp_list.append(self.sample_name)
+    def get_sample_summary(self):
+        """The summary returned to the PotentialSymTaxScreeningHandler. A tuple of the sample name,
+        whether the sample had no potential non symbiodiniaceae sequences (in which case it is added to the
+        checked samples and not screened in following iterations) and the sub evalue nucleotide sequence
+        to clade dict."""
+        return (
+            self.sample_name, not self.potential_non_symbiodiniaceae_sequences_list,
+            self.sub_evalue_nucleotide_sequence_to_clade_dict)
+
+    def _preclassify_and_blast_ambiguous_seqs(self):
+        """Only BLAST the sequences that the SymCladeKmerPreClassifier could not confidently classify.
+        The verdicts of the classified sequences are written to the sample's kmer_preclassification.out
+        and the blast.out holds the BLAST results of the ambiguous sequences."""
+        sequence_name_to_kmer_verdict_dict = {}
+        ambiguous_fasta_as_list = []
+        for sequence_name, nucleotide_sequence in self.fasta_dict.items():
+            kmer_verdict = self.kmer_preclassifier.get_verdict(nucleotide_sequence)
+            if kmer_verdict is None:
+                ambiguous_fasta_as_list.extend([f'>{sequence_name}', nucleotide_sequence])
+            else:
+                sequence_name_to_kmer_verdict_dict[sequence_name] = kmer_verdict
+        SymCladeKmerPreClassifier.write_verdicts(self.cwd, sequence_name_to_kmer_verdict_dict)
+        blast_output_path = os.path.join(self.cwd, 'blast.out')
+        if ambiguous_fasta_as_list:
+            ambiguous_fasta_path = os.path.join(self.cwd, 'ambiguous_seqs_for_tax_screening.fasta')
+            self.thread_safe_general.write_list_to_destination(ambiguous_fasta_path, ambiguous_fasta_as_list)
+            blastn_analysis = BlastnAnalysis(
+                input_file_path=ambiguous_fasta_path, output_file_path=blast_output_path,
+                db_path=self.path_to_symclade_db, output_format_string="6 qseqid sseqid staxids evalue pident qcovs")
+            blastn_analysis.execute_blastn_analysis(pipe_stdout_sterr=(not self.debug))
+        else:
+            self.thread_safe_general.write_list_to_destination(blast_output_path, [])
+        sys.stdout.write(
+            f'{self.sample_name}: BLAST of {int(len(ambiguous_fasta_as_list) / 2)} of {len(self.fasta_dict)} '
+            f'seqs not classified by the k-mer pre-classifier complete\n')
+
+    def _blast_unresolved_seqs_against_symclade_delta_db(self):
+        blast_output_path = os.path.join(self.cwd, 'blast.out')
+        blast_output_as_list = self.thread_safe_general.read_defined_file_to_list(blast_output_path)
+        unresolved_sequence_names = SymCladeDeltaDatabase.get_unresolved_sequence_names(
+            self.fasta_dict, blast_output_as_list, SymCladeKmerPreClassifier.read_clade_verdicts(self.cwd))
+        if not unresolved_sequence_names:
+            return
+        unresolved_fasta_path = os.path.join(self.cwd, 'unresolved_seqs_for_tax_screening.fasta')
+        unresolved_fasta_as_list = []
+        for sequence_name in unresolved_sequence_names:
+            unresolved_fasta_as_list.extend([f'>{sequence_name}', self.fasta_dict[sequence_name]])
+        self.thread_safe_general.write_list_to_destination(unresolved_fasta_path, unresolved_fasta_as_list)
+        delta_blastn_analysis = BlastnAnalysis(
+            input_file_path=unresolved_fasta_path,
+            output_file_path=os.path.join(self.cwd, 'blast_delta.out'), db_path=self.path_to_symclade_delta_db,
+            output_format_string="6 qseqid sseqid staxids evalue pident qcovs")
+        delta_blastn_analysis.execute_blastn_analysis(pipe_stdout_sterr=(not self.debug))
+        sys.stdout.write(
+            f'{self.sample_name}: BLAST of {len(unresolved_sequence_names)} unresolved seqs against delta complete\n')
+        self.thread_safe_general.write_list_to_destination(
+            blast_output_path,
+            SymCladeDeltaDatabase.merge_delta_blast_output(
+                blast_output_as_list, delta_blastn_analysis.return_blast_output_as_list()))
 
     def _identify_and_allocate_non_sym_and_sub_e_seqs(self):
         for line in self.blast_output_as_list:
             name_of_current_sequence = line.split('\t')[0]
             if name_of_current_sequence in self.already_processed_blast_seq_result:
                 continue
-            self.already_processed_blast_seq_result.append(name_of_current_sequence)
-            identity = float(line.split('\t')[4])
-            coverage = float(line.split('\t')[5])
+            self.already_processed_blast_seq_result.add(name_of_current_sequence)
 
-            # noinspection PyPep8,PyBroadException
             # here we are looking for sequences to add to the non_symbiodiniaceae_sequence_list
-            # if a sequence fails at any of our if statements it will be added to the non_symbiodiniaceae_sequence_list
-            try:
-                evalue_power = int(line.split('\t')[3].split('-')[1])
-                # With the smallest sequences i.e. 185bp it is impossible to get above the 100 threshold
-                # even if there is an exact match. As such, we sould also look at the match identity and coverage
-                if evalue_power < 100:  # evalue cut off, collect sequences that don't make the cut
-                    self._if_ident_cov_size_good_add_seq_to_non_sym_list_and_eval_dict(
-                        coverage, identity, name_of_current_sequence
-                    )
-            except:
-                # here we weren't able to extract the evalue_power for some reason.
-                self._if_ident_cov_size_good_add_seq_to_non_sym_list_and_eval_dict(
-                    coverage, identity, name_of_current_sequence
-                )
+            # if a sequence fails the match thresholds it will be added to the non_symbiodiniaceae_sequence_list
+            if SymCladeMatchThresholds.is_below_match_thresholds(line):
+                self._add_seq_to_non_sym_list_and_if_size_good_to_eval_dict(name_of_current_sequence)
 
-    def _if_ident_cov_size_good_add_seq_to_non_sym_list_and_eval_dict(
-            self, coverage, identity, name_of_current_sequence):
+    def _add_seq_to_non_sym_list_and_if_size_good_to_eval_dict(self, name_of_current_sequence):
         """This method will add nucleotide sequences that gave blast matches but that were below the evalue
-        or indentity and coverage thresholds to the evalue collection dict and
+        and indentity or coverage thresholds to the evalue collection dict and
         record how many samples that sequence was found in.
         It will also take into account the size thresholds that would normally
         happen later in the code during further mothur qc.
@@ -2379,18 +4035,12 @@ class PotentialSymTaxScreeningWorker:
         the checked list and are not checked in following iterations to speed things up.
         """
 
-        if identity < 80 or coverage < 95:
-            # incorporate the size cutoff here that would normally happen in the further mothur qc later in the code
-            self.potential_non_symbiodiniaceae_sequences_list.append(name_of_current_sequence)
-            if 184 < len(self.fasta_dict[name_of_current_sequence]) < 310:
-                with self.lock:
-                    if self.fasta_dict[name_of_current_sequence] in self.e_val_collection_mp_dict.keys():
-                        self.e_val_collection_mp_dict[self.fasta_dict[name_of_current_sequence]] += 1
-                    else:
-                        self.e_val_collection_mp_dict[self.fasta_dict[name_of_current_sequence]] = 1
-                        self.sub_evalue_nucleotide_sequence_to_clade_mp_dict[
-                            self.fasta_dict[name_of_current_sequence]
-                        ] = self.sequence_name_to_clade_dict[name_of_current_sequence]
+        self.potential_non_symbiodiniaceae_sequences_list.append(name_of_current_sequence)
+        # incorporate the size cutoff here that would normally happen in the further mothur qc later in the code
+        if 184 < len(self.fasta_dict[name_of_current_sequence]) < 310:
+            self.sub_evalue_nucleotide_sequence_to_clade_dict.setdefault(
+                self.fasta_dict[name_of_current_sequence],
+                self.sequence_name_to_clade_dict[name_of_current_sequence])
 
     def _add_seqs_with_no_blast_match_to_non_sym_list(self):
         sequences_with_no_blast_match_as_set = set(self.fasta_dict.keys()) - \
@@ -2413,115 +4063,86 @@ class PotentialSymTaxScreeningWorker:
 
 class SymNonSymTaxScreeningHandler:
     def __init__(
-            self, data_loading_samples_that_caused_errors_in_qc_mp_list, data_loading_list_of_samples_names,
-            data_loading_num_proc, multiprocess, data_loading_dataset_object):
+            self, data_loading_samples_that_caused_errors_in_qc_list, data_loading_list_of_samples_names,
+            data_loading_num_proc, multiprocess, data_loading_dataset_object, database_writer_process=False,
+            worker_pool=None):
         self.multiprocess = multiprocess
         self.ds_object = data_loading_dataset_object
-        if self.multiprocess:
-            self.sample_name_mp_input_queue = mp_Queue()
-            self.sym_non_sym_mp_manager = Manager()
-            self.samples_that_caused_errors_in_qc_mp_list = self.sym_non_sym_mp_manager.list(
-                data_loading_samples_that_caused_errors_in_qc_mp_list
-            )
-            self.sample_attributes_mp_output_queue = mp_Queue()
-            self.non_symbiodiniaceae_sequences_list = self.sym_non_sym_mp_manager.list()
-            self.num_proc = data_loading_num_proc
-            self._populate_input_queue(data_loading_list_of_samples_names)
+        self.database_writer_process = database_writer_process
+        self.num_proc = data_loading_num_proc
+        # The names of the samples that produce errors are returned by the workers along with the DataSetSample
+        self.samples_that_caused_errors_in_qc_list = list(data_loading_samples_that_caused_errors_in_qc_list)
+        self.dss_to_screen_list = self._get_dss_to_screen_list(data_loading_list_of_samples_names)
+        self.database_writer = None
+        if worker_pool is None:
+            self.worker_pool = ResultQueueWorkerPool(num_proc=self.num_proc, multiprocess=self.multiprocess)
         else:
-            self.sample_name_mp_input_queue = mt_Queue()
-            self.samples_that_caused_errors_in_qc_mp_list =  data_loading_samples_that_caused_errors_in_qc_mp_list
-            self.sample_attributes_mp_output_queue = mt_Queue()
-            self.non_symbiodiniaceae_sequences_list = []
-            self.num_proc = data_loading_num_proc
-            self._populate_input_queue(data_loading_list_of_samples_names)
-
-    def _populate_input_queue(self, data_loading_list_of_samples_names):
-        for sample_name in data_loading_list_of_samples_names:
-            self.sample_name_mp_input_queue.put(
-                DataSetSample.objects.get(name=sample_name, data_submission_from=self.ds_object))
-        for n in range(self.num_proc):
-            self.sample_name_mp_input_queue.put('STOP')
+            self.worker_pool = worker_pool
+
+    def _get_dss_to_screen_list(self, data_loading_list_of_samples_names):
+        # The samples that have already produced errors are not screened
+        return [
+            DataSetSample.objects.get(name=sample_name, data_submission_from=self.ds_object) for
+            sample_name in data_loading_list_of_samples_names if
+            sample_name not in self.samples_that_caused_errors_in_qc_list]
 
     def execute_sym_non_sym_tax_screening(
             self, data_loading_temp_working_directory,
             non_symb_and_size_violation_base_dir_path, data_loading_pre_med_sequence_output_directory_path,
-            data_loading_debug):
-        all_processes = []
+            data_loading_debug, data_loading_temp_working_directory_lifecycle=None):
         # http://stackoverflow.com/questions/8242837/django-multiprocessing-and-database-connections
         db.connections.close_all()
         sys.stdout.write('\nPerforming sym non sym tax screening QC\n')
 
-        for n in range(self.num_proc):
-            if self.multiprocess:
-                p = Process(target=self._sym_non_sym_tax_screening_worker, args=(
-                    self.sample_name_mp_input_queue, 
-                    self.samples_that_caused_errors_in_qc_mp_list, 
-                    self.sample_attributes_mp_output_queue,
-                    data_loading_temp_working_directory,
-                    non_symb_and_size_violation_base_dir_path, 
-                    data_loading_pre_med_sequence_output_directory_path,
-                    data_loading_debug))
-            else:
-                p = Thread(target=self._sym_non_sym_tax_screening_worker, args=(
-                self.sample_name_mp_input_queue, 
-                self.samples_that_caused_errors_in_qc_mp_list, 
-                self.sample_attributes_mp_output_queue,
-                data_loading_temp_working_directory, 
-                non_symb_and_size_violation_base_dir_path,
-                data_loading_pre_med_sequence_output_directory_path,
-                data_loading_debug))
-            all_processes.append(p)
-            p.start()
-
-        self._associate_info_to_dss_objects()
-
-        for p in all_processes:
-            p.join()
+        self.database_writer = DatabaseWriter(
+            use_writer_process=self.database_writer_process, multiprocess=self.multiprocess)
+        self.database_writer.start()
+        try:
+            self.worker_pool.execute(
+                worker_function=self._sym_non_sym_tax_screening_worker, work_items=self.dss_to_screen_list,
+                merge_result=self._associate_info_to_dss_object, num_workers=self.num_proc,
+                worker_args=(
+                    data_loading_temp_working_directory, non_symb_and_size_violation_base_dir_path,
+                    data_loading_pre_med_sequence_output_directory_path, data_loading_debug,
+                    data_loading_temp_working_directory_lifecycle))
+        finally:
+            self.database_writer.close()
 
     @staticmethod
     def _sym_non_sym_tax_screening_worker(
-        in_q, 
-        samples_that_caused_errors_in_qc_mp_list, 
-        sample_attributes_mp_output_queue, 
+        dss,
         data_loading_temp_working_directory, 
         data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path,
         data_loading_pre_med_sequence_output_directory_path,
-        data_loading_debug):
-
-        for dss in iter(in_q.get, 'STOP'):
-
-            if dss.name in samples_that_caused_errors_in_qc_mp_list:
-                continue
+        data_loading_debug, data_loading_temp_working_directory_lifecycle=None):
+        """Returns the DataSetSample with its tax screening attributes set and the name of the sample
+        if it produced an error (else None)."""
+        sym_non_sym_tax_screening_worker_object = SymNonSymTaxScreeningWorker(
+            data_loading_temp_working_directory=data_loading_temp_working_directory,
+            dss=dss,
+            data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path=
+            data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path,
+            data_loading_pre_med_sequence_output_directory_path=data_loading_pre_med_sequence_output_directory_path,
+            data_loading_debug=data_loading_debug
+        )
 
-            sym_non_sym_tax_screening_worker_object = SymNonSymTaxScreeningWorker(
-                data_loading_temp_working_directory=data_loading_temp_working_directory,
-                dss=dss,
-                data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path=
-                data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path,
-                data_loading_pre_med_sequence_output_directory_path=data_loading_pre_med_sequence_output_directory_path,
-                data_loading_debug=data_loading_debug,
-                sample_attributes_mp_output_queue=sample_attributes_mp_output_queue
-            )
+        error_sample_name = None
+        try:
+            sym_non_sym_tax_screening_worker_object.identify_sym_non_sym_seqs()
+        except RuntimeError as e:
+            error_sample_name = e.args[0]['sample_name']
+        # The tax screening .fasta, .names and blast.out are not needed once the sequences have been
+        # written out to the clade separated redundant fastas for MED
+        if data_loading_temp_working_directory_lifecycle is not None:
+            data_loading_temp_working_directory_lifecycle.release_tax_screening_intermediates(dss.name)
+        return sym_non_sym_tax_screening_worker_object.dss, error_sample_name
 
-            try:
-                sym_non_sym_tax_screening_worker_object.identify_sym_non_sym_seqs()
-            except RuntimeError as e:
-                samples_that_caused_errors_in_qc_mp_list.append(e.args[0]['sample_name'])
-        sample_attributes_mp_output_queue.put('DONE')
-
-    def _associate_info_to_dss_objects(self):
-        # now save the collected data contained in the sample_attributes_holder_mp_dict to the relevant
-        # dss_objs.
-        done_count = 0
-
-        dss_uid_to_dss_obj_dict = {dss.id: dss for dss in
-                                   DataSetSample.objects.filter(data_submission_from=self.ds_object)}
-        while done_count < self.num_proc:
-            dss = self.sample_attributes_mp_output_queue.get()
-            if dss == 'DONE':
-                done_count += 1
-            else:
-                dss.save()
+    def _associate_info_to_dss_object(self, dss_and_error_sample_name):
+        # now save the DataSetSample with the attributes collected by the worker
+        dss, error_sample_name = dss_and_error_sample_name
+        self.database_writer.save(dss)
+        if error_sample_name is not None:
+            self.samples_that_caused_errors_in_qc_list.append(error_sample_name)
 
 
 class SymNonSymTaxScreeningWorker:
@@ -2529,12 +4150,14 @@ class SymNonSymTaxScreeningWorker:
             self, data_loading_temp_working_directory, dss,
             data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path,
             data_loading_pre_med_sequence_output_directory_path, data_loading_debug,
-            sample_attributes_mp_output_queue
+            sample_attributes_mp_output_queue=None
     ):
         # init core objects
         self.dss = dss
         self.cwd = os.path.join(data_loading_temp_working_directory, self.dss.name)
         self.debug = data_loading_debug
+        # When given, the dss is put onto this queue once its attributes have been set.
+        # Otherwise, the dss is collected from this worker by the caller.
         self.sample_attributes_mp_output_queue = sample_attributes_mp_output_queue
         self.thread_safe_general = ThreadSafeGeneral()
 
@@ -2598,6 +4221,8 @@ class SymNonSymTaxScreeningWorker:
             blast_out_line.split('\t')[0]: blast_out_line.split('\t')[1][-1] for
             blast_out_line in self.blast_dict.values()
         }
+        # The sequences assigned to a clade by the SymCladeKmerPreClassifier have no BLAST results
+        self.sequence_name_to_clade_dict.update(SymCladeKmerPreClassifier.read_clade_verdicts(self.cwd))
 
 
     def identify_sym_non_sym_seqs(self):
@@ -2638,22 +4263,28 @@ class SymNonSymTaxScreeningWorker:
                 clade_of_sequences_to_write_out
             )
 
+            # The sequences are written out already padded with gaps to the length of the longest sequence
+            # so that the fasta can be passed directly to MED. This saves us running o_pad_with_gaps.py
+            # which reads the redundant fasta twice and writes out a second copy of it.
             sample_clade_fasta_path = os.path.join(
                 self.cwd,
                 clade_of_sequences_to_write_out,
-                f'seqs_for_med_{self.dss.name}_clade_{clade_of_sequences_to_write_out}.redundant.fasta'
+                f'seqs_for_med_{self.dss.name}_clade_{clade_of_sequences_to_write_out}.redundant.padded.fasta'
             )
             os.makedirs(os.path.dirname(sample_clade_fasta_path), exist_ok=True)
+            longest_sequence_length = max(
+                [len(self.fasta_dict[sequence_name]) for sequence_name in sequence_names_of_clade])
             with open(sample_clade_fasta_path, 'w') as f:
                 sequence_counter = 0
                 for sequence_name in sequence_names_of_clade:
+                    padded_sequence = self.fasta_dict[sequence_name].ljust(longest_sequence_length, '-')
                     # NB that MED will use the last '_' character as the separator for infering what the sample
                     # name is. As such we either need to make sure that '_' are not found after the '_' that
                     # separates the sample name from the rest of the sequence name, or we need to use another character
                     # for doing the sample name inference. This can be provided to med using the -t argument.
                     for i in range(len(self.name_dict[sequence_name].split('\t')[1].split(','))):
                         f.write(f'>{self.dss.name}_{sequence_counter}\n')
-                        f.write(f'{self.fasta_dict[sequence_name]}\n')
+                        f.write(f'{padded_sequence}\n')
                         sequence_counter += 1
 
             self._if_debug_check_length_of_deuniqued_fasta(sample_clade_fasta_path)
@@ -2749,7 +4380,8 @@ class SymNonSymTaxScreeningWorker:
         self._associate_sym_seq_no_size_violation_attributes_to_datasetsample()
         self._associate_sym_seq_size_violation_attributes_to_datasetsample()
         self.dss.initial_processing_complete = True
-        self.sample_attributes_mp_output_queue.put(self.dss)
+        if self.sample_attributes_mp_output_queue is not None:
+            self.sample_attributes_mp_output_queue.put(self.dss)
         print(f'{self.dss.name}: pre-med QC complete')
 
     def _associate_sym_seq_size_violation_attributes_to_datasetsample(self):
@@ -2793,7 +4425,8 @@ class SymNonSymTaxScreeningWorker:
         self.dss.initial_processing_complete = True
         self.dss.error_in_processing = True
         self.dss.error_reason = 'No symbiodiniaceae sequences left in sample after pre-med QC'
-        self.sample_attributes_mp_output_queue.put(self.dss)
+        if self.sample_attributes_mp_output_queue is not None:
+            self.sample_attributes_mp_output_queue.put(self.dss)
         raise RuntimeError({'sample_name': self.dss.name})
 
     def _identify_and_write_non_sym_seqs_in_sample(self):
@@ -2833,137 +4466,173 @@ class SymNonSymTaxScreeningWorker:
         non-symbiodinum. This does not take into size at all. We will screen and report size seperately.
         """
         for blast_sequence_name, blast_line in self.blast_dict.items():
-            # noinspection PyPep8,PyBroadException
-            try:
-                evalue_power = int(blast_line.split('\t')[3].split('-')[1])
-                # With the smallest sequences i.e. 185bp it is impossible to get above the 100 threshold
-                # even if there is an exact match. As such, we sould also look at the match identity and coverage
-                if evalue_power < 100:  # evalue cut off, collect sequences that don't make the cut
-                    self._if_low_identity_and_coverage_add_to_non_symb_set(
-                        name_of_current_sequence=blast_sequence_name, blast_line=blast_line
-                    )
-            except:
-                # here we weren't able to extract the evalue_power for some reason.
-                self._if_low_identity_and_coverage_add_to_non_symb_set(
-                    name_of_current_sequence=blast_sequence_name, blast_line=blast_line
-                )
-
-    def _if_low_identity_and_coverage_add_to_non_symb_set(self, name_of_current_sequence, blast_line):
-        percentage_identity = float(blast_line.split('\t')[4])
-        percentage_coverage = float(blast_line.split('\t')[5])
-        if percentage_identity < 80 or percentage_coverage < 95:
-            # incorporate the size cutoff here that would normally happen in the further mothur qc later in the code
-            self.non_symbiodiniaceae_sequence_name_set_for_sample.add(name_of_current_sequence)
+            if SymCladeMatchThresholds.is_below_match_thresholds(blast_line):
+                self.non_symbiodiniaceae_sequence_name_set_for_sample.add(blast_sequence_name)
 
 
 class PerformMEDHandler:
-    def __init__(self, data_loading_temp_working_directory, data_loading_num_proc, multiprocess):
+    def __init__(self, data_loading_temp_working_directory, data_loading_num_proc, multiprocess, worker_pool=None):
         # need to get list of the directories in which to perform the MED
         # we want to get a list of the .
         self.multiprocess = multiprocess
         self.temp_working_directory = data_loading_temp_working_directory
         self.num_proc = data_loading_num_proc
+        if worker_pool is None:
+            self.worker_pool = ResultQueueWorkerPool(num_proc=self.num_proc, multiprocess=self.multiprocess)
+        else:
+            self.worker_pool = worker_pool
         self.list_of_redundant_fasta_paths = []
+        # When resuming, the MED output directories with verified checkpoints. These are not decomposed again.
+        self.list_of_completed_med_result_dirs = []
         self._populate_list_of_redundant_fasta_paths()
-        if self.multiprocess:
-            self.input_queue_of_redundant_fasta_paths = mp_Queue()
-        else:
-            self.input_queue_of_redundant_fasta_paths = mt_Queue()
-        self._populate_input_queue_of_redundant_fasta_paths()
         self.list_of_med_result_dirs = [
             os.path.join(os.path.dirname(path_to_redundant_fasta), 'MEDOUT') for
-            path_to_redundant_fasta in self.list_of_redundant_fasta_paths]
-        
+            path_to_redundant_fasta in self.list_of_redundant_fasta_paths] + self.list_of_completed_med_result_dirs
+
     def execute_perform_med_worker(
             self, data_loading_debug, data_loading_path_to_med_padding_executable,
-            data_loading_path_to_med_decompose_executable):
-        all_processes = []
-
-        for n in range(self.num_proc):
-            if self.multiprocess:
-                p = Process(target=self._perform_med_worker, args=(
-                    self.input_queue_of_redundant_fasta_paths, data_loading_debug,
-                    data_loading_path_to_med_padding_executable,
-                    data_loading_path_to_med_decompose_executable))
-            else:
-                p = Thread(target=self._perform_med_worker, args=(
-                self.input_queue_of_redundant_fasta_paths, data_loading_debug,
-                data_loading_path_to_med_padding_executable,
-                data_loading_path_to_med_decompose_executable))
-            all_processes.append(p)
-            p.start()
-
-        for p in all_processes:
-            p.join()
+            data_loading_path_to_med_decompose_executable, data_loading_temp_working_directory_lifecycle=None):
+        # The workers of the worker_pool may be started here (if this is the first stage to use it) and
+        # later used by stages that use the database
+        # http://stackoverflow.com/questions/8242837/django-multiprocessing-and-database-connections
+        db.connections.close_all()
+        # The workers return nothing to be merged
+        self.worker_pool.execute(
+            worker_function=self._perform_med_worker, work_items=self.list_of_redundant_fasta_paths,
+            num_workers=self.num_proc, worker_args=(
+                data_loading_debug, data_loading_path_to_med_padding_executable,
+                data_loading_path_to_med_decompose_executable, data_loading_temp_working_directory_lifecycle))
 
     def _populate_list_of_redundant_fasta_paths(self):
+        med_checkpoint = DataLoadingCheckpoint(stage=DataLoadingCheckpoint.med_stage)
         for dirpath, dirnames, files in os.walk(self.temp_working_directory):
-            for file_name in files:
-                if file_name.endswith('redundant.fasta'):
-                    self.list_of_redundant_fasta_paths.append(os.path.join(dirpath, file_name))
+            if os.path.basename(dirpath) == 'MEDOUT' and med_checkpoint.is_complete(dirpath):
+                self.list_of_completed_med_result_dirs.append(dirpath)
+        for redundant_fasta_path in self.get_list_of_redundant_fasta_paths(self.temp_working_directory):
+            if os.path.join(os.path.dirname(redundant_fasta_path), 'MEDOUT') in self.list_of_completed_med_result_dirs:
+                continue
+            self.list_of_redundant_fasta_paths.append(redundant_fasta_path)
 
-    def _populate_input_queue_of_redundant_fasta_paths(self):
-        for redundant_fasta_path in self.list_of_redundant_fasta_paths:
-            self.input_queue_of_redundant_fasta_paths.put(redundant_fasta_path)
-        for n in range(self.num_proc):
-            self.input_queue_of_redundant_fasta_paths.put('STOP')
+    @staticmethod
+    def get_list_of_redundant_fasta_paths(directory):
+        """Return exactly one redundant fasta per clade directory. As the MED output of a clade is written to the
+        MEDOUT directory of the clade directory, returning both the padded and the unpadded fasta of a clade
+        would have two MED runs writing to the same MEDOUT."""
+        list_of_redundant_fasta_paths = []
+        for dirpath, dirnames, files in os.walk(directory):
+            # The redundant fastas are normally written out already padded by the SymNonSymTaxScreeningWorker
+            # but we still pick up unpadded redundant fastas. These will be padded by the PerformMEDWorker.
+            # Where both are present (e.g. a PerformMEDWorker padded the fasta but the loading was then
+            # interrupted) the padded fasta is used.
+            padded_file_names = [file_name for file_name in files if file_name.endswith('redundant.padded.fasta')]
+            unpadded_file_names = [file_name for file_name in files if file_name.endswith('redundant.fasta')]
+            if padded_file_names:
+                list_of_redundant_fasta_paths.append(os.path.join(dirpath, sorted(padded_file_names)[0]))
+            elif unpadded_file_names:
+                list_of_redundant_fasta_paths.append(os.path.join(dirpath, sorted(unpadded_file_names)[0]))
+        return list_of_redundant_fasta_paths
 
     @staticmethod
     def _perform_med_worker(
-            in_q, data_loading_debug, data_loading_path_to_med_padding_executable,
-            data_loading_path_to_med_decompose_executable):
-        for redundant_fata_path in iter(in_q.get, 'STOP'):
-            perform_med_worker_instance = PerformMEDWorker(
-                redundant_fasta_path=redundant_fata_path, data_loading_debug=data_loading_debug,
-                data_loading_path_to_med_padding_executable=data_loading_path_to_med_padding_executable,
-                data_loading_path_to_med_decompose_executable=data_loading_path_to_med_decompose_executable)
+            redundant_fata_path, data_loading_debug, data_loading_path_to_med_padding_executable,
+            data_loading_path_to_med_decompose_executable, data_loading_temp_working_directory_lifecycle=None):
+        perform_med_worker_instance = PerformMEDWorker(
+            redundant_fasta_path=redundant_fata_path, data_loading_debug=data_loading_debug,
+            data_loading_path_to_med_padding_executable=data_loading_path_to_med_padding_executable,
+            data_loading_path_to_med_decompose_executable=data_loading_path_to_med_decompose_executable)
 
-            perform_med_worker_instance.do_decomposition()
+        perform_med_worker_instance.do_decomposition()
+        perform_med_worker_instance.record_checkpoint()
+
+        if data_loading_temp_working_directory_lifecycle is not None:
+            data_loading_temp_working_directory_lifecycle.release_med_input(
+                [perform_med_worker_instance.redundant_fasta_path_unpadded,
+                 perform_med_worker_instance.redundant_fasta_path_padded])
 
 
 class PerformMEDWorker:
+    # Samples with more sequences than this in a single clade are decomposed in MED's memory-bounded mode.
+    # Both can be set in sp_config (med_memory_bounded_sequence_threshold and med_memory_ceiling_mb).
+    memory_bounded_med_sequence_threshold = getattr(sp_config, 'med_memory_bounded_sequence_threshold', 1000000)
+    memory_bounded_med_ceiling_mb = getattr(sp_config, 'med_memory_ceiling_mb', 4096)
+
     def __init__(
             self, redundant_fasta_path, data_loading_path_to_med_padding_executable, data_loading_debug,
             data_loading_path_to_med_decompose_executable):
         self.thread_safe_general = ThreadSafeGeneral()
-        self.redundant_fasta_path_unpadded = redundant_fasta_path
-        self.redundant_fasta_path_padded = self.redundant_fasta_path_unpadded.replace('.fasta', '.padded.fasta')
-        self.cwd = os.path.dirname(self.redundant_fasta_path_unpadded)
+        if redundant_fasta_path.endswith('.padded.fasta'):
+            self.padding_required = False
+            self.redundant_fasta_path_unpadded = None
+            self.redundant_fasta_path_padded = redundant_fasta_path
+        else:
+            self.padding_required = True
+            self.redundant_fasta_path_unpadded = redundant_fasta_path
+            self.redundant_fasta_path_padded = self.redundant_fasta_path_unpadded.replace('.fasta', '.padded.fasta')
+        self.cwd = os.path.dirname(redundant_fasta_path)
         self.sample_name = self.cwd.split('/')[-2]
         self.debug = data_loading_debug
         self.path_to_med_padding_executable = data_loading_path_to_med_padding_executable
         self.path_to_med_decompose_executable = data_loading_path_to_med_decompose_executable
-        self.med_output_dir = os.path.join(os.path.dirname(self.redundant_fasta_path_unpadded), 'MEDOUT')
+        self.med_output_dir = os.path.join(self.cwd, 'MEDOUT')
         os.makedirs(self.med_output_dir, exist_ok=True)
+        self.num_of_seqs_to_decompose = self._get_num_of_seqs_to_decompose()
         self.med_m_value = self._get_med_m_value()
+        self.med_memory_ceiling_args = self._get_med_memory_ceiling_args()
 
     def do_decomposition(self):
         sys.stdout.write(f'{self.sample_name}: starting MED analysis\n')
-        sys.stdout.write(f'{self.sample_name}: padding sequences\n')
-        subprocess.run([
-            self.path_to_med_padding_executable,
-            '-o', self.redundant_fasta_path_padded,
-            self.redundant_fasta_path_unpadded], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if self.padding_required:
+            sys.stdout.write(f'{self.sample_name}: padding sequences\n')
+            subprocess.run([
+                self.path_to_med_padding_executable,
+                '-o', self.redundant_fasta_path_padded,
+                self.redundant_fasta_path_unpadded], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         sys.stdout.write(f'{self.sample_name}: decomposing\n')
         self._do_the_decomposition()
         sys.stdout.write(f'{self.sample_name}: MED analysis complete\n')
 
+    def record_checkpoint(self):
+        DataLoadingCheckpoint(stage=DataLoadingCheckpoint.med_stage).record(
+            directory=self.med_output_dir,
+            file_paths=DataLoadingCheckpoint.get_file_paths_in_directory(self.med_output_dir))
+
     def _do_the_decomposition(self):
         # We cannot add check=True to the subprocess calls as we are expecting some of them to fail
         # when there are too few sequences
+        # The results are read back in from the binary MED-RESULTS.npz. The text results
+        # (MATRIX-COUNT.txt and NODE-REPRESENTATIVES.fasta) are only written out when debugging.
         if not self.debug:
             subprocess.run(
                 [self.path_to_med_decompose_executable, '-M', str(self.med_m_value), '--skip-gexf-files',
                  '--skip-gen-figures',
-                 '--skip-gen-html', '--skip-check-input', '-T', '-o',
-                 self.med_output_dir, self.redundant_fasta_path_padded], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                 '--skip-gen-html', '--skip-check-input', '--store-npz-results', '--skip-text-results', '-T'] +
+                self.med_memory_ceiling_args +
+                ['-o', self.med_output_dir, self.redundant_fasta_path_padded],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         elif self.debug:
             subprocess.run(
                 [self.path_to_med_decompose_executable, '-M', str(self.med_m_value), '--skip-gexf-files',
                  '--skip-gen-figures',
                  '--skip-gen-html',
-                 '--skip-check-input', '-T', '-o',
-                 self.med_output_dir, self.redundant_fasta_path_padded])
+                 '--skip-check-input', '--store-npz-results', '-T'] +
+                self.med_memory_ceiling_args +
+                ['-o', self.med_output_dir, self.redundant_fasta_path_padded])
+
+    def _get_med_memory_ceiling_args(self):
+        # For very deep single clade samples (millions of sequences) holding all of the read ids in memory
+        # can exhaust the RAM of a modest server. For these we run MED in its memory-bounded mode which
+        # spills the read ids to disk. The node outputs are identical to those of the default mode.
+        if self.num_of_seqs_to_decompose > self.memory_bounded_med_sequence_threshold:
+            return ['--memory-ceiling', str(self.memory_bounded_med_ceiling_mb)]
+        return []
+
+    def _get_num_of_seqs_to_decompose(self):
+        redundant_fasta_path = self.redundant_fasta_path_unpadded if self.padding_required \
+            else self.redundant_fasta_path_padded
+        # Counted line by line rather than by reading the fasta into memory as the fastas that are
+        # decomposed in the memory-bounded mode are those that are too large to be held in memory
+        with open(redundant_fasta_path, 'r') as f:
+            return sum(1 for line in f) / 2
 
     def _get_med_m_value(self):
         # Define MED M value dynamically.
@@ -2973,9 +4642,327 @@ class PerformMEDWorker:
         # calculated when working with a modelling project where I was subsampling to 1000 sequences. In this
         # scenario the M was set to 4.
         # We should also take care that M doesn't go below 4, so we should use a max choice for the M
-        num_of_seqs_to_decompose = len(
-            self.thread_safe_general.read_defined_file_to_list(self.redundant_fasta_path_unpadded)) / 2
-        return max(4, int(0.004 * num_of_seqs_to_decompose))
+        return max(4, int(0.004 * self.num_of_seqs_to_decompose))
+
+
+class StreamingSamplePipelineHandler:
+    """Performs the initial mothur QC, the taxonomic screening and the MED decomposition as a per sample
+    pipeline. Rather than all of the samples having to complete a stage before any sample can start the next,
+    each worker takes a sample through all of the stages it is given in turn so that a sample advances to its next
+    stage as soon as its previous stage is complete.
+    The iterative sub evalue screening needs the results of all of the samples and so cannot be streamed. When it is
+    being performed the pipeline is executed in two parts with the screening done in between
+    (see DataLoading._do_streaming_sample_pipeline).
+    As with the other handlers, the DataSetSample objects are only saved outside of the multiprocessing.
+    """
+    initial_mothur_qc_stage = 'initial_mothur_qc'
+    potential_sym_tax_screening_stage = 'potential_sym_tax_screening'
+    sym_non_sym_tax_screening_stage = 'sym_non_sym_tax_screening'
+    med_stage = 'med'
+    all_stages = [
+        initial_mothur_qc_stage, potential_sym_tax_screening_stage, sym_non_sym_tax_screening_stage, med_stage]
+
+    def __init__(self, data_loading_parent):
+        self.parent = data_loading_parent
+        if self.parent.multiprocess:
+            # The names of the samples currently being QCed. Used to throttle against the temp disk budget.
+            if self.parent.temp_working_directory_lifecycle is not None:
+                self.worker_manager = Manager()
+                self.samples_in_initial_qc_mp_list = self.worker_manager.list()
+            else:
+                self.samples_in_initial_qc_mp_list = None
+        else:
+            self.samples_in_initial_qc_mp_list = []
+        self.dss_uid_to_dss_obj_dict = None
+        self.database_writer = None
+        # When resuming, this starts with the samples that produced errors in the loading being resumed
+        self.samples_that_caused_errors_in_qc_list = list(self.parent.samples_that_caused_errors_in_qc_list)
+        self.list_of_med_output_directories = []
+        # The results of the potential sym tax screening are held under the same attributes as they are in the
+        # PotentialSymTaxScreeningHandler
+        self.sub_evalue_sequence_counter = SubEValueSequenceCounter(
+            spill_directory=self.parent.temp_working_directory)
+        self.checked_samples_list = []
+
+    def execute_streaming_sample_pipeline(self, stages):
+        self.parent._select_num_proc_for_stage(
+            stage='streaming_sample_pipeline', num_tasks=len(self.parent.sample_fastq_pairs))
+        # The DataSetSample objects are retrieved here, rather than in __init__, so that they hold the
+        # attributes saved in any earlier execution of the pipeline. Those given to the workers are
+        # retrieved separately from those that the outputs of the workers are collected into.
+        dss_name_to_dss_obj_dict = {
+            dss.name: dss for dss in DataSetSample.objects.filter(data_submission_from=self.parent.dataset_object)}
+        self.dss_uid_to_dss_obj_dict = {
+            dss.id: dss for dss in DataSetSample.objects.filter(data_submission_from=self.parent.dataset_object)}
+        self.database_writer = DatabaseWriter(
+            use_writer_process=self.parent.database_writer_process, multiprocess=self.parent.multiprocess)
+        self.database_writer.start()
+        # http://stackoverflow.com/questions/8242837/django-multiprocessing-and-database-connections
+        db.connections.close_all()
+
+        sys.stdout.write(f'\nPerforming {", ".join(stages)} as a per sample pipeline\n')
+        try:
+            # The outputs of each sample are collected as they are returned
+            self.parent.worker_pool.execute(
+                worker_function=self._streaming_sample_pipeline_worker,
+                work_items=self._get_input_queue_items(stages, dss_name_to_dss_obj_dict),
+                merge_result=self._collect_worker_outputs, worker_args=(
+                    stages, self.parent.temp_working_directory,
+                    self.parent.symclade_db_full_path, self.parent.non_symb_and_size_violation_base_dir_path,
+                    self.parent.pre_med_sequence_output_directory_path, self.parent.debug,
+                    self.parent.single_mothur_batch, self.parent.qc_cache_directory, self.parent.lazy_input_staging,
+                    self.parent.temp_working_directory_lifecycle, self.samples_in_initial_qc_mp_list,
+                    self.parent.kmer_preclassifier_mode, self.parent.path_to_med_padding_executable,
+                    self.parent.path_to_med_decompose_executable),
+                num_workers=self.parent.num_proc)
+        finally:
+            # So that the samples collected so far are saved even if the collection fails
+            self.database_writer.close()
+
+        # So that the order is independent of the order in which the samples completed the pipeline
+        self.list_of_med_output_directories.sort()
+
+    def _get_input_queue_items(self, stages, dss_name_to_dss_obj_dict):
+        """Yield the (fastq_path_pair, DSSAttributeAssignmentHolder, DataSetSample) of each sample. As a generator,
+        the work items are only made as the ResultQueueWorkerPool takes them."""
+        samples_that_caused_errors_in_qc_set = set(self.samples_that_caused_errors_in_qc_list)
+        for fastq_path_pair in self.parent.sample_fastq_pairs:
+            sample_name = fastq_path_pair.split('\t')[0].replace('[dS]', '-')
+            if sample_name in samples_that_caused_errors_in_qc_set:
+                continue
+            dss = dss_name_to_dss_obj_dict[sample_name]
+            # When resuming, the samples that have already been QCed skip the QC stage
+            if self.initial_mothur_qc_stage in stages and \
+                    sample_name not in self.parent.samples_resumed_with_initial_mothur_qc_complete:
+                dss_att_holder = DSSAttributeAssignmentHolder(name=dss.name, uid=dss.id)
+                if self.parent.lazy_input_staging:
+                    # The files have not been copied to the temp working directory so give the worker
+                    # the source paths to read from
+                    fastq_path_pair = '\t'.join(
+                        [fastq_path_pair.split('\t')[0]] + list(self.parent.get_source_fastq_path_pair(sample_name)))
+            else:
+                fastq_path_pair, dss_att_holder = None, None
+            yield fastq_path_pair, dss_att_holder, dss
+
+    def _collect_worker_outputs(self, worker_outputs):
+        for worker_output in worker_outputs:
+            if isinstance(worker_output, DSSAttributeAssignmentHolder):
+                # Made by the InitialMothurWorker
+                dss_obj = self.dss_uid_to_dss_obj_dict[worker_output.uid]
+                InitialMothurHandler.assign_qc_attributes_to_dss_obj(dss_obj=dss_obj, dss_proxy=worker_output)
+                self.database_writer.save(dss_obj)
+            elif isinstance(worker_output, DataSetSample):
+                # Made by the SymNonSymTaxScreeningWorker or by the
+                # StreamingSamplePipelineWorker when a stage of the sample fails
+                self.database_writer.save(worker_output)
+            else:
+                output_type, output_value = worker_output
+                if output_type == 'error_sample_name':
+                    self.samples_that_caused_errors_in_qc_list.append(output_value)
+                elif output_type == 'potential_sym_tax_screening_summary':
+                    PotentialSymTaxScreeningHandler.add_sample_summary_to_results(
+                        sample_summary=output_value, checked_samples_list=self.checked_samples_list,
+                        sub_evalue_sequence_counter=self.sub_evalue_sequence_counter)
+                elif output_type == 'med_output_directory':
+                    self.list_of_med_output_directories.append(output_value)
+
+    @staticmethod
+    def _streaming_sample_pipeline_worker(
+            fastq_path_pair_dss_att_holder_and_dss, stages, data_loading_temp_working_directory,
+            data_loading_path_to_symclade_db, data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path,
+            data_loading_pre_med_sequence_output_directory_path, data_loading_debug,
+            single_mothur_batch=False, qc_cache_directory=None, lazy_input_staging=False,
+            data_loading_temp_working_directory_lifecycle=None, samples_in_initial_qc_mp_list=None,
+            kmer_preclassifier_mode=None, data_loading_path_to_med_padding_executable=None,
+            data_loading_path_to_med_decompose_executable=None):
+        """
+        Run by the ResultQueueWorkerPool for each sample.
+        fastq_path_pair_dss_att_holder_and_dss: The (fastq_path_pair, DSSAttributeAssignmentHolder, DataSetSample)
+        tuple of the sample. The fastq_path_pair and the DSSAttributeAssignmentHolder are None if the initial mothur
+        QC is not one of the stages or has already been performed for the sample.
+        stages: The stages, from StreamingSamplePipelineHandler.all_stages, to perform for the sample.
+        Returns the outputs of the stages in the order they were made. These are the DSSAttributeAssignmentHolder
+        and DataSetSample objects to be saved, and (output_type, output_value) tuples.
+        """
+        fastq_path_pair, dss_att_holder, dss = fastq_path_pair_dss_att_holder_and_dss
+        # The pre-classifier is built once per worker rather than once per sample
+        if kmer_preclassifier_mode is not None and \
+                StreamingSamplePipelineHandler.potential_sym_tax_screening_stage in stages:
+            kmer_preclassifier = SymCladeKmerPreClassifier.get_shared(
+                path_to_symclade_db=data_loading_path_to_symclade_db)
+        else:
+            kmer_preclassifier = None
+
+        out_q = mt_Queue()
+        streaming_sample_pipeline_worker = StreamingSamplePipelineWorker(
+            dss=dss, fastq_path_pair=fastq_path_pair, dss_att_holder=dss_att_holder, out_q=out_q,
+            stages=stages, data_loading_temp_working_directory=data_loading_temp_working_directory,
+            data_loading_path_to_symclade_db=data_loading_path_to_symclade_db,
+            data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path=
+            data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path,
+            data_loading_pre_med_sequence_output_directory_path=
+            data_loading_pre_med_sequence_output_directory_path,
+            data_loading_debug=data_loading_debug, single_mothur_batch=single_mothur_batch,
+            qc_cache_directory=qc_cache_directory, lazy_input_staging=lazy_input_staging,
+            data_loading_temp_working_directory_lifecycle=data_loading_temp_working_directory_lifecycle,
+            samples_in_initial_qc_mp_list=samples_in_initial_qc_mp_list,
+            kmer_preclassifier=kmer_preclassifier, kmer_preclassifier_mode=kmer_preclassifier_mode,
+            data_loading_path_to_med_padding_executable=data_loading_path_to_med_padding_executable,
+            data_loading_path_to_med_decompose_executable=data_loading_path_to_med_decompose_executable)
+
+        streaming_sample_pipeline_worker.execute_stages()
+        return [out_q.get() for i in range(out_q.qsize())]
+
+
+class StreamingSamplePipelineWorker:
+    """Takes a single sample through the stages of the StreamingSamplePipelineHandler
+    using the workers of each of the stages."""
+    def __init__(
+            self, dss, fastq_path_pair, dss_att_holder, out_q, stages, data_loading_temp_working_directory,
+            data_loading_path_to_symclade_db, data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path,
+            data_loading_pre_med_sequence_output_directory_path, data_loading_debug, single_mothur_batch=False,
+            qc_cache_directory=None, lazy_input_staging=False, data_loading_temp_working_directory_lifecycle=None,
+            samples_in_initial_qc_mp_list=None, kmer_preclassifier=None, kmer_preclassifier_mode=None,
+            data_loading_path_to_med_padding_executable=None, data_loading_path_to_med_decompose_executable=None):
+        self.dss = dss
+        self.fastq_path_pair = fastq_path_pair
+        self.dss_att_holder = dss_att_holder
+        self.out_q = out_q
+        self.stages = stages
+        self.temp_working_directory = data_loading_temp_working_directory
+        self.cwd = os.path.join(self.temp_working_directory, self.dss.name)
+        self.path_to_symclade_db = data_loading_path_to_symclade_db
+        self.non_symbiodiniaceae_and_size_violation_base_directory_path = \
+            data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path
+        self.pre_med_sequence_output_directory_path = data_loading_pre_med_sequence_output_directory_path
+        self.debug = data_loading_debug
+        self.single_mothur_batch = single_mothur_batch
+        self.qc_cache_directory = qc_cache_directory
+        self.lazy_input_staging = lazy_input_staging
+        self.temp_working_directory_lifecycle = data_loading_temp_working_directory_lifecycle
+        self.samples_in_initial_qc_mp_list = samples_in_initial_qc_mp_list
+        self.kmer_preclassifier = kmer_preclassifier
+        self.kmer_preclassifier_mode = kmer_preclassifier_mode
+        self.path_to_med_padding_executable = data_loading_path_to_med_padding_executable
+        self.path_to_med_decompose_executable = data_loading_path_to_med_decompose_executable
+
+    def execute_stages(self):
+        """Any error in a stage is reported to the parent as an error of the sample (and recorded against its
+        DataSetSample) so that the worker carries on with the next sample."""
+        stage = None
+        try:
+            if StreamingSamplePipelineHandler.initial_mothur_qc_stage in self.stages and \
+                    self.fastq_path_pair is not None:
+                stage = StreamingSamplePipelineHandler.initial_mothur_qc_stage
+                if not self._do_initial_mothur_qc():
+                    return
+            if StreamingSamplePipelineHandler.potential_sym_tax_screening_stage in self.stages:
+                stage = StreamingSamplePipelineHandler.potential_sym_tax_screening_stage
+                self._do_potential_sym_tax_screening()
+            if StreamingSamplePipelineHandler.sym_non_sym_tax_screening_stage in self.stages:
+                stage = StreamingSamplePipelineHandler.sym_non_sym_tax_screening_stage
+                if not self._do_sym_non_sym_tax_screening():
+                    return
+            if StreamingSamplePipelineHandler.med_stage in self.stages:
+                stage = StreamingSamplePipelineHandler.med_stage
+                self._do_med_decomposition()
+        except Exception as e:
+            print(f'{self.dss.name}: error in the {stage} stage of the streaming sample pipeline')
+            traceback.print_exc()
+            self.dss.error_in_processing = True
+            self.dss.error_reason = f'{e.__class__.__name__} in {stage}'[:100]
+            self.out_q.put(self.dss)
+            self.out_q.put(('error_sample_name', self.dss.name))
+
+    def _do_initial_mothur_qc(self):
+        """Returns True if the QC was successful"""
+        if self.temp_working_directory_lifecycle is not None:
+            self.temp_working_directory_lifecycle.wait_for_disk_budget(
+                sample_name=self.dss.name, samples_in_initial_qc_list=self.samples_in_initial_qc_mp_list)
+            self.samples_in_initial_qc_mp_list.append(self.dss.name)
+
+        try:
+            try:
+                # The DSSAttributeAssignmentHolder is put on the out_q by the InitialMothurWorker
+                initial_mothur_worker = InitialMothurWorker(
+                    dss_att_holder=self.dss_att_holder, contig_pair=self.fastq_path_pair,
+                    temp_working_directory=self.temp_working_directory, debug=self.debug, out_q_attr_data=self.out_q,
+                    single_mothur_batch=self.single_mothur_batch, qc_cache_directory=self.qc_cache_directory,
+                    lazy_input_staging=self.lazy_input_staging)
+                initial_mothur_worker.start_initial_mothur_worker()
+            except Exception as e:
+                if not isinstance(e, RuntimeError):
+                    # The RuntimeErrors have already been logged against the sample by the InitialMothurWorker
+                    traceback.print_exc()
+                    InitialMothurWorker.log_qc_error_of_dss_att_holder(
+                        dss_att_holder=self.dss_att_holder, out_q_attr_data=self.out_q,
+                        errorreason=f'{e.__class__.__name__} in initial QC')
+                self.out_q.put(('error_sample_name', self.dss.name))
+                if self.temp_working_directory_lifecycle is not None:
+                    self.temp_working_directory_lifecycle.release_failed_sample(
+                        sample_name=self.dss.name, fastq_path_pair=self.fastq_path_pair.split('\t')[1:3])
+                return False
+            try:
+                initial_mothur_worker.record_checkpoint()
+                if self.temp_working_directory_lifecycle is not None:
+                    self.temp_working_directory_lifecycle.release_initial_qc_intermediates(
+                        sample_name=self.dss.name, fastq_path_pair=initial_mothur_worker.get_fastq_path_pair())
+            except OSError as e:
+                print(f'{self.dss.name}: WARNING unable to checkpoint or release the initial QC: {e}')
+        finally:
+            if self.temp_working_directory_lifecycle is not None:
+                self.samples_in_initial_qc_mp_list.remove(self.dss.name)
+
+        # The sym non sym screening uses the post QC sequence counts of the DataSetSample
+        InitialMothurHandler.assign_qc_attributes_to_dss_obj(dss_obj=self.dss, dss_proxy=self.dss_att_holder)
+        return True
+
+    def _do_potential_sym_tax_screening(self):
+        taxonomic_screening_worker = PotentialSymTaxScreeningWorker(
+            sample_name=self.dss.name, wkd=self.temp_working_directory,
+            path_to_symclade_db=self.path_to_symclade_db, debug=self.debug,
+            kmer_preclassifier=self.kmer_preclassifier, kmer_preclassifier_mode=self.kmer_preclassifier_mode)
+        taxonomic_screening_worker.execute_tax_screening()
+        self.out_q.put(('potential_sym_tax_screening_summary', taxonomic_screening_worker.get_sample_summary()))
+
+    def _do_sym_non_sym_tax_screening(self):
+        """Returns True if the screening was successful"""
+        # The DataSetSample is put on the out_q by the SymNonSymTaxScreeningWorker
+        sym_non_sym_tax_screening_worker_object = SymNonSymTaxScreeningWorker(
+            data_loading_temp_working_directory=self.temp_working_directory, dss=self.dss,
+            data_loading_non_symbiodiniaceae_and_size_violation_base_directory_path=
+            self.non_symbiodiniaceae_and_size_violation_base_directory_path,
+            data_loading_pre_med_sequence_output_directory_path=self.pre_med_sequence_output_directory_path,
+            data_loading_debug=self.debug, sample_attributes_mp_output_queue=self.out_q)
+
+        try:
+            sym_non_sym_tax_screening_worker_object.identify_sym_non_sym_seqs()
+            successful = True
+        except RuntimeError as e:
+            self.out_q.put(('error_sample_name', e.args[0]['sample_name']))
+            successful = False
+        if self.temp_working_directory_lifecycle is not None:
+            self.temp_working_directory_lifecycle.release_tax_screening_intermediates(self.dss.name)
+        return successful
+
+    def _do_med_decomposition(self):
+        for redundant_fasta_path in self._get_redundant_fasta_paths_of_sample():
+            perform_med_worker_instance = PerformMEDWorker(
+                redundant_fasta_path=redundant_fasta_path, data_loading_debug=self.debug,
+                data_loading_path_to_med_padding_executable=self.path_to_med_padding_executable,
+                data_loading_path_to_med_decompose_executable=self.path_to_med_decompose_executable)
+
+            perform_med_worker_instance.do_decomposition()
+            perform_med_worker_instance.record_checkpoint()
+
+            if self.temp_working_directory_lifecycle is not None:
+                self.temp_working_directory_lifecycle.release_med_input(
+                    [perform_med_worker_instance.redundant_fasta_path_unpadded,
+                     perform_med_worker_instance.redundant_fasta_path_padded])
+            self.out_q.put(('med_output_directory', perform_med_worker_instance.med_output_dir))
+
+    def _get_redundant_fasta_paths_of_sample(self):
+        return PerformMEDHandler.get_list_of_redundant_fasta_paths(self.cwd)
 
 
 class DataSetSampleSequenceCreatorWorker:
@@ -2983,24 +4970,47 @@ class DataSetSampleSequenceCreatorWorker:
     the count table, number of samples, number of nodes, these sorts of things."""
     def __init__(self, med_output_directory,
                  data_set_sample_creator_handler_ref_seq_sequence_to_ref_seq_id_dict,
-                 data_set_sample_creator_handler_ref_seq_uid_to_ref_seq_name_dict, data_loading_dataset_obj):
+                 data_set_sample_creator_handler_ref_seq_uid_to_ref_seq_name_dict, data_set_sample_object,
+                 database_writer):
         self.thread_safe_general = ThreadSafeGeneral()
         self.output_directory = med_output_directory
         self.sample_name = self.output_directory.split('/')[-3]
         self.clade = self.output_directory.split('/')[-2]
         self.nodes_list_of_nucleotide_sequences = []
-        self._populate_nodes_list_of_nucleotide_sequences()
+        self.node_abundance_df = None
+        # MED results are preferably read from the binary MED-RESULTS.npz archive.
+        # The text outputs are only written when the MED was run in debug mode.
+        npz_results_path = os.path.join(self.output_directory, 'MED-RESULTS.npz')
+        if os.path.isfile(npz_results_path):
+            self._populate_nodes_list_and_node_abundance_df_from_npz(npz_results_path)
+        else:
+            self._populate_nodes_list_of_nucleotide_sequences()
+            self.node_abundance_df = pd.read_csv(
+                os.path.join(self.output_directory, 'MATRIX-COUNT.txt'), delimiter='\t', header=0, index_col=0)
         self.num_med_nodes = len(self.nodes_list_of_nucleotide_sequences)
         self.node_sequence_name_to_ref_seq_id = {}
         self.ref_seq_sequence_to_ref_seq_id_dict = data_set_sample_creator_handler_ref_seq_sequence_to_ref_seq_id_dict
         self.ref_seq_uid_to_ref_seq_name_dict = data_set_sample_creator_handler_ref_seq_uid_to_ref_seq_name_dict
-        self.node_abundance_df = pd.read_csv(
-            os.path.join(self.output_directory, 'MATRIX-COUNT.txt'), delimiter='\t', header=0, index_col=0)
         self.total_num_sequences = sum(self.node_abundance_df.iloc[0])
-        self.dataset_sample_object = DataSetSample.objects.get(
-            data_submission_from=data_loading_dataset_obj, name=self.sample_name)
+        # The DataSetSample is held by the handler so that the updates of each of its clades are made to the same object
+        self.dataset_sample_object = data_set_sample_object
+        self.database_writer = database_writer
         self.clade_collection_object = None
 
+    def _populate_nodes_list_and_node_abundance_df_from_npz(self, npz_results_path):
+        with np.load(npz_results_path) as med_results:
+            node_names = [str(node_name) for node_name in med_results['node_ids']]
+            for node_seq_name, node_seq_abundance, node_seq_sequence in zip(
+                    node_names, med_results['node_sizes'], med_results['node_representatives']):
+                self.nodes_list_of_nucleotide_sequences.append(
+                    NucleotideSequence(
+                        name=node_seq_name, abundance=int(node_seq_abundance),
+                        sequence=str(node_seq_sequence).replace('-', '')))
+            # As read from the header of MATRIX-COUNT.txt
+            self.node_abundance_df = pd.DataFrame(
+                med_results['counts'], index=pd.Index([str(sample) for sample in med_results['samples']],
+                                                      name='samples'), columns=node_names)
+
     def _populate_nodes_list_of_nucleotide_sequences(self):
         node_file_path = os.path.join(self.output_directory, 'NODE-REPRESENTATIVES.fasta')
         try:
@@ -3042,15 +5052,16 @@ class DataSetSampleSequenceCreatorWorker:
         data_set_sample_sequence_list = []
         for node_nucleotide_sequence_object in self.nodes_list_of_nucleotide_sequences:
             associated_ref_seq_id = self.node_sequence_name_to_ref_seq_id[node_nucleotide_sequence_object.name]
-            associated_ref_seq_object = ReferenceSequence.objects.get(id=associated_ref_seq_id)
             df_index_label = self.node_abundance_df.index.values.tolist()[0]
-            dss = DataSetSampleSequence(reference_sequence_of=associated_ref_seq_object,
+            dss = DataSetSampleSequence(reference_sequence_of_id=associated_ref_seq_id,
                                         abundance=self.node_abundance_df.at[
                                             df_index_label, node_nucleotide_sequence_object.name],
                                         data_set_sample_from=self.dataset_sample_object)
             data_set_sample_sequence_list.append(dss)
-        for dsss_chunk in self.thread_safe_general.chunks(data_set_sample_sequence_list):
-            DataSetSampleSequence.objects.bulk_create(dsss_chunk)
+        # The DataSetSampleSequences are committed together with the updated clade totals of the DataSetSample
+        self.database_writer.write_atomically(
+            model_objects_to_bulk_create=data_set_sample_sequence_list,
+            model_objects_to_save=[self.dataset_sample_object])
 
     def _create_data_set_sample_sequences_with_clade_collection(self):
         data_set_sample_sequence_list = []
@@ -3058,19 +5069,19 @@ class DataSetSampleSequenceCreatorWorker:
         for node_nucleotide_sequence_object in self.nodes_list_of_nucleotide_sequences:
             associated_ref_seq_id = self.node_sequence_name_to_ref_seq_id[node_nucleotide_sequence_object.name]
             associated_ref_seq_uid_as_str_list.append(str(associated_ref_seq_id))
-            associated_ref_seq_object = ReferenceSequence.objects.get(id=associated_ref_seq_id)
             df_index_label = self.node_abundance_df.index.values.tolist()[0]
             dss = DataSetSampleSequence(
-                reference_sequence_of=associated_ref_seq_object,
+                reference_sequence_of_id=associated_ref_seq_id,
                 clade_collection_found_in=self.clade_collection_object,
                 abundance=self.node_abundance_df.at[df_index_label, node_nucleotide_sequence_object.name],
                 data_set_sample_from=self.dataset_sample_object)
             data_set_sample_sequence_list.append(dss)
-        # Save all of the newly created dss
-        for dsss_chunk in self.thread_safe_general.chunks(data_set_sample_sequence_list):
-            DataSetSampleSequence.objects.bulk_create(dsss_chunk)
         self.clade_collection_object.footprint = ','.join(associated_ref_seq_uid_as_str_list)
-        self.clade_collection_object.save()
+        # Save all of the newly created dss together with the updated clade totals of the DataSetSample
+        # and the footprint of the CladeCollection
+        self.database_writer.write_atomically(
+            model_objects_to_bulk_create=data_set_sample_sequence_list,
+            model_objects_to_save=[self.dataset_sample_object, self.clade_collection_object])
 
     def _we_made_a_clade_collection(self):
         return self.total_num_sequences > 200
@@ -3096,7 +5107,6 @@ class DataSetSampleSequenceCreatorWorker:
         clade_index = list('ABCDEFGHI').index(self.clade)
         cladal_seq_abundance_counter[clade_index] = self.total_num_sequences
         self.dataset_sample_object.cladal_seq_totals = json.dumps([str(a) for a in cladal_seq_abundance_counter])
-        self.dataset_sample_object.save()
 
     def _two_or_more_nodes_associated_to_the_same_reference_sequence(self):
         """Multiple nodes may be assigned to the same reference sequence. We only want to create one
@@ -3230,21 +5240,54 @@ class DataSetSampleSequenceCreatorWorker:
 
 class DataSetSampleCreatorHandler:
     """This class will be where we run the code for creating reference sequences, data set sample sequences and
-    clade collections."""
-    def __init__(self):
-        # dictionaries to save us having to do lots of database look ups
-        self.ref_seq_uid_to_ref_seq_name_dict = {
-            ref_seq.id: str(ref_seq) for ref_seq in ReferenceSequence.objects.all()}
-        self.ref_seq_sequence_to_ref_seq_id_dict = {
-            ref_seq.sequence: ref_seq.id for ref_seq in ReferenceSequence.objects.all()}
+    clade collections.
+    The DataSetSampleSequences are created in bulk by a DatabaseWriter. This never uses a writer process (whatever
+    the database_writer_process of the loading) as the objects of a clade must be written in the transaction, and
+    under the lock, in which its ReferenceSequences are created (see
+    _create_data_set_sample_sequences_of_med_output_directories).
+    """
+    def __init__(self, multiprocess=True):
+        self.multiprocess = multiprocess
+        # dictionaries to save us having to do lots of database look ups. They are those of the
+        # ReferenceSequenceCache of this process and so are only read in full by its first loading.
+        ReferenceSequenceCache.update()
+        self.ref_seq_uid_to_ref_seq_name_dict = ReferenceSequenceCache.ref_seq_uid_to_ref_seq_name_dict
+        self.ref_seq_sequence_to_ref_seq_id_dict = ReferenceSequenceCache.ref_seq_sequence_to_ref_seq_id_dict
 
     def execute_data_set_sample_creation(
-            self, data_loading_list_of_med_output_directories, data_loading_debug, data_loading_dataset_object):
+            self, data_loading_list_of_med_output_directories, data_loading_debug, data_loading_dataset_object,
+            data_loading_temp_working_directory_lifecycle=None, data_loading_resume=False):
+        if data_loading_resume:
+            sample_name_and_clade_already_populated_set = self._get_sample_name_and_clade_already_populated_set(
+                data_loading_dataset_object)
+        else:
+            sample_name_and_clade_already_populated_set = set()
+        sample_name_to_data_set_sample_dict = {
+            dss.name: dss for dss in DataSetSample.objects.filter(data_submission_from=data_loading_dataset_object)}
+        database_writer = DatabaseWriter(use_writer_process=False, multiprocess=self.multiprocess)
+        database_writer.start()
+        try:
+            self._create_data_set_sample_sequences_of_med_output_directories(
+                data_loading_list_of_med_output_directories, data_loading_debug, sample_name_to_data_set_sample_dict,
+                database_writer, data_loading_temp_working_directory_lifecycle,
+                sample_name_and_clade_already_populated_set)
+        finally:
+            database_writer.close()
+
+    def _create_data_set_sample_sequences_of_med_output_directories(
+            self, data_loading_list_of_med_output_directories, data_loading_debug,
+            sample_name_to_data_set_sample_dict, database_writer, data_loading_temp_working_directory_lifecycle,
+            sample_name_and_clade_already_populated_set):
         for med_output_directory in data_loading_list_of_med_output_directories:
+            if (med_output_directory.split('/')[-3], med_output_directory.split('/')[-2]) in \
+                    sample_name_and_clade_already_populated_set:
+                print(f'{med_output_directory}: already populated in the loading being resumed')
+                continue
             try:
                 data_set_sample_sequence_creator_worker = DataSetSampleSequenceCreatorWorker(
                     med_output_directory=med_output_directory,
-                    data_loading_dataset_obj=data_loading_dataset_object,
+                    data_set_sample_object=sample_name_to_data_set_sample_dict[med_output_directory.split('/')[-3]],
+                    database_writer=database_writer,
                     data_set_sample_creator_handler_ref_seq_sequence_to_ref_seq_id_dict=
                     self.ref_seq_sequence_to_ref_seq_id_dict,
                     data_set_sample_creator_handler_ref_seq_uid_to_ref_seq_name_dict=
@@ -3252,6 +5295,8 @@ class DataSetSampleCreatorHandler:
             except RuntimeError as e:
                 non_existant_med_output_dir = e.args[0]['med_output_directory']
                 print(f'{non_existant_med_output_dir}: File not found during DataSetSample creation.')
+                if data_loading_temp_working_directory_lifecycle is not None:
+                    data_loading_temp_working_directory_lifecycle.release_med_output(med_output_directory)
                 continue
             if data_loading_debug:
                 if data_set_sample_sequence_creator_worker.num_med_nodes < 10:
@@ -3262,4 +5307,42 @@ class DataSetSampleCreatorHandler:
             sys.stdout.write(
                 f'\n\nPopulating {data_set_sample_sequence_creator_worker.sample_name} with '
                 f'clade {data_set_sample_sequence_creator_worker.clade} sequences\n')
-            data_set_sample_sequence_creator_worker.make_data_set_sample_sequences()
\ No newline at end of file
+            # The new ReferenceSequences, the CladeCollection and the DataSetSampleSequences of a clade, and the
+            # updated cladal_seq_totals of the DataSetSample, are committed in a single transaction (the database_writer
+            # writes directly) so that a loading that is interrupted can be resumed without partially populated
+            # samples. The ReferenceSequences are matched and created under the reference sequences lock (committed
+            # before it is released) so that a concurrent loading does not create a second ReferenceSequence for a
+            # sequence.
+            with SharedResourceLock(DataLoading.reference_sequences_lock_name):
+                self._add_ref_seqs_created_by_concurrent_loadings()
+                try:
+                    with transaction.atomic():
+                        data_set_sample_sequence_creator_worker.make_data_set_sample_sequences()
+                except Exception:
+                    # The ReferenceSequences created in the rolled back transaction are in the ReferenceSequenceCache
+                    ReferenceSequenceCache.reset()
+                    raise
+            if data_loading_temp_working_directory_lifecycle is not None:
+                data_loading_temp_working_directory_lifecycle.release_med_output(med_output_directory)
+
+    @staticmethod
+    def _add_ref_seqs_created_by_concurrent_loadings():
+        # The ReferenceSequences created by this loading are already in the dictionaries (see
+        # DataSetSampleSequenceCreatorWorker._assign_node_sequence_to_new_ref_seq) and are simply re-added.
+        ReferenceSequenceCache.update()
+
+    @staticmethod
+    def _get_sample_name_and_clade_already_populated_set(data_loading_dataset_object):
+        """The (sample name, clade) pairs for which DataSetSampleSequences were created in the loading being
+        resumed. A clade's total in the cladal_seq_totals of a DataSetSample is only set (in the same transaction
+        as the DataSetSampleSequences are created) once the clade has been populated.
+        The CladeCollections that were created for a clade that was not populated are deleted."""
+        CladeCollection.objects.filter(
+            data_set_sample_from__data_submission_from=data_loading_dataset_object,
+            datasetsamplesequence__isnull=True).delete()
+        sample_name_and_clade_already_populated_set = set()
+        for dss in DataSetSample.objects.filter(data_submission_from=data_loading_dataset_object):
+            for clade, cladal_seq_total in zip(list('ABCDEFGHI'), json.loads(dss.cladal_seq_totals)):
+                if int(cladal_seq_total) != 0:
+                    sample_name_and_clade_already_populated_set.add((dss.name, clade))
+        return sample_name_and_clade_already_populated_set
@@ -4,13 +4,18 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
 from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
-from dbApp.models import DataSet, DataAnalysis, DataSetSample, Study, User
+from dbApp.models import DataSet, DataAnalysis, DataSetSample, Study, User, ReferenceSequence
 import pandas as pd
 import sys
 from collections import Counter
 from numpy import NaN
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connections
+from django.db.models import Max
+from threading import Lock
+from django.db.backends.signals import connection_created
 from datetime import datetime
+import time
 
 
 def delete_data_set(uid):
@@ -29,6 +34,154 @@ def write_ref_seq_objects_to_fasta(path, list_of_ref_seq_objs, identifier='name'
                 f.write(f'>{ref_seq_obj.id}\n')
             f.write(f'{ref_seq_obj.sequence}\n')
 
+class SQLitePerformanceProfile:
+    """Applies a set of SQLite PRAGMAs to every database connection as it is created.
+    By default SQLite journals every transaction to a rollback journal that is fsynced on each commit.
+    The performance profile uses a write ahead log (WAL) journal with synchronous=NORMAL so that commits no longer
+    wait on an fsync and readers are not blocked by the writer, together with a larger page cache and memory mapped
+    I/O. In WAL mode with synchronous=NORMAL a commit may be lost on a power failure (but the database will not be
+    corrupted). WAL mode requires that all of the processes using the database are on the same host and so
+    the profile should not be used where the database is on a network file system.
+    The query planner statistics are also refreshed with ANALYZE at most once every seconds_between_analyze.
+    This can be turned off with analyze=False (e.g. to benchmark the profile against the SQLite defaults).
+    """
+    performance_pragmas = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -64000,
+                           'mmap_size': 268435456}
+    # The SQLite defaults. Used to benchmark the performance profile against.
+    default_pragmas = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'cache_size': -2000, 'mmap_size': 0}
+    seconds_between_analyze = 24 * 60 * 60
+
+    def __init__(self, pragmas=None, analyze=True):
+        self.pragmas = self.performance_pragmas if pragmas is None else pragmas
+        self.analyze = analyze
+
+    def connect(self):
+        """Apply the profile to all connections created from now on and to those that are already open.
+        Replaces any profile that was previously connected."""
+        self.disconnect()
+        connection_created.connect(
+            self.apply_to_connection, weak=False, dispatch_uid='symportal_sqlite_performance_profile')
+        for connection in connections.all():
+            if connection.connection is not None:
+                self.apply_to_connection(sender=connection.__class__, connection=connection)
+
+    @staticmethod
+    def disconnect():
+        connection_created.disconnect(dispatch_uid='symportal_sqlite_performance_profile')
+
+    def apply_to_connection(self, sender, connection, **kwargs):
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            for pragma, value in self.pragmas.items():
+                cursor.execute(f'PRAGMA {pragma}={value}')
+        if self.analyze:
+            self._analyze_if_due(connection)
+
+    def _analyze_if_due(self, connection):
+        database_path = connection.settings_dict['NAME']
+        # e.g. the in memory database used by the Django testing framework
+        if not os.path.isfile(str(database_path)):
+            return
+        analyze_time_stamp_path = f'{database_path}.analyze_time_stamp'
+        if os.path.exists(analyze_time_stamp_path) and \
+                time.time() - os.path.getmtime(analyze_time_stamp_path) < self.seconds_between_analyze:
+            return
+        # Touch the time stamp before running ANALYZE so that the connections of
+        # any concurrently starting workers do not also run it.
+        with open(analyze_time_stamp_path, 'w') as f:
+            f.write(f'{datetime.now()}\n')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+class WorkerReferenceData:
+    """The ReferenceSequences held in memory by each worker of the persistent ResultQueueWorkerPool of a run
+    (loaded by the pool's initializer) so that the workers look up the ReferenceSequence of e.g. a
+    DataSetSampleSequence rather than querying the database for each one.
+    During a run ReferenceSequences are only created or, once, given a name. The version of the
+    ReferenceSequences (the highest id and the number with a name) is taken by the parent with get_current_version
+    and passed to the workers with each job. A worker whose ReferenceSequences are of a different version
+    reloads them.
+    When the workers are threads they share the one copy.
+    """
+    ref_seq_id_to_name_clade_and_has_name_dict = {}
+    version = None
+    lock = Lock()
+
+    @staticmethod
+    def get_current_version():
+        return (ReferenceSequence.objects.aggregate(Max('id'))['id__max'] or 0,
+                ReferenceSequence.objects.filter(has_name=True).count())
+
+    @classmethod
+    def load(cls, version=None):
+        with cls.lock:
+            if version is not None and version == cls.version:
+                return
+            # The version is taken before the ReferenceSequences are read so that any
+            # created in between are reloaded with the next version
+            loaded_version = cls.get_current_version() if version is None else version
+            cls.ref_seq_id_to_name_clade_and_has_name_dict = {
+                ref_seq_id: (name if has_name else f'{ref_seq_id}_{clade}', clade, has_name) for
+                ref_seq_id, name, has_name, clade in
+                ReferenceSequence.objects.values_list('id', 'name', 'has_name', 'clade')}
+            cls.version = loaded_version
+
+    @classmethod
+    def get_ref_seq_id_to_name_clade_and_has_name_dict(cls, version):
+        """A dict of ReferenceSequence id to the str of the ReferenceSequence (its name, or id and clade
+        if it has no name), its clade and its has_name, reloaded if it is not of the given version."""
+        if cls.version != version:
+            cls.load(version=version)
+        return cls.ref_seq_id_to_name_clade_and_has_name_dict
+
+
+class ReferenceSequenceCache:
+    """The id of each ReferenceSequence by its nucleotide sequence, and the str of each by its id, held by this
+    process so that they are not all read from the database by each loading that the process runs, e.g. the jobs
+    of a job queue worker or the commands of the daemon (which are forked from it with the cache already loaded).
+    As for the WorkerReferenceData, during a run ReferenceSequences are only created or given a name. An update
+    only reads the ReferenceSequences created since the last update and, if the number with a name has changed,
+    the names. If the database holds fewer ReferenceSequences than the cache (e.g. it was replaced),
+    the cache is reloaded. The dicts are updated in place.
+    """
+    ref_seq_sequence_to_ref_seq_id_dict = {}
+    ref_seq_uid_to_ref_seq_name_dict = {}
+    max_ref_seq_uid = 0
+    num_ref_seqs_with_name = 0
+    lock = Lock()
+
+    @classmethod
+    def update(cls):
+        with cls.lock:
+            if (ReferenceSequence.objects.aggregate(Max('id'))['id__max'] or 0) < cls.max_ref_seq_uid:
+                cls._clear()
+            for ref_seq_id, name, has_name, clade, sequence in ReferenceSequence.objects.filter(
+                    id__gt=cls.max_ref_seq_uid).values_list('id', 'name', 'has_name', 'clade', 'sequence'):
+                cls.ref_seq_sequence_to_ref_seq_id_dict[sequence] = ref_seq_id
+                cls.ref_seq_uid_to_ref_seq_name_dict[ref_seq_id] = name if has_name else f'{ref_seq_id}_{clade}'
+                cls.max_ref_seq_uid = max(cls.max_ref_seq_uid, ref_seq_id)
+            num_ref_seqs_with_name = ReferenceSequence.objects.filter(has_name=True).count()
+            if num_ref_seqs_with_name != cls.num_ref_seqs_with_name:
+                cls.ref_seq_uid_to_ref_seq_name_dict.update(
+                    ReferenceSequence.objects.filter(has_name=True).values_list('id', 'name'))
+                cls.num_ref_seqs_with_name = num_ref_seqs_with_name
+
+    @classmethod
+    def reset(cls):
+        """Empty the cache so that it is reloaded in full by the next update, e.g. if ReferenceSequences that
+        were added to it were then rolled back."""
+        with cls.lock:
+            cls._clear()
+
+    @classmethod
+    def _clear(cls):
+        cls.ref_seq_sequence_to_ref_seq_id_dict.clear()
+        cls.ref_seq_uid_to_ref_seq_name_dict.clear()
+        cls.max_ref_seq_uid, cls.num_ref_seqs_with_name = 0, 0
+
+
 class ApplyDatasheetToDataSetSamples:
     """Class responsible for allowing us to apply a datasheet to a given set of DataSetSample objects
     that belong to a given DataSet. For the time being we will just be working with single DataSets. In the
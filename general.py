@@ -7,6 +7,11 @@ from plumbum import local
 import json
 import numpy as np
 import random
+import traceback
+import fcntl
+from multiprocessing import Queue as mp_Queue, Process
+from threading import Thread, local as thread_local
+from queue import Queue as mt_Queue, Empty
 
 class ThreadSafeGeneral:
     def __init__(self):
@@ -527,6 +532,42 @@ class ThreadSafeGeneral:
 
         return new_colours
 
+class SharedResourceLock:
+    """An advisory lock, held on a lock file in the locks directory of the SymPortal root, that coordinates the
+    access of concurrent loadings (separate SymPortal processes working on the same database and SymPortal root) to
+    a resource that they share. E.g. the ReferenceSequence objects or the symClade BLAST database.
+    Used as a context manager. An exclusive lock (shared=False) is held by a single holder at a time.
+    A shared lock can be held by any number of holders at once, but not together with an exclusive lock,
+    so that e.g. several loadings can BLAST against symClade while it is not being rewritten.
+    The lock is released when the holder leaves the context or if its process exits.
+    Shared locks are not upgraded to exclusive locks (a holder of a shared lock must not take
+    the exclusive lock of the same resource) as two holders upgrading at once would deadlock.
+    """
+    lock_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locks')
+
+    def __init__(self, resource_name, shared=False):
+        self.resource_name = resource_name
+        self.shared = shared
+        self.lock_file_path = os.path.join(self.lock_directory, f'{resource_name}.lock')
+        self.lock_file = None
+
+    def __enter__(self):
+        os.makedirs(self.lock_directory, exist_ok=True)
+        self.lock_file = open(self.lock_file_path, 'a')
+        lock_operation = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(self.lock_file.fileno(), lock_operation | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f'\nWaiting for the {self.resource_name} lock held by another loading')
+            fcntl.flock(self.lock_file.fileno(), lock_operation)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+        self.lock_file.close()
+        self.lock_file = None
+
+
 def chunks(l, n=500):
         """Yield successive n-sized chunks from l.
         Modified to explicitly cast to list to cover the case that a set is passed in.
@@ -534,4 +575,399 @@ def chunks(l, n=500):
         """
         in_list = list(l)
         for i in range(0, len(in_list), n):
-            yield in_list[i:i + n]
\ No newline at end of file
+            yield in_list[i:i + n]
+
+
+class ResultQueueWorkerPool:
+    """Executes a worker function over a list of work items with num_proc worker processes (or threads if
+    multiprocess is False).
+    Rather than the workers writing their results to multiprocessing.Manager dicts or lists, where every access is
+    a pickled round trip to the manager process, each worker puts the result of each work item onto a result queue
+    and the results are merged in the parent, by merge_result, as they are collected.
+    The worker_function is called as worker_function(work_item, *worker_args) and must be picklable
+    (e.g. a module level function or a staticmethod). Its return value, unless None, is passed to merge_result
+    (if given).
+    If a worker_function raises an exception, it is raised as a RuntimeError in the parent once all of the
+    work items have been processed.
+    If persistent is False, the workers are started and stopped by each execute.
+    If persistent is True, the workers are started by the first execute and are then reused by each following
+    execute until close() is called. Rather than each parallel stage starting its own workers, each of which has to
+    re-establish its Django database connection, a single persistent pool can be shared by all of the parallel
+    stages of a run. The worker_function and worker_args of each execute are sent once to each worker
+    rather than with each work item. As the workers are forked at the first execute,
+    the database connections of the parent should be closed before it.
+    Only max_in_flight_per_worker work items per worker are given to the workers at any one time. A further work item
+    is only taken from work_items (which may be a generator) once a result has been collected, so that the
+    number of work items and results held in memory is bounded by the number of workers rather than
+    by the number of work items.
+    If num_workers is given to execute, at most num_workers work items are processed at any one time so that a
+    stage can use fewer of the workers of a shared pool (see AutoConcurrencySelector).
+    Each work item and result is tagged with the id of the execute (job) that it belongs to. If an execute does not
+    complete (e.g. merge_result raises, or a worker process exits unexpectedly) the job is abandoned: the worker
+    processes are terminated (and are restarted by the next execute) or, as threads cannot be terminated, the
+    results of the work items still in flight are drained. Any work item or result of an abandoned job that is
+    still queued is discarded by its job id.
+    If the working directory of the parent has changed since the worker processes were started, they are restarted
+    by the next execute.
+    If an initializer is given, initializer(*initargs) is called by each worker when it starts, e.g. to load the
+    read only data that is used by the jobs of a persistent pool.
+    With each result, a worker reports the peak memory of its work item (see _get_task_max_rss_gb). The highest of
+    these since a reader's last call of pop_peak_task_memory_gb is returned by it. Each reader (e.g. the
+    AutoConcurrencySelector and the StageProfiler) keeps its own peak so that they do not reset each other's.
+    """
+    max_in_flight_per_worker = 2
+    # How often (seconds) the workers are checked to still be alive while waiting for a result
+    result_poll_interval = 5
+
+    def __init__(self, num_proc, multiprocess=True, persistent=False, initializer=None, initargs=()):
+        self.num_proc = num_proc
+        self.multiprocess = multiprocess
+        self.persistent = persistent
+        self.initializer = initializer
+        self.initargs = initargs
+        self.work_item_queue = None
+        self.result_queue = None
+        # One per worker. Used to send the worker_function and worker_args of each execute to every worker.
+        self.job_queues = []
+        self.all_processes = []
+        self.job_id = 0
+        # reader: the highest peak task memory (GB) since the reader's last pop_peak_task_memory_gb.
+        # A reader other than the default (None) is tracked from its first call.
+        self.reader_to_peak_task_memory_gb_dict = {None: None}
+        # The working directory of the parent when the workers were started
+        self.working_directory = None
+
+    def pop_peak_task_memory_gb(self, reader=None):
+        """The highest peak memory (GB) of the work items processed since the reader's last call, or None if none
+        were."""
+        peak_task_memory_gb = self.reader_to_peak_task_memory_gb_dict.get(reader)
+        self.reader_to_peak_task_memory_gb_dict[reader] = None
+        return peak_task_memory_gb
+
+    def start(self):
+        if self.all_processes and self.multiprocess and os.getcwd() != self.working_directory:
+            # The worker processes keep the working directory that they were started in. So that the relative
+            # paths of a job (e.g. of the job queue) are resolved against the parent's working directory,
+            # they are restarted.
+            self.close()
+        if self.all_processes:
+            return
+        self.working_directory = os.getcwd()
+        if self.multiprocess:
+            self.work_item_queue = mp_Queue()
+            self.result_queue = mp_Queue()
+            self.job_queues = [mp_Queue() for n in range(self.num_proc)]
+        else:
+            self.work_item_queue = mt_Queue()
+            self.result_queue = mt_Queue()
+            self.job_queues = [mt_Queue() for n in range(self.num_proc)]
+        for job_queue in self.job_queues:
+            worker_args = (self.work_item_queue, job_queue, self.result_queue, self.initializer, self.initargs)
+            if self.multiprocess:
+                p = Process(target=self._result_queue_worker, args=worker_args)
+            else:
+                p = Thread(target=self._result_queue_worker, args=worker_args)
+            self.all_processes.append(p)
+            p.start()
+
+    def close(self):
+        if not self.all_processes:
+            return
+        for n in range(self.num_proc):
+            self.work_item_queue.put('STOP')
+        for p in self.all_processes:
+            p.join()
+        self.all_processes = []
+
+    def execute(self, worker_function, work_items, merge_result=None, worker_args=(), num_workers=None):
+        self.start()
+        if num_workers is None or num_workers >= self.num_proc:
+            max_num_work_items_in_flight = self.num_proc * self.max_in_flight_per_worker
+        else:
+            max_num_work_items_in_flight = max(1, num_workers)
+        try:
+            self._execute_job(worker_function, work_items, merge_result, worker_args, max_num_work_items_in_flight)
+        finally:
+            if not self.persistent:
+                self.close()
+
+    def _execute_job(self, worker_function, work_items, merge_result, worker_args, max_num_work_items_in_flight):
+        self.job_id += 1
+        for job_queue in self.job_queues:
+            job_queue.put((self.job_id, worker_function, worker_args))
+        work_item_iterator = iter(work_items)
+        work_items_exhausted = False
+        num_work_items_in_flight = 0
+        worker_tracebacks = []
+        job_complete = False
+        try:
+            while True:
+                while not work_items_exhausted and num_work_items_in_flight < max_num_work_items_in_flight:
+                    try:
+                        work_item = next(work_item_iterator)
+                    except StopIteration:
+                        work_items_exhausted = True
+                        break
+                    self.work_item_queue.put((self.job_id, work_item))
+                    num_work_items_in_flight += 1
+                if num_work_items_in_flight == 0:
+                    break
+                # The results are merged as they are collected. Exactly one result is returned for each work item.
+                result_type, result_job_id, result, task_max_rss_gb = self._get_result()
+                if result_job_id != self.job_id:
+                    # The result of a work item of an abandoned job
+                    continue
+                num_work_items_in_flight -= 1
+                self._record_task_memory(task_max_rss_gb)
+                if result_type == 'ERROR':
+                    worker_tracebacks.append(result)
+                elif result is not None and merge_result is not None:
+                    merge_result(result)
+            job_complete = True
+        finally:
+            if not job_complete:
+                self._abandon_job(num_work_items_in_flight)
+
+        if worker_tracebacks:
+            raise RuntimeError({'message': f'{len(worker_tracebacks)} work item(s) raised an exception',
+                                'tracebacks': worker_tracebacks})
+
+    def _get_result(self):
+        # Rather than blocking on the result queue indefinitely, check that the workers are still alive
+        # so that a worker process that was killed (e.g. by the OOM killer) does not hang the parent.
+        while True:
+            try:
+                return self.result_queue.get(timeout=self.result_poll_interval)
+            except Empty:
+                if not all(p.is_alive() for p in self.all_processes):
+                    raise RuntimeError({
+                        'message': 'A worker of the pool exited before returning its results',
+                        'exitcodes': [p.exitcode for p in self.all_processes] if self.multiprocess else None})
+
+    def _record_task_memory(self, task_max_rss_gb):
+        self_max_rss_gb, children_max_rss_gb = task_max_rss_gb
+        # The peak of a worker thread itself is that of the whole parent process
+        # and so only the memory of the child processes run by the work item is attributable to it
+        task_memory_gb = max(self_max_rss_gb if self.multiprocess else 0, children_max_rss_gb)
+        if task_memory_gb <= 0:
+            return
+        for reader, peak_task_memory_gb in self.reader_to_peak_task_memory_gb_dict.items():
+            if peak_task_memory_gb is None or task_memory_gb > peak_task_memory_gb:
+                self.reader_to_peak_task_memory_gb_dict[reader] = task_memory_gb
+
+    def _abandon_job(self, num_work_items_in_flight):
+        if self.multiprocess:
+            # The queues may be left in an inconsistent state by the terminated workers. They are discarded and new
+            # ones are made when the pool is restarted by the next execute.
+            for queue in [self.work_item_queue] + self.job_queues:
+                queue.cancel_join_thread()
+            for p in self.all_processes:
+                p.terminate()
+            for p in self.all_processes:
+                p.join()
+            self.all_processes = []
+            return
+        try:
+            while num_work_items_in_flight > 0:
+                result_type, result_job_id, result, task_max_rss_gb = self._get_result()
+                if result_job_id == self.job_id:
+                    num_work_items_in_flight -= 1
+        except RuntimeError:
+            # A worker thread exited. Its work item will never return a result.
+            pass
+
+    @staticmethod
+    def _result_queue_worker(work_item_queue, job_queue, result_queue, initializer=None, initargs=()):
+        ChildProcessPeakMemoryRecorder.install()
+        if initializer is not None:
+            initializer(*initargs)
+        current_job_id, worker_function, worker_args = 0, None, None
+        for job_id, work_item in iter(work_item_queue.get, 'STOP'):
+            # The job is always put onto the job queues before its work items. A worker that received no work
+            # items from an earlier job will find that job's details ahead of the current job's.
+            while current_job_id < job_id:
+                current_job_id, worker_function, worker_args = job_queue.get()
+            if job_id != current_job_id:
+                # A work item of an abandoned job
+                continue
+            reset_peak_rss()
+            ChildProcessPeakMemoryRecorder.reset()
+            try:
+                result = ('RESULT', job_id, worker_function(work_item, *worker_args))
+            except Exception:
+                result = ('ERROR', job_id, traceback.format_exc())
+            result_queue.put(result + (ResultQueueWorkerPool._get_task_max_rss_gb(),))
+
+    @staticmethod
+    def _get_task_max_rss_gb():
+        """The (worker, child processes) peak resident set size (GB) of the work item just processed by the
+        worker. That of the worker itself is since it was reset before the work item (on linux) or else is the
+        high water mark of the worker. That of the child processes (e.g. mothur, BLAST or MED) is the highest peak of
+        the child processes run by the work item (see ChildProcessPeakMemoryRecorder)."""
+        self_max_rss_gb = get_peak_rss_gb() or 0
+        return self_max_rss_gb, ChildProcessPeakMemoryRecorder.get_peak_rss_gb()
+
+
+class ChildProcessPeakMemoryRecorder:
+    """Records the peak resident set size of each child process run through subprocess (e.g. by subprocess.run) as
+    it is waited for. It is read from the resource usage that os.wait4 returns for that one process, rather than from
+    RUSAGE_CHILDREN, which is the high water mark of all of the completed child processes of the process and so
+    would not show the peak of a child process that uses less memory than an earlier one.
+    install() replaces subprocess.Popen, in this process, with a PeakMemoryRecordingPopen. The peak is recorded for
+    the thread that waits for the child process so that each worker thread of a ResultQueueWorkerPool records
+    those of its own work items. Child processes that are not run through subprocess (e.g. those run by plumbum)
+    or that are reaped by Popen.poll() are not recorded.
+    """
+    recorded_peak = thread_local()
+
+    @staticmethod
+    def install():
+        if not issubclass(subprocess.Popen, PeakMemoryRecordingPopen):
+            subprocess.Popen = PeakMemoryRecordingPopen
+
+    @classmethod
+    def reset(cls):
+        cls.recorded_peak.rss_gb = 0
+
+    @classmethod
+    def record(cls, max_rss):
+        cls.recorded_peak.rss_gb = max(cls.get_peak_rss_gb(), max_rss_to_gb(max_rss))
+
+    @classmethod
+    def get_peak_rss_gb(cls):
+        """The highest peak resident set size (GB) of the child processes waited for by this thread since the last
+        reset, or 0 if there were none."""
+        return getattr(cls.recorded_peak, 'rss_gb', 0)
+
+
+class PeakMemoryRecordingPopen(subprocess.Popen):
+    """A subprocess.Popen that records the peak resident set size of its process when it is waited for
+    (see ChildProcessPeakMemoryRecorder)."""
+    def _try_wait(self, wait_flags):
+        # As subprocess.Popen._try_wait, but with os.wait4 so that the resource usage of the process is returned
+        try:
+            (pid, sts, rusage) = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return self.pid, 0
+        if pid == self.pid:
+            ChildProcessPeakMemoryRecorder.record(rusage.ru_maxrss)
+        return pid, sts
+
+
+def get_max_rss_gb(children=False):
+    """The peak resident set size (GB) of this process, or of its largest completed child process if children is
+    True. None if it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return max_rss_to_gb(
+        resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss)
+
+
+def reset_peak_rss():
+    """On linux the peak resident set size of this process (its VmHWM) can be reset so that get_peak_rss_gb is
+    that since the reset (e.g. of the next work item of a worker) rather than the high water mark of the whole
+    process. Returns whether it was reset."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss_gb():
+    """The peak resident set size (GB) of this process since reset_peak_rss, or its high water mark if it cannot
+    be reset. None if it cannot be read."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / (1024 ** 2)
+    except OSError:
+        pass
+    return get_max_rss_gb(children=False)
+
+
+def max_rss_to_gb(max_rss):
+    # ru_maxrss is in kilobytes on linux and in bytes on macOS
+    if sys.platform == 'darwin':
+        return max_rss / (1024 ** 3)
+    return max_rss / (1024 ** 2)
+
+
+class AutoConcurrencySelector:
+    """Selects the number of workers of each parallel stage when --num_proc auto is used.
+    The number of workers of a stage is the smallest of: the available cores, the number of tasks of the stage and
+    the number of tasks whose peak memory fits in usable_memory_fraction of the currently available memory.
+    The peak memory of a task is taken from stage_to_default_task_memory_gb_dict until it has been measured.
+    It is measured, when the next stage is selected, as the highest peak memory reported by the workers of the
+    worker_pool for the tasks of the stage (see ResultQueueWorkerPool._get_task_max_rss_gb). This is that of the
+    worker process, or of the mothur, BLAST or MED process run by the task if higher. The stages whose tasks are
+    not run on the worker_pool keep their default.
+    As the available memory is read at the start of each stage, and the measured peak memory of a stage
+    is used the next time that the stage is run (e.g. the iterations of the taxonomic screening, or the outputs
+    of a later loading or analysis), the concurrency adapts between stages.
+    """
+    # The estimated peak memory (GB) of a single task of each stage before it has been measured
+    stage_to_default_task_memory_gb_dict = {
+        'initial_mothur_qc': 1.0, 'potential_sym_tax_screening': 1.0, 'sym_non_sym_tax_screening': 0.5,
+        'med_decomposition': 1.0, 'streaming_sample_pipeline': 1.5, 'pre_med_seq_matching': 0.5,
+        'seq_count_table_output': 0.5}
+    usable_memory_fraction = 0.8
+
+    def __init__(self, worker_pool=None):
+        self.available_cores = self._get_available_cores()
+        self.stage_to_measured_task_memory_gb_dict = {}
+        self.current_stage = None
+        # The ResultQueueWorkerPool that the tasks of the stages are run on
+        self.worker_pool = worker_pool
+
+    def select_num_proc(self, stage, num_tasks=None):
+        self._record_peak_memory_of_current_stage()
+        task_memory_gb = self.stage_to_measured_task_memory_gb_dict.get(
+            stage, self.stage_to_default_task_memory_gb_dict[stage])
+        num_proc = self.available_cores
+        if num_tasks is not None:
+            num_proc = min(num_proc, num_tasks)
+        available_memory_gb = self._get_available_memory_gb()
+        if available_memory_gb is not None:
+            num_proc = min(num_proc, int((available_memory_gb * self.usable_memory_fraction) / task_memory_gb))
+        num_proc = max(1, num_proc)
+        print(f'\nAuto concurrency: {num_proc} worker(s) for {stage} '
+              f'({self.available_cores} cores available, {task_memory_gb:.2f} GB per task, '
+              f'{"unknown" if available_memory_gb is None else f"{available_memory_gb:.1f}"} GB memory available)')
+        self.current_stage = stage
+        if self.worker_pool is not None:
+            # So that only the tasks of this stage are measured
+            self.worker_pool.pop_peak_task_memory_gb()
+        return num_proc
+
+    def _record_peak_memory_of_current_stage(self):
+        if self.current_stage is None or self.worker_pool is None:
+            return
+        peak_task_memory_gb = self.worker_pool.pop_peak_task_memory_gb()
+        if peak_task_memory_gb is not None:
+            self.stage_to_measured_task_memory_gb_dict[self.current_stage] = peak_task_memory_gb
+        self.current_stage = None
+
+    @staticmethod
+    def _get_available_cores():
+        if hasattr(os, 'sched_getaffinity'):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    @staticmethod
+    def _get_available_memory_gb():
+        try:
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) / (1024 ** 2)
+        except OSError:
+            pass
+        try:
+            return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / (1024 ** 3)
+        except (ValueError, OSError, AttributeError):
+            return None
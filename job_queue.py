@@ -0,0 +1,122 @@
+"""A local queue of SymPortal jobs (e.g. loadings, analyses and outputs) that are submitted with --queue_job and run,
+one after the other, by a job queue worker (--job_queue_worker)."""
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+
+class JobQueue:
+    """The jobs are held in their own SQLite database (job_queue/job_queue.sqlite3 in the SymPortal root) rather than
+    in the SymPortal database so that submitting a job, or a worker looking for a job, does not contend with
+    the loadings and analyses that are writing to the SymPortal database.
+    Each job is the list of command line arguments of a main.py invocation and the working directory from which
+    it was submitted (so that relative paths resolve as they would have done).
+    A job is queued, then running, then complete or failed. The timings, the pid of the worker that ran it
+    and, if it failed, the error are recorded.
+    A job cannot itself be a job queue worker or the daemon (see unqueueable_args) as it would never end.
+    """
+    unqueueable_args = ['--job_queue_worker', '--daemon']
+    def __init__(self, symportal_root_directory):
+        self.job_queue_directory = os.path.join(symportal_root_directory, 'job_queue')
+        os.makedirs(self.job_queue_directory, exist_ok=True)
+        self.job_queue_db_path = os.path.join(self.job_queue_directory, 'job_queue.sqlite3')
+        self._execute(
+            'CREATE TABLE IF NOT EXISTS job ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, args TEXT NOT NULL, working_directory TEXT NOT NULL, '
+            'status TEXT NOT NULL, submitted_time_stamp TEXT NOT NULL, start_time_stamp TEXT, '
+            'end_time_stamp TEXT, seconds REAL, worker_pid INTEGER, error TEXT)')
+
+    def _connect(self):
+        # Autocommit (isolation_level=None) so that each statement is committed unless a transaction is begun.
+        # The timeout covers a worker claiming a job while another job is being submitted.
+        return sqlite3.connect(self.job_queue_db_path, timeout=60, isolation_level=None)
+
+    def _execute(self, sql, parameters=()):
+        """Execute a single statement and return the cursor's lastrowid and fetched rows."""
+        connection = self._connect()
+        try:
+            cursor = connection.execute(sql, parameters)
+            return cursor.lastrowid, cursor.fetchall()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_unqueueable_args(args_list):
+        return [arg for arg in args_list if arg.split('=')[0] in JobQueue.unqueueable_args]
+
+    def submit_job(self, args_list, working_directory):
+        unqueueable_args = self.get_unqueueable_args(args_list)
+        if unqueueable_args:
+            raise RuntimeError({'message': f'{", ".join(unqueueable_args)} cannot be run as a job of the job queue',
+                                'args_list': args_list})
+        job_id, rows = self._execute(
+            'INSERT INTO job (args, working_directory, status, submitted_time_stamp) VALUES (?, ?, ?, ?)',
+            (json.dumps(args_list), working_directory, 'queued', self._get_time_stamp()))
+        return job_id
+
+    def claim_next_job(self, worker_pid):
+        """Mark the oldest queued job as running and return its (id, args_list, working_directory).
+        None if no jobs are queued. The job is claimed in an immediate transaction so that two workers
+        cannot claim the same job."""
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                "SELECT id, args, working_directory FROM job WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                connection.execute('COMMIT')
+                return None
+            connection.execute(
+                "UPDATE job SET status = 'running', start_time_stamp = ?, worker_pid = ? WHERE id = ?",
+                (self._get_time_stamp(), worker_pid, row[0]))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.close()
+        return row[0], json.loads(row[1]), row[2]
+
+    def record_job_end(self, job_id, seconds, error=None):
+        self._execute(
+            'UPDATE job SET status = ?, end_time_stamp = ?, seconds = ?, error = ? WHERE id = ?',
+            ('complete' if error is None else 'failed', self._get_time_stamp(), seconds, error, job_id))
+
+    def fail_jobs_of_exited_workers(self):
+        """Jobs that are running on a worker that is no longer running (e.g. it was killed) will never end.
+        They are marked as failed. The workers are assumed to run on this machine."""
+        lastrowid, rows = self._execute("SELECT id, worker_pid FROM job WHERE status = 'running'")
+        for job_id, worker_pid in rows:
+            if not self._pid_is_running(worker_pid):
+                # The status is checked again in case the job ended since it was selected
+                self._execute(
+                    "UPDATE job SET status = 'failed', error = ? WHERE id = ? AND status = 'running'",
+                    (f'The worker (pid {worker_pid}) exited while the job was running', job_id))
+
+    def display_jobs(self):
+        lastrowid, rows = self._execute(
+            'SELECT id, status, submitted_time_stamp, start_time_stamp, end_time_stamp, seconds, args, error '
+            'FROM job ORDER BY id')
+        print('id\tstatus\tsubmitted\tstarted\tended\tseconds\targs\terror')
+        for job_id, status, submitted, started, ended, seconds, args, error in rows:
+            seconds = '' if seconds is None else f'{seconds:.0f}'
+            # Only the last line of the error (the exception) is displayed
+            error = '' if error is None else error.strip().split('\n')[-1]
+            print(f'{job_id}\t{status}\t{submitted}\t{started or ""}\t{ended or ""}\t{seconds}\t'
+                  f'{" ".join(json.loads(args))}\t{error}')
+
+    @staticmethod
+    def _pid_is_running(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # The process exists but belongs to another user
+            return True
+        return True
+
+    @staticmethod
+    def _get_time_stamp():
+        return str(datetime.now()).split('.')[0]
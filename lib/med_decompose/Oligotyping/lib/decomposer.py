@@ -62,6 +62,9 @@ class Decomposer:
         self.skip_gexf_files = False
         self.skip_basic_analyses = False
         self.quick = False
+        self.store_npz_results = False
+        self.skip_text_results = False
+        self.memory_ceiling = None
          
         if args:
             self.alignment = args.alignment
@@ -89,6 +92,9 @@ class Decomposer:
             self.skip_gen_html = args.skip_gen_html
             self.skip_gexf_files = args.skip_gexf_files
             self.quick = args.quick
+            self.store_npz_results = args.store_npz_results
+            self.skip_text_results = args.skip_text_results
+            self.memory_ceiling = args.memory_ceiling
 
         self.decomposition_depth = -1
 
@@ -102,6 +108,14 @@ class Decomposer:
             self.skip_storing_final_nodes = True
             self.skip_gen_html = True
 
+        if self.skip_text_results and not self.store_npz_results:
+            raise utils.ConfigError("--skip-text-results requires --store-npz-results, otherwise no results\
+                                     would be stored.")
+
+        if self.skip_text_results and not (self.skip_gen_figures and self.skip_gen_html):
+            raise utils.ConfigError("Figures and HTML output are generated from the text results. Please use\
+                                     --skip-gen-figures and --skip-gen-html together with --skip-text-results.")
+
         # there is a difference between 'average read length' and 'alignment length',
         # therefore there are two different variables to keep that information. the first
         # one is the average length of reads when gaps are removed (if there are any):
@@ -136,6 +150,12 @@ class Decomposer:
         if self.number_of_threads:
             self.no_threading = False
 
+        if self.memory_ceiling:
+            # the nodes are processed and stored one at a time rather than in batches of forked
+            # processes, each of which would hold its own copy of the reads of its nodes.
+            self.no_threading = True
+            self.number_of_threads = None
+
     def check_apps(self):
         try:
             blast.LocalBLAST(None, None, None)
@@ -214,8 +234,22 @@ class Decomposer:
         self.progress.update('May take a while depending on the number of reads...')
 
         self.topology.nodes_output_directory = self.nodes_directory
-        
-        reads = utils.get_read_objects_from_file(self.alignment)
+
+        if self.memory_ceiling:
+            # read ids are by far the largest in-memory structure for deep data sets. they are spilled
+            # to disk whenever they and the unique sequences together reach the ceiling.
+            self.topology.memory_bounded = True
+            reads, unique_sequences_bytes = utils.get_read_objects_from_file_memory_bounded(
+                                                        self.alignment,
+                                                        os.path.join(self.tmp_directory, 'READ-IDS.spill'),
+                                                        self.memory_ceiling * 1024 * 1024)
+            if unique_sequences_bytes > self.memory_ceiling * 1024 * 1024:
+                # every node works on the unique sequences, so they cannot be spilled.
+                self.run.warning("The unique sequences alone take up about %d MB, which is more than the memory\
+                                  ceiling (%d MB). Only the read ids are being kept on disk."\
+                                            % (unique_sequences_bytes // (1024 * 1024), self.memory_ceiling))
+        else:
+            reads = utils.get_read_objects_from_file(self.alignment)
         
         self.root = self.topology.add_new_node('root', reads, root = True)
         
@@ -280,6 +314,9 @@ class Decomposer:
         self.run.info('root_alignment', self.alignment)
         self.run.info('sample_mapping', self.sample_mapping)
         self.run.info('quick', self.quick)
+        self.run.info('store_npz_results', self.store_npz_results)
+        self.run.info('skip_text_results', self.skip_text_results)
+        self.run.info('memory_ceiling', self.memory_ceiling)
         self.run.info('merge_homopolymer_splits', self.merge_homopolymer_splits)
         self.run.info('skip_removing_outliers', self.skip_removing_outliers)
         self.run.info('relocate_outliers', self.relocate_outliers)
@@ -339,14 +376,22 @@ class Decomposer:
         self._report_final_numbers()
          
         self._generate_ENVIRONMENT_file()
-        self._generate_MATRIX_files()
+
+        if not self.skip_text_results:
+            self._generate_MATRIX_files()
+
+        if self.store_npz_results:
+            self._store_npz_results()
 
         if not self.skip_storing_final_nodes:
             self._store_final_nodes()
 
         self._store_topology()
         self._store_all_outliers()
-        self._store_node_representatives()
+
+        if not self.skip_text_results:
+            self._store_node_representatives()
+
         self._store_read_distribution_table()
         
         if self.store_topology_dict:
@@ -1220,6 +1265,29 @@ class Decomposer:
         self.run.info('matrix_percent_file_path', self.matrix_percent_file_path)
 
 
+    def _store_npz_results(self):
+        # store the same information as MATRIX-COUNT.txt and NODE-REPRESENTATIVES.fasta in a single
+        # compressed archive so that downstream tools can read results without parsing text files.
+        self.progress.new('NPZ Results File')
+        self.progress.update('Being generated')
+
+        npz_results_file_path = self.generate_output_destination("MED-RESULTS.npz")
+
+        node_ids = self.topology.final_nodes
+        nodes = [self.topology.get_node(node_id) for node_id in node_ids]
+
+        numpy.savez_compressed(npz_results_file_path,
+                               node_ids = numpy.array(node_ids, dtype = str),
+                               node_sizes = numpy.array([node.size for node in nodes], dtype = numpy.int64),
+                               node_representatives = numpy.array([node.representative_seq for node in nodes], dtype = str),
+                               samples = numpy.array(self.samples, dtype = str),
+                               counts = numpy.array([self.unit_counts[sample] for sample in self.samples],
+                                                    dtype = numpy.int64).reshape(len(self.samples), len(node_ids)))
+
+        self.progress.end()
+        self.run.info('npz_results_file_path', npz_results_file_path)
+
+
     def _store_topology_dict(self):
         self.progress.new('Generating topology dict (lightweight)')
         topology_dict = {}
@@ -64,6 +64,19 @@ def entropy(l, l_qual = None, expected_qual_score = 40, amino_acid_sequences = F
         return -(sum(E_Cs))
 
 
+def entropy_from_counts(char_counts, total, amino_acid_sequences = False):
+    # identical to entropy() for a column with no quality scores, but works from
+    # character counts so the column itself never has to be built in memory.
+    valid_chars = VALID_CHARS['amino_acid'] if amino_acid_sequences else VALID_CHARS['nucleotide']
+
+    E_Cs = []
+    for char in valid_chars:
+        P_C = (char_counts.get(char, 0) * 1.0 / total) + 0.0000000000000000001
+        E_Cs.append(P_C * log(P_C))
+
+    return -(sum(E_Cs))
+
+
 def entropy_analysis(alignment_path, output_file = None, verbose = True, uniqued = False, freq_from_defline = None, weighted = False, qual_stats_dict = None, amino_acid_sequences = False):
     if freq_from_defline == None:
         freq_from_defline = lambda x: int([t.split(':')[1] for t in x.split('|') if t.startswith('freq')][0])
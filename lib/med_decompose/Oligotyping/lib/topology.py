@@ -15,6 +15,7 @@ import operator
 
 from Oligotyping.lib import fastalib as u
 from Oligotyping.lib.entropy import entropy
+from Oligotyping.lib.entropy import entropy_from_counts
 from Oligotyping.utils.utils import ConfigError
 
 class Topology:
@@ -40,6 +41,10 @@ class Topology:
 
         self.logger = None
 
+        # when set, nodes compute entropy from per position character counts
+        # instead of building every column of the alignment in memory.
+        self.memory_bounded = False
+
 
     def get_new_node_id(self):
         if not self.next_available_node_id:
@@ -57,6 +62,7 @@ class Topology:
             raise ConfigError("Nodes output directory has to be declared before adding new nodes")
 
         node = Node(node_id, self.nodes_output_directory)
+        node.memory_bounded = self.memory_bounded
 
         node.reads = unique_read_objects_list
         node.size = sum([read.frequency for read in node.reads])
@@ -317,6 +323,7 @@ class Node:
         self.file_path_prefix   = os.path.join(output_directory, node_id)
         self.alignment_path     = self.file_path_prefix + '.fa'
         self.unique_alignment_path = self.file_path_prefix + '.unique'
+        self.memory_bounded     = False
 
 
     def __str__(self):
@@ -331,12 +338,23 @@ class Node:
     def do_entropy(self):
         self.entropy_tpls = []
         for position in range(0, len(self.representative_seq)):
-            column = ''.join([read.seq[position] * read.frequency for read in self.reads])
+            if self.memory_bounded:
+                char_counts = {}
+                for read in self.reads:
+                    char = read.seq[position]
+                    char_counts[char] = char_counts.get(char, 0) + read.frequency
+                num_chars = len(char_counts)
+            else:
+                column = ''.join([read.seq[position] * read.frequency for read in self.reads])
+                num_chars = len(set(column))
             
-            if len(set(column)) == 1:
+            if num_chars == 1:
                 self.entropy_tpls.append((position, 0.0),)
             else:
-                e = entropy(column)
+                if self.memory_bounded:
+                    e = entropy_from_counts(char_counts, sum(char_counts.values()))
+                else:
+                    e = entropy(column)
 
                 if e < 0.00001:
                     self.entropy_tpls.append((position, 0.0),)
@@ -101,6 +101,21 @@ def decomposer():
                         help = 'When set, the pipeline will do only the essential steps, skipping anything\
                                 auxiliary, even if other parameters require otherwise. Please do not use it other than\
                                 benchmarking or testing purposes')
+    parser.add_argument('-Z', '--memory-ceiling', type=int, default=None, metavar = "INTEGER",
+                        help = 'Memory ceiling in megabytes. When set, decomposer runs in a memory-bounded mode\
+                                for very deep data sets: read ids are spilled to a file in the TMP directory once\
+                                they and the unique sequences together reach this value, node entropy is computed\
+                                from character counts rather than from full alignment columns and nodes are\
+                                processed one at a time (as with --no-threading). The unique sequences are always\
+                                held in memory. Node outputs are identical to the default mode.')
+    parser.add_argument('--store-npz-results', action = 'store_true', default = False,
+                        help = 'When set, node names, node sizes, node representative sequences and the sample by\
+                                node count matrix will also be stored in a single compressed NumPy archive\
+                                (MED-RESULTS.npz) that can be loaded without parsing the text outputs.')
+    parser.add_argument('--skip-text-results', action = 'store_true', default = False,
+                        help = 'When set, MATRIX-COUNT.txt, MATRIX-PERCENT.txt and NODE-REPRESENTATIVES.fasta will\
+                                not be generated. Can only be used together with --store-npz-results,\
+                                --skip-gen-figures and --skip-gen-html.')
     parser.add_argument('--version', action = 'store_true', default = False,
                         help = 'Print version and exit.')    
 
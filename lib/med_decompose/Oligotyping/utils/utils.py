@@ -1268,6 +1268,44 @@ def get_read_objects_from_file(input_file_path):
     return read_objects
 
 
+def get_read_objects_from_file_memory_bounded(input_file_path, spill_file_path, memory_ceiling_bytes):
+    # this function returns the same read objects as get_read_objects_from_file, in
+    # the same order, but read ids (which is where the memory goes when there are
+    # millions of reads) are kept in a file on disk rather than in memory. the unique
+    # sequences, which every node of the topology works on, are kept in memory and
+    # are counted against the ceiling. the read objects are returned together with
+    # the number of bytes that the unique sequences are estimated to take up.
+    input_fasta = u.SequenceSource(input_file_path)
+    read_id_store = ReadIdSpillStore(spill_file_path, memory_ceiling_bytes)
+    # keyed by the sequence itself rather than by a hash of it, so that each unique
+    # sequence is held once: [count, first read id]
+    unique_seq_dict = {}
+
+    while next(input_fasta):
+        seq = input_fasta.seq.upper()
+        if seq in unique_seq_dict:
+            unique_seq_dict[seq][0] += 1
+        else:
+            unique_seq_dict[seq] = [1, input_fasta.id]
+            read_id_store.add_resident_bytes(len(seq) + len(input_fasta.id) +\
+                                             ReadIdSpillStore.BYTES_PER_UNIQUE_OVERHEAD)
+        read_id_store.add(seq, input_fasta.id)
+
+    input_fasta.close()
+    read_id_store.close()
+
+    # same ordering as SequenceSource with unique = True (count, then sha1 of the sequence)
+    unique_seq_list = sorted(unique_seq_dict, reverse = True,
+                             key = lambda seq: (unique_seq_dict[seq][0], hashlib.sha1(seq.encode('utf-8')).hexdigest()))
+
+    read_objects = []
+    for seq in unique_seq_list:
+        count, first_id = unique_seq_dict.pop(seq)
+        read_objects.append(UniqueFASTAEntry(seq, SpilledReadIds(read_id_store, seq, first_id, count)))
+
+    return read_objects, read_id_store.resident_bytes
+
+
 def split_fasta_file(input_file_path, dest_dir, prefix = 'part', num_reads_per_file = 5000):
     input_fasta = u.SequenceSource(input_file_path)
     
@@ -1372,6 +1410,137 @@ class Multiprocessing:
             time.sleep(1)
 
 
+class ReadIdSpillStore:
+    """Read ids of unique sequences are buffered in memory and, once the buffers and the
+       unique sequences (resident_bytes) together get larger than max_bytes, appended to a
+       file on disk. The chunks of each key form a linked list on disk: every chunk starts
+       with a header that holds the offset of the next chunk of the same key, which is
+       patched in when that chunk is written. Only the offsets of the first and the last
+       chunk of each key are held in memory, however many times the buffers are flushed,
+       and ids come back in the order they were added."""
+    # rough per-id overhead of a str object and its list pointer
+    BYTES_PER_ID_OVERHEAD = 57
+    # rough per-unique-sequence overhead of its str objects, its dict entry and its read object
+    BYTES_PER_UNIQUE_OVERHEAD = 400
+    # flushing more often than this would cost a write per key for only a few ids
+    MIN_BUFFERED_BYTES = 1024 * 1024
+    # offset of the next chunk of the same key (0 for the last chunk) and length of the chunk
+    CHUNK_HEADER = struct.Struct('<QI')
+    NEXT_OFFSET = struct.Struct('<Q')
+
+    def __init__(self, spill_file_path, max_bytes):
+        self.spill_file_path = spill_file_path
+        self.max_bytes = max_bytes
+        self.buffers = {}
+        # key: (offset of the first chunk, offset of the last chunk)
+        self.chunk_offsets = {}
+        self.buffered_bytes = 0
+        self.resident_bytes = 0
+        self.spill_file_obj = open(self.spill_file_path, 'w+b')
+        # a single handle is used to read the ids back. it is reopened by a forked
+        # process as a forked handle would share its file position with the parent.
+        self.read_file_obj = None
+        self.read_file_pid = None
+
+
+    def add_resident_bytes(self, num_bytes):
+        self.resident_bytes += num_bytes
+
+
+    def add(self, key, read_id):
+        if key in self.buffers:
+            self.buffers[key].append(read_id)
+        else:
+            self.buffers[key] = [read_id]
+
+        self.buffered_bytes += len(read_id) + self.BYTES_PER_ID_OVERHEAD
+
+        if self.buffered_bytes > max(self.MIN_BUFFERED_BYTES, self.max_bytes - self.resident_bytes):
+            self.flush()
+
+
+    def flush(self):
+        for key in self.buffers:
+            data = ('\n'.join(self.buffers[key]) + '\n').encode('utf-8')
+            offset = self.spill_file_obj.seek(0, os.SEEK_END)
+            self.spill_file_obj.write(self.CHUNK_HEADER.pack(0, len(data)))
+            self.spill_file_obj.write(data)
+
+            if key in self.chunk_offsets:
+                # link the last chunk of the key to this one. no chunk is written at offset 0
+                # other than the first, so a next offset of 0 marks the last chunk.
+                first_offset, last_offset = self.chunk_offsets[key]
+                self.spill_file_obj.seek(last_offset)
+                self.spill_file_obj.write(self.NEXT_OFFSET.pack(offset))
+                self.chunk_offsets[key] = (first_offset, offset)
+            else:
+                self.chunk_offsets[key] = (offset, offset)
+
+        self.buffers = {}
+        self.buffered_bytes = 0
+
+
+    def close(self):
+        self.flush()
+        self.spill_file_obj.close()
+        self.spill_file_obj = None
+
+
+    def _get_read_file_obj(self):
+        if self.read_file_obj is None or self.read_file_pid != os.getpid():
+            self.read_file_obj = open(self.spill_file_path, 'rb')
+            self.read_file_pid = os.getpid()
+        return self.read_file_obj
+
+
+    def iter_ids(self, key):
+        # only one chunk is in memory at any given time. the position is set before every
+        # read so that several keys can be iterated at once.
+        read_file_obj = self._get_read_file_obj()
+        offset = self.chunk_offsets[key][0]
+        while True:
+            read_file_obj.seek(offset)
+            next_offset, length = self.CHUNK_HEADER.unpack(read_file_obj.read(self.CHUNK_HEADER.size))
+            for read_id in read_file_obj.read(length).decode('utf-8').split('\n')[:-1]:
+                yield read_id
+
+            if not next_offset:
+                break
+            offset = next_offset
+
+
+class SpilledReadIds:
+    """Stands in for the list of read ids of a UniqueFASTAEntry when ids are kept on disk."""
+    def __init__(self, read_id_store, key, first_id, count):
+        self.read_id_store = read_id_store
+        self.key = key
+        self.first_id = first_id
+        self.count = count
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __iter__(self):
+        return self.read_id_store.iter_ids(self.key)
+
+
+    def __getitem__(self, index):
+        if index == 0:
+            return self.first_id
+
+        if index < 0:
+            index += self.count
+
+        if index < 0 or index >= self.count:
+            raise IndexError('read id index out of range')
+
+        for i, read_id in enumerate(self):
+            if i == index:
+                return read_id
+
+
 class UniqueFASTAEntry:
     def __init__(self, seq, ids):
         self.seq = seq
@@ -49,22 +49,58 @@ if sp_config.system_type == 'remote':
     import requests
     import re
 import data_analysis
-from general import ThreadSafeGeneral
+from general import ThreadSafeGeneral, ResultQueueWorkerPool, AutoConcurrencySelector
 from django_general import CreateStudyAndAssociateUsers
 import django_general
+from resource_estimation import StageProfiler, RuntimeResourceEstimator, get_data_analysis_work_units
+from job_queue import JobQueue
+from symportal_daemon import SymPortalDaemonServer, get_socket_path
 from shutil import which
 import time
 import subprocess
 import json
 from django.core.exceptions import ObjectDoesNotExist
 import logging
+import traceback
+from django import db
 
 class SymPortalWorkFlowManager:
-    def __init__(self, custom_args_list=None):
+    # The seconds between the checks for new jobs of a job queue worker whose queue is empty
+    job_queue_poll_interval = 10
+
+    def __init__(self, custom_args_list=None, worker_pool=None):
         self.start_time = time.time()
+        self.custom_args_list = custom_args_list
         self.args = self._define_args(custom_args_list)
+        # Local installations apply a managed SQLite performance profile to each database connection
+        # (see django_general.SQLitePerformanceProfile). It can be turned off in sp_config.
+        if sp_config.system_type == 'local' and getattr(sp_config, 'sqlite_performance_profile', True):
+            django_general.SQLitePerformanceProfile().connect()
         # general attributes
         self.thread_safe_general = ThreadSafeGeneral()
+        # With --num_proc auto the worker pool is sized to the available cores and the number of workers of each
+        # parallel stage is selected by the AutoConcurrencySelector (see _select_num_proc_for_stage).
+        self.auto_concurrency_selector = None
+        if self.args.num_proc == 'auto':
+            self.auto_concurrency_selector = AutoConcurrencySelector()
+            self.args.num_proc = self.auto_concurrency_selector.available_cores
+        # Started at the first parallel stage of the run and then shared by all of the parallel stages
+        # of the data loading, data analysis and output generation. Closed at the end of start_work_flow.
+        # When given (by a job queue worker), the pool is shared by the jobs of the worker and is closed by it.
+        # Each worker loads the read only reference data of the run once, when it starts
+        # (see data_loading.initialize_pool_worker).
+        if worker_pool is None:
+            self.worker_pool = ResultQueueWorkerPool(
+                num_proc=self.args.num_proc, multiprocess=self.args.multiprocess, persistent=True,
+                initializer=data_loading.initialize_pool_worker,
+                initargs=(self._get_path_to_symclade_db_of_pool_workers(),))
+            self.close_worker_pool = True
+        else:
+            self.worker_pool = worker_pool
+            self.close_worker_pool = False
+        if self.auto_concurrency_selector is not None:
+            # The peak memory of the tasks of each stage is reported by the workers of the pool
+            self.auto_concurrency_selector.worker_pool = self.worker_pool
         self.symportal_root_directory = os.path.abspath(os.path.dirname(__file__))
         self.dbbackup_dir = os.path.join(self.symportal_root_directory, 'dbBackUp')
         os.makedirs(self.dbbackup_dir, exist_ok=True)
@@ -104,6 +140,18 @@ class SymPortalWorkFlowManager:
         self.unifrac_distance_object = None
         self.braycurtis_distance_object = None
 
+    def _select_num_proc_for_stage(self, stage):
+        if self.auto_concurrency_selector is None:
+            return self.args.num_proc
+        return self.auto_concurrency_selector.select_num_proc(stage=stage)
+
+    def _get_path_to_symclade_db_of_pool_workers(self):
+        """The symClade database whose k-mer pre-classifier is built by each pool worker when it starts.
+        None unless the k-mer pre-classifier is being used."""
+        if self.args.kmer_preclassifier or self.args.kmer_preclassifier_validation:
+            return os.path.join(os.path.abspath(os.path.dirname(__file__)), 'symbiodiniaceaeDB', 'symClade.fa')
+        return None
+
     def _redefine_arg_analyse(self):
         """When the user passes the argument --analyse_next then we will find the UIDs
         that were used for the previous analysis and append the passed UIDs to them
@@ -132,9 +180,22 @@ class SymPortalWorkFlowManager:
         else:
             return parser.parse_args()
 
+    @staticmethod
+    def _num_proc_type(num_proc):
+        if num_proc == 'auto':
+            return num_proc
+        try:
+            return int(num_proc)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'--num_proc must be an integer or auto, not {num_proc}')
+
     @staticmethod
     def _define_additional_args(parser):
-        parser.add_argument('--num_proc', type=int, help='Number of processors to use', default=1)
+        parser.add_argument(
+            '--num_proc', type=SymPortalWorkFlowManager._num_proc_type,
+            help='Number of processors to use. If auto, the number of processors used by each of the parallel '
+                 'stages of the data loading and of the sequence count table outputs is selected from the available '
+                 'cores and memory and the measured memory footprint of the stage\'s tasks. [1]', default=1)
         parser.add_argument('--name', help='A name for your input or analysis', default='noName')
         parser.add_argument('--description', help='An optional description', default='No description')
         parser.add_argument('--data_analysis_id', type=int, help='The ID of the data_analysis you wish to output from')
@@ -183,6 +244,108 @@ class SymPortalWorkFlowManager:
         parser.add_argument('--multiprocess', help="When passed, concurrency will be acheived using "
                                                    "multiprocessing rather than multithreading.",
                             action='store_true', default=False)
+        parser.add_argument('--single_mothur_batch',
+                            help="When passed, the initial mothur QC of each sample will be run as three "
+                                 "mothur batch files rather than with a mothur process per mothur command. "
+                                 "The QC is otherwise the same. "
+                                 "[False]", action='store_true', default=False)
+        parser.add_argument('--use_qc_cache',
+                            help="When passed, the results of the initial mothur QC of each sample will be cached "
+                                 "in SymPortal's qc_cache directory, keyed by the contents of the sample's fastq "
+                                 "files and the QC parameters. Samples whose results are already cached will "
+                                 "not be QCed again. [False]", action='store_true', default=False)
+        parser.add_argument('--lazy_input_staging',
+                            help="When passed, the fastq files will not be copied to the temporary working "
+                                 "directory before the QC starts. Instead each sample's (compressed) fastq files "
+                                 "are read by mothur directly from where they were supplied. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--release_intermediates',
+                            help="When passed, the intermediate files of each sample will be removed from the "
+                                 "temporary working directory as soon as no later stage of the loading needs "
+                                 "them, rather than all being removed at the end of the loading. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--temp_disk_budget', type=float,
+                            help="The number of GB that the temporary working directory may occupy. While the "
+                                 "directory is larger than this, no new samples will be started in the initial QC. "
+                                 "Implies --release_intermediates. [None]", default=None)
+        parser.add_argument('--deduplicated_blast_screening',
+                            help="When passed, the sequences of all samples will be BLASTed against the symClade "
+                                 "database together, so that each unique sequence is only BLASTed once, rather "
+                                 "than BLASTing the sequences of each sample separately. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--use_blast_cache',
+                            help="When passed, the results of BLASTing sequences against the symClade database "
+                                 "will be cached in SymPortal's blast_cache directory, keyed by the sequence and "
+                                 "the version of the symClade database. Only sequences without cached results will "
+                                 "be BLASTed. Requires --deduplicated_blast_screening. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--incremental_symclade_updates',
+                            help="When passed, the Symbiodiniaceae sequences confirmed during the sub e value "
+                                 "screening will be held in a small secondary BLAST database that is searched "
+                                 "alongside symClade. Each screening iteration then only BLASTs the still "
+                                 "unresolved sequences against this secondary database. symClade is updated "
+                                 "once the screening is complete. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--kmer_preclassifier',
+                            help="When passed, sequences will first be classified using a k-mer based classifier "
+                                 "built from the symClade database. Sequences confidently assigned to a clade, or "
+                                 "confidently rejected as non-Symbiodiniaceae, will not be BLASTed against symClade. "
+                                 "[False]", action='store_true', default=False)
+        parser.add_argument('--kmer_preclassifier_validation',
+                            help="When passed, all sequences will be BLASTed against symClade as normal and the "
+                                 "concordance of the k-mer based classifier with the BLAST results "
+                                 "will be reported. [False]", action='store_true', default=False)
+        parser.add_argument('--sub_evalue_screening_db', metavar='path_to_blast_db',
+                            help="The nucleotide BLAST database (or a fasta file from which one will be made) "
+                                 "to screen the sub e value sequences against in place of NCBI's nt. "
+                                 "When passed, the sub e value screening is also performed on local systems. "
+                                 "A small stand-in for testing is provided at "
+                                 "tests/data/sub_evalue_screening_db/nt_stand_in.fa. [None]", default=None)
+        parser.add_argument('--sub_evalue_verdict_cache',
+                            help="When passed, whether each sub e value sequence was found to be "
+                                 "Symbiodiniaceae is cached in SymPortal's sub_evalue_verdict_cache directory "
+                                 "for the database screened against so that the sequence is not searched for "
+                                 "again in later loadings. [False]", action='store_true', default=False)
+        parser.add_argument('--streaming_pipeline',
+                            help="When passed, the samples are taken through the initial QC, taxonomic screening "
+                                 "and MED as a per sample pipeline so that each sample advances to its next stage "
+                                 "as soon as its previous stage is complete rather than waiting for all samples "
+                                 "to complete the stage. If the sub e value sequences are being screened, "
+                                 "the screening is performed once all samples have been QCed. The first BLAST "
+                                 "against symClade is then made per sample, without --deduplicated_blast_screening "
+                                 "or --use_blast_cache. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--resume', metavar='DataSet UID', type=int,
+                            help="Resume the interrupted loading of the DataSet with the given UID. Pass the same "
+                                 "arguments (e.g. --load and --data_sheet) as the original loading. Stages and "
+                                 "samples that were completed, and whose intermediate files can be verified, "
+                                 "will not be performed again. [None]", default=None)
+        parser.add_argument('--db_writer_process',
+                            help="When passed, the sample attributes collected from the parallel stages of the "
+                                 "data loading, and the ReferenceSequences, DataSetSampleSequences and pre-MED "
+                                 "sequences created in bulk, are written to the database by a single dedicated "
+                                 "writer process that commits them in batched transactions. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--dry_run',
+                            help="When passed with --load or --analyse, nothing is loaded or analysed. Instead the "
+                                 "time, peak memory, database growth and temp disk use of each stage are estimated "
+                                 "from the input fastq files (--load) or the DataSets to be analysed (--analyse) "
+                                 "using models calibrated with the stage profiles of previous loadings and "
+                                 "analyses. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--queue_job',
+                            help="When passed, rather than being run, the command (e.g. a --load, --analyse or "
+                                 "output) is added to the local job queue to be run by a job queue worker "
+                                 "(see --job_queue_worker). [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--exit_when_job_queue_empty',
+                            help="When passed with --job_queue_worker, the worker exits once the job queue is "
+                                 "empty rather than waiting for new jobs. [False]",
+                            action='store_true', default=False)
+        parser.add_argument('--daemon_socket',
+                            help="The path of the Unix socket that the daemon (see --daemon) listens on. The client "
+                                 "takes the path from the SYMPORTAL_DAEMON_SOCKET environment variable. "
+                                 "[symportal.sock in the SymPortal root]", default=None)
         parser.add_argument('--force_basal_lineage_separation',
                             help="When passed, cladocopium profiles sequences from the C3, C15 and C1 radiations "
                                  "will not be allowed to occur together in profiles.",
@@ -287,6 +450,22 @@ class SymPortalWorkFlowManager:
             '--between_sample_distances_sample_set', metavar='DataSetSample UIDs',
             help='Use this function to output pairwise distances between samples clade '
                  'separated from a given collection of DataSetSample objects')
+        group.add_argument(
+            '--job_queue_worker', action='store_true',
+            help='Run the jobs that have been added to the local job queue (using --queue_job) one after the other. '
+                 'The jobs are run in this process so that each job does not pay for the start up of SymPortal. '
+                 'The worker pool of the worker (see --num_proc and --multiprocess) is shared by its jobs. '
+                 'Several workers can be run at once. The worker waits for new jobs when the queue is empty '
+                 '(see --exit_when_job_queue_empty).')
+        group.add_argument(
+            '--daemon', action='store_true',
+            help='Run SymPortal as a daemon that keeps Django and the SymPortal modules loaded and runs the commands '
+                 'it is sent over a Unix socket (see --daemon_socket). Send a command by giving the arguments that '
+                 'would otherwise be given to main.py to the client, e.g.: '
+                 'python3 symportal_daemon.py --display_data_sets')
+        group.add_argument(
+            '--display_job_queue', action='store_true',
+            help='Display the jobs of the local job queue with their status and timings')
         group.add_argument(
             '--vacuum_database', action='store_true',
             help='Vacuuming the database will free up memory from objects that have been deleted recently')
@@ -303,7 +482,22 @@ class SymPortalWorkFlowManager:
             help='Output version')
 
     def start_work_flow(self):
-        if self.args.load:
+        try:
+            self._start_work_flow()
+        finally:
+            if self.close_worker_pool:
+                self.worker_pool.close()
+
+    def _start_work_flow(self):
+        if self.args.queue_job:
+            self.submit_job_to_job_queue()
+        elif self.args.job_queue_worker:
+            self.perform_job_queue_worker()
+        elif self.args.daemon:
+            self.perform_daemon()
+        elif self.args.dry_run:
+            self.perform_dry_run()
+        elif self.args.load:
             self.perform_data_loading()
         elif self.args.analyse:
             self._perform_data_analysis()
@@ -360,6 +554,9 @@ class SymPortalWorkFlowManager:
         elif self.args.vacuum_database:
             self.perform_vacuum_database()
             return True
+        elif self.args.display_job_queue:
+            JobQueue(symportal_root_directory=self.symportal_root_directory).display_jobs()
+            return True
         elif self.args.version:
             print(__version__)
             return True
@@ -456,14 +653,21 @@ class SymPortalWorkFlowManager:
         self.output_dir = os.path.join(
             self.symportal_root_directory, 'outputs', 'analyses', str(self.data_analysis_object.id), self.date_time_str)
         self._set_html_dir_and_js_out_path_from_output_dir()
+        # Records the time and resources of each stage to calibrate the RuntimeResourceEstimator (--dry_run)
+        stage_profiler = StageProfiler(
+            symportal_root_directory=self.symportal_root_directory, worker_pool=self.worker_pool)
+        stage_profiler.start_stage('data_analysis')
         self._start_data_analysis()
+        stage_profiler.end_stage(num_proc=1)
 
         if not self.args.no_output:
+            stage_profiler.start_stage('data_analysis_outputs')
             self._do_data_analysis_output()
             if not self.args.no_ordinations:
                 self._do_data_analysis_ordinations()
             else:
                 print('Ordinations skipped at user\'s request')
+            stage_profiler.end_stage(num_proc=self.args.num_proc)
 
             # here output the js_output_path item for the DataExplorer
             self._output_js_output_path_dict()
@@ -472,6 +676,8 @@ class SymPortalWorkFlowManager:
         else:
             print('\nOutputs skipped at user\'s request\n')
             self._print_analysis_obj_attributes()
+        stage_profiler.write_stage_profiles(work_units_dict=get_data_analysis_work_units(
+            list_of_data_set_uids=[int(uid) for uid in self.data_analysis_object.list_of_data_set_uids.split(',')]))
 
     def _print_analysis_obj_attributes(self):
         try:
@@ -630,7 +836,7 @@ class SymPortalWorkFlowManager:
 
     def _make_data_analysis_output_seq_tables(self):
         self.output_seq_count_table_obj = output.SequenceCountTableCreator(
-            num_proc=self.args.num_proc,
+            num_proc=self._select_num_proc_for_stage(stage='seq_count_table_output'),
             symportal_root_dir=self.symportal_root_directory,
             no_pre_med_seqs=self.args.no_pre_med_seqs,
             ds_uids_output_str=self.data_analysis_object.list_of_data_set_uids,
@@ -639,7 +845,7 @@ class SymPortalWorkFlowManager:
             analysis_obj=self.data_analysis_object,
             date_time_str=self.date_time_str,
             html_dir=self.html_dir, js_output_path_dict=self.js_output_path_dict, multiprocess=self.args.multiprocess,
-            call_type='analysis')
+            worker_pool=self.worker_pool, call_type='analysis')
         self.output_seq_count_table_obj.make_seq_output_tables()
 
     def _make_data_analysis_output_type_tables(self):
@@ -662,18 +868,151 @@ class SymPortalWorkFlowManager:
         self.data_analysis_object.description = self.args.description
         self.data_analysis_object.save()
 
+    # JOB QUEUE
+    def submit_job_to_job_queue(self):
+        args_list = self.custom_args_list if self.custom_args_list is not None else sys.argv[1:]
+        args_list = [arg for arg in args_list if arg != '--queue_job']
+        # The parsed args also cover an abbreviated argument e.g. --job_queue_w
+        if self.args.job_queue_worker or self.args.daemon or JobQueue.get_unqueueable_args(args_list):
+            sys.exit('--job_queue_worker and --daemon cannot be used with --queue_job')
+        job_id = JobQueue(symportal_root_directory=self.symportal_root_directory).submit_job(
+            args_list=args_list, working_directory=os.getcwd())
+        print(f'Job {job_id} added to the job queue: {" ".join(args_list)}')
+
+    def perform_job_queue_worker(self):
+        """Run the queued jobs one after the other, each as a SymPortalWorkFlowManager in this process.
+        The Django set up, the imported modules, the reference data cached by this process (see
+        django_general.ReferenceSequenceCache) and this process's worker pool are reused by each job. The worker
+        processes of the pool are restarted by a job with a different working directory (see
+        ResultQueueWorkerPool.start).
+        A job that raises an exception (or exits) is recorded as failed and the worker moves on to the next job.
+        """
+        job_queue = JobQueue(symportal_root_directory=self.symportal_root_directory)
+        job_queue.fail_jobs_of_exited_workers()
+        worker_working_directory = os.getcwd()
+        print(f'Job queue worker started (pid {os.getpid()})')
+        while True:
+            job = job_queue.claim_next_job(worker_pid=os.getpid())
+            if job is None:
+                if self.args.exit_when_job_queue_empty:
+                    print('The job queue is empty. Exiting.')
+                    return
+                time.sleep(self.job_queue_poll_interval)
+                continue
+            job_id, args_list, working_directory = job
+            print(f'\n\nStarting job {job_id}: {" ".join(args_list)}')
+            job_start_time = time.time()
+            error = None
+            try:
+                os.chdir(working_directory)
+                SymPortalWorkFlowManager(custom_args_list=args_list, worker_pool=self.worker_pool).start_work_flow()
+            except (Exception, SystemExit):
+                error = traceback.format_exc()
+                print(f'\n\nJob {job_id} failed:\n{error}')
+            finally:
+                os.chdir(worker_working_directory)
+                self._reset_after_job()
+            job_queue.record_job_end(job_id=job_id, seconds=time.time() - job_start_time, error=error)
+            print(f'\n\nJob {job_id} {"failed" if error else "complete"} in {time.time() - job_start_time:.0f}s')
+
+    @staticmethod
+    def _reset_after_job():
+        # The log handlers added by a data loading would otherwise also log the following jobs
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            root_logger.removeHandler(handler)
+            handler.close()
+        db.connections.close_all()
+
+    # DAEMON
+    def perform_daemon(self):
+        """Run the commands received over the daemon's Unix socket, each in a child process forked from this one
+        (see symportal_daemon.SymPortalDaemonServer), so that they start with Django set up and the
+        SymPortal modules imported. The database connections are closed before each fork so that the
+        children do not share them."""
+        # Warm up the database connection, e.g. so that a missing database is reported now rather than by a command
+        DataSet.objects.exists()
+        # Load the reference data that the commands would otherwise each load: the ReferenceSequences (and their
+        # clades) used by the loadings and by the workers of the pools of the commands, and the clade k-mer sets
+        # of symClade. The forked commands only reload what has changed since (see django_general.WorkerReferenceData
+        # and django_general.ReferenceSequenceCache).
+        print('Loading the reference sequences')
+        django_general.ReferenceSequenceCache.update()
+        data_loading.initialize_pool_worker(path_to_symclade_db=os.path.join(
+            self.symportal_root_directory, 'symbiodiniaceaeDB', 'symClade.fa'))
+        daemon_server = SymPortalDaemonServer(
+            socket_path=self.args.daemon_socket or get_socket_path(), run_command=self._run_daemon_command,
+            before_fork=db.connections.close_all, check_command=self._check_daemon_command)
+        daemon_server.serve_forever()
+
+    @staticmethod
+    def _check_daemon_command(args_list):
+        """The error message of a command that cannot be run by the daemon, or None. As for the job queue, a
+        job queue worker would poll for jobs for ever and a daemon could not bind the socket of this daemon."""
+        unqueueable_args = JobQueue.get_unqueueable_args(args_list)
+        if unqueueable_args:
+            return f'{", ".join(unqueueable_args)} cannot be run as a command of the SymPortal daemon'
+        return None
+
+    @staticmethod
+    def _run_daemon_command(args_list):
+        work_flow_manager = SymPortalWorkFlowManager(custom_args_list=args_list)
+        # The parsed args also cover an abbreviated argument e.g. --job_queue_w
+        if work_flow_manager.args.job_queue_worker or work_flow_manager.args.daemon:
+            sys.exit('--job_queue_worker and --daemon cannot be run as a command of the SymPortal daemon')
+        work_flow_manager.start_work_flow()
+
+    # DRY RUN
+    def perform_dry_run(self):
+        runtime_resource_estimator = RuntimeResourceEstimator(
+            symportal_root_directory=self.symportal_root_directory, num_proc=self.args.num_proc)
+        if self.args.load:
+            runtime_resource_estimator.estimate_data_loading(
+                user_input_path=self.args.load, streaming_pipeline=self.args.streaming_pipeline,
+                no_pre_med_seqs=self.args.no_pre_med_seqs, no_output=self.args.no_output)
+        elif self.args.analyse:
+            runtime_resource_estimator.estimate_data_analysis(
+                list_of_data_set_uids=[int(uid) for uid in self.args.analyse.split(',')],
+                no_output=self.args.no_output)
+        else:
+            sys.exit('--dry_run can only be used with --load or --analyse')
+
     # DATA LOADING
     def perform_data_loading(self):
         self._verify_name_arg_given_load()
+        self._verify_blast_screening_args()
         self._execute_data_loading()
 
+    def _verify_blast_screening_args(self):
+        # The BLAST cache is only used by the deduplicated BLAST screening
+        if self.args.use_blast_cache and not self.args.deduplicated_blast_screening:
+            sys.exit('--use_blast_cache can only be used with --deduplicated_blast_screening')
+        if self.args.streaming_pipeline and self.args.deduplicated_blast_screening:
+            # In the streaming pipeline each sample is BLASTed against symClade by its own worker
+            print('WARNING: with --streaming_pipeline the samples are BLASTed against symClade one at a time as '
+                  'they complete the QC. --deduplicated_blast_screening (and --use_blast_cache) only apply to the '
+                  'iterations of the sub e value screening after the first.')
+
     def _execute_data_loading(self):
         self.data_loading_object = data_loading.DataLoading(
             parent_work_flow_obj=self, datasheet_path=self.args.data_sheet, user_input_path=self.args.load,
             screen_sub_evalue=self.screen_sub_eval_bool, num_proc=self.args.num_proc, no_fig=self.args.no_figures,
             no_ord=self.args.no_ordinations, no_output=self.args.no_output, distance_method=self.args.distance_method,
             no_pre_med_seqs=self.args.no_pre_med_seqs, debug=self.args.debug, multiprocess=self.args.multiprocess,
-            start_time=self.start_time, date_time_str=self.date_time_str)
+            start_time=self.start_time, date_time_str=self.date_time_str,
+            single_mothur_batch=self.args.single_mothur_batch, use_qc_cache=self.args.use_qc_cache,
+            lazy_input_staging=self.args.lazy_input_staging, release_intermediates=self.args.release_intermediates,
+            temp_disk_budget=self.args.temp_disk_budget,
+            deduplicated_blast_screening=self.args.deduplicated_blast_screening,
+            use_blast_cache=self.args.use_blast_cache,
+            incremental_symclade_updates=self.args.incremental_symclade_updates,
+            kmer_preclassifier=self.args.kmer_preclassifier,
+            kmer_preclassifier_validation=self.args.kmer_preclassifier_validation,
+            sub_evalue_screening_db=self.args.sub_evalue_screening_db,
+            use_sub_evalue_verdict_cache=self.args.sub_evalue_verdict_cache,
+            streaming_pipeline=self.args.streaming_pipeline, resume_data_set_uid=self.args.resume,
+            database_writer_process=self.args.db_writer_process, worker_pool=self.worker_pool,
+            auto_concurrency_selector=self.auto_concurrency_selector)
         self.data_loading_object.load_data()
 
     def _verify_name_arg_given_load(self):
@@ -797,8 +1136,10 @@ class SymPortalWorkFlowManager:
             symportal_root_dir=self.symportal_root_directory, call_type='stand_alone',
             no_pre_med_seqs=self.args.no_pre_med_seqs,
             ds_uids_output_str=self.args.print_output_seqs,
-            num_proc=self.args.num_proc, output_dir=self.output_dir, date_time_str=self.date_time_str,
-            html_dir=self.html_dir, js_output_path_dict=self.js_output_path_dict, multiprocess=self.args.multiprocess)
+            num_proc=self._select_num_proc_for_stage(stage='seq_count_table_output'),
+            output_dir=self.output_dir, date_time_str=self.date_time_str,
+            html_dir=self.html_dir, js_output_path_dict=self.js_output_path_dict, multiprocess=self.args.multiprocess,
+            worker_pool=self.worker_pool)
         self.output_seq_count_table_obj.make_seq_output_tables()
 
     def _stand_alone_sequence_output_data_set_sample(self):
@@ -806,8 +1147,10 @@ class SymPortalWorkFlowManager:
             symportal_root_dir=self.symportal_root_directory, call_type='stand_alone',
             no_pre_med_seqs=self.args.no_pre_med_seqs,
             dss_uids_output_str=self.args.print_output_seqs_sample_set,
-            num_proc=self.args.num_proc, html_dir=self.html_dir, js_output_path_dict=self.js_output_path_dict,
-            output_dir=self.output_dir, date_time_str=self.date_time_str, multiprocess=self.args.multiprocess)
+            num_proc=self._select_num_proc_for_stage(stage='seq_count_table_output'),
+            html_dir=self.html_dir, js_output_path_dict=self.js_output_path_dict,
+            output_dir=self.output_dir, date_time_str=self.date_time_str, multiprocess=self.args.multiprocess,
+            worker_pool=self.worker_pool)
         self.output_seq_count_table_obj.make_seq_output_tables()
 
     # STAND_ALONE TYPE OUTPUT
@@ -902,7 +1245,7 @@ class SymPortalWorkFlowManager:
     def _stand_alone_seq_output_from_type_output_data_set(self):
         self.output_seq_count_table_obj = output.SequenceCountTableCreator(
             call_type='analysis',
-            num_proc=self.args.num_proc,
+            num_proc=self._select_num_proc_for_stage(stage='seq_count_table_output'),
             symportal_root_dir=self.symportal_root_directory,
             no_pre_med_seqs=self.args.no_pre_med_seqs,
             ds_uids_output_str=self.args.print_output_types,
@@ -910,13 +1253,13 @@ class SymPortalWorkFlowManager:
             sorted_sample_uid_list=self.output_type_count_table_obj.sorted_list_of_vdss_uids_to_output,
             analysis_obj=self.data_analysis_object,
             date_time_str=self.date_time_str, html_dir=self.html_dir, js_output_path_dict=self.js_output_path_dict,
-            multiprocess=self.args.multiprocess)
+            multiprocess=self.args.multiprocess, worker_pool=self.worker_pool)
         self.output_seq_count_table_obj.make_seq_output_tables()
 
     def _stand_alone_seq_output_from_type_output_data_set_sample(self):
         self.output_seq_count_table_obj = output.SequenceCountTableCreator(
             call_type='analysis',
-            num_proc=self.args.num_proc,
+            num_proc=self._select_num_proc_for_stage(stage='seq_count_table_output'),
             symportal_root_dir=self.symportal_root_directory,
             no_pre_med_seqs=self.args.no_pre_med_seqs,
             dss_uids_output_str=self.args.print_output_types_sample_set,
@@ -924,7 +1267,7 @@ class SymPortalWorkFlowManager:
             sorted_sample_uid_list=self.output_type_count_table_obj.sorted_list_of_vdss_uids_to_output,
             analysis_obj=self.data_analysis_object,
             date_time_str=self.date_time_str, html_dir=self.html_dir, js_output_path_dict=self.js_output_path_dict,
-            multiprocess=self.args.multiprocess)
+            multiprocess=self.args.multiprocess, worker_pool=self.worker_pool)
         self.output_seq_count_table_obj.make_seq_output_tables()
 
     def _stand_alone_type_output_data_set(self):
@@ -1,8 +1,5 @@
 from dbApp.models import (DataSet, ReferenceSequence, DataSetSampleSequence, AnalysisType, DataSetSample,
                           DataAnalysis, DataSetSampleSequencePM, CladeCollectionType)
-from multiprocessing import Queue as mp_Queue, Process, Manager, Lock as mp_Lock
-from queue import Queue as mt_Queue
-from threading import Thread, Lock as mt_Lock
 import sys
 from django import db
 import os
@@ -12,7 +9,8 @@ import pandas as pd
 import numpy as np
 import sp_config
 import virtual_objects
-from general import ThreadSafeGeneral
+from general import ThreadSafeGeneral, ResultQueueWorkerPool
+from django_general import WorkerReferenceData
 from exceptions import NoDataSetSampleSequencePMObjects
 
 
@@ -870,9 +868,14 @@ class SequenceCountTableCreator:
     def __init__(
             self, symportal_root_dir, call_type, num_proc, html_dir, js_output_path_dict, date_time_str,
             no_pre_med_seqs, multiprocess, dss_uids_output_str=None, ds_uids_output_str=None, output_dir=None,
-            sorted_sample_uid_list=None, analysis_obj=None):
+            sorted_sample_uid_list=None, analysis_obj=None, worker_pool=None):
         self.multiprocess = multiprocess
         self.thread_safe_general = ThreadSafeGeneral()
+        # The ResultQueueWorkerPool of the run if given, else the workers are started and stopped by each stage
+        if worker_pool is None:
+            self.worker_pool = ResultQueueWorkerPool(num_proc=num_proc, multiprocess=self.multiprocess)
+        else:
+            self.worker_pool = worker_pool
         self._init_core_vars(
             symportal_root_dir, analysis_obj, call_type, dss_uids_output_str, ds_uids_output_str, num_proc,
             output_dir, sorted_sample_uid_list, date_time_str, html_dir)
@@ -976,10 +979,9 @@ class SequenceCountTableCreator:
 
     def _init_seq_abundance_collection_objects(self):
         """Output objects from first worker to be used by second worker"""
-        self.dss_id_to_list_of_dsss_objects_dict_mp_dict = None
-        self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict = None
-        self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict = None
-        # this is the list that we will use the self.annotated_dss_name_to_cummulative_rel_abund_mp_dict to create
+        self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_dict = None
+        self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_dict = None
+        # this is the list that we will use the self.annotated_dss_name_to_cummulative_rel_abund_dict to create
         # it is a list of the ref_seqs_ordered first by clade then by abundance.
         self.clade_abundance_ordered_ref_seq_list = []
 
@@ -1707,7 +1709,7 @@ class SequenceCountTableCreator:
         seq_count_table_output_series_generator_handler = SeqOutputSeriesGeneratorHandler(parent=self)
         seq_count_table_output_series_generator_handler.execute_sequence_count_table_dataframe_contructor_handler()
         self.dss_id_to_pandas_series_results_list_dict = \
-            dict(seq_count_table_output_series_generator_handler.dss_id_to_pandas_series_results_list_mp_dict)
+            seq_count_table_output_series_generator_handler.dss_id_to_pandas_series_results_list_dict
 
     def _collect_abundances_for_creating_the_output(self):
         seq_collection_handler = SequenceCountTableCollectAbundanceHandler(parent_seq_count_tab_creator=self)
@@ -1716,16 +1718,13 @@ class SequenceCountTableCreator:
         self.update_dicts_for_the_second_worker_from_first_worker(seq_collection_handler)
 
     def update_dicts_for_the_second_worker_from_first_worker(self, seq_collection_handler):
-        self.dss_id_to_list_of_dsss_objects_dict_mp_dict = \
-            seq_collection_handler.dss_id_to_list_of_dsss_objects_mp_dict
-
-        self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict = \
+        self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_dict = \
             seq_collection_handler.\
-                dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict
+                dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_dict
 
-        self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict = \
+        self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_dict = \
             seq_collection_handler.\
-                dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict
+                dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_dict
 
         self.clade_abundance_ordered_ref_seq_list = \
             seq_collection_handler.clade_abundance_ordered_ref_seq_list
@@ -1969,88 +1968,58 @@ class SequenceCountTableCollectAbundanceHandler:
     """
     def __init__(self, parent_seq_count_tab_creator):
         self.seq_count_table_creator = parent_seq_count_tab_creator
-        if self.seq_count_table_creator.multiprocess:
-            self.mp_manager = Manager()
-            self.input_dss_mp_queue = mp_Queue()
-            self._populate_input_dss_mp_queue()
-            self.ref_seq_names_clade_annotated = [
-                ref_seq.name if ref_seq.has_name else str(ref_seq) for
-                ref_seq in self.seq_count_table_creator.ref_seqs_in_datasets]
-            self.dss_id_to_list_of_dsss_objects_mp_dict = self.mp_manager.dict()
-            self._populate_dss_id_to_list_of_dsss_objects()
-            self.annotated_dss_name_to_cummulative_rel_abund_mp_dict = self.mp_manager.dict(
-            {refSeq_name: 0 for refSeq_name in self.ref_seq_names_clade_annotated})
-            self.lock = mp_Lock()
-            self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict = self.mp_manager.dict()
-            self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict = self.mp_manager.dict()
-        else:
-            self.input_dss_mp_queue = mt_Queue()
-            self._populate_input_dss_mp_queue()
-            self.ref_seq_names_clade_annotated = [
-                ref_seq.name if ref_seq.has_name else str(ref_seq) for
-                ref_seq in self.seq_count_table_creator.ref_seqs_in_datasets]
-            self.dss_id_to_list_of_dsss_objects_mp_dict = {}
-            self._populate_dss_id_to_list_of_dsss_objects()
-            self.annotated_dss_name_to_cummulative_rel_abund_mp_dict = {refSeq_name: 0 for refSeq_name in self.ref_seq_names_clade_annotated}
-            self.lock = mt_Lock()
-            self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict = {}
-            self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict = {}
-
-        # this is the list that we will use the self.annotated_dss_name_to_cummulative_rel_abund_mp_dict to create
+        self.ref_seq_names_clade_annotated = [
+            ref_seq.name if ref_seq.has_name else str(ref_seq) for
+            ref_seq in self.seq_count_table_creator.ref_seqs_in_datasets]
+        # The results returned by the workers are merged into these as they are collected
+        self.annotated_dss_name_to_cummulative_rel_abund_dict = {
+            refSeq_name: 0 for refSeq_name in self.ref_seq_names_clade_annotated}
+        self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_dict = {}
+        self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_dict = {}
+
+        # this is the list that we will use the self.annotated_dss_name_to_cummulative_rel_abund_dict to create
         # it is a list of the ref_seqs_ordered first by clade then by abundance.
         self.clade_abundance_ordered_ref_seq_list = []
 
     def execute_sequence_count_table_ordered_seqs_worker(self):
-        all_processes = []
-        
         # close all connections to the db so that they are automatically recreated for each process
         # http://stackoverflow.com/questions/8242837/django-multiprocessing-and-database-connections
         db.connections.close_all()
-        for n in range(self.seq_count_table_creator.num_proc):
-            if self.seq_count_table_creator.multiprocess:
-                p = Process(target=self._sequence_count_table_ordered_seqs_worker, args=(
-                    self.input_dss_mp_queue, 
-                    self.dss_id_to_list_of_dsss_objects_mp_dict, 
-                    self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict, 
-                    self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict,
-                    self.annotated_dss_name_to_cummulative_rel_abund_mp_dict, self.ref_seq_names_clade_annotated, self.lock))
-            else:
-                p = Thread(target=self._sequence_count_table_ordered_seqs_worker, args=(
-                    self.input_dss_mp_queue, 
-                    self.dss_id_to_list_of_dsss_objects_mp_dict, 
-                    self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict, 
-                    self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict,
-                    self.annotated_dss_name_to_cummulative_rel_abund_mp_dict, self.ref_seq_names_clade_annotated, self.lock))
-            all_processes.append(p)
-            p.start()
-
-        for p in all_processes:
-            p.join()
+        self.seq_count_table_creator.worker_pool.execute(
+            worker_function=self._sequence_count_table_ordered_seqs_worker,
+            work_items=self._get_dss_and_list_of_dsss_objects(),
+            merge_result=self._merge_sample_abundances,
+            worker_args=(self.ref_seq_names_clade_annotated, WorkerReferenceData.get_current_version()),
+            num_workers=self.seq_count_table_creator.num_proc)
 
         self._generate_clade_abundance_ordered_ref_seq_list_from_seq_name_abund_dict()
 
     @staticmethod
     def _sequence_count_table_ordered_seqs_worker(
-        in_q, 
-        dss_id_to_list_of_dsss_objects_mp_dict, 
-        dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict, 
-        dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict, 
-        annotated_dss_name_to_cummulative_rel_abund_mp_dict, ref_seq_names_clade_annotated, lock):
-        for dss in iter(in_q.get, 'STOP'):
-            sys.stdout.write(f'\r{dss.name}: collecting seq abundances')
-            sequence_count_table_ordered_seqs_worker_instance = SequenceCountTableCollectAbundanceWorker(
-                dss_id_to_list_of_dsss_objects_mp_dict=dss_id_to_list_of_dsss_objects_mp_dict,
-                dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict=dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict,
-                dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict=dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict,
-                annotated_dss_name_to_cummulative_rel_abund_mp_dict=annotated_dss_name_to_cummulative_rel_abund_mp_dict, 
-                ref_seq_names_clade_annotated=ref_seq_names_clade_annotated,
-                dss=dss, lock=lock)
-            sequence_count_table_ordered_seqs_worker_instance.start_seq_abund_collection()
-    
+            dss_and_list_of_dsss_objects, ref_seq_names_clade_annotated, reference_data_version):
+        dss, list_of_dsss_objects = dss_and_list_of_dsss_objects
+        sys.stdout.write(f'\r{dss.name}: collecting seq abundances')
+        sequence_count_table_ordered_seqs_worker_instance = SequenceCountTableCollectAbundanceWorker(
+            list_of_dsss_objects=list_of_dsss_objects,
+            ref_seq_names_clade_annotated=ref_seq_names_clade_annotated, dss=dss,
+            ref_seq_id_to_name_clade_and_has_name_dict=
+            WorkerReferenceData.get_ref_seq_id_to_name_clade_and_has_name_dict(version=reference_data_version))
+        return sequence_count_table_ordered_seqs_worker_instance.start_seq_abund_collection()
+
+    def _merge_sample_abundances(self, sample_abundances):
+        dss_id, list_of_abs_and_rel_abund_of_contained_dsss_dicts, \
+            list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs = sample_abundances
+        self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_dict[dss_id] = \
+            list_of_abs_and_rel_abund_of_contained_dsss_dicts
+        self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_dict[dss_id] = \
+            list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs
+        for seq_name, rel_abund in list_of_abs_and_rel_abund_of_contained_dsss_dicts[1].items():
+            self.annotated_dss_name_to_cummulative_rel_abund_dict[seq_name] += rel_abund
+
     def _generate_clade_abundance_ordered_ref_seq_list_from_seq_name_abund_dict(self):
         for i in range(len(self.seq_count_table_creator.ordered_list_of_clades_found)):
             temp_within_clade_list_for_sorting = []
-            for seq_name, abund_val in self.annotated_dss_name_to_cummulative_rel_abund_mp_dict.items():
+            for seq_name, abund_val in self.annotated_dss_name_to_cummulative_rel_abund_dict.items():
                 if seq_name.startswith(
                         self.seq_count_table_creator.ordered_list_of_clades_found[i]) or seq_name[-2:] == \
                         f'_{self.seq_count_table_creator.ordered_list_of_clades_found[i]}':
@@ -2066,46 +2035,35 @@ class SequenceCountTableCollectAbundanceHandler:
             sorted_within_clade = [a[0] for a in temp_within_clade_list_for_sorting]
             self.clade_abundance_ordered_ref_seq_list.extend(sorted_within_clade)
 
-    def _populate_input_dss_mp_queue(self):
-        for dss in self.seq_count_table_creator.list_of_dss_objects:
-            self.input_dss_mp_queue.put(dss)
-
-        for N in range(self.seq_count_table_creator.num_proc):
-            self.input_dss_mp_queue.put('STOP')
-
-    def _populate_dss_id_to_list_of_dsss_objects(self):
+    def _get_dss_and_list_of_dsss_objects(self):
+        # A generator so that the DataSetSampleSequences of a sample are only retrieved
+        # as the sample is given to a worker, rather than those of all samples being held in memory at once.
         for dss in self.seq_count_table_creator.list_of_dss_objects:
             sys.stdout.write(f'\r{dss.name}')
-            self.dss_id_to_list_of_dsss_objects_mp_dict[dss.id] = list(
-                DataSetSampleSequence.objects.filter(data_set_sample_from=dss))
+            yield dss, list(DataSetSampleSequence.objects.filter(data_set_sample_from=dss))
 
 
 class SequenceCountTableCollectAbundanceWorker:
-    def __init__(
-        self,
-        dss_id_to_list_of_dsss_objects_mp_dict, 
-        dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict, 
-        dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict, 
-        annotated_dss_name_to_cummulative_rel_abund_mp_dict, ref_seq_names_clade_annotated,
-        dss, lock):
-        self.dss_id_to_list_of_dsss_objects_mp_dict = dss_id_to_list_of_dsss_objects_mp_dict
-        self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict = dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict
-        self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict = dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict
-        self.annotated_dss_name_to_cummulative_rel_abund_mp_dict = annotated_dss_name_to_cummulative_rel_abund_mp_dict
+    def __init__(self, list_of_dsss_objects, ref_seq_names_clade_annotated, dss,
+                 ref_seq_id_to_name_clade_and_has_name_dict):
+        self.list_of_dsss_objects = list_of_dsss_objects
         self.ref_seq_names_clade_annotated = ref_seq_names_clade_annotated
         self.dss = dss
+        # The ReferenceSequences held by the worker (see WorkerReferenceData) so that the ReferenceSequence
+        # of each DataSetSampleSequence does not have to be retrieved from the database
+        self.ref_seq_id_to_name_clade_and_has_name_dict = ref_seq_id_to_name_clade_and_has_name_dict
         self.total_abundance_of_sequences_in_sample = sum([int(a) for a in json.loads(self.dss.cladal_seq_totals)])
-        self.lock = lock
 
     def start_seq_abund_collection(self):
+        """Returns the dss.id, [{seq_name:absolute abundance}, {seq_name:relative abundance}] and
+        [{clade:absolute abundance of no name seqs}, {clade:relative abundance of no name seqs}]
+        to be merged by the SequenceCountTableCollectAbundanceHandler."""
         clade_summary_absolute_dict, clade_summary_relative_dict = \
             self._generate_empty_noname_seq_abund_summary_by_clade_dicts()
 
         smple_seq_count_aboslute_dict, smple_seq_count_relative_dict = self._generate_empty_seq_name_to_abund_dicts()
 
-        dsss_in_sample = self.dss_id_to_list_of_dsss_objects_mp_dict[self.dss.id]
-
-        for dsss in dsss_in_sample:
+        for dsss in self.list_of_dsss_objects:
             # determine what the name of the seq will be in the output
             name_unit = self._determine_output_name_of_dsss_and_pop_noname_clade_dicts(
                 clade_summary_absolute_dict, clade_summary_relative_dict, dsss)
@@ -2113,38 +2071,24 @@ class SequenceCountTableCollectAbundanceWorker:
             self._populate_abs_and_rel_abundances_for_dsss(dsss, name_unit, smple_seq_count_aboslute_dict,
                                                            smple_seq_count_relative_dict)
 
-        self._associate_sample_abundances_to_mp_dicts(
-            clade_summary_absolute_dict,
-            clade_summary_relative_dict,
-            smple_seq_count_aboslute_dict,
-            smple_seq_count_relative_dict)
-
-    def _associate_sample_abundances_to_mp_dicts(self, clade_summary_absolute_dict, clade_summary_relative_dict,
-                                                 smple_seq_count_aboslute_dict, smple_seq_count_relative_dict):
-        with self.lock:
-            self.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict[self.dss.id] = [smple_seq_count_aboslute_dict,
-                                                                                                            smple_seq_count_relative_dict]
-            self.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict[self.dss.id] = [
-                clade_summary_absolute_dict, clade_summary_relative_dict]
+        return (
+            self.dss.id, [smple_seq_count_aboslute_dict, smple_seq_count_relative_dict],
+            [clade_summary_absolute_dict, clade_summary_relative_dict])
 
     def _populate_abs_and_rel_abundances_for_dsss(self, dsss, name_unit, smple_seq_count_aboslute_dict,
                                                   smple_seq_count_relative_dict):
         rel_abund_of_dsss = dsss.abundance / self.total_abundance_of_sequences_in_sample
-        with self.lock:
-            self.annotated_dss_name_to_cummulative_rel_abund_mp_dict[name_unit] += rel_abund_of_dsss
         smple_seq_count_aboslute_dict[name_unit] += dsss.abundance
         smple_seq_count_relative_dict[name_unit] += rel_abund_of_dsss
 
     def _determine_output_name_of_dsss_and_pop_noname_clade_dicts(
             self, clade_summary_absolute_dict, clade_summary_relative_dict, dsss):
-        if not dsss.reference_sequence_of.has_name:
-            name_unit = str(dsss.reference_sequence_of.id) + f'_{dsss.reference_sequence_of.clade}'
+        # The name_unit is the str of the ReferenceSequence. That of a sequence without a name is its id and clade.
+        name_unit, clade, has_name = self.ref_seq_id_to_name_clade_and_has_name_dict[dsss.reference_sequence_of_id]
+        if not has_name:
             # the clade summries are only for the noName seqs
-            clade_summary_absolute_dict[dsss.reference_sequence_of.clade] += dsss.abundance
-            clade_summary_relative_dict[
-                dsss.reference_sequence_of.clade] += dsss.abundance / self.total_abundance_of_sequences_in_sample
-        else:
-            name_unit = str(dsss.reference_sequence_of)
+            clade_summary_absolute_dict[clade] += dsss.abundance
+            clade_summary_relative_dict[clade] += dsss.abundance / self.total_abundance_of_sequences_in_sample
         return name_unit
 
     def _generate_empty_seq_name_to_abund_dicts(self):
@@ -2163,74 +2107,44 @@ class SeqOutputSeriesGeneratorHandler:
     def __init__(self, parent):
         self.seq_count_table_creator = parent
         self.output_df_header = self._create_output_df_header()
-        if self.seq_count_table_creator.multiprocess:
-            self.worker_manager = Manager()
-            # dss.id : [pandas_series_for_absolute_abundace, pandas_series_for_absolute_abundace]
-            self.dss_id_to_pandas_series_results_list_mp_dict = self.worker_manager.dict()
-            self.dss_input_queue = mp_Queue()
-            self._populate_dss_input_queue()
-            self.lock = mp_Lock()
-        else:
-            # dss.id : [pandas_series_for_absolute_abundace, pandas_series_for_absolute_abundace]
-            self.dss_id_to_pandas_series_results_list_mp_dict = {}
-            self.dss_input_queue = mt_Queue()
-            self._populate_dss_input_queue()
-            self.lock = mt_Lock()
+        # dss.id : [pandas_series_for_absolute_abundace, pandas_series_for_absolute_abundace]
+        self.dss_id_to_pandas_series_results_list_dict = {}
 
     def execute_sequence_count_table_dataframe_contructor_handler(self):
-        all_processes = []
         # close all connections to the db so that they are automatically recreated for each process
         # http://stackoverflow.com/questions/8242837/django-multiprocessing-and-database-connections
         db.connections.close_all()
 
         sys.stdout.write('\n\nOutputting seq data\n')
-        for n in range(self.seq_count_table_creator.num_proc):
-            if self.seq_count_table_creator.multiprocess:
-                p = Process(target=self._output_df_contructor_worker, args=(
-                    self.dss_input_queue,
-                    self.seq_count_table_creator.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict,
-                    self.seq_count_table_creator.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict,
-                    self.seq_count_table_creator.clade_abundance_ordered_ref_seq_list,
-                    self.dss_id_to_pandas_series_results_list_mp_dict,
-                    self.output_df_header, self.lock))
-            else:
-                p = Thread(target=self._output_df_contructor_worker, args=(
-                self.dss_input_queue,
-                self.seq_count_table_creator.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict,
-                self.seq_count_table_creator.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict,
-                self.seq_count_table_creator.clade_abundance_ordered_ref_seq_list,
-                self.dss_id_to_pandas_series_results_list_mp_dict,
-                self.output_df_header, self.lock))
-            all_processes.append(p)
-            p.start()
-
-        for p in all_processes:
-            p.join()
+        # Each worker is given only the abundances of the sample it is working on
+        self.seq_count_table_creator.worker_pool.execute(
+            worker_function=self._output_df_contructor_worker,
+            work_items=[(
+                dss,
+                self.seq_count_table_creator.dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_dict[
+                    dss.id],
+                self.seq_count_table_creator.dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_dict[dss.id]
+            ) for dss in self.seq_count_table_creator.list_of_dss_objects],
+            merge_result=self._merge_sample_series,
+            worker_args=(self.seq_count_table_creator.clade_abundance_ordered_ref_seq_list, self.output_df_header),
+            num_workers=self.seq_count_table_creator.num_proc)
 
     @staticmethod
-    def _output_df_contructor_worker(
-        in_q, 
-        dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict,
-        dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict,
-        clade_abundance_ordered_ref_seq_list,
-        dss_id_to_pandas_series_results_list_mp_dict,
-        output_df_header, lock):
-        for dss in iter(in_q.get, 'STOP'):
-            seq_output_series_generator_worker = SeqOutputSeriesGeneratorWorker(
-                dss=dss,
-                list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs=dss_id_to_list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs_mp_dict[dss.id],
-                list_of_abs_and_rel_abund_of_contained_dsss_dicts=dss_id_to_list_of_abs_and_rel_abund_of_contained_dsss_dicts_mp_dict[dss.id],
-                clade_abundance_ordered_ref_seq_list=clade_abundance_ordered_ref_seq_list,
-                dss_id_to_pandas_series_results_list_mp_dict=dss_id_to_pandas_series_results_list_mp_dict,
-                output_df_header=output_df_header, lock=lock)
-            seq_output_series_generator_worker.make_series()
-
-    def _populate_dss_input_queue(self):
-        for dss in self.seq_count_table_creator.list_of_dss_objects:
-            self.dss_input_queue.put(dss)
-
-        for N in range(self.seq_count_table_creator.num_proc):
-            self.dss_input_queue.put('STOP')
+    def _output_df_contructor_worker(work_item, clade_abundance_ordered_ref_seq_list, output_df_header):
+        dss, list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs, \
+            list_of_abs_and_rel_abund_of_contained_dsss_dicts = work_item
+        seq_output_series_generator_worker = SeqOutputSeriesGeneratorWorker(
+            dss=dss,
+            list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs=
+            list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs,
+            list_of_abs_and_rel_abund_of_contained_dsss_dicts=list_of_abs_and_rel_abund_of_contained_dsss_dicts,
+            clade_abundance_ordered_ref_seq_list=clade_abundance_ordered_ref_seq_list,
+            output_df_header=output_df_header)
+        return seq_output_series_generator_worker.make_series()
+
+    def _merge_sample_series(self, sample_series):
+        dss_id, list_of_pandas_series = sample_series
+        self.dss_id_to_pandas_series_results_list_dict[dss_id] = list_of_pandas_series
 
     def _create_output_df_header(self):
         header_pre = self.seq_count_table_creator.clade_abundance_ordered_ref_seq_list
@@ -2255,8 +2169,7 @@ class SeqOutputSeriesGeneratorHandler:
 class SeqOutputSeriesGeneratorWorker:
     def __init__(
             self, dss, list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs,
-            list_of_abs_and_rel_abund_of_contained_dsss_dicts,
-            dss_id_to_pandas_series_results_list_mp_dict, clade_abundance_ordered_ref_seq_list, output_df_header, lock):
+            list_of_abs_and_rel_abund_of_contained_dsss_dicts, clade_abundance_ordered_ref_seq_list, output_df_header):
 
         self.dss = dss
         # dss.id : [{dsss:absolute abundance in dss}, {dsss:relative abundance in dss}]
@@ -2265,15 +2178,14 @@ class SeqOutputSeriesGeneratorWorker:
         #          ]
         self.list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs = list_of_abs_and_rel_abund_clade_summaries_of_noname_seqs
         self.list_of_abs_and_rel_abund_of_contained_dsss_dicts = list_of_abs_and_rel_abund_of_contained_dsss_dicts
-        self.dss_id_to_pandas_series_results_list_mp_dict = dss_id_to_pandas_series_results_list_mp_dict
         self.clade_abundance_ordered_ref_seq_list = clade_abundance_ordered_ref_seq_list
         self.output_df_header = output_df_header
         self.sample_row_data_absolute = []
         self.sample_row_data_relative = []
         self.sample_seq_tot = sum([int(a) for a in json.loads(dss.cladal_seq_totals)])
-        self.lock = lock
 
     def make_series(self):
+        """Returns the dss.id and [absolute abundance pandas series, relative abundance pandas series]"""
         sys.stdout.write(f'\r{self.dss.name}: Creating data ouput row')
         if self._dss_had_problem_in_processing():
             self.sample_row_data_absolute.append(self.dss.name)
@@ -2281,19 +2193,16 @@ class SeqOutputSeriesGeneratorWorker:
 
             self._populate_quality_control_data_of_failed_sample()
 
-            self._output_the_failed_sample_pandas_series()
-            return
+            return self._output_the_failed_sample_pandas_series()
 
         self._populate_quality_control_data_of_successful_sample()
 
-        self._output_the_successful_sample_pandas_series()
+        return self._output_the_successful_sample_pandas_series()
 
     def _output_the_successful_sample_pandas_series(self):
         sample_series_absolute = pd.Series(self.sample_row_data_absolute, index=self.output_df_header, name=self.dss.id)
         sample_series_relative = pd.Series(self.sample_row_data_relative, index=self.output_df_header, name=self.dss.id)
-        with self.lock:
-            self.dss_id_to_pandas_series_results_list_mp_dict[self.dss.id] = [
-                sample_series_absolute, sample_series_relative]
+        return self.dss.id, [sample_series_absolute, sample_series_relative]
 
     def _populate_quality_control_data_of_successful_sample(self):
         self._populate_qc_meta_successful_sample()
@@ -2381,9 +2290,7 @@ class SeqOutputSeriesGeneratorWorker:
     def _output_the_failed_sample_pandas_series(self):
         sample_series_absolute = pd.Series(self.sample_row_data_absolute, index=self.output_df_header, name=self.dss.id)
         sample_series_relative = pd.Series(self.sample_row_data_relative, index=self.output_df_header, name=self.dss.id)
-        with self.lock:
-            self.dss_id_to_pandas_series_results_list_mp_dict[self.dss.id] = [sample_series_absolute,
-                                                                                    sample_series_relative]
+        return self.dss.id, [sample_series_absolute, sample_series_relative]
 
     def _populate_quality_control_data_of_failed_sample(self):
         # Add in the qc totals if possible
@@ -0,0 +1,313 @@
+"""Profiling of the stages of a data loading or data analysis, and the dry run estimation (--dry_run) of the time
+and resources that a data loading or data analysis will take, from models calibrated with the recorded profiles."""
+from dbApp.models import DataSetSample, CladeCollection, DataSetSampleSequence
+from general import ChildProcessPeakMemoryRecorder, reset_peak_rss, get_peak_rss_gb
+import os
+import gzip
+import json
+import time
+from datetime import datetime
+from django import db
+
+
+def get_database_size_mb():
+    """The size of the database. None if it cannot be determined."""
+    try:
+        if db.connection.vendor == 'sqlite':
+            database_path = db.connection.settings_dict['NAME']
+            return sum(
+                [os.path.getsize(path) for path in [database_path, f'{database_path}-wal'] if
+                 os.path.exists(path)]) / (1024 ** 2)
+        if db.connection.vendor == 'postgresql':
+            with db.connection.cursor() as cursor:
+                cursor.execute('SELECT pg_database_size(current_database())')
+                return cursor.fetchone()[0] / (1024 ** 2)
+    except Exception:
+        return None
+    return None
+
+
+def get_directory_size_mb(directory_path):
+    if directory_path is None or not os.path.exists(directory_path):
+        return None
+    total_size = 0
+    for dirpath, dirnames, files in os.walk(directory_path):
+        for file_name in files:
+            try:
+                total_size += os.path.getsize(os.path.join(dirpath, file_name))
+            except OSError:
+                continue
+    return total_size / (1024 ** 2)
+
+
+def get_data_loading_work_units(data_set_object):
+    list_of_dss_objects = DataSetSample.objects.filter(data_submission_from=data_set_object)
+    return {'samples': len(list_of_dss_objects), 'reads': sum([dss.num_contigs for dss in list_of_dss_objects])}
+
+
+def get_data_analysis_work_units(list_of_data_set_uids):
+    return {
+        'samples': DataSetSample.objects.filter(data_submission_from__in=list_of_data_set_uids).count(),
+        'clade_collections': CladeCollection.objects.filter(
+            data_set_sample_from__data_submission_from__in=list_of_data_set_uids).count(),
+        'distinct_sequences': DataSetSampleSequence.objects.filter(
+            data_set_sample_from__data_submission_from__in=list_of_data_set_uids
+        ).values('reference_sequence_of').distinct().count()}
+
+
+class StageProfiler:
+    """Records, for each stage of a data loading or data analysis, its wall clock time, the number of processors
+    it used, its peak memory, the growth of the database and the size of the temp working directory at its end.
+    The profiles are appended, together with the work units (e.g. reads, clade collections) of the loading or
+    analysis, to stage_profiles/stage_profiles.jsonl. These are the calibration data of the RuntimeResourceEstimator.
+    Two peak memories are recorded:
+    peak_task_memory_gb is the highest peak memory of a single task of the stage run on the worker_pool, as reported
+    by its workers (see ResultQueueWorkerPool._get_task_max_rss_gb). This is that of the worker process, or of the
+    mothur, BLAST or MED process run by the task if higher. None if no tasks of the stage were run on the worker_pool.
+    peak_memory_gb is the peak memory of this (the main) process during the stage, or of a child process that it
+    ran through subprocess if higher (see ChildProcessPeakMemoryRecorder). It is only recorded if it can be reset
+    at the start of the stage (on linux) or if the high water mark of the process was raised during the stage.
+    """
+    def __init__(self, symportal_root_directory, temp_working_directory=None, worker_pool=None):
+        self.stage_profiles_path = os.path.join(symportal_root_directory, 'stage_profiles', 'stage_profiles.jsonl')
+        self.temp_working_directory = temp_working_directory
+        # The ResultQueueWorkerPool that the tasks of the parallel stages are run on
+        self.worker_pool = worker_pool
+        self.stage_profiles = []
+        self.current_stage = None
+        self.stage_start_time = None
+        self.peak_rss_was_reset = False
+        self.peak_memory_gb_at_stage_start = None
+        self.database_size_mb_at_stage_start = None
+        ChildProcessPeakMemoryRecorder.install()
+
+    def start_stage(self, stage):
+        self.current_stage = stage
+        self.stage_start_time = time.time()
+        self.peak_rss_was_reset = reset_peak_rss()
+        self.peak_memory_gb_at_stage_start = get_peak_rss_gb()
+        ChildProcessPeakMemoryRecorder.reset()
+        if self.worker_pool is not None:
+            # So that only the tasks of this stage are measured
+            self.worker_pool.pop_peak_task_memory_gb(reader='stage_profiler')
+        self.database_size_mb_at_stage_start = get_database_size_mb()
+
+    def end_stage(self, num_proc):
+        peak_memory_gb = get_peak_rss_gb()
+        if peak_memory_gb is not None and not self.peak_rss_was_reset and \
+                peak_memory_gb <= self.peak_memory_gb_at_stage_start:
+            peak_memory_gb = None
+        if ChildProcessPeakMemoryRecorder.get_peak_rss_gb() > (peak_memory_gb or 0):
+            peak_memory_gb = ChildProcessPeakMemoryRecorder.get_peak_rss_gb()
+        peak_task_memory_gb = None
+        if self.worker_pool is not None:
+            peak_task_memory_gb = self.worker_pool.pop_peak_task_memory_gb(reader='stage_profiler')
+        database_size_mb = get_database_size_mb()
+        if database_size_mb is None or self.database_size_mb_at_stage_start is None:
+            database_growth_mb = None
+        else:
+            database_growth_mb = database_size_mb - self.database_size_mb_at_stage_start
+        self.stage_profiles.append({
+            'stage': self.current_stage, 'num_proc': num_proc, 'seconds': time.time() - self.stage_start_time,
+            'peak_memory_gb': peak_memory_gb, 'peak_task_memory_gb': peak_task_memory_gb,
+            'database_growth_mb': database_growth_mb,
+            'temp_disk_mb': get_directory_size_mb(self.temp_working_directory)})
+        self.current_stage = None
+
+    def write_stage_profiles(self, work_units_dict):
+        if not self.stage_profiles:
+            return
+        os.makedirs(os.path.dirname(self.stage_profiles_path), exist_ok=True)
+        time_stamp = str(datetime.now()).split('.')[0]
+        with open(self.stage_profiles_path, 'a') as f:
+            for stage_profile in self.stage_profiles:
+                stage_profile['work_units'] = work_units_dict
+                stage_profile['time_stamp'] = time_stamp
+                f.write(f'{json.dumps(stage_profile)}\n')
+        self.stage_profiles = []
+
+
+class RuntimeResourceEstimator:
+    """Estimates, without loading or analysing anything, the time, peak memory, database growth and temp disk
+    use of each stage of a data loading (from the reads and samples of the input fastq files)
+    or of a data analysis (from the clade collections and distinct sequences of the DataSets to be analysed).
+    Each stage is modelled as linear in its work unit: the seconds per work unit (per processor for the
+    parallel stages), the database and temp disk MB per work unit and either the peak memory per task (the per
+    sample stages) or the peak memory per memory work unit. The models are calibrated with the stage profiles
+    recorded by the StageProfiler. A stage without any profiles uses its default model.
+    The peak memory of a parallel stage is that of num_proc tasks running at once. Its peak memory per task is
+    calibrated with the peak_task_memory_gb reported for the tasks run on the worker pool, and is left at its default
+    if that was not recorded. That of the other stages, which run in the main process, is calibrated with the
+    peak_memory_gb of the main process.
+    """
+    # stage: (work unit, parallel, memory work unit (None if the memory is per task), seconds per work unit,
+    # peak memory GB (per task or per memory work unit), database MB per work unit, temp disk MB per work unit)
+    stage_to_default_model_dict = {
+        'initial_mothur_qc': ('reads', True, None, 6e-4, 1.0, 0, 2e-3),
+        'taxonomic_screening': ('reads', True, None, 2e-4, 1.0, 0, 5e-4),
+        'med_decomposition': ('reads', True, None, 4e-4, 1.0, 0, 5e-4),
+        'streaming_sample_pipeline': ('reads', True, None, 1.2e-3, 1.5, 0, 2e-3),
+        'data_set_sample_sequence_creation': ('reads', False, None, 5e-5, 0.5, 1e-5, 0),
+        'pre_med_seq_creation': ('reads', True, None, 1e-4, 0.5, 5e-5, 0),
+        'data_loading_outputs': ('reads', True, None, 2e-5, 0.5, 0, 0),
+        'data_analysis': ('clade_collections', False, 'distinct_sequences', 0.5, 1e-5, 5e-2, 0),
+        'data_analysis_outputs': ('clade_collections', True, None, 5e-2, 0.5, 0, 0)}
+    fastq_extensions = ('.fastq', '.fq', '.fastq.gz', '.fq.gz')
+    num_records_to_sample = 10000
+
+    def __init__(self, symportal_root_directory, num_proc):
+        self.stage_profiles_path = os.path.join(symportal_root_directory, 'stage_profiles', 'stage_profiles.jsonl')
+        self.num_proc = num_proc
+        self.stage_to_stage_profiles_dict = self._read_stage_profiles()
+
+    def estimate_data_loading(self, user_input_path, streaming_pipeline=False, no_pre_med_seqs=False,
+                              no_output=False):
+        work_units_dict = self._get_input_work_units(user_input_path)
+        print(f'\nDry run of the loading of {user_input_path}')
+        print(f'{work_units_dict["samples"]} samples with an estimated {work_units_dict["reads"]} read pairs')
+        if streaming_pipeline:
+            stages = ['streaming_sample_pipeline']
+        else:
+            stages = ['initial_mothur_qc', 'taxonomic_screening', 'med_decomposition']
+        stages.append('data_set_sample_sequence_creation')
+        if not no_pre_med_seqs:
+            stages.append('pre_med_seq_creation')
+        if not no_output:
+            stages.append('data_loading_outputs')
+        self._report_estimates(stages=stages, work_units_dict=work_units_dict)
+
+    def estimate_data_analysis(self, list_of_data_set_uids, no_output=False):
+        work_units_dict = get_data_analysis_work_units(list_of_data_set_uids)
+        print(f'\nDry run of the analysis of DataSets {",".join([str(uid) for uid in list_of_data_set_uids])}')
+        print(f'{work_units_dict["samples"]} samples, {work_units_dict["clade_collections"]} clade collections and '
+              f'{work_units_dict["distinct_sequences"]} distinct sequences')
+        stages = ['data_analysis']
+        if not no_output:
+            stages.append('data_analysis_outputs')
+        self._report_estimates(stages=stages, work_units_dict=work_units_dict)
+
+    def _report_estimates(self, stages, work_units_dict):
+        print(f'\nEstimates for {self.num_proc} processor(s):')
+        print('stage\tcalibration_profiles\tminutes\tpeak_memory_gb\tdatabase_growth_mb\ttemp_disk_mb')
+        total_seconds, max_peak_memory_gb, total_database_growth_mb, max_temp_disk_mb = 0, 0, 0, 0
+        for stage in stages:
+            seconds, peak_memory_gb, database_growth_mb, temp_disk_mb = self._estimate_stage(
+                stage=stage, work_units_dict=work_units_dict)
+            total_seconds += seconds
+            max_peak_memory_gb = max(max_peak_memory_gb, peak_memory_gb)
+            total_database_growth_mb += database_growth_mb
+            max_temp_disk_mb = max(max_temp_disk_mb, temp_disk_mb)
+            num_profiles = len(self.stage_to_stage_profiles_dict.get(stage, []))
+            print(f'{stage}\t{num_profiles if num_profiles else "none (default model)"}\t{seconds / 60:.1f}\t'
+                  f'{peak_memory_gb:.1f}\t{database_growth_mb:.1f}\t{temp_disk_mb:.1f}')
+        print(f'total\t\t{total_seconds / 60:.1f}\t{max_peak_memory_gb:.1f}\t'
+              f'{total_database_growth_mb:.1f}\t{max_temp_disk_mb:.1f}')
+        if not self.stage_to_stage_profiles_dict:
+            print(f'\nNo stage profiles were found at {self.stage_profiles_path}. The default models are uncalibrated '
+                  f'and the estimates are only indicative. The profiles are recorded by each loading and analysis.')
+
+    def _estimate_stage(self, stage, work_units_dict):
+        work_unit, parallel, memory_work_unit, seconds_per_work_unit, peak_memory_gb, database_mb_per_work_unit, \
+            temp_disk_mb_per_work_unit = self._get_calibrated_model(stage)
+        num_proc = min(self.num_proc, max(1, work_units_dict['samples'])) if parallel else 1
+        seconds = seconds_per_work_unit * work_units_dict[work_unit] / num_proc
+        if memory_work_unit is None:
+            # Each of the processors runs one task at a time. A stage that is not parallel runs its one at a time
+            # in the main process.
+            peak_memory_gb = peak_memory_gb * num_proc
+        else:
+            peak_memory_gb = peak_memory_gb * work_units_dict[memory_work_unit]
+        database_growth_mb = database_mb_per_work_unit * work_units_dict[work_unit]
+        temp_disk_mb = temp_disk_mb_per_work_unit * work_units_dict[work_unit]
+        return seconds, peak_memory_gb, database_growth_mb, temp_disk_mb
+
+    def _get_calibrated_model(self, stage):
+        work_unit, parallel, memory_work_unit, seconds_per_work_unit, peak_memory_gb, database_mb_per_work_unit, \
+            temp_disk_mb_per_work_unit = self.stage_to_default_model_dict[stage]
+        stage_profiles = [
+            stage_profile for stage_profile in self.stage_to_stage_profiles_dict.get(stage, []) if
+            stage_profile['work_units'].get(work_unit)]
+        if not stage_profiles:
+            return self.stage_to_default_model_dict[stage]
+        # The ratio of the sums so that the larger, and so more representative, profiles carry more weight
+        total_work_units = sum([stage_profile['work_units'][work_unit] for stage_profile in stage_profiles])
+        seconds_per_work_unit = sum([
+            stage_profile['seconds'] * (stage_profile['num_proc'] if parallel else 1) for
+            stage_profile in stage_profiles]) / total_work_units
+        # The profiles recorded before peak_task_memory_gb was introduced have no per task peak for the parallel
+        # stages. Their peak_memory_gb is only that of the main process.
+        memory_key = 'peak_task_memory_gb' if parallel else 'peak_memory_gb'
+        memory_profiles = [
+            stage_profile for stage_profile in stage_profiles if stage_profile.get(memory_key) is not None]
+        if memory_profiles and memory_work_unit is None:
+            peak_memory_gb = max([stage_profile[memory_key] for stage_profile in memory_profiles])
+        elif memory_profiles:
+            total_memory_work_units = sum(
+                [stage_profile['work_units'].get(memory_work_unit, 0) for stage_profile in memory_profiles])
+            if total_memory_work_units:
+                peak_memory_gb = sum(
+                    [stage_profile[memory_key] for stage_profile in memory_profiles]) / total_memory_work_units
+        database_profiles = [
+            stage_profile for stage_profile in stage_profiles if stage_profile['database_growth_mb'] is not None]
+        if database_profiles:
+            database_mb_per_work_unit = max(0, sum(
+                [stage_profile['database_growth_mb'] for stage_profile in database_profiles]) / sum(
+                [stage_profile['work_units'][work_unit] for stage_profile in database_profiles]))
+        temp_disk_profiles = [
+            stage_profile for stage_profile in stage_profiles if stage_profile['temp_disk_mb'] is not None]
+        if temp_disk_profiles:
+            temp_disk_mb_per_work_unit = sum(
+                [stage_profile['temp_disk_mb'] for stage_profile in temp_disk_profiles]) / sum(
+                [stage_profile['work_units'][work_unit] for stage_profile in temp_disk_profiles])
+        return work_unit, parallel, memory_work_unit, seconds_per_work_unit, peak_memory_gb, \
+            database_mb_per_work_unit, temp_disk_mb_per_work_unit
+
+    def _read_stage_profiles(self):
+        stage_to_stage_profiles_dict = {}
+        if not os.path.exists(self.stage_profiles_path):
+            return stage_to_stage_profiles_dict
+        with open(self.stage_profiles_path, 'r') as f:
+            for line in f:
+                try:
+                    stage_profile = json.loads(line)
+                except ValueError:
+                    # e.g. a line that was only partially written
+                    continue
+                if stage_profile['stage'] in self.stage_to_default_model_dict:
+                    stage_to_stage_profiles_dict.setdefault(stage_profile['stage'], []).append(stage_profile)
+        return stage_to_stage_profiles_dict
+
+    def _get_input_work_units(self, user_input_path):
+        if not os.path.isdir(user_input_path):
+            sys.exit(f'{user_input_path} is not a directory. '
+                     f'The dry run can only inspect a directory of fastq or fastq.gz files.')
+        fastq_paths = sorted([
+            os.path.join(user_input_path, file_name) for file_name in os.listdir(user_input_path) if
+            file_name.endswith(self.fastq_extensions)])
+        if not fastq_paths:
+            sys.exit(f'No fastq or fastq.gz files were found in {user_input_path}')
+        num_reads = sum([self._estimate_num_records_in_fastq(fastq_path) for fastq_path in fastq_paths])
+        # The reads are paired so each sample has a forward and a reverse fastq file
+        return {'samples': len(fastq_paths) // 2, 'reads': int(num_reads / 2)}
+
+    def _estimate_num_records_in_fastq(self, fastq_path):
+        """Count the records of the first num_records_to_sample records of the file and extrapolate from the
+        number of (compressed) bytes that they occupy to the size of the file.
+        If the file holds fewer records than this, the count is exact."""
+        file_size = os.path.getsize(fastq_path)
+        with open(fastq_path, 'rb') as raw_file:
+            if fastq_path.endswith('.gz'):
+                fastq_file = gzip.GzipFile(fileobj=raw_file)
+            else:
+                fastq_file = raw_file
+            num_lines = 0
+            for line in fastq_file:
+                num_lines += 1
+                if num_lines == self.num_records_to_sample * 4:
+                    break
+            else:
+                return num_lines // 4
+            # The position of the raw file is that of the compressed bytes read so far (for gzip files this is
+            # rounded up to the read buffer).
+            bytes_read = raw_file.tell()
+        return int((num_lines // 4) * file_size / bytes_read)
@@ -1,3 +1,12 @@
 system_type = "local"
 user_name = "undefined"
 user_email = "undefined"
+# Only used when system_type is "local". When True a WAL journal, a larger page cache and memory mapped I/O
+# are used for the SQLite database (see django_general.SQLitePerformanceProfile). Set to False if the database
+# is on a network file system.
+sqlite_performance_profile = True
+# Clades of a sample with more sequences than med_memory_bounded_sequence_threshold are decomposed by MED in its
+# memory-bounded mode, in which the read ids are spilled to disk once they and the unique sequences take up
+# med_memory_ceiling_mb megabytes.
+med_memory_bounded_sequence_threshold = 1000000
+med_memory_ceiling_mb = 4096
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""The SymPortal daemon (main.py --daemon) and its client.
+The client only uses the standard library so that a command sent to the daemon does not pay for the start up of
+Django or the import of the output, plotting, distance and analysis modules. Run the client with the arguments that
+would otherwise be given to main.py, e.g.:
+python3 symportal_daemon.py --display_data_sets
+The socket of the daemon is taken from the SYMPORTAL_DAEMON_SOCKET environment variable if it is set.
+"""
+import os
+import sys
+import json
+import socket
+import signal
+import traceback
+
+
+default_socket_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'symportal.sock')
+# Separates the output of a command from its exit status. The output of a command will not contain a NUL byte.
+exit_status_marker = b'\0SYMPORTAL_EXIT_STATUS:'
+
+
+def get_socket_path():
+    return os.environ.get('SYMPORTAL_DAEMON_SOCKET', default_socket_path)
+
+
+class SymPortalDaemonServer:
+    """Accepts commands (lists of main.py arguments) on a Unix socket and runs each one, by calling run_command
+    with the arguments, in a child process forked from the daemon. The children inherit the state that the daemon
+    has already loaded (the Django set up, the imported modules and anything else that was warmed up before
+    serve_forever was called) so that a command starts without delay. As each command is run in its own process,
+    several commands (e.g. a display while a loading is running) can run at once, a command can change its working
+    directory and exit without affecting the daemon, and the output of the command, including that of the
+    programs that it runs (e.g. mothur), is sent back to the client.
+    The socket is only accessible to the user that started the daemon.
+    If check_command is given, it is called in the daemon with the arguments of each command before the command is
+    forked. A command for which it returns an error message is not run: the message is sent to the client with an
+    exit status of 1.
+    """
+    accept_timeout = 1
+    # The seconds that a client has to send its command once it has connected
+    request_timeout = 10
+
+    def __init__(self, socket_path, run_command, before_fork=None, check_command=None):
+        self.socket_path = socket_path
+        self.run_command = run_command
+        # Called in the daemon before each fork, e.g. to close the database connections
+        self.before_fork = before_fork
+        self.check_command = check_command
+        self.server_socket = None
+        self.child_pids = set()
+
+    def serve_forever(self):
+        # So that the daemon stops, and removes its socket, when it is terminated as well as when it is interrupted
+        signal.signal(signal.SIGTERM, self._raise_keyboard_interrupt)
+        self._remove_stale_socket()
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # The socket is created with the umask so that it is never accessible to other users,
+            # even between the bind and the chmod
+            previous_umask = os.umask(0o177)
+            try:
+                self.server_socket.bind(self.socket_path)
+            finally:
+                os.umask(previous_umask)
+            os.chmod(self.socket_path, 0o600)
+            self.server_socket.listen()
+            # A timeout so that the exited children are regularly reaped while no commands are being received
+            self.server_socket.settimeout(self.accept_timeout)
+            print(f'SymPortal daemon (pid {os.getpid()}) listening on {self.socket_path}')
+            while True:
+                self._reap_exited_children()
+                try:
+                    client_socket, address = self.server_socket.accept()
+                except socket.timeout:
+                    continue
+                self._fork_command(client_socket)
+        except KeyboardInterrupt:
+            print('\nSymPortal daemon stopping')
+        finally:
+            self.server_socket.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        test_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            test_socket.connect(self.socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Left behind by a daemon that did not exit cleanly
+            os.remove(self.socket_path)
+            return
+        finally:
+            test_socket.close()
+        raise RuntimeError({'message': f'A SymPortal daemon is already listening on {self.socket_path}'})
+
+    def _fork_command(self, client_socket):
+        request = self._receive_request(client_socket)
+        if request is None:
+            client_socket.close()
+            return
+        if self.check_command is not None:
+            error_message = self.check_command(request['args'])
+            if error_message is not None:
+                self._reject_command(client_socket, error_message)
+                return
+        if self.before_fork is not None:
+            self.before_fork()
+        pid = os.fork()
+        if pid:
+            self.child_pids.add(pid)
+            client_socket.close()
+            return
+        # The child
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.server_socket.close()
+        exit_status = 1
+        try:
+            exit_status = self._run_command_for_client(client_socket, request)
+        finally:
+            os._exit(exit_status)
+
+    def _receive_request(self, client_socket):
+        """The command (its args and working_directory) sent by the client, or None if none was received."""
+        client_socket.settimeout(self.request_timeout)
+        try:
+            return json.loads(client_socket.makefile('rb').readline())
+        except (OSError, ValueError):
+            return None
+        finally:
+            client_socket.settimeout(None)
+
+    @staticmethod
+    def _reject_command(client_socket, error_message):
+        try:
+            client_socket.sendall(f'{error_message}\n'.encode() + exit_status_marker + b'1\n')
+        except OSError:
+            # The client has gone away
+            pass
+        finally:
+            client_socket.close()
+
+    def _run_command_for_client(self, client_socket, request):
+        # The output of the command, and of the programs that it runs, is sent to the client
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(client_socket.fileno(), 1)
+        os.dup2(client_socket.fileno(), 2)
+        sys.stdout.reconfigure(line_buffering=True)
+        exit_status = 0
+        try:
+            os.chdir(request['working_directory'])
+            self.run_command(request['args'])
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                exit_status = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                exit_status = 1
+        except BaseException:
+            traceback.print_exc()
+            exit_status = 1
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            client_socket.sendall(exit_status_marker + f'{exit_status}\n'.encode())
+            client_socket.close()
+        except OSError:
+            # The client has gone away
+            pass
+        return exit_status
+
+    @staticmethod
+    def _raise_keyboard_interrupt(signal_number, frame):
+        raise KeyboardInterrupt
+
+    def _reap_exited_children(self):
+        for pid in list(self.child_pids):
+            try:
+                reaped_pid, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                reaped_pid = pid
+            if reaped_pid:
+                self.child_pids.discard(pid)
+
+
+class SymPortalDaemonClient:
+    receive_size = 65536
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+
+    def run_command(self, args_list):
+        """Send the command to the daemon, write its output to stdout as it is received and return its
+        exit status."""
+        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client_socket.connect(self.socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            sys.exit(f'No SymPortal daemon is listening on {self.socket_path}. Start one with: main.py --daemon')
+        client_socket.sendall(f'{json.dumps({"args": args_list, "working_directory": os.getcwd()})}\n'.encode())
+        pending = b''
+        while True:
+            data = client_socket.recv(self.receive_size)
+            if not data:
+                break
+            pending += data
+            if exit_status_marker in pending:
+                continue
+            # Hold back enough bytes that a marker split across two receives is not written out
+            num_bytes_to_write = len(pending) - len(exit_status_marker)
+            if num_bytes_to_write > 0:
+                self._write(pending[:num_bytes_to_write])
+                pending = pending[num_bytes_to_write:]
+        client_socket.close()
+        if exit_status_marker not in pending:
+            self._write(pending)
+            print('\nThe connection to the SymPortal daemon was lost before the command completed', file=sys.stderr)
+            return 1
+        output, exit_status = pending.split(exit_status_marker, 1)
+        self._write(output)
+        return int(exit_status.decode().strip())
+
+    @staticmethod
+    def _write(data):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+
+if __name__ == "__main__":
+    sys.exit(SymPortalDaemonClient(socket_path=get_socket_path()).run_command(sys.argv[1:]))
@@ -4,9 +4,11 @@ import os
 from general import ThreadSafeGeneral
 
 class BlastnAnalysis:
+    # NCBI's nt
+    default_db_path = '/home/humebc/phylogeneticSoftware/ncbi-blast-2.6.0+/ntdbdownload/nt'
+
     def __init__(
-            self, input_file_path, output_file_path,
-            db_path='/home/humebc/phylogeneticSoftware/ncbi-blast-2.6.0+/ntdbdownload/nt', max_target_seqs=1,
+            self, input_file_path, output_file_path, db_path=default_db_path, max_target_seqs=1,
             num_threads=1, output_format_string="6 qseqid sseqid staxids evalue pident qcovs staxid stitle ssciname",
             blastn_exec_path='blastn', pipe_stdout_sterr=True
     ):
@@ -256,6 +258,156 @@ class MothurAnalysis:
 
         self.__execute_summary()
 
+    def execute_initial_qc_single_batch(self):
+        """
+        This performs the same QC as running execute_make_contigs, execute_unique_seqs, execute_pcr(
+        do_reverse_pcr_as_well=True), execute_unique_seqs, execute_screen_seqs and execute_split_abund one
+        after the other, with the same commands, in the same order, on the same files, but rather than starting
+        mothur for each command (and for the summary.seqs that follows each command) the commands are
+        run in three mothur batches:
+        1 - make.contigs, unique.seqs and the fwd pcr.seqs
+        2 - reverse.seqs of the fwd PCR scrap and the rev pcr.seqs (only if there is a scrap fasta)
+        3 - unique.seqs, screen.seqs and split.abund
+        The batches are split where the per-step chain cleans a fasta in python: the fwd PCR scrap is cleaned
+        and the primer mismatch annotations are removed from the PCR outputs between the batches.
+        As in execute_pcr, the unfiltered name file of the unique contigs is used for both PCRs and for the
+        unique.seqs of the combined fwd and rev PCR fasta.
+        Returns the number of contigs.
+        """
+        self.stdout_as_list = []
+        self._make_contig_make_and_write_out_dot_file()
+        self._pcr_make_and_write_oligo_file_if_doesnt_exist()
+        contigs_fasta_path = self.dot_file_file_path.replace('.file', '.trim.contigs.fasta')
+
+        # Batch 1
+        # The output paths of the unique.seqs are those that mothur gives them
+        self.name_file_path = contigs_fasta_path.replace('.fasta', '.names')
+        self.fasta_path = contigs_fasta_path.replace('.fasta', '.unique.fasta')
+        self._pcr_make_mothur_batch_file()
+        self.mothur_batch_file = [
+            f'set.dir(input={self.input_dir})',
+            f'set.dir(output={self.output_dir})',
+            f'make.contigs(file={self.dot_file_file_path}, processors=1)',
+            f'unique.seqs(fasta={contigs_fasta_path})'
+        ] + self.mothur_batch_file[2:]
+        self.thread_safe_general.write_list_to_destination(self.mothur_batch_file_path, self.mothur_batch_file)
+        print(f'{self.name}: starting make.contigs and fwd PCR. This may take some time.')
+        self._run_mothur_batch_file_command_initial_qc_single_batch()
+        try:
+            num_contigs = int(len(self.thread_safe_general.read_defined_file_to_list(contigs_fasta_path))/2)
+        except FileNotFoundError:
+            raise RuntimeError('Make.contigs out fasta not found')
+        if num_contigs == 0:
+            raise RuntimeError('empty fasta')
+        self.check_fasta_and_name_valid()
+        if not os.path.exists(self.fasta_path) or not os.path.exists(self.name_file_path):
+            raise RuntimeError('error in initial qc')
+
+        # As in execute_pcr, the name file is purposefully not updated
+        fwd_output_scrapped_fasta_path = self.fasta_path.replace('.fasta', '.scrap.pcr.fasta')
+        fwd_output_good_fasta_path = self.fasta_path.replace('.fasta', '.pcr.fasta')
+        self.remove_primer_mismatch_annotations_from_fasta(fwd_output_good_fasta_path)
+
+        # Batch 2
+        if self._if_scrap_fasta_exists_clean_and_write_out(fwd_output_scrapped_fasta_path):
+            self.remove_primer_mismatch_annotations_from_fasta(fwd_output_scrapped_fasta_path)
+            rc_fasta_path = fwd_output_scrapped_fasta_path.replace('.fasta', '.rc.fasta')
+            self.fasta_path = rc_fasta_path
+            self._pcr_make_mothur_batch_file()
+            self.mothur_batch_file = [
+                f'set.dir(input={self.input_dir})',
+                f'set.dir(output={self.output_dir})',
+                f'reverse.seqs(fasta={fwd_output_scrapped_fasta_path})'
+            ] + self.mothur_batch_file[2:]
+            self.thread_safe_general.write_list_to_destination(self.mothur_batch_file_path, self.mothur_batch_file)
+            print(f'{self.name}: starting rev PCR. This may take some time.')
+            self._run_mothur_batch_file_command_initial_qc_single_batch()
+            rev_output_good_fasta_path = rc_fasta_path.replace('.fasta', '.pcr.fasta')
+            self.remove_primer_mismatch_annotations_from_fasta(rev_output_good_fasta_path)
+            self._make_new_fasta_path_for_fwd_rev_combined(rev_output_good_fasta_path)
+            self.thread_safe_general.combine_two_fasta_files(
+                path_one=fwd_output_good_fasta_path,
+                path_two=rev_output_good_fasta_path,
+                path_for_combined=self.fasta_path
+            )
+        else:
+            self.fasta_path = fwd_output_good_fasta_path
+        if len(self.thread_safe_general.read_defined_file_to_list(self.fasta_path)) == 0:
+            raise RuntimeError('PCR fasta file is blank')
+
+        # Batch 3
+        self.mothur_batch_file = [
+            f'set.dir(input={self.input_dir})',
+            f'set.dir(output={self.output_dir})',
+            f'unique.seqs(fasta={self.fasta_path}, name={self.name_file_path})',
+            f'screen.seqs(fasta=current, name=current, maxambig=0, processors=1)',
+            f'split.abund(fasta=current, name=current, cutoff=2)'
+        ]
+        self.thread_safe_general.write_list_to_destination(self.mothur_batch_file_path, self.mothur_batch_file)
+        num_lines_of_stdout_before_batch = len(self.stdout_as_list)
+        self._run_mothur_batch_file_command_initial_qc_single_batch()
+        self.name_file_path, self.fasta_path = self._extract_output_paths_of_command_initial_qc_single_batch(
+            'unique.seqs', first_stdout_line=num_lines_of_stdout_before_batch)
+        self.check_fasta_and_name_valid()
+
+        # As with execute_screen_seqs and execute_split_abund, the .good and .abund
+        # files may not have been output so we only update the paths if they exist.
+        for output_file_infix in ['.good', '.abund']:
+            new_fasta_path = self.fasta_path.replace('.fasta', f'{output_file_infix}.fasta')
+            new_name_file_path = self.name_file_path.replace('.names', f'{output_file_infix}.names')
+            if os.path.exists(new_fasta_path):
+                self.fasta_path = new_fasta_path
+            if os.path.exists(new_name_file_path):
+                self.name_file_path = new_name_file_path
+
+        self.check_fasta_and_name_valid()
+
+        return num_contigs
+
+    def get_initial_qc_single_batch_failed_command(self):
+        """Return the name of the mothur command that was being run when the first ERROR
+        was output by mothur during execute_initial_qc_single_batch, else None"""
+        current_command = None
+        for stdout_line in self.stdout_as_list:
+            if stdout_line.startswith('mothur > '):
+                current_command = stdout_line.replace('mothur > ', '').split('(')[0]
+            if 'ERROR' in stdout_line:
+                return current_command
+        return None
+
+    def _extract_output_paths_of_command_initial_qc_single_batch(self, command, first_stdout_line=0):
+        """As _extract_output_path_two_lines, but for the first given command run since the first_stdout_line
+        of the stdout of the batches of execute_initial_qc_single_batch"""
+        command_found = False
+        for i in range(first_stdout_line, len(self.stdout_as_list)):
+            if self.stdout_as_list[i].startswith(f'mothur > {command}('):
+                command_found = True
+            if command_found and 'Output File Names' in self.stdout_as_list[i]:
+                return self.stdout_as_list[i + 1], self.stdout_as_list[i + 2]
+        raise RuntimeError('error in initial qc')
+
+    def _run_mothur_batch_file_command_initial_qc_single_batch(self):
+        """As with the make.contigs command, we stream the stdout so that we can kill mothur if it
+        gets stuck in a loop outputting warnings. The stdout of each batch is added to stdout_as_list."""
+        num_lines_of_stdout_before_batch = len(self.stdout_as_list)
+        warning_count = 0
+        self.latest_completed_process_command = subprocess.Popen(['mothur', self.mothur_batch_file_path],
+                                                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        for byte_line in self.latest_completed_process_command.stdout:
+            byte_line_as_string = byte_line.decode('ISO-8859-1')
+            self.stdout_as_list.append(byte_line_as_string.rstrip())
+            if 'WARNING' in byte_line_as_string:
+                warning_count += 1
+                if warning_count > 10000000:
+                    self.latest_completed_process_command.kill()
+                    raise RuntimeError('bad fastq, mothur stuck in loop')
+        self.latest_completed_process_command.wait()
+        if not self.stdout_and_sterr_to_pipe:
+            for line in self.stdout_as_list[num_lines_of_stdout_before_batch:]:
+                print(line)
+        if self.latest_completed_process_command.returncode == 1:
+            raise RuntimeError('error in initial qc')
+
     def __execute_summary(self):
         self._summarise_make_and_write_mothur_batch()
         self._run_mothur_batch_file_summary()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark a full load of the test dataset with the SQLite defaults against the SQLite performance profile
+(see django_general.SQLitePerformanceProfile). Each configuration is loaded the given number of times and the
+wall clock time of each loading is reported. The DataSets that are loaded are deleted after each loading.
+Run from the SymPortal root directory: python3 -m tests.benchmark_sqlite_performance_profile
+"""
+import os
+import shutil
+import time
+import argparse
+import main
+import django_general
+import sp_config
+from django import db
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+from dbApp.models import DataSet
+
+
+class SQLitePerformanceProfileBenchmark:
+    def __init__(self):
+        self.parser = argparse.ArgumentParser(
+            description='Benchmark a full load of the test dataset with and without the SQLite performance profile')
+        self.parser.add_argument('--repeats', type=int, default=1,
+                                 help='The number of times each configuration is loaded. [1]')
+        self.parser.add_argument('--num_proc', type=int, default=6, help='Passed to --num_proc. [6]')
+        self.args = self.parser.parse_args()
+        self.symportal_testing_root_dir = os.path.abspath(os.path.dirname(__file__))
+        self.symportal_root_dir = os.path.abspath(os.path.join(self.symportal_testing_root_dir, '..'))
+        self.test_data_dir_path = os.path.join(self.symportal_testing_root_dir, 'data', 'smith_subsampled_data')
+        self.data_sheet_file_path = os.path.join(self.test_data_dir_path, 'test_data_submission_input.csv')
+        self.name = 'sqlite_benchmark'
+        self.configuration_to_times_dict = {'sqlite_defaults': [], 'sqlite_performance_profile': []}
+
+    def execute_benchmark(self):
+        self._cleanup_after_previous_benchmark()
+        # Alternate the configurations so that any warming of the file system cache is shared between them
+        for repeat in range(self.args.repeats):
+            for configuration in self.configuration_to_times_dict.keys():
+                self.configuration_to_times_dict[configuration].append(self._time_data_loading(configuration))
+        self._report()
+
+    def _time_data_loading(self, configuration):
+        # The journal mode can only be changed when no other connections are open
+        db.connections.close_all()
+        if configuration == 'sqlite_defaults':
+            # The baseline is SQLite as it is without the profile and so does not refresh the planner statistics
+            sp_config.sqlite_performance_profile = False
+            django_general.SQLitePerformanceProfile(
+                pragmas=django_general.SQLitePerformanceProfile.default_pragmas, analyze=False).connect()
+        else:
+            sp_config.sqlite_performance_profile = True
+        print(f'\n\nBenchmarking: {configuration}\n\n')
+        custom_args_list = ['--load', self.test_data_dir_path, '--name', self.name, '--num_proc',
+                            str(self.args.num_proc), '--data_sheet', self.data_sheet_file_path]
+        start_time = time.time()
+        work_flow_manager = main.SymPortalWorkFlowManager(custom_args_list)
+        work_flow_manager.start_work_flow()
+        elapsed_time = time.time() - start_time
+        self._delete_data_set(work_flow_manager.data_set_object.id)
+        return elapsed_time
+
+    def _cleanup_after_previous_benchmark(self):
+        for ds_uid in [ds.id for ds in DataSet.objects.filter(name=self.name)]:
+            print(f'Cleaning up after previous benchmark: {ds_uid}')
+            self._delete_data_set(ds_uid)
+
+    def _delete_data_set(self, data_set_uid):
+        directory_to_delete = os.path.abspath(os.path.join(
+            self.symportal_root_dir, 'outputs', 'loaded_data_sets', str(data_set_uid)))
+        if os.path.exists(directory_to_delete):
+            shutil.rmtree(directory_to_delete)
+        django_general.delete_data_set(data_set_uid)
+
+    def _report(self):
+        print('\n\nconfiguration\tmean_seconds\tloading_seconds')
+        for configuration, times in self.configuration_to_times_dict.items():
+            print(f'{configuration}\t{sum(times) / len(times):.1f}\t{",".join([f"{t:.1f}" for t in times])}')
+        default_mean = sum(self.configuration_to_times_dict['sqlite_defaults']) / self.args.repeats
+        profile_mean = sum(self.configuration_to_times_dict['sqlite_performance_profile']) / self.args.repeats
+        print(f'The performance profile loaded in {100 * profile_mean / default_mean:.1f}% '
+              f'of the time taken with the SQLite defaults')
+
+
+if __name__ == "__main__":
+    sqlite_performance_profile_benchmark = SQLitePerformanceProfileBenchmark()
+    sqlite_performance_profile_benchmark.execute_benchmark()
@@ -0,0 +1,964 @@
+#!/usr/bin/env python3
+"""Tests of the data loading components that can be run without mothur, BLAST or a loaded database.
+Run from the SymPortal root directory: python3 -m pytest tests/data_loading_tests.py
+"""
+import os
+import json
+import random
+import itertools
+import threading
+import shutil
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+import numpy as np
+import pandas as pd
+from types import SimpleNamespace
+from queue import Queue as mt_Queue
+import main
+import data_loading
+from general import ResultQueueWorkerPool
+
+
+class PerformMEDHandlerRedundantFastaPathTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_fasta(self, sample_name, clade, padded):
+        clade_dir = os.path.join(self.temp_dir, sample_name, clade)
+        os.makedirs(clade_dir, exist_ok=True)
+        file_name = f'seqs_for_med_{sample_name}_clade_{clade}.redundant{".padded" if padded else ""}.fasta'
+        path = os.path.join(clade_dir, file_name)
+        with open(path, 'w') as f:
+            f.write('>seq_1\nACGT\n')
+        return path
+
+    def test_one_fasta_per_clade_directory_preferring_padded(self):
+        unpadded_a = self._write_fasta('sample_1', 'A', padded=False)
+        padded_a = self._write_fasta('sample_1', 'A', padded=True)
+        unpadded_c = self._write_fasta('sample_1', 'C', padded=False)
+        padded_d = self._write_fasta('sample_2', 'D', padded=True)
+        paths = data_loading.PerformMEDHandler.get_list_of_redundant_fasta_paths(self.temp_dir)
+        self.assertEqual(sorted(paths), sorted([padded_a, unpadded_c, padded_d]))
+        self.assertNotIn(unpadded_a, paths)
+        self.assertEqual(len({os.path.dirname(path) for path in paths}), len(paths))
+
+
+class DataSetSampleSequenceCreatorWorkerMEDResultsTests(unittest.TestCase):
+    node_ids = ['000000011', '000000035', '000000102']
+    node_sizes = [120, 45, 9]
+    node_representatives = ['ACGT-ACGTA', 'ACGTTACG-A', '-CGTTACGTA']
+    samples = ['A01']
+    counts = [[120, 45, 9]]
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.med_output_directory = os.path.join(self.temp_dir, 'A01', 'C', 'MEDOUT')
+        os.makedirs(self.med_output_directory)
+        # The binary results of MED and the equivalent text results written in its debug mode
+        np.savez_compressed(
+            os.path.join(self.med_output_directory, 'MED-RESULTS.npz'), node_ids=np.array(self.node_ids, dtype=str),
+            node_sizes=np.array(self.node_sizes, dtype=np.int64),
+            node_representatives=np.array(self.node_representatives, dtype=str),
+            samples=np.array(self.samples, dtype=str), counts=np.array(self.counts, dtype=np.int64))
+        with open(os.path.join(self.med_output_directory, 'MATRIX-COUNT.txt'), 'w') as f:
+            f.write('\t'.join(['samples'] + self.node_ids) + '\n')
+            for sample, sample_counts in zip(self.samples, self.counts):
+                f.write('\t'.join([sample] + [str(count) for count in sample_counts]) + '\n')
+        with open(os.path.join(self.med_output_directory, 'NODE-REPRESENTATIVES.fasta'), 'w') as f:
+            for node_id, node_size, node_representative in zip(
+                    self.node_ids, self.node_sizes, self.node_representatives):
+                f.write(f'>{node_id}|size:{node_size}\n{node_representative}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_worker(self):
+        return data_loading.DataSetSampleSequenceCreatorWorker(
+            med_output_directory=self.med_output_directory,
+            data_set_sample_creator_handler_ref_seq_sequence_to_ref_seq_id_dict={},
+            data_set_sample_creator_handler_ref_seq_uid_to_ref_seq_name_dict={}, data_set_sample_object=None,
+            database_writer=None)
+
+    def test_npz_and_text_results_give_the_same_nodes_and_abundances(self):
+        npz_worker = self._get_worker()
+        os.remove(os.path.join(self.med_output_directory, 'MED-RESULTS.npz'))
+        text_worker = self._get_worker()
+        self.assertEqual(
+            [(node.name, node.abundance, node.sequence) for node in npz_worker.nodes_list_of_nucleotide_sequences],
+            [(node.name, node.abundance, node.sequence) for node in text_worker.nodes_list_of_nucleotide_sequences])
+        self.assertEqual(npz_worker.nodes_list_of_nucleotide_sequences[0].sequence, 'ACGTACGTA')
+        pd.testing.assert_frame_equal(npz_worker.node_abundance_df, text_worker.node_abundance_df)
+        self.assertEqual(npz_worker.num_med_nodes, 3)
+        self.assertEqual(npz_worker.total_num_sequences, text_worker.total_num_sequences)
+
+
+class InitialMothurWorkerErrorTests(unittest.TestCase):
+    """Any error in the QC of a sample must be reported to the parent and must not stop the worker
+    from carrying on with the next sample."""
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.default_start_initial_mothur_worker = data_loading.InitialMothurWorker.start_initial_mothur_worker
+
+    def tearDown(self):
+        data_loading.InitialMothurWorker.start_initial_mothur_worker = self.default_start_initial_mothur_worker
+        shutil.rmtree(self.temp_dir)
+
+    def _raise_os_error(self):
+        raise OSError('No space left on device')
+
+    def test_os_error_is_reported_and_next_sample_is_qced(self):
+        data_loading.InitialMothurWorker.start_initial_mothur_worker = self._raise_os_error
+        outputs = []
+        ResultQueueWorkerPool(num_proc=1, multiprocess=False).execute(
+            worker_function=data_loading.InitialMothurHandler._worker_initial_mothur,
+            work_items=[(f'{sample_name}\tfwd.fastq.gz\trev.fastq.gz',
+                         data_loading.DSSAttributeAssignmentHolder(name=sample_name, uid=uid))
+                        for sample_name, uid in [('sample_1', 1), ('sample_2', 2)]],
+            merge_result=outputs.extend, worker_args=(self.temp_dir, False))
+        self.assertIn(('error_sample_name', 'sample_1'), outputs)
+        self.assertIn(('error_sample_name', 'sample_2'), outputs)
+        dss_att_holders = [output for output in outputs
+                           if isinstance(output, data_loading.DSSAttributeAssignmentHolder)]
+        self.assertEqual(len(dss_att_holders), 2)
+        self.assertTrue(all(dss_att_holder.error_in_processing for dss_att_holder in dss_att_holders))
+
+
+class LazyInputStagingTests(unittest.TestCase):
+    """With lazy_input_staging mothur is given the source fastq files, which must never be removed."""
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_dir = tempfile.mkdtemp()
+        self.source_fastq_path_pair = [os.path.join(self.source_dir, f'sample_1_R{i}.fastq.gz') for i in [1, 2]]
+        for source_path in self.source_fastq_path_pair:
+            with open(source_path, 'w') as f:
+                f.write('@read_1\nACGT\n+\nIIII\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+        shutil.rmtree(self.source_dir)
+
+    def test_source_fastq_files_are_read_in_place_and_kept(self):
+        initial_mothur_worker = data_loading.InitialMothurWorker(
+            dss_att_holder=data_loading.DSSAttributeAssignmentHolder(name='sample_1', uid=1),
+            contig_pair='\t'.join(['sample_1'] + self.source_fastq_path_pair), temp_working_directory=self.temp_dir,
+            debug=False, out_q_attr_data=mt_Queue(), lazy_input_staging=True)
+        self.assertEqual(list(initial_mothur_worker.get_fastq_path_pair()), self.source_fastq_path_pair)
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, 'sample_1')), [])
+        lifecycle = data_loading.TempWorkingDirectoryLifecycle(temp_working_directory=self.temp_dir)
+        lifecycle.release_failed_sample(
+            sample_name='sample_1', fastq_path_pair=initial_mothur_worker.get_fastq_path_pair())
+        self.assertTrue(all(os.path.isfile(source_path) for source_path in self.source_fastq_path_pair))
+
+
+class SymCladeBlastResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.temp_dir, 'blast_cache')
+        self.symclade_path = os.path.join(self.temp_dir, 'symClade.fa')
+        self._write_symclade('>A_ref\nACGTACGT\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_symclade(self, contents):
+        with open(self.symclade_path, 'w') as f:
+            f.write(contents)
+
+    def _get_cache(self):
+        return data_loading.SymCladeBlastResultCache(
+            cache_directory=self.cache_directory, path_to_symclade_db=self.symclade_path)
+
+    def test_results_are_kept_between_loadings(self):
+        blast_cache = self._get_cache()
+        self.assertIsNone(blast_cache.get_blast_results('ACGT'))
+        blast_cache.store_blast_results({'ACGT': ['A_ref\t1e-20\t100\t100', 'A_ref_2\t1e-10\t90\t100'], 'TTTT': []})
+        blast_cache.close()
+        blast_cache = self._get_cache()
+        self.assertEqual(
+            blast_cache.get_blast_results('ACGT'), ['A_ref\t1e-20\t100\t100', 'A_ref_2\t1e-10\t90\t100'])
+        # A sequence without a match is cached as such and is not BLASTed again
+        self.assertEqual(blast_cache.get_blast_results('TTTT'), [])
+        self.assertIsNone(blast_cache.get_blast_results('ACGA'))
+        blast_cache.close()
+
+    def test_new_symclade_version_invalidates_results(self):
+        blast_cache = self._get_cache()
+        blast_cache.store_blast_results({'ACGT': ['A_ref\t1e-20\t100\t100']})
+        blast_cache.close()
+        self._write_symclade('>A_ref\nACGTACGT\n>C_ref\nGGGGCCCC\n')
+        blast_cache = self._get_cache()
+        self.assertIsNone(blast_cache.get_blast_results('ACGT'))
+        blast_cache.close()
+        # Each version is held in a single file however many times results are stored
+        self.assertEqual(len(os.listdir(self.cache_directory)), 2)
+
+
+class SymCladeMatchThresholdsTests(unittest.TestCase):
+    def test_thresholds(self):
+        is_below_match_thresholds = data_loading.SymCladeMatchThresholds.is_below_match_thresholds
+        # A match that meets the evalue threshold is never below the thresholds
+        self.assertFalse(is_below_match_thresholds('seq_1\tA_ref\t0\t1e-120\t70\t90'))
+        self.assertFalse(is_below_match_thresholds('seq_1\tA_ref\t0\t1e-90\t80\t95'))
+        self.assertTrue(is_below_match_thresholds('seq_1\tA_ref\t0\t1e-90\t79.9\t100'))
+        self.assertTrue(is_below_match_thresholds('seq_1\tA_ref\t0\t1e-90\t100\t94'))
+        # An evalue that cannot be read is treated as failing the evalue threshold
+        self.assertFalse(is_below_match_thresholds('seq_1\tA_ref\t0\t0.0\t100\t100'))
+        self.assertTrue(is_below_match_thresholds('seq_1\tA_ref\t0\t0.0\t70\t100'))
+
+    def test_delta_database_unresolved_sequences_follow_the_thresholds(self):
+        fasta_dict = {'seq_1': 'ACGT', 'seq_2': 'ACGA', 'seq_3': 'ACGC'}
+        blast_output_as_list = [
+            'seq_1\tA_ref\t0\t1e-90\t100\t100', 'seq_2\tA_ref\t0\t1e-90\t75\t100',
+            'seq_2\tC_ref\t0\t1e-90\t100\t100']
+        # seq_2 is judged on its first (best) match and seq_3 has no match
+        self.assertEqual(
+            data_loading.SymCladeDeltaDatabase.get_unresolved_sequence_names(fasta_dict, blast_output_as_list),
+            ['seq_2', 'seq_3'])
+
+
+class SymCladeKmerPreClassifierTests(unittest.TestCase):
+    """The pre-classifier must agree with the symClade BLAST on the sequences it classifies. Sequences that are
+    close to, but not in, symClade (near-miss decoys) must be left to BLAST rather than given a wrong clade.
+    The decoys include chimeras of two distant references of the same clade."""
+    symclade_path = os.path.join(
+        os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'symbiodiniaceaeDB', 'symClade.fa')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.kmer_preclassifier = data_loading.SymCladeKmerPreClassifier(path_to_symclade_db=cls.symclade_path)
+        cls.symclade_fasta_dict = data_loading.ThreadSafeGeneral().create_dict_from_fasta(
+            fasta_path=cls.symclade_path)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.random_generator = random.Random(1234)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _mutate(self, nucleotide_sequence, rate):
+        return ''.join(
+            self.random_generator.choice('ACGT'.replace(nucleotide, '')) if self.random_generator.random() < rate
+            else nucleotide for nucleotide in nucleotide_sequence)
+
+    def _get_decoy_fasta_dict(self):
+        decoy_fasta_dict = {}
+        for i, (sequence_name, nucleotide_sequence) in enumerate(self.symclade_fasta_dict.items()):
+            if i % 5:
+                continue
+            for rate in [0.02, 0.05, 0.1, 0.3]:
+                decoy_fasta_dict[f'{sequence_name}_mutated_{rate}'] = self._mutate(nucleotide_sequence, rate)
+            shuffled_nucleotide_list = list(nucleotide_sequence)
+            self.random_generator.shuffle(shuffled_nucleotide_list)
+            decoy_fasta_dict[f'{sequence_name}_shuffled'] = ''.join(shuffled_nucleotide_list)
+        decoy_fasta_dict.update(self._get_chimera_fasta_dict())
+        return decoy_fasta_dict
+
+    def _get_chimera_fasta_dict(self):
+        """Chimeras of the first half of a reference and the second half of a distant reference of its clade"""
+        chimera_fasta_dict = {}
+        for clade in ['A', 'C']:
+            clade_sequence_names = [
+                sequence_name for sequence_name in self.symclade_fasta_dict if sequence_name[-1] == clade]
+            num_clade_chimeras = 0
+            while num_clade_chimeras < 50:
+                first_sequence_name, second_sequence_name = self.random_generator.sample(clade_sequence_names, 2)
+                first_kmer_set = self.kmer_preclassifier._get_kmer_set(self.symclade_fasta_dict[first_sequence_name])
+                second_kmer_set = self.kmer_preclassifier._get_kmer_set(
+                    self.symclade_fasta_dict[second_sequence_name])
+                if len(first_kmer_set & second_kmer_set) / len(first_kmer_set) > 0.6:
+                    continue
+                first_nucleotide_sequence = self.symclade_fasta_dict[first_sequence_name]
+                second_nucleotide_sequence = self.symclade_fasta_dict[second_sequence_name]
+                chimera_fasta_dict[f'{first_sequence_name}_chimera_{second_sequence_name}'] = \
+                    first_nucleotide_sequence[:len(first_nucleotide_sequence) // 2] + \
+                    second_nucleotide_sequence[len(second_nucleotide_sequence) // 2:]
+                num_clade_chimeras += 1
+        return chimera_fasta_dict
+
+    def test_symclade_sequences_are_assigned_their_clade(self):
+        verdicts = [self.kmer_preclassifier.get_verdict(nucleotide_sequence) for
+                    nucleotide_sequence in self.symclade_fasta_dict.values()]
+        for sequence_name, verdict in zip(self.symclade_fasta_dict.keys(), verdicts):
+            self.assertIn(verdict, [sequence_name[-1], None])
+        # Only a handful of the sequences are too similar to a second clade to be assigned
+        self.assertLess(verdicts.count(None), len(verdicts) * 0.02)
+
+    def test_near_miss_decoys_are_never_given_a_wrong_clade(self):
+        for decoy_name, nucleotide_sequence in self._get_decoy_fasta_dict().items():
+            verdict = self.kmer_preclassifier.get_verdict(nucleotide_sequence)
+            if decoy_name.endswith('_shuffled'):
+                self.assertIn(verdict, [data_loading.SymCladeKmerPreClassifier.rejected_verdict, None])
+            else:
+                self.assertIn(
+                    verdict, [decoy_name.split('_mutated_')[0][-1],
+                              data_loading.SymCladeKmerPreClassifier.rejected_verdict, None])
+
+    def test_chimeras_are_only_assigned_a_clade_if_close_to_a_single_reference(self):
+        reference_kmer_set_list = [
+            self.kmer_preclassifier._get_kmer_set(nucleotide_sequence) for
+            nucleotide_sequence in self.symclade_fasta_dict.values()]
+        num_chimeras_within_clade_containment = 0
+        num_chimeras_far_from_a_single_reference = 0
+        chimera_fasta_dict = self._get_chimera_fasta_dict()
+        for chimera_name, nucleotide_sequence in chimera_fasta_dict.items():
+            query_kmer_set = self.kmer_preclassifier._get_kmer_set(nucleotide_sequence)
+            clade_containment = len(
+                query_kmer_set & self.kmer_preclassifier.clade_to_kmer_set_dict[chimera_name[-1]]
+            ) / len(query_kmer_set)
+            if clade_containment >= self.kmer_preclassifier.min_containment_for_clade_assignment:
+                num_chimeras_within_clade_containment += 1
+            best_reference_containment = max(
+                len(query_kmer_set & reference_kmer_set) / len(query_kmer_set) for
+                reference_kmer_set in reference_kmer_set_list)
+            # A chimera that is not close to any single reference would fail the coverage threshold of BLAST
+            if best_reference_containment < 0.9:
+                num_chimeras_far_from_a_single_reference += 1
+                self.assertIsNone(self.kmer_preclassifier.get_verdict(nucleotide_sequence))
+            else:
+                self.assertIn(self.kmer_preclassifier.get_verdict(nucleotide_sequence), [chimera_name[-1], None])
+        # Most of the chimeras are made up almost entirely of the k-mers of their clade, but not of any one reference
+        self.assertGreater(num_chimeras_within_clade_containment, len(chimera_fasta_dict) * 0.8)
+        self.assertGreater(num_chimeras_far_from_a_single_reference, len(chimera_fasta_dict) * 0.5)
+
+    @unittest.skipUnless(shutil.which('blastn') and shutil.which('makeblastdb'), 'Requires BLAST')
+    def test_verdicts_agree_with_blast(self):
+        # A clade verdict must be the clade of a BLAST match that meets the thresholds. A rejected sequence must
+        # have no BLAST match or one that is below the thresholds.
+        symclade_db_path = os.path.join(self.temp_dir, 'symClade.fa')
+        shutil.copyfile(self.symclade_path, symclade_db_path)
+        data_loading.ThreadSafeGeneral.make_new_blast_db(
+            input_fasta_to_make_db_from=symclade_db_path, db_title='symClade')
+        query_fasta_dict = dict(self.symclade_fasta_dict)
+        query_fasta_dict.update(self._get_decoy_fasta_dict())
+        query_fasta_path = os.path.join(self.temp_dir, 'query.fasta')
+        data_loading.ThreadSafeGeneral.write_list_to_destination(
+            query_fasta_path, [line for sequence_name, nucleotide_sequence in query_fasta_dict.items()
+                               for line in [f'>{sequence_name}', nucleotide_sequence]])
+        blastn_analysis = data_loading.BlastnAnalysis(
+            input_file_path=query_fasta_path, output_file_path=os.path.join(self.temp_dir, 'blast.out'),
+            db_path=symclade_db_path, output_format_string="6 qseqid sseqid staxids evalue pident qcovs")
+        blastn_analysis.execute_blastn_analysis()
+        sequence_name_to_first_blast_line_dict = {}
+        for blast_line in blastn_analysis.return_blast_output_as_list():
+            sequence_name_to_first_blast_line_dict.setdefault(blast_line.split('\t')[0], blast_line)
+        for sequence_name, nucleotide_sequence in query_fasta_dict.items():
+            verdict = self.kmer_preclassifier.get_verdict(nucleotide_sequence)
+            blast_line = sequence_name_to_first_blast_line_dict.get(sequence_name)
+            if verdict == data_loading.SymCladeKmerPreClassifier.rejected_verdict:
+                self.assertTrue(
+                    blast_line is None or data_loading.SymCladeMatchThresholds.is_below_match_thresholds(blast_line))
+            elif verdict is not None:
+                self.assertIsNotNone(blast_line)
+                self.assertFalse(data_loading.SymCladeMatchThresholds.is_below_match_thresholds(blast_line))
+                self.assertEqual(blast_line.split('\t')[1][-1], verdict)
+
+    def test_verdicts_are_kept_apart_from_the_blast_output(self):
+        sample_directory = os.path.join(self.temp_dir, 'sample_1')
+        os.makedirs(sample_directory)
+        symclade_sequence_name, symclade_nucleotide_sequence = next(iter(self.symclade_fasta_dict.items()))
+        with open(os.path.join(sample_directory, 'fasta_file_for_tax_screening.fasta'), 'w') as f:
+            f.write(f'>seq_1\n{symclade_nucleotide_sequence}\n>seq_2\n{"ACGT" * 60}\n')
+        with open(os.path.join(sample_directory, 'name_file_for_tax_screening.names'), 'w') as f:
+            f.write('seq_1\tseq_1\nseq_2\tseq_2\n')
+        taxonomic_screening_worker = data_loading.PotentialSymTaxScreeningWorker(
+            sample_name='sample_1', wkd=self.temp_dir, path_to_symclade_db=self.symclade_path, debug=False,
+            kmer_preclassifier=self.kmer_preclassifier, kmer_preclassifier_mode='classify')
+        # Both sequences are classified so nothing is BLASTed
+        taxonomic_screening_worker.execute_tax_screening()
+        self.assertEqual(data_loading.ThreadSafeGeneral.read_defined_file_to_list(
+            os.path.join(sample_directory, 'blast.out')), [])
+        self.assertEqual(
+            data_loading.SymCladeKmerPreClassifier.read_clade_verdicts(sample_directory),
+            {'seq_1': symclade_sequence_name[-1]})
+        self.assertEqual(taxonomic_screening_worker.sequence_name_to_clade_dict, {'seq_1': symclade_sequence_name[-1]})
+        # The rejected sequence is treated as having no BLAST match
+        self.assertEqual(taxonomic_screening_worker.potential_non_symbiodiniaceae_sequences_list, ['seq_2'])
+        self.assertEqual(taxonomic_screening_worker.sub_evalue_nucleotide_sequence_to_clade_dict, {})
+
+
+# The results of the stub blastn for each nucleotide sequence, without the qseqid, and the queries it was run on
+stub_blast_results_dict = {}
+stub_blast_queries = []
+
+
+def run_stub_blastn(blastn_analysis, pipe_stdout_sterr=True):
+    fasta_dict = data_loading.ThreadSafeGeneral().create_dict_from_fasta(fasta_path=blastn_analysis.input_file_path)
+    stub_blast_queries.extend(fasta_dict.values())
+    data_loading.ThreadSafeGeneral.write_list_to_destination(
+        blastn_analysis.output_file_path,
+        [f'{sequence_name}\t{blast_result}' for sequence_name, nucleotide_sequence in fasta_dict.items() for
+         blast_result in stub_blast_results_dict[nucleotide_sequence]])
+
+
+class PotentialSymTaxScreeningDeduplicationTests(unittest.TestCase):
+    """The deduplicated BLAST screening must give the same per sample screening results as BLASTing each sample."""
+    sample_names = ['sample_1', 'sample_2', 'sample_3']
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        random_generator = random.Random(1234)
+        nucleotide_sequences = [
+            ''.join(random_generator.choice('ACGT') for i in range(random_generator.randrange(150, 300)))
+            for j in range(30)]
+        # Matches that meet the thresholds, matches below the thresholds (judged on the first match) and no match
+        for i, nucleotide_sequence in enumerate(nucleotide_sequences):
+            stub_blast_results_dict[nucleotide_sequence] = [
+                ['A_ref\t0\t1e-120\t100\t100'], ['C_ref\t0\t1e-90\t70\t100', 'A_ref\t0\t1e-120\t100\t100'],
+                ['D_ref\t0\t1e-90\t100\t90'], []][i % 4]
+        for sample_name in self.sample_names:
+            sample_directory = os.path.join(self.temp_dir, 'per_sample', sample_name)
+            os.makedirs(sample_directory)
+            sample_nucleotide_sequences = random_generator.sample(nucleotide_sequences, 15)
+            with open(os.path.join(sample_directory, 'fasta_file_for_tax_screening.fasta'), 'w') as f:
+                for i, nucleotide_sequence in enumerate(sample_nucleotide_sequences):
+                    f.write(f'>{sample_name}_seq_{i}\n{nucleotide_sequence}\n')
+            with open(os.path.join(sample_directory, 'name_file_for_tax_screening.names'), 'w') as f:
+                for i in range(len(sample_nucleotide_sequences)):
+                    f.write(f'{sample_name}_seq_{i}\t{sample_name}_seq_{i}\n')
+        # A sample with only matches that meet the thresholds, so is added to the checked samples
+        sample_directory = os.path.join(self.temp_dir, 'per_sample', 'sample_4')
+        os.makedirs(sample_directory)
+        with open(os.path.join(sample_directory, 'fasta_file_for_tax_screening.fasta'), 'w') as f:
+            f.write(f'>sample_4_seq_0\n{nucleotide_sequences[0]}\n>sample_4_seq_1\n{nucleotide_sequences[4]}\n')
+        with open(os.path.join(sample_directory, 'name_file_for_tax_screening.names'), 'w') as f:
+            f.write('sample_4_seq_0\tsample_4_seq_0\nsample_4_seq_1\tsample_4_seq_1\n')
+        shutil.copytree(os.path.join(self.temp_dir, 'per_sample'), os.path.join(self.temp_dir, 'deduplicated'))
+
+    def tearDown(self):
+        stub_blast_results_dict.clear()
+        del stub_blast_queries[:]
+        shutil.rmtree(self.temp_dir)
+
+    def _screen(self, deduplicated_blast_screening):
+        temp_working_directory = os.path.join(
+            self.temp_dir, 'deduplicated' if deduplicated_blast_screening else 'per_sample')
+        del stub_blast_queries[:]
+        potential_sym_tax_screening_handler = data_loading.PotentialSymTaxScreeningHandler(
+            samples_that_caused_errors_in_qc_list=[], checked_samples_list=[],
+            list_of_samples_names=self.sample_names + ['sample_4'], num_proc=2, multiprocess=False,
+            deduplicated_blast_screening=deduplicated_blast_screening, temp_working_directory=temp_working_directory)
+        with mock.patch.object(data_loading.BlastnAnalysis, 'execute_blastn_analysis', run_stub_blastn):
+            potential_sym_tax_screening_handler.execute_potential_sym_tax_screening(
+                data_loading_temp_working_directory=temp_working_directory,
+                data_loading_path_to_symclade_db=os.path.join(self.temp_dir, 'symClade.fa'), data_loading_debug=False)
+        sub_evalue_sequence_counter = potential_sym_tax_screening_handler.sub_evalue_sequence_counter
+        sub_evalue_sequences = sorted(sub_evalue_sequence_counter.get_sequences_found_in_at_least(1))
+        sub_evalue_sequence_counter.close()
+        blast_output_dict = {
+            sample_name: sorted(data_loading.ThreadSafeGeneral.read_defined_file_to_list(
+                os.path.join(temp_working_directory, sample_name, 'blast.out')))
+            for sample_name in self.sample_names + ['sample_4']}
+        return (sorted(potential_sym_tax_screening_handler.checked_samples_list), sub_evalue_sequences,
+                blast_output_dict, list(stub_blast_queries))
+
+    def test_deduplicated_screening_matches_per_sample_screening(self):
+        per_sample_checked, per_sample_sub_evalue, per_sample_blast_output, per_sample_queries = self._screen(
+            deduplicated_blast_screening=False)
+        deduplicated_checked, deduplicated_sub_evalue, deduplicated_blast_output, deduplicated_queries = \
+            self._screen(deduplicated_blast_screening=True)
+        self.assertEqual(per_sample_checked, ['sample_4'])
+        self.assertEqual(deduplicated_checked, per_sample_checked)
+        self.assertTrue(per_sample_sub_evalue)
+        self.assertEqual(deduplicated_sub_evalue, per_sample_sub_evalue)
+        self.assertEqual(deduplicated_blast_output, per_sample_blast_output)
+        # Each unique sequence is only BLASTed once
+        self.assertEqual(len(deduplicated_queries), len(set(deduplicated_queries)))
+        self.assertEqual(set(deduplicated_queries), set(per_sample_queries))
+        self.assertGreater(len(per_sample_queries), len(deduplicated_queries))
+
+
+class PotentialSymTaxScreeningAggregationTests(unittest.TestCase):
+    """The per sample summaries of the workers, merged by the handler, must give the same checked samples, sub e
+    value sequence counts and clades as the per sequence accumulation of the workers into shared dicts that
+    they replaced."""
+    blast_results = [
+        'A_ref\t0\t1e-120\t100\t100', 'C_ref\t0\t1e-90\t70\t100', 'D_ref\t0\t1e-90\t100\t90',
+        'C_ref\t0\t1e-90\t90\t98', 'A_ref\t0\t0.0\t75\t100', 'D_ref\t0\t0.0\t100\t100']
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.default_max_in_memory_sequences = data_loading.SubEValueSequenceCounter.max_in_memory_sequences
+        random_generator = random.Random(1234)
+        nucleotide_sequences = [
+            ''.join(random_generator.choice('ACGT') for i in range(random_generator.randrange(150, 330)))
+            for j in range(40)]
+        self.sample_name_to_fasta_and_blast_output_dict = {}
+        for sample_number in range(8):
+            sample_name = f'sample_{sample_number}'
+            sample_directory = os.path.join(self.temp_dir, sample_name)
+            os.makedirs(sample_directory)
+            if sample_number < 7:
+                sample_nucleotide_sequences = random_generator.sample(nucleotide_sequences, 20)
+            else:
+                # Only sequences with a good match, so the sample is checked
+                sample_nucleotide_sequences = nucleotide_sequences[:3]
+            fasta_dict = {
+                f'{sample_name}_seq_{i}': nucleotide_sequence for
+                i, nucleotide_sequence in enumerate(sample_nucleotide_sequences)}
+            blast_output_as_list = []
+            for sequence_name, nucleotide_sequence in fasta_dict.items():
+                sequence_index = nucleotide_sequences.index(nucleotide_sequence)
+                if sample_number == 7:
+                    blast_output_as_list.append(f'{sequence_name}\t{self.blast_results[0]}')
+                    continue
+                # A few sequences have no match and some several matches, judged on the first
+                for blast_result in random_generator.sample(self.blast_results, sequence_index % 3):
+                    blast_output_as_list.append(f'{sequence_name}\t{blast_result}')
+            data_loading.ThreadSafeGeneral.write_list_to_destination(
+                os.path.join(sample_directory, 'fasta_file_for_tax_screening.fasta'),
+                [line for sequence_name, nucleotide_sequence in fasta_dict.items() for
+                 line in [f'>{sequence_name}', nucleotide_sequence]])
+            data_loading.ThreadSafeGeneral.write_list_to_destination(
+                os.path.join(sample_directory, 'name_file_for_tax_screening.names'),
+                [f'{sequence_name}\t{sequence_name}' for sequence_name in fasta_dict])
+            data_loading.ThreadSafeGeneral.write_list_to_destination(
+                os.path.join(sample_directory, 'blast.out'), blast_output_as_list)
+            self.sample_name_to_fasta_and_blast_output_dict[sample_name] = (fasta_dict, blast_output_as_list)
+
+    def tearDown(self):
+        data_loading.SubEValueSequenceCounter.max_in_memory_sequences = self.default_max_in_memory_sequences
+        shutil.rmtree(self.temp_dir)
+
+    def _accumulate_per_sequence(self):
+        """The accumulation of each sub e value sequence, as it was found, into the shared dicts"""
+        checked_samples_list = []
+        e_val_collection_dict = {}
+        sub_evalue_nucleotide_sequence_to_clade_dict = {}
+        for sample_name, (fasta_dict, blast_output_as_list) in self.sample_name_to_fasta_and_blast_output_dict.items():
+            sequence_name_to_clade_dict = {
+                blast_line.split('\t')[0]: blast_line.split('\t')[1][-1] for blast_line in blast_output_as_list}
+            potential_non_symbiodiniaceae_sequences_list = list(
+                set(fasta_dict.keys()) - set(sequence_name_to_clade_dict.keys()))
+            already_processed_blast_seq_result = []
+            for line in blast_output_as_list:
+                name_of_current_sequence = line.split('\t')[0]
+                if name_of_current_sequence in already_processed_blast_seq_result:
+                    continue
+                already_processed_blast_seq_result.append(name_of_current_sequence)
+                identity = float(line.split('\t')[4])
+                coverage = float(line.split('\t')[5])
+                try:
+                    if int(line.split('\t')[3].split('-')[1]) >= 100:
+                        continue
+                except (IndexError, ValueError):
+                    pass
+                if identity < 80 or coverage < 95:
+                    potential_non_symbiodiniaceae_sequences_list.append(name_of_current_sequence)
+                    if 184 < len(fasta_dict[name_of_current_sequence]) < 310:
+                        if fasta_dict[name_of_current_sequence] in e_val_collection_dict:
+                            e_val_collection_dict[fasta_dict[name_of_current_sequence]] += 1
+                        else:
+                            e_val_collection_dict[fasta_dict[name_of_current_sequence]] = 1
+                            sub_evalue_nucleotide_sequence_to_clade_dict[fasta_dict[name_of_current_sequence]] = \
+                                sequence_name_to_clade_dict[name_of_current_sequence]
+            if not potential_non_symbiodiniaceae_sequences_list:
+                checked_samples_list.append(sample_name)
+        return checked_samples_list, {
+            nucleotide_sequence: (num_samples_found_in, sub_evalue_nucleotide_sequence_to_clade_dict[
+                nucleotide_sequence]) for nucleotide_sequence, num_samples_found_in in e_val_collection_dict.items()}
+
+    def _merge_sample_summaries(self):
+        checked_samples_list = []
+        sub_evalue_sequence_counter = data_loading.SubEValueSequenceCounter(spill_directory=self.temp_dir)
+        for sample_name in self.sample_name_to_fasta_and_blast_output_dict:
+            taxonomic_screening_worker = data_loading.PotentialSymTaxScreeningWorker(
+                sample_name=sample_name, wkd=self.temp_dir, path_to_symclade_db=None, debug=False,
+                blast_output_precomputed=True)
+            taxonomic_screening_worker.execute_tax_screening()
+            data_loading.PotentialSymTaxScreeningHandler.add_sample_summary_to_results(
+                sample_summary=taxonomic_screening_worker.get_sample_summary(),
+                checked_samples_list=checked_samples_list, sub_evalue_sequence_counter=sub_evalue_sequence_counter)
+        sub_evalue_sequence_to_num_samples_and_clade_dict = {
+            nucleotide_sequence: (num_samples_found_in, clade) for nucleotide_sequence, num_samples_found_in, clade in
+            sub_evalue_sequence_counter.get_sequences_found_in_at_least(1)}
+        sub_evalue_sequence_counter.close()
+        return checked_samples_list, sub_evalue_sequence_to_num_samples_and_clade_dict
+
+    def test_merged_sample_summaries_match_per_sequence_accumulation(self):
+        per_sequence_checked_samples, per_sequence_sub_evalue_dict = self._accumulate_per_sequence()
+        self.assertEqual(per_sequence_checked_samples, ['sample_7'])
+        self.assertTrue(any(
+            num_samples_found_in > 1 for num_samples_found_in, clade in per_sequence_sub_evalue_dict.values()))
+        for max_in_memory_sequences in [self.default_max_in_memory_sequences, 5]:
+            data_loading.SubEValueSequenceCounter.max_in_memory_sequences = max_in_memory_sequences
+            merged_checked_samples, merged_sub_evalue_dict = self._merge_sample_summaries()
+            self.assertEqual(merged_checked_samples, per_sequence_checked_samples)
+            self.assertEqual(merged_sub_evalue_dict, per_sequence_sub_evalue_dict)
+
+
+class SubEValueSequenceCounterTests(unittest.TestCase):
+    """The counts spilled to disk must match those counted in memory."""
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.default_max_in_memory_sequences = data_loading.SubEValueSequenceCounter.max_in_memory_sequences
+
+    def tearDown(self):
+        data_loading.SubEValueSequenceCounter.max_in_memory_sequences = self.default_max_in_memory_sequences
+        shutil.rmtree(self.temp_dir)
+
+    def _count(self, samples):
+        sub_evalue_sequence_counter = data_loading.SubEValueSequenceCounter(spill_directory=self.temp_dir)
+        for sample_sub_evalue_nucleotide_sequence_to_clade_dict in samples:
+            sub_evalue_sequence_counter.add_sample_sequences(sample_sub_evalue_nucleotide_sequence_to_clade_dict)
+        sequences_found_in_two_samples = list(sub_evalue_sequence_counter.get_sequences_found_in_at_least(2))
+        sub_evalue_sequence_counter.close()
+        return sequences_found_in_two_samples
+
+    def test_spilled_counts_match_in_memory_counts(self):
+        random_generator = random.Random(1234)
+        sequences = [''.join(random_generator.choice('ACGT') for i in range(20)) for j in range(50)]
+        samples = [{sequence: random_generator.choice('ACD') for sequence in random_generator.sample(sequences, 10)}
+                   for k in range(20)]
+        in_memory_counts = self._count(samples)
+        data_loading.SubEValueSequenceCounter.max_in_memory_sequences = 5
+        spilled_counts = self._count(samples)
+        self.assertTrue(in_memory_counts)
+        self.assertEqual(in_memory_counts, spilled_counts)
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+
+class SubEValueVerdictCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.temp_dir, 'sub_evalue_verdict_cache')
+        self.db_path = os.path.join(self.temp_dir, 'db', 'nt_stand_in')
+        os.makedirs(os.path.dirname(self.db_path))
+        for extension in ['.nhr', '.nin', '.nsq']:
+            with open(self.db_path + extension, 'w') as f:
+                f.write('stand in')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_backend(self, db_path=None, required_symbiodiniaceae_matches=3):
+        return data_loading.SubEValueScreeningBackend(
+            temp_working_directory=self.temp_dir, num_proc=1, debug=False,
+            required_symbiodiniaceae_matches=required_symbiodiniaceae_matches,
+            db_path=db_path or self.db_path, verdict_cache_directory=self.cache_directory)
+
+    def test_verdicts_are_kept_between_loadings(self):
+        backend = self._get_backend()
+        backend._store_verdicts({'ACGT': True, 'TTTT': False})
+        backend.close()
+        backend = self._get_backend()
+        self.assertTrue(backend._get_cached_verdict('ACGT'))
+        self.assertFalse(backend._get_cached_verdict('TTTT'))
+        self.assertIsNone(backend._get_cached_verdict('ACGA'))
+        backend.close()
+
+    def test_updated_db_or_criteria_invalidate_verdicts(self):
+        backend = self._get_backend()
+        backend._store_verdicts({'ACGT': True})
+        backend.close()
+        backend = self._get_backend(required_symbiodiniaceae_matches=2)
+        self.assertIsNone(backend._get_cached_verdict('ACGT'))
+        backend.close()
+        with open(self.db_path + '.nsq', 'w') as f:
+            f.write('updated stand in')
+        backend = self._get_backend()
+        self.assertIsNone(backend._get_cached_verdict('ACGT'))
+        backend.close()
+
+    def test_verdicts_are_not_cached_if_the_db_cannot_be_read(self):
+        backend = self._get_backend(db_path=os.path.join(self.temp_dir, 'missing_db', 'nt'))
+        self.assertIsNone(backend.verdict_cache_connection)
+        backend._store_verdicts({'ACGT': True})
+        self.assertIsNone(backend._get_cached_verdict('ACGT'))
+        self.assertFalse(os.path.exists(self.cache_directory))
+
+
+class StreamingSamplePipelineErrorTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_error_in_a_stage_is_reported_and_next_sample_is_processed(self):
+        # The samples have no fasta to screen so the stage raises a FileNotFoundError
+        outputs = []
+        ResultQueueWorkerPool(num_proc=1, multiprocess=False).execute(
+            worker_function=data_loading.StreamingSamplePipelineHandler._streaming_sample_pipeline_worker,
+            work_items=[(None, None, data_loading.DataSetSample(name=sample_name))
+                        for sample_name in ['sample_1', 'sample_2']],
+            merge_result=outputs.extend, worker_args=(
+                [data_loading.StreamingSamplePipelineHandler.potential_sym_tax_screening_stage],
+                self.temp_dir, None, self.temp_dir, self.temp_dir, False))
+        self.assertEqual(
+            [output for output in outputs if isinstance(output, tuple)],
+            [('error_sample_name', 'sample_1'), ('error_sample_name', 'sample_2')])
+        data_set_samples = [output for output in outputs if isinstance(output, data_loading.DataSetSample)]
+        self.assertEqual(len(data_set_samples), 2)
+        self.assertTrue(all(data_set_sample.error_in_processing for data_set_sample in data_set_samples))
+
+
+class TempWorkingDirectoryLifecycleCheckpointTests(unittest.TestCase):
+    """The checkpoints must survive the release of a sample's intermediates so that a --resume loading can
+    skip the stages that completed."""
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.temp_working_directory = os.path.join(self.temp_dir, 'temp_working_directory')
+        self.sample_directory = os.path.join(self.temp_working_directory, 'sample_1')
+        os.makedirs(self.sample_directory)
+        self.lifecycle = data_loading.TempWorkingDirectoryLifecycle(self.temp_working_directory)
+        self.initial_mothur_qc_checkpoint = data_loading.DataLoadingCheckpoint(
+            stage=data_loading.DataLoadingCheckpoint.initial_mothur_qc_stage)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_file(self, path, content='>seq_1\nACGT\n'):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _do_initial_mothur_qc(self):
+        tax_screening_paths = [
+            self._write_file(os.path.join(self.sample_directory, file_name)) for file_name in
+            ['name_file_for_tax_screening.names', 'fasta_file_for_tax_screening.fasta']]
+        self._write_file(os.path.join(self.sample_directory, 'stability.trim.contigs.fasta'))
+        self.initial_mothur_qc_checkpoint.record(directory=self.sample_directory, file_paths=tax_screening_paths)
+
+    def test_initial_qc_checkpoint_is_complete_after_release(self):
+        self._do_initial_mothur_qc()
+        self.lifecycle.release_initial_qc_intermediates('sample_1', fastq_path_pair=[])
+        self.assertFalse(os.path.exists(os.path.join(self.sample_directory, 'stability.trim.contigs.fasta')))
+        self.assertTrue(self.initial_mothur_qc_checkpoint.is_complete(self.sample_directory))
+
+    def test_resume_from_med_after_tax_screening_release(self):
+        self._do_initial_mothur_qc()
+        self.lifecycle.release_initial_qc_intermediates('sample_1', fastq_path_pair=[])
+        redundant_fasta_path = self._write_file(
+            os.path.join(self.sample_directory, 'A', 'seqs_for_med_sample_1_clade_A.redundant.padded.fasta'))
+        self.lifecycle.release_tax_screening_intermediates('sample_1')
+        self.assertFalse(
+            os.path.exists(os.path.join(self.sample_directory, 'fasta_file_for_tax_screening.fasta')))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.sample_directory, self.initial_mothur_qc_checkpoint.checkpoint_file_name)))
+
+        pre_med_sequence_output_directory_path = os.path.join(self.temp_dir, 'pre_med_seqs')
+        self._write_file(os.path.join(pre_med_sequence_output_directory_path, 'pre_med_seqs_sample_1.fasta'))
+        data_loading_stand_in = SimpleNamespace(
+            temp_working_directory=self.temp_working_directory,
+            pre_med_sequence_output_directory_path=pre_med_sequence_output_directory_path)
+        data_loading.DataLoading._record_taxonomic_screening_checkpoint(data_loading_stand_in)
+        self.assertTrue(data_loading.DataLoading._taxonomic_screening_checkpoint_is_complete(data_loading_stand_in))
+
+        # A redundant fasta that changed since the checkpoint cannot be resumed from
+        self._write_file(redundant_fasta_path, content='>seq_1\nACGA\n')
+        self.assertFalse(data_loading.DataLoading._taxonomic_screening_checkpoint_is_complete(data_loading_stand_in))
+
+
+class RecordedModelObject:
+    """Stands in for a model object so that the DatabaseWriter can be tested without a database"""
+    saved_names = []
+    bulk_created_names = []
+
+    class objects:
+        @staticmethod
+        def bulk_create(model_objects, batch_size=None):
+            RecordedModelObject.bulk_created_names.extend(model_object.name for model_object in model_objects)
+
+    def __init__(self, name, fail_to_save=False):
+        self.name = name
+        self.fail_to_save = fail_to_save
+
+    def save(self):
+        if self.fail_to_save:
+            raise ValueError(f'{self.name} could not be saved')
+        RecordedModelObject.saved_names.append(self.name)
+
+
+class DatabaseWriterTests(unittest.TestCase):
+    class FastDatabaseWriter(data_loading.DatabaseWriter):
+        max_batch_size = 2
+        max_seconds_between_commits = 0.1
+
+    def setUp(self):
+        RecordedModelObject.saved_names = []
+        RecordedModelObject.bulk_created_names = []
+        self.atomic_patch = mock.patch.object(data_loading.transaction, 'atomic', contextlib.nullcontext)
+        self.atomic_patch.start()
+        self.connections_patch = mock.patch.object(data_loading.db, 'connections')
+        self.connections_patch.start()
+
+    def tearDown(self):
+        self.atomic_patch.stop()
+        self.connections_patch.stop()
+
+    def test_flush_waits_for_the_objects_to_be_committed(self):
+        database_writer = self.FastDatabaseWriter(use_writer_process=True, multiprocess=False)
+        database_writer.start()
+        database_writer.bulk_create([RecordedModelObject(f'bulk_{i}') for i in range(5)])
+        database_writer.write_atomically(
+            model_objects_to_bulk_create=[RecordedModelObject('atomic_bulk')],
+            model_objects_to_save=[RecordedModelObject('atomic_save')])
+        database_writer.flush()
+        self.assertEqual(RecordedModelObject.bulk_created_names, [f'bulk_{i}' for i in range(5)] + ['atomic_bulk'])
+        self.assertEqual(RecordedModelObject.saved_names, ['atomic_save'])
+        database_writer.save(RecordedModelObject('save'))
+        database_writer.close()
+        self.assertEqual(RecordedModelObject.saved_names, ['atomic_save', 'save'])
+
+    def test_without_writer_process_objects_are_written_immediately(self):
+        database_writer = self.FastDatabaseWriter(use_writer_process=False, multiprocess=False)
+        database_writer.start()
+        database_writer.write_atomically(
+            model_objects_to_bulk_create=[RecordedModelObject('atomic_bulk')],
+            model_objects_to_save=[RecordedModelObject('atomic_save')])
+        self.assertEqual(RecordedModelObject.bulk_created_names, ['atomic_bulk'])
+        self.assertEqual(RecordedModelObject.saved_names, ['atomic_save'])
+        database_writer.close()
+
+    def test_save_raises_rather_than_blocking_when_the_writer_has_died(self):
+        database_writer = self.FastDatabaseWriter(use_writer_process=True, multiprocess=False)
+        database_writer.start()
+        with mock.patch('threading.excepthook'):
+            with self.assertRaises(RuntimeError):
+                # Enough objects to fill the bounded write queue once the writer has died
+                for i in range(100):
+                    database_writer.save(RecordedModelObject(f'save_{i}', fail_to_save=True))
+            database_writer.writer.join()
+
+
+
+class FakeDatabase:
+    """Stands in for the database and its transactions (one set of nested transactions per thread)
+    for the objects of the FakeModels."""
+    def __init__(self):
+        self.committed_objects = []
+        self.thread_local = threading.local()
+        self.ids = itertools.count(1)
+
+    @contextlib.contextmanager
+    def atomic(self):
+        transaction_stack = self.thread_local.__dict__.setdefault('transaction_stack', [])
+        transaction_stack.append([])
+        try:
+            yield
+        except BaseException:
+            transaction_stack.pop()
+            raise
+        written_objects = transaction_stack.pop()
+        if transaction_stack:
+            transaction_stack[-1].extend(written_objects)
+        else:
+            self.committed_objects.extend(written_objects)
+
+    def write(self, model_object):
+        if model_object.id is None:
+            model_object.id = next(self.ids)
+        transaction_stack = getattr(self.thread_local, 'transaction_stack', None)
+        if transaction_stack:
+            transaction_stack[-1].append(model_object)
+        else:
+            self.committed_objects.append(model_object)
+
+    def get_committed_objects(self, model):
+        """The committed objects of the model, each once however many times it was saved"""
+        return list({model_object.id: model_object for model_object in self.committed_objects if
+                     isinstance(model_object, model)}.values())
+
+
+def make_fake_model(fake_database, model_name):
+    class FakeModel:
+        class objects:
+            @staticmethod
+            def bulk_create(model_objects, batch_size=None):
+                for model_object in model_objects:
+                    fake_database.write(model_object)
+
+        def __init__(self, **kwargs):
+            self.id = None
+            self.__dict__.update(kwargs)
+
+        def save(self):
+            fake_database.write(self)
+
+        def __str__(self):
+            return f'{self.id}_{self.clade}'
+
+    FakeModel.__name__ = model_name
+    return FakeModel
+
+
+class DataSetSampleCreationRollbackTests(unittest.TestCase):
+    """A clade whose population fails must leave nothing in the database, including when the loading uses a
+    database writer process, and must leave no ReferenceSequence of the rolled back transaction in the
+    ReferenceSequenceCache."""
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.med_output_directory = os.path.join(self.temp_dir, 'A01', 'C', 'MEDOUT')
+        os.makedirs(self.med_output_directory)
+        np.savez_compressed(
+            os.path.join(self.med_output_directory, 'MED-RESULTS.npz'),
+            node_ids=np.array(['000000011', '000000035'], dtype=str), node_sizes=np.array([300, 45], dtype=np.int64),
+            node_representatives=np.array(['ACGTACGTAC', 'ACGTTACGTA'], dtype=str),
+            samples=np.array(['A01'], dtype=str), counts=np.array([[300, 45]], dtype=np.int64))
+        self.fake_database = FakeDatabase()
+        self.fake_models = {model_name: make_fake_model(self.fake_database, model_name) for model_name in
+                            ['ReferenceSequence', 'DataSetSampleSequence', 'CladeCollection', 'DataSetSample']}
+        self.dss = self.fake_models['DataSetSample'](
+            name='A01', post_med_absolute=0, post_med_unique=0, cladal_seq_totals=json.dumps(['0'] * 9))
+        self.fake_models['DataSetSample'].objects.filter = staticmethod(lambda **kwargs: [self.dss])
+        for model_name, fake_model in self.fake_models.items():
+            self._patch(mock.patch.object(data_loading, model_name, fake_model))
+        self._patch(mock.patch.object(data_loading.transaction, 'atomic', self.fake_database.atomic))
+        self._patch(mock.patch.object(data_loading.db, 'connections'))
+        self._patch(mock.patch.object(data_loading, 'SharedResourceLock'))
+        self._patch(mock.patch.object(data_loading.ReferenceSequenceCache, 'update'))
+        data_loading.ReferenceSequenceCache.reset()
+        self.addCleanup(data_loading.ReferenceSequenceCache.reset)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _patch(self, patcher):
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_data_set_sample_sequences(self):
+        data_loading_stand_in = SimpleNamespace(
+            database_writer_process=True, multiprocess=False,
+            list_of_med_output_directories=[self.med_output_directory], debug=False,
+            dataset_object=self.fake_models['DataSetSample'](), temp_working_directory_lifecycle=None,
+            resume_data_set_uid=None)
+        data_loading.DataLoading._create_data_set_sample_sequences_from_med_nodes(data_loading_stand_in)
+
+    def test_failed_clade_is_rolled_back_with_the_database_writer_process(self):
+        create_data_set_sample_sequences = \
+            data_loading.DataSetSampleSequenceCreatorWorker._create_data_set_sample_sequences
+
+        def create_data_set_sample_sequences_and_fail(data_set_sample_sequence_creator_worker):
+            create_data_set_sample_sequences(data_set_sample_sequence_creator_worker)
+            raise ValueError('failed after the DataSetSampleSequences were written')
+
+        with mock.patch.object(data_loading.DataSetSampleSequenceCreatorWorker, '_create_data_set_sample_sequences',
+                               create_data_set_sample_sequences_and_fail):
+            with self.assertRaises(ValueError):
+                self._create_data_set_sample_sequences()
+        self.assertEqual(self.fake_database.committed_objects, [])
+        self.assertEqual(data_loading.ReferenceSequenceCache.ref_seq_sequence_to_ref_seq_id_dict, {})
+
+        # The clade is populated by the next attempt
+        self.dss.post_med_absolute, self.dss.post_med_unique = 0, 0
+        self._create_data_set_sample_sequences()
+        ref_seq_ids = {
+            ref_seq.id for ref_seq in self.fake_database.get_committed_objects(self.fake_models['ReferenceSequence'])}
+        data_set_sample_sequences = self.fake_database.get_committed_objects(
+            self.fake_models['DataSetSampleSequence'])
+        self.assertEqual(len(ref_seq_ids), 2)
+        self.assertEqual({dsss.reference_sequence_of_id for dsss in data_set_sample_sequences}, ref_seq_ids)
+        self.assertEqual(len(self.fake_database.get_committed_objects(self.fake_models['CladeCollection'])), 1)
+        self.assertIn(self.dss, self.fake_database.committed_objects)
+        self.assertEqual(json.loads(self.dss.cladal_seq_totals)[2], '345')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Tests of the django_general components that can be run without a loaded database.
+Run from the SymPortal root directory: python3 -m pytest tests/django_general_tests.py
+"""
+import unittest
+from unittest import mock
+import main
+import django_general
+from django_general import WorkerReferenceData, ReferenceSequenceCache
+
+
+class WorkerReferenceDataTests(unittest.TestCase):
+    def setUp(self):
+        self.ref_seq_values = [(1, 'C3', True, 'C'), (2, 'unnamed', False, 'A')]
+        reference_sequence_patcher = mock.patch.object(django_general, 'ReferenceSequence')
+        self.reference_sequence = reference_sequence_patcher.start()
+        self.addCleanup(reference_sequence_patcher.stop)
+        self.reference_sequence.objects.values_list.side_effect = lambda *args: list(self.ref_seq_values)
+        self.addCleanup(self._reset_worker_reference_data)
+
+    @staticmethod
+    def _reset_worker_reference_data():
+        WorkerReferenceData.ref_seq_id_to_name_clade_and_has_name_dict = {}
+        WorkerReferenceData.version = None
+
+    def test_reference_sequences_are_only_reloaded_for_a_new_version(self):
+        self.assertEqual(
+            WorkerReferenceData.get_ref_seq_id_to_name_clade_and_has_name_dict(version=(2, 1)),
+            {1: ('C3', 'C', True), 2: ('2_A', 'A', False)})
+        self.ref_seq_values.append((3, 'unnamed', False, 'D'))
+        self.assertNotIn(3, WorkerReferenceData.get_ref_seq_id_to_name_clade_and_has_name_dict(version=(2, 1)))
+        self.assertEqual(self.reference_sequence.objects.values_list.call_count, 1)
+        self.assertEqual(
+            WorkerReferenceData.get_ref_seq_id_to_name_clade_and_has_name_dict(version=(3, 1))[3],
+            ('3_D', 'D', False))
+        self.assertEqual(WorkerReferenceData.version, (3, 1))
+
+
+class FakeReferenceSequenceManager:
+    """Stands in for ReferenceSequence.objects for the queries made by the ReferenceSequenceCache.
+    Each ReferenceSequence is an (id, name, has_name, clade, sequence) tuple."""
+    def __init__(self, ref_seqs):
+        self.ref_seqs = ref_seqs
+        self.num_ref_seqs_read = 0
+
+    def aggregate(self, *args):
+        return {'id__max': max((ref_seq[0] for ref_seq in self.ref_seqs), default=None)}
+
+    def filter(self, id__gt=None, has_name=None):
+        ref_seqs = [ref_seq for ref_seq in self.ref_seqs if
+                    (id__gt is None or ref_seq[0] > id__gt) and (has_name is None or ref_seq[2] == has_name)]
+        return FakeReferenceSequenceQuerySet(self, ref_seqs)
+
+
+class FakeReferenceSequenceQuerySet:
+    field_names = ['id', 'name', 'has_name', 'clade', 'sequence']
+
+    def __init__(self, manager, ref_seqs):
+        self.manager = manager
+        self.ref_seqs = ref_seqs
+
+    def count(self):
+        return len(self.ref_seqs)
+
+    def values_list(self, *field_names):
+        self.manager.num_ref_seqs_read += len(self.ref_seqs)
+        return [tuple(ref_seq[self.field_names.index(field_name)] for field_name in field_names)
+                for ref_seq in self.ref_seqs]
+
+
+class ReferenceSequenceCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.manager = FakeReferenceSequenceManager([(1, 'C3', True, 'C', 'AAAA'), (2, 'noName', False, 'A', 'CCCC')])
+        reference_sequence_patcher = mock.patch.object(django_general, 'ReferenceSequence')
+        reference_sequence_patcher.start().objects = self.manager
+        self.addCleanup(reference_sequence_patcher.stop)
+        self.addCleanup(ReferenceSequenceCache.reset)
+        ReferenceSequenceCache.reset()
+
+    def test_only_new_reference_sequences_and_names_are_read(self):
+        ReferenceSequenceCache.update()
+        self.assertEqual(ReferenceSequenceCache.ref_seq_sequence_to_ref_seq_id_dict, {'AAAA': 1, 'CCCC': 2})
+        self.assertEqual(ReferenceSequenceCache.ref_seq_uid_to_ref_seq_name_dict, {1: 'C3', 2: '2_A'})
+        self.manager.num_ref_seqs_read = 0
+        ReferenceSequenceCache.update()
+        self.assertEqual(self.manager.num_ref_seqs_read, 0)
+        # A new ReferenceSequence and the naming of an existing one (e.g. by a data analysis)
+        self.manager.ref_seqs[1] = (2, 'A1', True, 'A', 'CCCC')
+        self.manager.ref_seqs.append((3, 'noName', False, 'D', 'GGGG'))
+        ReferenceSequenceCache.update()
+        self.assertEqual(ReferenceSequenceCache.ref_seq_uid_to_ref_seq_name_dict, {1: 'C3', 2: 'A1', 3: '3_D'})
+        self.assertEqual(ReferenceSequenceCache.ref_seq_sequence_to_ref_seq_id_dict['GGGG'], 3)
+
+    def test_cache_is_reloaded_if_the_database_has_fewer_reference_sequences(self):
+        ReferenceSequenceCache.update()
+        self.manager.ref_seqs[:] = [(1, 'C3', True, 'C', 'AAAA')]
+        ReferenceSequenceCache.update()
+        self.assertEqual(ReferenceSequenceCache.ref_seq_sequence_to_ref_seq_id_dict, {'AAAA': 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Tests of the ResultQueueWorkerPool error paths, the AutoConcurrencySelector and the SharedResourceLock.
+Run from the SymPortal root directory: python3 -m pytest tests/general_tests.py
+"""
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import unittest
+from queue import Queue as mt_Queue, Empty
+from multiprocessing import Process, Queue as mp_Queue, Event as mp_Event
+from general import ResultQueueWorkerPool, AutoConcurrencySelector, SharedResourceLock
+
+
+class FastPollingResultQueueWorkerPool(ResultQueueWorkerPool):
+    result_poll_interval = 0.1
+
+
+def square(work_item):
+    return work_item * work_item
+
+
+def square_unless_three(work_item):
+    if work_item == 3:
+        raise ValueError('three')
+    return work_item * work_item
+
+
+# Appended to by the pool initializer of each worker process (or once per worker thread)
+initializer_calls = []
+
+
+def record_initializer_call(initializer_arg):
+    initializer_calls.append(initializer_arg)
+
+
+def get_initializer_calls(work_item):
+    return list(initializer_calls)
+
+
+def allocate_memory(work_item_mb):
+    memory = bytearray(work_item_mb * 1024 * 1024)
+    return len(memory)
+
+
+def run_process_allocating_memory(work_item_mb):
+    subprocess.run([sys.executable, '-c', f'memory = bytearray({work_item_mb} * 1024 * 1024)'], check=True)
+    return work_item_mb
+
+
+def get_working_directory(work_item):
+    return os.getcwd()
+
+
+def exit_if_three(work_item):
+    if work_item == 3:
+        os._exit(1)
+    return work_item * work_item
+
+
+def hold_lock(lock_directory, shared, holder_name, acquired_queue, release_event):
+    SharedResourceLock.lock_directory = lock_directory
+    with SharedResourceLock(resource_name='symClade', shared=shared):
+        acquired_queue.put(holder_name)
+        release_event.wait()
+
+
+class ResultQueueWorkerPoolTests(unittest.TestCase):
+    def _execute(self, worker_pool, worker_function, work_items):
+        results = []
+        worker_pool.execute(worker_function=worker_function, work_items=work_items, merge_result=results.append)
+        return sorted(results)
+
+    def test_results_are_merged(self):
+        for multiprocess in [True, False]:
+            worker_pool = FastPollingResultQueueWorkerPool(num_proc=2, multiprocess=multiprocess)
+            self.assertEqual(self._execute(worker_pool, square, range(10)), [i * i for i in range(10)])
+
+    def test_worker_exception_is_raised_after_all_work_items(self):
+        for multiprocess in [True, False]:
+            worker_pool = FastPollingResultQueueWorkerPool(num_proc=2, multiprocess=multiprocess, persistent=True)
+            results = []
+            with self.assertRaises(RuntimeError) as context:
+                worker_pool.execute(
+                    worker_function=square_unless_three, work_items=range(6), merge_result=results.append)
+            self.assertIn('ValueError', context.exception.args[0]['tracebacks'][0])
+            self.assertEqual(sorted(results), [0, 1, 4, 16, 25])
+            # The persistent workers are still usable
+            self.assertEqual(self._execute(worker_pool, square, range(4)), [0, 1, 4, 9])
+            worker_pool.close()
+
+    def test_pool_is_usable_after_merge_result_raises(self):
+        def merge_result_raising(result):
+            raise KeyError(result)
+        for multiprocess in [True, False]:
+            worker_pool = FastPollingResultQueueWorkerPool(num_proc=2, multiprocess=multiprocess, persistent=True)
+            with self.assertRaises(KeyError):
+                worker_pool.execute(worker_function=square, work_items=range(20), merge_result=merge_result_raising)
+            # No result of the abandoned job is merged into the next one
+            self.assertEqual(self._execute(worker_pool, square, range(100, 104)), [i * i for i in range(100, 104)])
+            worker_pool.close()
+
+    def test_worker_process_that_exits_does_not_hang_the_parent(self):
+        worker_pool = FastPollingResultQueueWorkerPool(num_proc=2, multiprocess=True, persistent=True)
+        with self.assertRaises(RuntimeError) as context:
+            worker_pool.execute(worker_function=exit_if_three, work_items=range(6))
+        self.assertIn(1, context.exception.args[0]['exitcodes'])
+        self.assertEqual(worker_pool.all_processes, [])
+        # The pool is restarted by the next execute
+        self.assertEqual(self._execute(worker_pool, square, range(4)), [0, 1, 4, 9])
+        worker_pool.close()
+
+    def test_initializer_is_called_once_by_each_worker(self):
+        worker_pool = FastPollingResultQueueWorkerPool(
+            num_proc=2, multiprocess=True, persistent=True, initializer=record_initializer_call,
+            initargs=('reference_data',))
+        for i in range(2):
+            results = self._execute(worker_pool, get_initializer_calls, range(6))
+            self.assertEqual(results, [['reference_data']] * 6)
+        worker_pool.close()
+        self.assertEqual(initializer_calls, [])
+
+        del initializer_calls[:]
+        worker_pool = FastPollingResultQueueWorkerPool(
+            num_proc=2, multiprocess=False, persistent=True, initializer=record_initializer_call,
+            initargs=('reference_data',))
+        self._execute(worker_pool, get_initializer_calls, range(6))
+        self._execute(worker_pool, get_initializer_calls, range(6))
+        worker_pool.close()
+        self.assertEqual(initializer_calls, ['reference_data'] * 2)
+        del initializer_calls[:]
+
+    def test_worker_processes_are_restarted_in_a_new_working_directory(self):
+        parent_working_directory = os.getcwd()
+        temp_dir = tempfile.mkdtemp()
+        worker_pool = FastPollingResultQueueWorkerPool(num_proc=2, multiprocess=True, persistent=True)
+        try:
+            self.assertEqual(set(self._execute(worker_pool, get_working_directory, range(4))),
+                             {parent_working_directory})
+            os.chdir(temp_dir)
+            self.assertEqual(set(self._execute(worker_pool, get_working_directory, range(4))), {os.getcwd()})
+        finally:
+            os.chdir(parent_working_directory)
+            worker_pool.close()
+            shutil.rmtree(temp_dir)
+
+    def test_worker_discards_work_items_of_abandoned_jobs(self):
+        work_item_queue, job_queue, result_queue = mt_Queue(), mt_Queue(), mt_Queue()
+        job_queue.put((1, square, ()))
+        job_queue.put((3, square, ()))
+        for job_id, work_item in [(1, 2), (2, 3), (3, 4), (2, 5)]:
+            work_item_queue.put((job_id, work_item))
+        work_item_queue.put('STOP')
+        ResultQueueWorkerPool._result_queue_worker(work_item_queue, job_queue, result_queue)
+        results = [result_queue.get() for i in range(result_queue.qsize())]
+        self.assertEqual([result[:3] for result in results], [('RESULT', 1, 4), ('RESULT', 3, 16)])
+
+
+class AutoConcurrencySelectorTests(unittest.TestCase):
+    def test_task_memory_is_measured_per_task_by_the_workers(self):
+        worker_pool = FastPollingResultQueueWorkerPool(num_proc=2, multiprocess=True, persistent=True)
+        auto_concurrency_selector = AutoConcurrencySelector(worker_pool=worker_pool)
+        auto_concurrency_selector.select_num_proc(stage='initial_mothur_qc')
+        worker_pool.execute(worker_function=allocate_memory, work_items=[200, 10, 10])
+        auto_concurrency_selector.select_num_proc(stage='med_decomposition')
+        worker_pool.execute(worker_function=allocate_memory, work_items=[10, 10])
+        auto_concurrency_selector.select_num_proc(stage='seq_count_table_output')
+        worker_pool.close()
+        measured_task_memory_gb_dict = auto_concurrency_selector.stage_to_measured_task_memory_gb_dict
+        self.assertGreater(measured_task_memory_gb_dict['initial_mothur_qc'], 0.19)
+        self.assertIn('med_decomposition', measured_task_memory_gb_dict)
+        if os.path.exists('/proc/self/clear_refs'):
+            # The peak of each worker is reset before each task so is not that of the larger task of the first stage
+            self.assertLess(measured_task_memory_gb_dict['med_decomposition'], 0.19)
+        self.assertNotIn('seq_count_table_output', measured_task_memory_gb_dict)
+
+    def test_child_process_memory_is_measured_per_task(self):
+        for multiprocess in [True, False]:
+            worker_pool = FastPollingResultQueueWorkerPool(num_proc=1, multiprocess=multiprocess, persistent=True)
+            auto_concurrency_selector = AutoConcurrencySelector(worker_pool=worker_pool)
+            auto_concurrency_selector.select_num_proc(stage='initial_mothur_qc')
+            worker_pool.execute(worker_function=run_process_allocating_memory, work_items=[300])
+            # The child processes of the next stage use less memory than that of the first stage
+            auto_concurrency_selector.select_num_proc(stage='med_decomposition')
+            worker_pool.execute(worker_function=run_process_allocating_memory, work_items=[50, 50])
+            auto_concurrency_selector.select_num_proc(stage='seq_count_table_output')
+            worker_pool.close()
+            measured_task_memory_gb_dict = auto_concurrency_selector.stage_to_measured_task_memory_gb_dict
+            self.assertGreater(measured_task_memory_gb_dict['initial_mothur_qc'], 0.29)
+            self.assertGreater(measured_task_memory_gb_dict['med_decomposition'], 0.049)
+            # The peak of a worker process is only reset between tasks on linux
+            if not multiprocess or os.path.exists('/proc/self/clear_refs'):
+                self.assertLess(measured_task_memory_gb_dict['med_decomposition'], 0.29)
+
+
+
+class SharedResourceLockTests(unittest.TestCase):
+    def setUp(self):
+        self.lock_directory = tempfile.mkdtemp()
+        self.acquired_queue = mp_Queue()
+        self.holder_processes = []
+
+    def tearDown(self):
+        for p in self.holder_processes:
+            p.terminate()
+            p.join()
+        shutil.rmtree(self.lock_directory)
+
+    def _start_holder(self, shared, holder_name):
+        release_event = mp_Event()
+        p = Process(
+            target=hold_lock, args=(self.lock_directory, shared, holder_name, self.acquired_queue, release_event))
+        p.start()
+        self.holder_processes.append(p)
+        return release_event
+
+    def _get_acquired_holder(self, timeout=10):
+        try:
+            return self.acquired_queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def test_shared_locks_are_held_together_and_exclude_the_exclusive_lock(self):
+        release_first_shared = self._start_holder(shared=True, holder_name='first_shared')
+        self.assertEqual(self._get_acquired_holder(), 'first_shared')
+        # A second process holds the shared lock while the first still does
+        release_second_shared = self._start_holder(shared=True, holder_name='second_shared')
+        self.assertEqual(self._get_acquired_holder(), 'second_shared')
+
+        release_exclusive = self._start_holder(shared=False, holder_name='exclusive')
+        self.assertIsNone(self._get_acquired_holder(timeout=1))
+        release_first_shared.set()
+        self.assertIsNone(self._get_acquired_holder(timeout=1))
+        # Only once both of the shared holders have released the lock
+        release_second_shared.set()
+        self.assertEqual(self._get_acquired_holder(), 'exclusive')
+
+        # The exclusive lock excludes both shared and exclusive holders
+        release_third_shared = self._start_holder(shared=True, holder_name='third_shared')
+        self._start_holder(shared=False, holder_name='second_exclusive')
+        self.assertIsNone(self._get_acquired_holder(timeout=1))
+        release_exclusive.set()
+        first_holder_after_release = self._get_acquired_holder()
+        self.assertIn(first_holder_after_release, ['third_shared', 'second_exclusive'])
+        self.assertIsNone(self._get_acquired_holder(timeout=1))
+        release_third_shared.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
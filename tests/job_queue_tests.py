@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Tests of the claiming of the jobs of the JobQueue.
+Run from the SymPortal root directory: python3 -m pytest tests/job_queue_tests.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Process, Queue as mp_Queue
+from job_queue import JobQueue
+
+
+def claim_jobs(symportal_root_directory, claimed_job_id_queue):
+    job_queue = JobQueue(symportal_root_directory=symportal_root_directory)
+    for job in iter(lambda: job_queue.claim_next_job(worker_pid=os.getpid()), None):
+        claimed_job_id_queue.put(job[0])
+    claimed_job_id_queue.put('DONE')
+
+
+class JobQueueClaimTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.job_queue = JobQueue(symportal_root_directory=self.temp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_jobs_are_claimed_in_the_order_they_were_submitted(self):
+        first_job_id = self.job_queue.submit_job(['--display_data_sets'], '/first')
+        second_job_id = self.job_queue.submit_job(['--display_analyses'], '/second')
+        self.assertEqual(self.job_queue.claim_next_job(worker_pid=os.getpid()),
+                         (first_job_id, ['--display_data_sets'], '/first'))
+        self.assertEqual(self.job_queue.claim_next_job(worker_pid=os.getpid()),
+                         (second_job_id, ['--display_analyses'], '/second'))
+        self.assertIsNone(self.job_queue.claim_next_job(worker_pid=os.getpid()))
+
+    def test_each_job_is_claimed_by_only_one_of_several_workers(self):
+        submitted_job_ids = [self.job_queue.submit_job(['--display_data_sets'], self.temp_dir) for i in range(40)]
+        claimed_job_id_queue = mp_Queue()
+        workers = [Process(target=claim_jobs, args=(self.temp_dir, claimed_job_id_queue)) for i in range(4)]
+        for worker in workers:
+            worker.start()
+        claimed_job_ids = []
+        done_count = 0
+        while done_count < len(workers):
+            claimed_job_id = claimed_job_id_queue.get(timeout=60)
+            if claimed_job_id == 'DONE':
+                done_count += 1
+            else:
+                claimed_job_ids.append(claimed_job_id)
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sorted(claimed_job_ids), submitted_job_ids)
+
+    def test_running_job_of_an_exited_worker_is_failed(self):
+        job_id = self.job_queue.submit_job(['--display_data_sets'], self.temp_dir)
+        worker = Process(target=os.getpid)
+        worker.start()
+        worker.join()
+        self.job_queue.claim_next_job(worker_pid=worker.pid)
+        self.job_queue.fail_jobs_of_exited_workers()
+        lastrowid, rows = self.job_queue._execute('SELECT status FROM job WHERE id = ?', (job_id,))
+        self.assertEqual(rows, [('failed',)])
+
+    def test_worker_and_daemon_cannot_be_submitted(self):
+        for args_list in [['--job_queue_worker'], ['--daemon', '--daemon_socket', '/tmp/sp.sock']]:
+            with self.assertRaises(RuntimeError):
+                self.job_queue.submit_job(args_list, self.temp_dir)
+        self.assertIsNone(self.job_queue.claim_next_job(worker_pid=os.getpid()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Tests that MED's memory-bounded mode (--memory-ceiling) gives the same results as its default, in memory, mode.
+Run from the SymPortal root directory: python3 -m pytest tests/med_decompose_tests.py
+"""
+import os
+import sys
+import random
+import shutil
+import tempfile
+import subprocess
+import unittest
+import numpy as np
+med_decompose_directory = os.path.join(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'lib', 'med_decompose')
+sys.path.insert(0, med_decompose_directory)
+from Oligotyping.lib.decomposer import Decomposer
+from Oligotyping.utils import parsers
+from Oligotyping.utils import utils
+
+
+class MemoryBoundedMEDTests(unittest.TestCase):
+    alignment_length = 60
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.alignment_path = os.path.join(self.temp_dir, 'alignment.fasta')
+        self._write_alignment()
+        # So that the ids are spilled, and the chunks of each unique sequence linked, after every read
+        self.default_min_buffered_bytes = utils.ReadIdSpillStore.MIN_BUFFERED_BYTES
+        utils.ReadIdSpillStore.MIN_BUFFERED_BYTES = 0
+
+    def tearDown(self):
+        utils.ReadIdSpillStore.MIN_BUFFERED_BYTES = self.default_min_buffered_bytes
+        shutil.rmtree(self.temp_dir)
+
+    def _write_alignment(self):
+        # Three templates that differ at a few positions, in three samples, plus reads with a random error
+        random_generator = random.Random(1234)
+        template = ''.join(random_generator.choice('ACGT') for i in range(self.alignment_length))
+        templates = [template, template[:10] + 'T' + template[11:40] + 'G' + template[41:],
+                     template[:25] + 'A' + template[26:50] + '-' + template[51:]]
+        with open(self.alignment_path, 'w') as f:
+            read_number = 0
+            for sample_name, template_frequencies in [('s1', [400, 120, 30]), ('s2', [250, 200, 60]),
+                                                      ('s3', [100, 20, 150])]:
+                for template, frequency in zip(templates, template_frequencies):
+                    for i in range(frequency):
+                        seq = template
+                        if random_generator.random() < 0.1:
+                            position = random_generator.randrange(self.alignment_length)
+                            seq = seq[:position] + random_generator.choice('ACGT') + seq[position + 1:]
+                        read_number += 1
+                        f.write(f'>{sample_name}_read{read_number}\n{seq}\n')
+
+    def _get_decomposer(self, output_directory, memory_ceiling_mb=None):
+        args_list = ['-M', '4', '--skip-gexf-files', '--skip-gen-figures', '--skip-gen-html', '--skip-check-input',
+                     '--store-npz-results', '-T', '-o', output_directory, self.alignment_path]
+        if memory_ceiling_mb is not None:
+            args_list = ['--memory-ceiling', str(memory_ceiling_mb)] + args_list
+        return Decomposer(parsers.decomposer().parse_args(args_list))
+
+    def test_read_objects_match_in_memory_read_objects(self):
+        in_memory_reads = utils.get_read_objects_from_file(self.alignment_path)
+        memory_bounded_reads, unique_sequences_bytes = utils.get_read_objects_from_file_memory_bounded(
+            self.alignment_path, os.path.join(self.temp_dir, 'READ-IDS.spill'), 1)
+        self.assertGreater(unique_sequences_bytes, 0)
+        self.assertEqual(len(in_memory_reads), len(memory_bounded_reads))
+        for in_memory_read, memory_bounded_read in zip(in_memory_reads, memory_bounded_reads):
+            self.assertEqual(in_memory_read.seq, memory_bounded_read.seq)
+            self.assertEqual(in_memory_read.frequency, memory_bounded_read.frequency)
+            self.assertEqual(in_memory_read.ids[0], memory_bounded_read.ids[0])
+            self.assertEqual(in_memory_read.ids[-1], memory_bounded_read.ids[-1])
+            self.assertEqual(list(in_memory_read.ids), list(memory_bounded_read.ids))
+
+    def test_spilled_ids_of_several_sequences_can_be_iterated_at_once(self):
+        memory_bounded_reads, unique_sequences_bytes = utils.get_read_objects_from_file_memory_bounded(
+            self.alignment_path, os.path.join(self.temp_dir, 'READ-IDS.spill'), 1)
+        first_ids = iter(memory_bounded_reads[0].ids)
+        second_ids = iter(memory_bounded_reads[1].ids)
+        interleaved_ids = [(next(first_ids), next(second_ids)) for i in range(5)]
+        self.assertEqual([ids[0] for ids in interleaved_ids], list(memory_bounded_reads[0].ids)[:5])
+        self.assertEqual([ids[1] for ids in interleaved_ids], list(memory_bounded_reads[1].ids)[:5])
+
+    def test_memory_bounded_mode_processes_nodes_one_at_a_time(self):
+        decomposer = self._get_decomposer(os.path.join(self.temp_dir, 'bounded'), memory_ceiling_mb=1)
+        self.assertTrue(decomposer.no_threading)
+
+    def test_raw_topology_matches_in_memory_raw_topology(self):
+        # The stages of the decomposition that do not need BLAST
+        results = []
+        for memory_ceiling_mb in [None, 1]:
+            decomposer = self._get_decomposer(
+                os.path.join(self.temp_dir, str(memory_ceiling_mb)), memory_ceiling_mb=memory_ceiling_mb)
+            decomposer.check_dirs()
+            decomposer._init_logger()
+            decomposer.info_file_path = decomposer.generate_output_destination('RUNINFO')
+            decomposer.run.init_info_file_obj(decomposer.info_file_path)
+            decomposer._init_topology()
+            decomposer._generate_raw_topology()
+            decomposer._generate_samples_dict()
+            results.append((
+                [(decomposer.topology.nodes[node_id].representative_seq, decomposer.topology.nodes[node_id].size)
+                 for node_id in decomposer.topology.final_nodes],
+                {sample: sorted(node_counts.values()) for sample, node_counts in decomposer.samples_dict.items()}))
+        self.assertEqual(results[0], results[1])
+        self.assertGreater(len(results[0][0]), 1)
+
+    @unittest.skipUnless(shutil.which('blastn'), 'The full decomposition requires blastn')
+    def test_decomposition_matches_in_memory_decomposition(self):
+        decompose_path = os.path.join(med_decompose_directory, 'decompose.py')
+        npz_results = []
+        for memory_ceiling_args, output_directory_name in [([], 'in_memory'), (['--memory-ceiling', '1'], 'bounded')]:
+            output_directory = os.path.join(self.temp_dir, output_directory_name)
+            subprocess.run(
+                [sys.executable, decompose_path, '-M', '4', '--skip-gexf-files', '--skip-gen-figures',
+                 '--skip-gen-html', '--skip-check-input', '--store-npz-results', '-T'] + memory_ceiling_args +
+                ['-o', output_directory, self.alignment_path], check=True, stdout=subprocess.PIPE)
+            npz_results.append(np.load(os.path.join(output_directory, 'MED-RESULTS.npz')))
+        in_memory_results, memory_bounded_results = npz_results
+        for key in in_memory_results.files:
+            np.testing.assert_array_equal(in_memory_results[key], memory_bounded_results[key])
+
+
+if __name__ == "__main__":
+    unittest.main()
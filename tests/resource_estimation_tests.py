@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Tests of the StageProfiler and of the calibration and estimates of the RuntimeResourceEstimator.
+Run from the SymPortal root directory: python3 -m pytest tests/resource_estimation_tests.py
+"""
+import os
+import sys
+import json
+import shutil
+import subprocess
+import tempfile
+import unittest
+import main
+from general import ResultQueueWorkerPool, AutoConcurrencySelector
+from resource_estimation import StageProfiler, RuntimeResourceEstimator
+
+
+class FastPollingResultQueueWorkerPool(ResultQueueWorkerPool):
+    result_poll_interval = 0.1
+
+
+def allocate_memory(work_item_mb):
+    memory = bytearray(work_item_mb * 1024 * 1024)
+    return len(memory)
+
+
+def make_stage_profile(stage, num_proc, seconds, work_units, peak_memory_gb=None, peak_task_memory_gb=None,
+                       database_growth_mb=None, temp_disk_mb=None):
+    return {
+        'stage': stage, 'num_proc': num_proc, 'seconds': seconds, 'peak_memory_gb': peak_memory_gb,
+        'peak_task_memory_gb': peak_task_memory_gb, 'database_growth_mb': database_growth_mb,
+        'temp_disk_mb': temp_disk_mb, 'work_units': work_units, 'time_stamp': '2026-01-01 00:00:00'}
+
+
+class RuntimeResourceEstimatorTests(unittest.TestCase):
+    def setUp(self):
+        self.symportal_root_directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.symportal_root_directory, 'stage_profiles'))
+        self.stage_profiles_path = os.path.join(
+            self.symportal_root_directory, 'stage_profiles', 'stage_profiles.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.symportal_root_directory)
+
+    def _write_stage_profiles(self, stage_profiles, partial_line=None):
+        with open(self.stage_profiles_path, 'w') as f:
+            for stage_profile in stage_profiles:
+                f.write(f'{json.dumps(stage_profile)}\n')
+            if partial_line is not None:
+                f.write(partial_line)
+
+    def _write_synthetic_stage_profiles(self):
+        self._write_stage_profiles([
+            make_stage_profile(
+                'initial_mothur_qc', num_proc=4, seconds=100, work_units={'samples': 10, 'reads': 1000000},
+                peak_memory_gb=0.3, peak_task_memory_gb=2.0, database_growth_mb=0, temp_disk_mb=1000),
+            make_stage_profile(
+                'initial_mothur_qc', num_proc=2, seconds=50, work_units={'samples': 2, 'reads': 100000},
+                peak_memory_gb=0.3, peak_task_memory_gb=3.0, database_growth_mb=0, temp_disk_mb=300),
+            # A profile recorded before the per task peak memory was. Its peak memory is only that of the main
+            # process and so is not used for the per task peak memory of a parallel stage.
+            make_stage_profile(
+                'initial_mothur_qc', num_proc=1, seconds=30, work_units={'samples': 2, 'reads': 100000},
+                peak_memory_gb=5.0),
+            # A loading without any reads carries no information for a per read model
+            make_stage_profile(
+                'initial_mothur_qc', num_proc=1, seconds=1000, work_units={'samples': 0, 'reads': 0},
+                peak_task_memory_gb=50.0),
+            make_stage_profile(
+                'data_set_sample_sequence_creation', num_proc=1, seconds=20,
+                work_units={'samples': 10, 'reads': 1000000}, peak_memory_gb=0.8, database_growth_mb=30),
+            make_stage_profile(
+                'data_analysis', num_proc=1, seconds=10,
+                work_units={'samples': 10, 'clade_collections': 100, 'distinct_sequences': 1000}, peak_memory_gb=1.0),
+            make_stage_profile(
+                'data_analysis', num_proc=1, seconds=50,
+                work_units={'samples': 20, 'clade_collections': 300, 'distinct_sequences': 3000}, peak_memory_gb=3.0),
+            make_stage_profile(
+                'an_unknown_stage', num_proc=1, seconds=10, work_units={'samples': 1, 'reads': 1})],
+            partial_line='{"stage": "med_decomposition", "num_pr')
+
+    def test_models_are_calibrated_with_the_stage_profiles(self):
+        self._write_synthetic_stage_profiles()
+        runtime_resource_estimator = RuntimeResourceEstimator(
+            symportal_root_directory=self.symportal_root_directory, num_proc=8)
+        self.assertEqual(
+            set(runtime_resource_estimator.stage_to_stage_profiles_dict),
+            {'initial_mothur_qc', 'data_set_sample_sequence_creation', 'data_analysis'})
+
+        work_unit, parallel, memory_work_unit, seconds_per_work_unit, peak_memory_gb, database_mb_per_work_unit, \
+            temp_disk_mb_per_work_unit = runtime_resource_estimator._get_calibrated_model('initial_mothur_qc')
+        self.assertEqual((work_unit, parallel, memory_work_unit), ('reads', True, None))
+        # The processor seconds per read, weighted by the reads of each profile
+        self.assertAlmostEqual(seconds_per_work_unit, (100 * 4 + 50 * 2 + 30) / 1200000)
+        # The highest per task peak memory reported by the workers
+        self.assertAlmostEqual(peak_memory_gb, 3.0)
+        self.assertAlmostEqual(database_mb_per_work_unit, 0)
+        self.assertAlmostEqual(temp_disk_mb_per_work_unit, (1000 + 300) / 1100000)
+
+        peak_memory_gb, database_mb_per_work_unit = runtime_resource_estimator._get_calibrated_model(
+            'data_set_sample_sequence_creation')[4:6]
+        # A stage that is not parallel runs in the main process and so is calibrated with its peak memory
+        self.assertAlmostEqual(peak_memory_gb, 0.8)
+        self.assertAlmostEqual(database_mb_per_work_unit, 30 / 1000000)
+
+        seconds_per_work_unit, peak_memory_gb = runtime_resource_estimator._get_calibrated_model('data_analysis')[3:5]
+        self.assertAlmostEqual(seconds_per_work_unit, 60 / 400)
+        # The peak memory per distinct sequence
+        self.assertAlmostEqual(peak_memory_gb, 4.0 / 4000)
+
+        self.assertEqual(
+            runtime_resource_estimator._get_calibrated_model('med_decomposition'),
+            RuntimeResourceEstimator.stage_to_default_model_dict['med_decomposition'])
+
+    def test_the_peak_memory_of_a_parallel_stage_is_not_calibrated_without_per_task_peaks(self):
+        self._write_stage_profiles([
+            make_stage_profile(
+                'med_decomposition', num_proc=4, seconds=100, work_units={'samples': 10, 'reads': 1000000},
+                peak_memory_gb=7.0)])
+        runtime_resource_estimator = RuntimeResourceEstimator(
+            symportal_root_directory=self.symportal_root_directory, num_proc=4)
+        seconds_per_work_unit, peak_memory_gb = runtime_resource_estimator._get_calibrated_model(
+            'med_decomposition')[3:5]
+        self.assertAlmostEqual(seconds_per_work_unit, 400 / 1000000)
+        self.assertEqual(peak_memory_gb, RuntimeResourceEstimator.stage_to_default_model_dict['med_decomposition'][4])
+
+    def test_stages_are_estimated_from_the_calibrated_models(self):
+        self._write_synthetic_stage_profiles()
+        runtime_resource_estimator = RuntimeResourceEstimator(
+            symportal_root_directory=self.symportal_root_directory, num_proc=8)
+        work_units_dict = {'samples': 4, 'reads': 2000000, 'clade_collections': 50, 'distinct_sequences': 5000}
+
+        seconds, peak_memory_gb, database_growth_mb, temp_disk_mb = runtime_resource_estimator._estimate_stage(
+            stage='initial_mothur_qc', work_units_dict=work_units_dict)
+        # Only as many processors as there are samples are used, each running one task at a time
+        self.assertAlmostEqual(seconds, (530 / 1200000) * 2000000 / 4)
+        self.assertAlmostEqual(peak_memory_gb, 3.0 * 4)
+        self.assertAlmostEqual(database_growth_mb, 0)
+        self.assertAlmostEqual(temp_disk_mb, (1300 / 1100000) * 2000000)
+
+        seconds, peak_memory_gb, database_growth_mb, temp_disk_mb = runtime_resource_estimator._estimate_stage(
+            stage='data_set_sample_sequence_creation', work_units_dict=work_units_dict)
+        self.assertAlmostEqual(seconds, (20 / 1000000) * 2000000)
+        # Not multiplied by the number of processors
+        self.assertAlmostEqual(peak_memory_gb, 0.8)
+        self.assertAlmostEqual(database_growth_mb, 60)
+
+        seconds, peak_memory_gb = runtime_resource_estimator._estimate_stage(
+            stage='data_analysis', work_units_dict=work_units_dict)[:2]
+        self.assertAlmostEqual(seconds, (60 / 400) * 50)
+        self.assertAlmostEqual(peak_memory_gb, (4.0 / 4000) * 5000)
+
+        # An uncalibrated stage uses its default model
+        default_model = RuntimeResourceEstimator.stage_to_default_model_dict['med_decomposition']
+        seconds, peak_memory_gb = runtime_resource_estimator._estimate_stage(
+            stage='med_decomposition', work_units_dict=work_units_dict)[:2]
+        self.assertAlmostEqual(seconds, default_model[3] * 2000000 / 4)
+        self.assertAlmostEqual(peak_memory_gb, default_model[4] * 4)
+
+    def test_without_stage_profiles_the_default_models_are_used(self):
+        runtime_resource_estimator = RuntimeResourceEstimator(
+            symportal_root_directory=self.symportal_root_directory, num_proc=2)
+        self.assertEqual(runtime_resource_estimator.stage_to_stage_profiles_dict, {})
+        for stage, default_model in RuntimeResourceEstimator.stage_to_default_model_dict.items():
+            self.assertEqual(runtime_resource_estimator._get_calibrated_model(stage), default_model)
+
+
+class StageProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.symportal_root_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.symportal_root_directory)
+
+    def test_the_per_task_peak_memory_of_the_worker_pool_is_recorded(self):
+        worker_pool = FastPollingResultQueueWorkerPool(num_proc=2, multiprocess=True, persistent=True)
+        # The AutoConcurrencySelector reads the peak task memory of the same pool
+        auto_concurrency_selector = AutoConcurrencySelector(worker_pool=worker_pool)
+        stage_profiler = StageProfiler(
+            symportal_root_directory=self.symportal_root_directory, worker_pool=worker_pool)
+        stage_profiler.start_stage('initial_mothur_qc')
+        auto_concurrency_selector.select_num_proc(stage='initial_mothur_qc')
+        worker_pool.execute(worker_function=allocate_memory, work_items=[200, 10, 10])
+        stage_profiler.end_stage(num_proc=2)
+        stage_profiler.start_stage('med_decomposition')
+        auto_concurrency_selector.select_num_proc(stage='med_decomposition')
+        worker_pool.execute(worker_function=allocate_memory, work_items=[10, 10])
+        stage_profiler.end_stage(num_proc=2)
+        auto_concurrency_selector.select_num_proc(stage='seq_count_table_output')
+        worker_pool.close()
+
+        initial_mothur_qc_profile, med_decomposition_profile = stage_profiler.stage_profiles
+        self.assertGreater(initial_mothur_qc_profile['peak_task_memory_gb'], 0.19)
+        self.assertIsNotNone(med_decomposition_profile['peak_task_memory_gb'])
+        if os.path.exists('/proc/self/clear_refs'):
+            self.assertLess(med_decomposition_profile['peak_task_memory_gb'], 0.19)
+        # Neither reader of the pool's peak task memory resets that of the other
+        self.assertGreater(
+            auto_concurrency_selector.stage_to_measured_task_memory_gb_dict['initial_mothur_qc'], 0.19)
+
+        stage_profiler.write_stage_profiles(work_units_dict={'samples': 3, 'reads': 30000})
+        runtime_resource_estimator = RuntimeResourceEstimator(
+            symportal_root_directory=self.symportal_root_directory, num_proc=2)
+        self.assertAlmostEqual(
+            runtime_resource_estimator._get_calibrated_model('initial_mothur_qc')[4],
+            initial_mothur_qc_profile['peak_task_memory_gb'])
+
+    def test_the_peak_memory_of_the_main_process_is_recorded_for_a_stage_not_run_on_the_pool(self):
+        stage_profiler = StageProfiler(symportal_root_directory=self.symportal_root_directory)
+        stage_profiler.start_stage('data_set_sample_sequence_creation')
+        subprocess.run([sys.executable, '-c', 'memory = bytearray(300 * 1024 * 1024)'], check=True)
+        stage_profiler.end_stage(num_proc=1)
+        stage_profile = stage_profiler.stage_profiles[0]
+        self.assertGreater(stage_profile['peak_memory_gb'], 0.29)
+        self.assertIsNone(stage_profile['peak_task_memory_gb'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Tests of a command sent by the SymPortalDaemonClient to the SymPortalDaemonServer.
+Run from the SymPortal root directory: python3 -m pytest tests/symportal_daemon_tests.py
+"""
+import os
+import stat
+import sys
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from multiprocessing import Process
+import main
+from symportal_daemon import SymPortalDaemonServer, SymPortalDaemonClient
+
+
+def run_test_command(args_list):
+    print(f'args: {" ".join(args_list)}')
+    print(f'working directory: {os.getcwd()}')
+    if '--fail' in args_list:
+        raise ValueError('command failed')
+    os.system('echo output of a program run by the command')
+    exit(3)
+
+
+def serve_test_commands(socket_path):
+    # The daemon sends the output written to the file descriptors 1 and 2 so sys.stdout must not be replaced (by pytest)
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    SymPortalDaemonServer(
+        socket_path=socket_path, run_command=run_test_command,
+        check_command=main.SymPortalWorkFlowManager._check_daemon_command).serve_forever()
+
+
+class SymPortalDaemonRoundTripTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.temp_dir, 'sp.sock')
+        self.daemon = Process(target=serve_test_commands, args=(self.socket_path,))
+        self.daemon.start()
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.1)
+
+    def tearDown(self):
+        self.daemon.terminate()
+        self.daemon.join()
+        shutil.rmtree(self.temp_dir)
+
+    def _run_command(self, args_list):
+        output = []
+        with mock.patch.object(SymPortalDaemonClient, '_write', side_effect=output.append):
+            exit_status = SymPortalDaemonClient(socket_path=self.socket_path).run_command(args_list)
+        return exit_status, b''.join(output).decode()
+
+    def test_output_and_exit_status_are_returned_to_the_client(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+        exit_status, output = self._run_command(['--display_data_sets'])
+        self.assertEqual(exit_status, 3)
+        self.assertIn('args: --display_data_sets\n', output)
+        self.assertIn(f'working directory: {os.getcwd()}\n', output)
+        self.assertIn('output of a program run by the command\n', output)
+
+    def test_failed_command_does_not_stop_the_daemon(self):
+        exit_status, output = self._run_command(['--fail'])
+        self.assertEqual(exit_status, 1)
+        self.assertIn('ValueError: command failed', output)
+        exit_status, output = self._run_command(['--display_data_sets'])
+        self.assertEqual(exit_status, 3)
+
+    def test_job_queue_worker_and_daemon_commands_are_rejected_before_they_are_forked(self):
+        for args_list in [['--job_queue_worker'], ['--daemon', '--daemon_socket', 'other.sock']]:
+            exit_status, output = self._run_command(args_list)
+            self.assertEqual(exit_status, 1)
+            self.assertIn(f'{args_list[0]} cannot be run as a command of the SymPortal daemon', output)
+            # The command was not run
+            self.assertNotIn('args:', output)
+        exit_status, output = self._run_command(['--display_data_sets'])
+        self.assertEqual(exit_status, 3)
+
+    def test_socket_is_removed_when_the_daemon_stops(self):
+        self.daemon.terminate()
+        self.daemon.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Tests of the mothur and BLAST wrappers of symportal_utils. These require mothur (and BLAST) to be installed.
+Run from the SymPortal root directory: python3 -m pytest tests/symportal_utils_tests.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from symportal_utils import MothurAnalysis
+
+
+@unittest.skipUnless(shutil.which('mothur'), 'The initial QC requires mothur')
+class InitialQCSingleBatchTests(unittest.TestCase):
+    """The single batch initial QC must give the same sequences, with the same names, as the per-step QC
+    that is run by the InitialMothurWorker."""
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_data_dir_path = os.path.join(
+            os.path.abspath(os.path.dirname(__file__)), 'data', 'smith_subsampled_data')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_mothur_analysis(self, sample_name, qc_mode):
+        working_directory = os.path.join(self.temp_dir, qc_mode, sample_name)
+        os.makedirs(working_directory)
+        return MothurAnalysis(
+            name=sample_name, input_dir=working_directory, output_dir=working_directory,
+            fastq_gz_fwd_path=os.path.join(self.test_data_dir_path, f'{sample_name}.1_subsampled.fastq'),
+            fastq_gz_rev_path=os.path.join(self.test_data_dir_path, f'{sample_name}.2_subsampled.fastq'),
+            stdout_and_sterr_to_pipe=True)
+
+    def _get_seq_to_names_dict(self, mothur_analysis):
+        fasta_as_list = mothur_analysis.thread_safe_general.read_defined_file_to_list(mothur_analysis.fasta_path)
+        name_file_as_list = mothur_analysis.thread_safe_general.read_defined_file_to_list(
+            mothur_analysis.name_file_path)
+        representative_name_to_names_dict = {
+            line.split('\t')[0]: sorted(line.split('\t')[1].split(',')) for line in name_file_as_list}
+        return {fasta_as_list[i + 1]: representative_name_to_names_dict[fasta_as_list[i][1:]]
+                for i in range(0, len(fasta_as_list), 2)}
+
+    def test_single_batch_matches_per_step_qc(self):
+        for sample_name in ['A01', 'C01']:
+            per_step_mothur_analysis = self._get_mothur_analysis(sample_name, 'per_step')
+            per_step_num_contigs = per_step_mothur_analysis.execute_make_contigs()
+            per_step_mothur_analysis.execute_unique_seqs()
+            per_step_mothur_analysis.execute_pcr(do_reverse_pcr_as_well=True)
+            per_step_mothur_analysis.execute_unique_seqs()
+            per_step_mothur_analysis.execute_screen_seqs()
+            per_step_mothur_analysis.execute_split_abund()
+
+            single_batch_mothur_analysis = self._get_mothur_analysis(sample_name, 'single_batch')
+            single_batch_num_contigs = single_batch_mothur_analysis.execute_initial_qc_single_batch()
+
+            self.assertEqual(per_step_num_contigs, single_batch_num_contigs)
+            per_step_seq_to_names_dict = self._get_seq_to_names_dict(per_step_mothur_analysis)
+            single_batch_seq_to_names_dict = self._get_seq_to_names_dict(single_batch_mothur_analysis)
+            self.assertTrue(per_step_seq_to_names_dict)
+            self.assertEqual(per_step_seq_to_names_dict, single_batch_seq_to_names_dict)
+            # No read is counted in both orientations
+            all_names = [name for names in single_batch_seq_to_names_dict.values() for name in names]
+            self.assertEqual(len(all_names), len(set(all_names)))
+
+
+if __name__ == "__main__":
+    unittest.main()